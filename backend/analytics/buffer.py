@@ -0,0 +1,192 @@
+"""
+Analytics ingestion buffer
+Batches tracker writes so request handlers only append to memory
+"""
+import asyncio
+import logging
+import time
+from collections import deque, defaultdict
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A Redis operation: (command, key, *args), e.g. ("lpush", "events:x", payload)
+RedisOp = Tuple[Any, ...]
+
+
+def coalesce_redis_ops(ops: List[RedisOp]) -> List[Tuple[str, tuple]]:
+    """
+    Merge a batch of Redis operations into as few commands as possible
+
+    LPUSH/SADD values for the same key are sent in one command, INCRs become
+    a single INCRBY, and only the last LTRIM/EXPIRE per key is kept. The
+    resulting key state is the same as replaying the operations one by one.
+    """
+    pushes: Dict[str, list] = defaultdict(list)
+    members: Dict[str, list] = defaultdict(list)
+    increments: Dict[str, int] = defaultdict(int)
+    trims: Dict[str, Tuple[int, int]] = {}
+    expiries: Dict[str, int] = {}
+
+    for command, key, *args in ops:
+        if command == "lpush":
+            pushes[key].extend(args)
+        elif command == "sadd":
+            members[key].extend(args)
+        elif command == "incr":
+            increments[key] += args[0] if args else 1
+        elif command == "ltrim":
+            trims[key] = (args[0], args[1])
+        elif command == "expire":
+            expiries[key] = args[0]
+        else:
+            raise ValueError(f"Unsupported buffered Redis command: {command}")
+
+    commands: List[Tuple[str, tuple]] = []
+    commands.extend(("lpush", (key, *values)) for key, values in pushes.items())
+    commands.extend(("sadd", (key, *values)) for key, values in members.items())
+    commands.extend(("incrby", (key, amount)) for key, amount in increments.items())
+    commands.extend(("ltrim", (key, *bounds)) for key, bounds in trims.items())
+    commands.extend(("expire", (key, ttl)) for key, ttl in expiries.items())
+    return commands
+
+
+class AnalyticsBuffer:
+    """
+    Bounded in-process buffer of analytics records
+
+    Each record carries the Redis operations and the MongoDB document it
+    produces. A background task flushes the buffer when it reaches
+    `flush_size` records or every `flush_interval` seconds: all Redis
+    operations go out in one pipelined round trip and the documents with one
+    `insert_many` per collection. When the buffer is full new records are
+    dropped and counted rather than slowing down the request. An optional
+    `on_flush` coroutine receives each flushed batch of documents, grouped by
+    collection, after they have been written.
+    """
+
+    def __init__(self, max_size: int = 10000, flush_size: int = 500, flush_interval: float = 1.0):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._records: Deque[Tuple[List[RedisOp], Optional[str], Optional[Dict[str, Any]]]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._redis = None
+        self._db = None
+        self._on_flush: Optional[Callable[[Dict[str, List[Dict[str, Any]]]], Awaitable[None]]] = None
+        self.stats = {
+            "enqueued": 0,
+            "dropped": 0,
+            "flushed_records": 0,
+            "redis_commands": 0,
+            "mongo_documents": 0,
+            "flushes": 0,
+            "redis_failures": 0,
+            "mongo_failures": 0,
+            "last_flush_ms": 0.0
+        }
+
+    def append(self, redis_ops: List[RedisOp], collection: Optional[str] = None, document: Optional[Dict[str, Any]] = None) -> bool:
+        """Queue one record; returns False when it was dropped because the buffer is full"""
+        if len(self._records) >= self.max_size:
+            self.stats["dropped"] += 1
+            self._wakeup.set()
+            return False
+
+        self._records.append((redis_ops, collection, document))
+        self.stats["enqueued"] += 1
+        if len(self._records) >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    async def flush(self) -> int:
+        """Write out up to `flush_size` buffered records; returns how many were taken"""
+        if not self._records:
+            return 0
+
+        batch = [self._records.popleft() for _ in range(min(self.flush_size, len(self._records)))]
+        start = time.perf_counter()
+
+        ops: List[RedisOp] = []
+        documents: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for redis_ops, collection, document in batch:
+            ops.extend(redis_ops)
+            if collection and document is not None:
+                documents[collection].append(document)
+
+        if ops and self._redis is not None:
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                commands = coalesce_redis_ops(ops)
+                for command, args in commands:
+                    getattr(pipe, command)(*args)
+                await pipe.execute()
+                self.stats["redis_commands"] += len(commands)
+            except Exception as e:
+                self.stats["redis_failures"] += 1
+                logger.error(f"Failed to flush analytics to Redis: {e}")
+
+        if self._db is not None:
+            for collection, docs in documents.items():
+                try:
+                    await self._db[collection].insert_many(docs, ordered=False)
+                    self.stats["mongo_documents"] += len(docs)
+                except Exception as e:
+                    self.stats["mongo_failures"] += 1
+                    logger.error(f"Failed to flush analytics to MongoDB ({collection}): {e}")
+
+        if documents and self._on_flush is not None:
+            try:
+                await self._on_flush(documents)
+            except Exception as e:
+                logger.error(f"Analytics flush callback failed: {e}")
+
+        self.stats["flushes"] += 1
+        self.stats["flushed_records"] += len(batch)
+        self.stats["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return len(batch)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                # Drain in flush_size batches while the buffer stays above the threshold
+                while await self.flush() and len(self._records) >= self.flush_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Analytics buffer flush failed: {e}")
+
+    def start(self, redis_client, db, on_flush: Optional[Callable[[Dict[str, List[Dict[str, Any]]]], Awaitable[None]]] = None):
+        """Attach the sinks and start the background flusher"""
+        self._redis = redis_client
+        self._db = db
+        self._on_flush = on_flush
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flusher and write out whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while await self.flush():
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Buffer occupancy plus ingestion and drop counters"""
+        return {
+            **self.stats,
+            "pending": len(self._records),
+            "capacity": self.max_size
+        }
@@ -0,0 +1,246 @@
+"""
+Segmentation model fitting
+Pure training functions, run inside a process pool by UserSegmentation
+"""
+import logging
+from typing import Dict, List, Any, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+# Features the cluster characteristics and names are derived from
+SUMMARY_COLUMNS = [
+    'age', 'total_reservations', 'checkin_rate', 'avg_events_per_day',
+    'days_since_registration', 'page_views'
+]
+
+# Passes over the data for MiniBatchKMeans
+MINIBATCH_EPOCHS = 3
+
+
+def cluster_count(num_users: int, max_clusters: int) -> int:
+    """Clusters for a population: sqrt(n_users), between 2 and max_clusters"""
+    return max(2, min(max_clusters, int(np.sqrt(num_users))))
+
+
+def pca_components(num_features: int, num_users: int) -> int:
+    """PCA components: at most 3, the number of features or n_users - 1"""
+    return max(1, min(3, num_features, num_users - 1))
+
+
+def sampled_silhouette(X: np.ndarray, labels: np.ndarray, sample_size: int) -> float:
+    """Silhouette score on at most `sample_size` points (the full score is O(n²))"""
+    try:
+        if len(np.unique(labels)) < 2:
+            return 0.0
+        sample = sample_size if len(X) > sample_size else None
+        return float(silhouette_score(X, labels, sample_size=sample, random_state=42))
+    except Exception:
+        return 0.0
+
+
+def cluster_name(characteristics: Dict[str, Any], avg_page_views: float, cluster_id: int) -> str:
+    """Determine meaningful name for cluster based on characteristics"""
+    # High-value users: High reservations, high check-in rate
+    if (characteristics['avg_reservations'] > 3 and
+        characteristics['avg_checkin_rate'] > 0.8):
+        return "VIP Members"
+
+    # Regular attendees: Moderate reservations, good check-in rate
+    elif (characteristics['avg_reservations'] > 1 and
+          characteristics['avg_checkin_rate'] > 0.6):
+        return "Regular Attendees"
+
+    # New users: Recently registered, low activity
+    elif characteristics['avg_days_since_registration'] < 7:
+        return "New Users"
+
+    # Browsers: High page views, low reservations
+    elif avg_page_views > characteristics['avg_reservations'] * 3:
+        return "Browsers"
+
+    # At-risk: Old users, low recent activity
+    elif (characteristics['avg_days_since_registration'] > 30 and
+          characteristics['avg_events_per_day'] < 0.1):
+        return "At Risk"
+
+    return f"Segment {cluster_id}"
+
+
+def analyze_clusters(sizes: np.ndarray, means: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    """
+    Cluster characteristics and names from per-cluster sizes and means
+
+    Args:
+        sizes: users per cluster, indexed by cluster id
+        means: per-cluster means of SUMMARY_COLUMNS, indexed by cluster id
+    """
+    total = sizes.sum()
+    cluster_analysis = {}
+    for cluster_id in means.index:
+        size = int(sizes[cluster_id])
+        if size == 0:
+            continue
+        row = means.loc[cluster_id]
+        characteristics = {
+            'size': size,
+            'percentage': size / total * 100,
+            'avg_age': float(row['age']),
+            'avg_reservations': float(row['total_reservations']),
+            'avg_checkin_rate': float(row['checkin_rate']),
+            'avg_events_per_day': float(row['avg_events_per_day']),
+            'avg_days_since_registration': float(row['days_since_registration'])
+        }
+        name = cluster_name(characteristics, float(row['page_views']), int(cluster_id))
+        cluster_analysis[name] = {**characteristics, 'cluster_id': int(cluster_id)}
+    return cluster_analysis
+
+
+def _model(scaler, pca, kmeans, feature_columns: List[str], cluster_analysis: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'scaler': scaler,
+        'pca': pca,
+        'kmeans': kmeans,
+        'feature_columns': feature_columns,
+        'cluster_names': {
+            characteristics['cluster_id']: name
+            for name, characteristics in cluster_analysis.items()
+        }
+    }
+
+
+def fit_full(df: pd.DataFrame, max_clusters: int, silhouette_sample: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Fit StandardScaler, PCA and KMeans on an in-memory feature frame; returns (model, results)"""
+    num_users = len(df)
+    feature_columns = [col for col in df.columns if col != 'user_id']
+    X = df[feature_columns]
+    if X.shape[1] == 0:
+        raise ValueError("No features available for training")
+
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    n_components = pca_components(X.shape[1], num_users)
+    pca = PCA(n_components=n_components)
+    X_pca = pca.fit_transform(X_scaled)
+
+    optimal_clusters = cluster_count(num_users, max_clusters)
+    logger.info(f"Using {optimal_clusters} clusters for {num_users} users")
+    kmeans = KMeans(n_clusters=optimal_clusters, random_state=42, n_init=10)
+    labels = kmeans.fit_predict(X_pca)
+
+    sizes = np.bincount(labels, minlength=optimal_clusters)
+    means = X[SUMMARY_COLUMNS].groupby(labels).mean()
+    cluster_analysis = analyze_clusters(sizes, means)
+
+    results = {
+        'num_users': num_users,
+        'num_features': len(feature_columns),
+        'num_clusters': int(np.count_nonzero(sizes)),
+        'optimal_clusters': optimal_clusters,
+        'pca_components': n_components,
+        'cluster_analysis': cluster_analysis,
+        'silhouette_score': sampled_silhouette(X_pca, labels, silhouette_sample),
+        'model_type': 'ml_clustering',
+        'training_mode': 'full'
+    }
+    return _model(scaler, pca, kmeans, feature_columns, cluster_analysis), results
+
+
+def _chunks(num_rows: int, chunk_size: int, min_rows: int) -> Iterator[slice]:
+    """Row slices of about chunk_size; a tail shorter than min_rows joins the previous slice"""
+    starts = list(range(0, num_rows, chunk_size))
+    if len(starts) > 1 and num_rows - starts[-1] < min_rows:
+        starts.pop()
+    for index, start in enumerate(starts):
+        end = starts[index + 1] if index + 1 < len(starts) else num_rows
+        yield slice(start, end)
+
+
+def fit_streamed(
+    path: str,
+    feature_columns: List[str],
+    max_clusters: int,
+    chunk_size: int,
+    silhouette_sample: int
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Fit the model chunk by chunk from a float64 feature matrix on disk
+
+    The matrix (rows × feature_columns, row-major) is memory-mapped and read
+    in `chunk_size` slices: StandardScaler and IncrementalPCA are fitted with
+    `partial_fit`, then MiniBatchKMeans runs MINIBATCH_EPOCHS passes of
+    `partial_fit`. Memory stays bounded by the chunk size whatever the number
+    of users; cluster characteristics are accumulated as per-cluster sums and
+    the silhouette score is computed on a fixed-size sample.
+    """
+    data = np.memmap(path, dtype=np.float64, mode='r').reshape(-1, len(feature_columns))
+    num_users = len(data)
+    optimal_clusters = cluster_count(num_users, max_clusters)
+    n_components = pca_components(len(feature_columns), num_users)
+    min_rows = max(n_components, optimal_clusters)
+    logger.info(f"Using {optimal_clusters} clusters for {num_users} users (minibatch)")
+
+    def frame(rows: slice) -> pd.DataFrame:
+        return pd.DataFrame(np.asarray(data[rows]), columns=feature_columns)
+
+    scaler = StandardScaler()
+    for rows in _chunks(num_users, chunk_size, min_rows):
+        scaler.partial_fit(frame(rows))
+
+    pca = IncrementalPCA(n_components=n_components)
+    for rows in _chunks(num_users, chunk_size, min_rows):
+        pca.partial_fit(scaler.transform(frame(rows)))
+
+    kmeans = MiniBatchKMeans(
+        n_clusters=optimal_clusters, random_state=42, batch_size=chunk_size, n_init=3
+    )
+    for _ in range(MINIBATCH_EPOCHS):
+        for rows in _chunks(num_users, chunk_size, min_rows):
+            kmeans.partial_fit(pca.transform(scaler.transform(frame(rows))))
+
+    # Final pass: cluster sizes and sums for the characteristics
+    summary_positions = [feature_columns.index(column) for column in SUMMARY_COLUMNS]
+    sizes = np.zeros(optimal_clusters, dtype=np.int64)
+    sums = np.zeros((optimal_clusters, len(SUMMARY_COLUMNS)))
+    sample_rows = np.sort(np.random.default_rng(42).choice(
+        num_users, size=min(silhouette_sample, num_users), replace=False
+    ))
+    sample_points, sample_labels = [], []
+    for rows in _chunks(num_users, chunk_size, min_rows):
+        chunk = frame(rows)
+        X_pca = pca.transform(scaler.transform(chunk))
+        labels = kmeans.predict(X_pca)
+        sizes += np.bincount(labels, minlength=optimal_clusters)
+        np.add.at(sums, labels, chunk.values[:, summary_positions])
+
+        in_chunk = sample_rows[(sample_rows >= rows.start) & (sample_rows < rows.stop)] - rows.start
+        sample_points.append(X_pca[in_chunk])
+        sample_labels.append(labels[in_chunk])
+
+    means = pd.DataFrame(
+        sums / np.maximum(sizes, 1)[:, None], columns=SUMMARY_COLUMNS
+    )
+    cluster_analysis = analyze_clusters(sizes, means)
+
+    results = {
+        'num_users': num_users,
+        'num_features': len(feature_columns),
+        'num_clusters': int(np.count_nonzero(sizes)),
+        'optimal_clusters': optimal_clusters,
+        'pca_components': n_components,
+        'cluster_analysis': cluster_analysis,
+        'silhouette_score': sampled_silhouette(
+            np.concatenate(sample_points), np.concatenate(sample_labels), silhouette_sample
+        ),
+        'silhouette_sample_size': len(sample_rows),
+        'model_type': 'ml_clustering',
+        'training_mode': 'minibatch'
+    }
+    return _model(scaler, pca, kmeans, feature_columns, cluster_analysis), results
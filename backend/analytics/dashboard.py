@@ -5,23 +5,105 @@ Handles WebSocket connections and real-time metric broadcasting
 import asyncio
 import json
 import logging
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
 from fastapi import WebSocket, WebSocketDisconnect
 from datetime import datetime
 import redis.asyncio as redis
 import os
 
+from analytics.lease import RedisLease, worker_id
+from analytics.system_metrics import SystemMetricsSampler
+from core.config import settings
+
 logger = logging.getLogger(__name__)
 
+# Hourly counters and endpoints shown on the dashboard
+EVENT_TYPES = ['page_view', 'event_booking', 'user_registration', 'event_checkin']
+ENDPOINTS = ['events', 'reservations', 'login', 'register']
+
+# Cross-worker fan-out: one elected producer publishes, every worker relays
+BROADCAST_CHANNEL = "dashboard:broadcast"
+LEADER_KEY = "dashboard:leader"
+
+# Push event names per reservation status change
+RESERVATION_EVENTS = {
+    'confirmed': 'reservation_created',
+    'checked_in': 'reservation_checked_in',
+    'cancelled': 'reservation_cancelled'
+}
+
+class DashboardConnection:
+    """One dashboard WebSocket with its bounded outgoing queue"""
+    
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.connected_at = time.monotonic()
+        self.last_seen = self.connected_at
+        self.sent = 0
+        self.dropped = 0
+    
+    def offer(self, message: str, drop_oldest: bool) -> bool:
+        """
+        Queue a message without waiting
+        
+        When the queue is full the oldest queued message is discarded if
+        `drop_oldest`, otherwise nothing is queued and False is returned.
+        """
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            if not drop_oldest:
+                return False
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.dropped += 1
+            self.queue.put_nowait(message)
+            return True
+
+
 class DashboardManager:
     """
     Manages real-time dashboard connections and metric broadcasting
+    
+    Every connection gets a bounded send queue drained by its own writer
+    task, so a broadcast only enqueues and a stalled browser never delays
+    the other dashboards. A client whose queue fills up either loses its
+    oldest queued messages or is disconnected (DASHBOARD_SLOW_CLIENT_POLICY);
+    a send that takes longer than DASHBOARD_SEND_TIMEOUT, or a client silent
+    for DASHBOARD_PING_TIMEOUT despite periodic pings, is disconnected.
     """
     
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.connections: Dict[WebSocket, DashboardConnection] = {}
         self.redis_client = None
         self.broadcast_task = None
+        self.ping_task = None
+        self.subscribe_task = None
+        self.worker_id = worker_id()
+        self.leadership = RedisLease(LEADER_KEY, self.worker_id)
+        self._listening = False
+        self.drop_oldest = settings.DASHBOARD_SLOW_CLIENT_POLICY != "disconnect"
+        self.connection_stats = {
+            "connected_total": 0,
+            "sent_messages": 0,
+            "dropped_messages": 0,
+            "slow_disconnects": 0,
+            "stale_disconnects": 0
+        }
+        self.interval = settings.DASHBOARD_BROADCAST_INTERVAL
+        self.system_sampler = SystemMetricsSampler(
+            interval=settings.SYSTEM_METRICS_INTERVAL,
+            window=settings.SYSTEM_METRICS_WINDOW
+        )
+        self._snapshot: Dict[str, Any] = {}
+        self._snapshot_at = 0.0
+        self._snapshot_lock = asyncio.Lock()
         
     async def initialize(self):
         """Initialize Redis connection and start broadcasting"""
@@ -29,8 +111,19 @@ class DashboardManager:
             redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379')
             self.redis_client = redis.from_url(redis_url)
             
-            # Start broadcasting task
+            # Sample system metrics in the background
+            self.system_sampler.start()
+            
+            # Start broadcasting, relaying and keepalive tasks
             self.broadcast_task = asyncio.create_task(self._broadcast_loop())
+            self.subscribe_task = asyncio.create_task(self._subscribe_loop())
+            self.ping_task = asyncio.create_task(self._ping_loop())
+            
+            # Push booking, check-in and cancellation events to the dashboards
+            if not self._listening:
+                from services.reservation_service import reservation_service
+                reservation_service.add_listener(self.publish_reservation_changes)
+                self._listening = True
             
             logger.info("Dashboard manager initialized successfully")
             
@@ -38,12 +131,19 @@ class DashboardManager:
             logger.error(f"Failed to initialize dashboard manager: {e}")
             raise
 
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.connections)
+
     async def connect(self, websocket: WebSocket):
-        """Accept new WebSocket connection"""
+        """Accept new WebSocket connection and start its writer"""
         try:
             await websocket.accept()
-            self.active_connections.append(websocket)
-            logger.info(f"New dashboard connection. Total: {len(self.active_connections)}")
+            connection = DashboardConnection(websocket, settings.DASHBOARD_SEND_QUEUE_SIZE)
+            connection.writer = asyncio.create_task(self._writer(connection))
+            self.connections[websocket] = connection
+            self.connection_stats["connected_total"] += 1
+            logger.info(f"New dashboard connection. Total: {len(self.connections)}")
             
             # Send initial metrics to new connection
             await self._send_initial_metrics(websocket)
@@ -52,17 +152,64 @@ class DashboardManager:
             logger.error(f"Failed to connect dashboard websocket: {e}")
 
     async def disconnect(self, websocket: WebSocket):
-        """Remove WebSocket connection"""
-        try:
-            self.active_connections.remove(websocket)
-            logger.info(f"Dashboard disconnected. Total: {len(self.active_connections)}")
-        except ValueError:
+        """Remove WebSocket connection and stop its writer"""
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
             # Connection was already removed
+            return
+        
+        self.connection_stats["sent_messages"] += connection.sent
+        self.connection_stats["dropped_messages"] += connection.dropped
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        try:
+            await websocket.close()
+        except Exception:
             pass
+        logger.info(f"Dashboard disconnected. Total: {len(self.connections)}")
+
+    def touch(self, websocket: WebSocket):
+        """Record that a client is alive (any message counts as a pong)"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+
+    def send(self, websocket: WebSocket, message: str):
+        """Queue a message for one connection"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self._enqueue(connection, message)
+
+    def _enqueue(self, connection: DashboardConnection, message: str):
+        if not connection.offer(message, self.drop_oldest):
+            self.connection_stats["slow_disconnects"] += 1
+            logger.warning("Disconnecting dashboard that cannot keep up")
+            asyncio.create_task(self.disconnect(connection.websocket))
+
+    async def _writer(self, connection: DashboardConnection):
+        """Drain one connection's queue; a failed or stalled send ends the connection"""
+        try:
+            while True:
+                message = await connection.queue.get()
+                await asyncio.wait_for(
+                    connection.websocket.send_text(message),
+                    timeout=settings.DASHBOARD_SEND_TIMEOUT
+                )
+                connection.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.connection_stats["slow_disconnects"] += 1
+            logger.warning("Dashboard send timed out, disconnecting")
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to send message to websocket: {e}")
+        await self.disconnect(connection.websocket)
 
     async def broadcast_metrics(self, metrics: Dict[str, Any]):
-        """Broadcast metrics to all connected dashboards"""
-        if not self.active_connections:
+        """Broadcast metrics to the dashboards connected to this worker"""
+        if not self.connections:
             return
             
         message = json.dumps({
@@ -71,85 +218,208 @@ class DashboardManager:
             'timestamp': datetime.utcnow().isoformat()
         })
         
-        # Send to all connections
-        disconnected = []
-        for connection in self.active_connections[:]:  # Copy list to avoid iteration issues
+        self._relay(message)
+
+    def _relay(self, message: str):
+        """Hand a serialized message to every local writer"""
+        for connection in list(self.connections.values()):
+            self._enqueue(connection, message)
+
+    async def _ping_loop(self):
+        """Ping every dashboard and drop the ones that stopped answering"""
+        while True:
+            await asyncio.sleep(settings.DASHBOARD_PING_INTERVAL)
             try:
-                await connection.send_text(message)
-            except WebSocketDisconnect:
-                disconnected.append(connection)
+                now = time.monotonic()
+                ping = json.dumps({'type': 'ping', 'timestamp': datetime.utcnow().isoformat()})
+                for connection in list(self.connections.values()):
+                    if now - connection.last_seen > settings.DASHBOARD_PING_TIMEOUT:
+                        self.connection_stats["stale_disconnects"] += 1
+                        await self.disconnect(connection.websocket)
+                    else:
+                        self._enqueue(connection, ping)
             except Exception as e:
-                logger.error(f"Failed to send message to websocket: {e}")
-                disconnected.append(connection)
-        
-        # Remove disconnected connections
-        for conn in disconnected:
-            await self.disconnect(conn)
+                logger.error(f"Error in dashboard ping loop: {e}")
+
+    def get_connection_stats(self) -> Dict[str, Any]:
+        """Connection count, queue depths and send/drop counters"""
+        depths = [connection.queue.qsize() for connection in self.connections.values()]
+        return {
+            **self.connection_stats,
+            "connections": len(self.connections),
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_capacity": settings.DASHBOARD_SEND_QUEUE_SIZE,
+            "sent_messages": self.connection_stats["sent_messages"] + sum(
+                connection.sent for connection in self.connections.values()
+            ),
+            "dropped_messages": self.connection_stats["dropped_messages"] + sum(
+                connection.dropped for connection in self.connections.values()
+            )
+        }
+
+    @property
+    def is_leader(self) -> bool:
+        return self.leadership.held
+
+    async def _hold_leadership(self) -> bool:
+        """Take or renew the producer lease; True while this worker is the producer"""
+        was_leader = self.leadership.held
+        if await self.leadership.hold(self.redis_client, int(self.interval * 3 * 1000)) and not was_leader:
+            logger.info(f"Dashboard producer is now {self.worker_id}")
+        return self.leadership.held
 
     async def _broadcast_loop(self):
-        """Main broadcasting loop that sends metrics every 5 seconds"""
+        """Producer loop: the elected worker publishes one snapshot per interval"""
         while True:
             try:
-                if self.active_connections:
-                    metrics = await self._get_current_metrics()
-                    await self.broadcast_metrics(metrics)
+                if await self._hold_leadership():
+                    metrics = await self.get_metrics()
+                    await self.redis_client.publish(BROADCAST_CHANNEL, json.dumps({
+                        'type': 'metrics_update',
+                        'data': metrics,
+                        'timestamp': datetime.utcnow().isoformat()
+                    }))
                 
-                await asyncio.sleep(5)  # Broadcast every 5 seconds
+                await asyncio.sleep(self.interval)
                 
             except Exception as e:
+                # Without Redis, fall back to broadcasting this worker's own view
                 logger.error(f"Error in broadcast loop: {e}")
-                await asyncio.sleep(5)
+                self.leadership.held = False
+                if self.connections:
+                    await self.broadcast_metrics(await self.get_metrics())
+                await asyncio.sleep(self.interval)
+
+    async def _subscribe_loop(self):
+        """Relay every message published on the broadcast channel to local sockets"""
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(BROADCAST_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self._on_published(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Dashboard subscription failed, resubscribing: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    def _on_published(self, data):
+        text = data.decode('utf-8') if isinstance(data, bytes) else data
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError:
+            return
+        if payload.get('type') == 'metrics_update' and not self.is_leader:
+            # Followers serve the producer's snapshot instead of recomputing it
+            self._snapshot = payload.get('data', {})
+            self._snapshot_at = time.monotonic()
+        self._relay(text)
+
+    async def publish_event(self, event: str, data: Dict[str, Any]):
+        """Push an event to every dashboard on every worker"""
+        message = json.dumps({
+            'type': 'push_event',
+            'event': event,
+            'data': data,
+            'timestamp': datetime.utcnow().isoformat()
+        }, default=str)
+        try:
+            if self.redis_client is None:
+                raise RuntimeError("Redis not initialized")
+            await self.redis_client.publish(BROADCAST_CHANNEL, message)
+        except Exception as e:
+            logger.error(f"Failed to publish dashboard event {event}: {e}")
+            self._relay(message)
+
+    async def publish_reservation_changes(self, changes: List[Dict[str, Any]]):
+        """Reservation listener: push one event per status change"""
+        for change in changes:
+            event = RESERVATION_EVENTS.get(change['status'])
+            if event:
+                await self.publish_event(event, {
+                    'reservation_id': change['reservation_id'],
+                    'event_id': change['event_id'],
+                    'user_id': change['user_id']
+                })
 
     async def _send_initial_metrics(self, websocket: WebSocket):
         """Send initial metrics to newly connected dashboard"""
         try:
-            metrics = await self._get_current_metrics()
+            metrics = await self.get_metrics()
             initial_message = json.dumps({
                 'type': 'initial_metrics',
                 'data': metrics,
                 'timestamp': datetime.utcnow().isoformat()
             })
-            await websocket.send_text(initial_message)
+            self.send(websocket, initial_message)
         except Exception as e:
             logger.error(f"Failed to send initial metrics: {e}")
 
+    async def get_metrics(self) -> Dict[str, Any]:
+        """
+        Current metrics snapshot, built at most once per broadcast interval
+        
+        The broadcast loop, new connections and the metrics endpoint all read
+        the same snapshot; concurrent callers wait for a single rebuild.
+        """
+        if time.monotonic() - self._snapshot_at < self.interval:
+            return self._snapshot
+        
+        async with self._snapshot_lock:
+            if time.monotonic() - self._snapshot_at >= self.interval:
+                self._snapshot = await self._get_current_metrics()
+                self._snapshot_at = time.monotonic()
+            return self._snapshot
+
     async def _get_current_metrics(self) -> Dict[str, Any]:
-        """Get current metrics from Redis"""
+        """Get current metrics from Redis in one pipelined round trip"""
         try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.scard("active_users")
+            for event_type in EVENT_TYPES:
+                pipe.get(f"counter:{event_type}:hourly")
+            for endpoint in ENDPOINTS:
+                perf_key = f"perf:{endpoint}"
+                pipe.lrange(f"{perf_key}:times", 0, -1)
+                pipe.get(f"{perf_key}:total")
+                pipe.get(f"{perf_key}:success")
+            results = iter(await pipe.execute())
+            
             metrics = {}
             
             # Active users
-            active_users = await self.redis_client.scard("active_users")
-            metrics['active_users'] = active_users
+            metrics['active_users'] = next(results)
             
             # Hourly event counters
-            event_types = ['page_view', 'event_booking', 'user_registration', 'event_checkin']
-            for event_type in event_types:
-                counter_key = f"counter:{event_type}:hourly"
-                count = await self.redis_client.get(counter_key)
+            for event_type in EVENT_TYPES:
+                count = next(results)
                 metrics[f'{event_type}_hourly'] = int(count) if count else 0
             
             # Performance metrics
-            endpoints = ['events', 'reservations', 'login', 'register']
             performance_data = {}
-            for endpoint in endpoints:
-                perf_key = f"perf:{endpoint}"
+            for endpoint in ENDPOINTS:
+                times, total, success = next(results), next(results), next(results)
                 
-                # Average response time
-                times = await self.redis_client.lrange(f"{perf_key}:times", 0, -1)
+                # Response times
                 if times:
-                    avg_time = sum(float(t) for t in times) / len(times)
-                    performance_data[f'{endpoint}_avg_response'] = round(avg_time, 3)
-                    performance_data[f'{endpoint}_max_response'] = round(max(float(t) for t in times), 3)
-                    performance_data[f'{endpoint}_min_response'] = round(min(float(t) for t in times), 3)
+                    times = [float(t) for t in times]
+                    performance_data[f'{endpoint}_avg_response'] = round(sum(times) / len(times), 3)
+                    performance_data[f'{endpoint}_max_response'] = round(max(times), 3)
+                    performance_data[f'{endpoint}_min_response'] = round(min(times), 3)
                 else:
                     performance_data[f'{endpoint}_avg_response'] = 0
                     performance_data[f'{endpoint}_max_response'] = 0
                     performance_data[f'{endpoint}_min_response'] = 0
                 
                 # Success rate
-                total = await self.redis_client.get(f"{perf_key}:total")
-                success = await self.redis_client.get(f"{perf_key}:success")
                 if total and int(total) > 0:
                     success_rate = (int(success) if success else 0) / int(total) * 100
                     performance_data[f'{endpoint}_success_rate'] = round(success_rate, 2)
@@ -159,8 +429,10 @@ class DashboardManager:
             metrics['performance'] = performance_data
             
             # System metrics
-            system_metrics = await self._get_system_metrics()
-            metrics['system'] = system_metrics
+            metrics['system'] = self._get_system_metrics()
+            
+            # Dashboard fan-out
+            metrics['dashboard'] = self.get_connection_stats()
             
             return metrics
             
@@ -168,29 +440,9 @@ class DashboardManager:
             logger.error(f"Failed to get current metrics: {e}")
             return {}
 
-    async def _get_system_metrics(self) -> Dict[str, Any]:
-        """Get system performance metrics"""
-        try:
-            import psutil
-            
-            # CPU and Memory usage
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
-            return {
-                'cpu_percent': cpu_percent,
-                'memory_percent': memory.percent,
-                'memory_used_gb': round(memory.used / (1024**3), 2),
-                'memory_total_gb': round(memory.total / (1024**3), 2),
-                'disk_percent': disk.percent,
-                'disk_used_gb': round(disk.used / (1024**3), 2),
-                'disk_total_gb': round(disk.total / (1024**3), 2)
-            }
-            
-        except Exception as e:
-            logger.error(f"Failed to get system metrics: {e}")
-            return {}
+    def _get_system_metrics(self) -> Dict[str, Any]:
+        """Latest system performance sample from the background sampler"""
+        return self.system_sampler.snapshot()
 
     async def get_historical_data(self, metric_name: str, hours: int = 24) -> List[Dict[str, Any]]:
         """Get historical data for charts"""
@@ -256,18 +508,23 @@ class DashboardManager:
         try:
             if self.broadcast_task:
                 self.broadcast_task.cancel()
+            if self.ping_task:
+                self.ping_task.cancel()
+            if self.subscribe_task:
+                self.subscribe_task.cancel()
+            
+            # Let another worker take over producing right away
+            if self.redis_client:
+                await self.leadership.release(self.redis_client)
+            
+            await self.system_sampler.stop()
                 
             if self.redis_client:
                 await self.redis_client.close()
                 
             # Close all WebSocket connections
-            for connection in self.active_connections[:]:
-                try:
-                    await connection.close()
-                except:
-                    pass
-            
-            self.active_connections.clear()
+            for websocket in self.active_connections:
+                await self.disconnect(websocket)
             
         except Exception as e:
             logger.error(f"Failed to cleanup dashboard manager: {e}")
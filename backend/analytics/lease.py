@@ -0,0 +1,53 @@
+"""
+Redis leases - elect one worker for work that must not run once per process
+
+A lease is a Redis key holding the owner's id with an expiry. It is taken
+with `SET NX PX` and renewed or released with compare-and-set scripts, so only
+the current holder can extend or drop it. When the holder dies the key
+expires and another worker takes over.
+"""
+import os
+import socket
+import uuid
+
+# Extend the lease only while this worker still holds it
+RENEW_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def worker_id() -> str:
+    """Identifier of this process, unique across hosts and restarts"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class RedisLease:
+    """Single-holder lease on one Redis key"""
+
+    def __init__(self, key: str, holder: str):
+        self.key = key
+        self.holder = holder
+        self.held = False
+
+    async def hold(self, redis_client, lease_ms: int) -> bool:
+        """Renew the lease if held, otherwise try to take it; True while held"""
+        if self.held:
+            self.held = bool(await redis_client.eval(RENEW_LEASE, 1, self.key, self.holder, lease_ms))
+        if not self.held:
+            self.held = bool(await redis_client.set(self.key, self.holder, nx=True, px=lease_ms))
+        return self.held
+
+    async def release(self, redis_client):
+        """Give the lease up so another worker can take it right away"""
+        if self.held:
+            self.held = False
+            await redis_client.eval(RELEASE_LEASE, 1, self.key, self.holder)
@@ -0,0 +1,114 @@
+"""
+Model registry - Versioned MongoDB storage for trained segmentation models
+
+Every training run is saved as a new version: the pickled artifacts go to the
+`model_artifacts` GridFS bucket and the metadata to a `model_versions`
+document, so every replica and every redeploy sees the same models. The
+metadata document is written last and points at its artifact file, so a
+version only becomes visible once its artifacts are complete; the latest
+version is the newest metadata document. Versions beyond `keep` are pruned.
+
+The registry runs on the API's Motor database; pickling happens in a thread
+so large models never block the event loop.
+"""
+
+import asyncio
+import json
+import logging
+import pickle
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import DESCENDING
+
+logger = logging.getLogger(__name__)
+
+
+def _plain(value: Any) -> Any:
+    """JSON fallback for numpy scalars and other non-JSON values"""
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class ModelRegistry:
+    """Versioned store for one named model"""
+
+    BUCKET = "model_artifacts"
+
+    def __init__(self, db, name: str, keep: int = 5):
+        self.versions = db.model_versions
+        self.artifacts = AsyncIOMotorGridFSBucket(db, bucket_name=self.BUCKET)
+        self.name = name
+        self.keep = max(1, keep)
+
+    async def save(self, artifacts: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store a new model version and make it the latest
+
+        Returns the stored metadata, including the assigned `version`.
+        """
+        created_at = datetime.utcnow()
+        version = f"{created_at.strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        # Plain JSON types only (training results may hold numpy scalars)
+        metadata = json.loads(json.dumps({
+            **metadata,
+            "name": self.name,
+            "version": version,
+            "created_at": created_at.isoformat()
+        }, default=_plain))
+
+        payload = await asyncio.to_thread(pickle.dumps, artifacts, pickle.HIGHEST_PROTOCOL)
+        artifact_id = await self.artifacts.upload_from_stream(
+            f"{self.name}/{version}.pkl",
+            payload,
+            metadata={"name": self.name, "version": version}
+        )
+        await self.versions.insert_one({**metadata, "artifact_id": artifact_id})
+
+        await self._prune()
+        logger.info(f"Saved {self.name} model version {version}")
+        return metadata
+
+    async def latest_version(self) -> Optional[str]:
+        """Newest stored version, or None when nothing is stored"""
+        doc = await self.versions.find_one(
+            {"name": self.name}, {"_id": 0, "version": 1}, sort=[("version", DESCENDING)]
+        )
+        return doc["version"] if doc else None
+
+    async def load(self, version: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Artifacts and metadata of one version"""
+        metadata = await self.versions.find_one({"name": self.name, "version": version}, {"_id": 0})
+        if metadata is None:
+            raise KeyError(f"Unknown {self.name} model version {version}")
+        stream = await self.artifacts.open_download_stream(metadata.pop("artifact_id"))
+        artifacts = await asyncio.to_thread(pickle.loads, await stream.read())
+        return artifacts, metadata
+
+    async def load_latest(self) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Artifacts and metadata of the latest version, or None"""
+        version = await self.latest_version()
+        if version is None:
+            return None
+        return await self.load(version)
+
+    async def list_versions(self) -> List[Dict[str, Any]]:
+        """Metadata of every stored version, newest first"""
+        return await self.versions.find(
+            {"name": self.name}, {"_id": 0, "artifact_id": 0}
+        ).sort("version", DESCENDING).to_list(length=None)
+
+    async def _prune(self):
+        """Delete versions beyond the newest `keep`; the latest one is always kept"""
+        stale = await self.versions.find(
+            {"name": self.name}, {"_id": 1, "artifact_id": 1}
+        ).sort("version", DESCENDING).skip(self.keep).to_list(length=None)
+        for doc in stale:
+            # Metadata first, so a version is never listed without its artifacts
+            await self.versions.delete_one({"_id": doc["_id"]})
+            try:
+                await self.artifacts.delete(doc["artifact_id"])
+            except NoFile:
+                pass
@@ -2,20 +2,225 @@
 User Segmentation System
 Uses machine learning to segment users based on behavior patterns
 """
+import asyncio
 import logging
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Tuple
-from sklearn.cluster import KMeans
+from typing import Dict, List, Any, Optional, Tuple
 from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-from pymongo import MongoClient
+from concurrent.futures import ProcessPoolExecutor
 import os
-import pickle
+import tempfile
+import redis.asyncio as redis
+
+from core.config import settings
+from core.database import database
+from core.feature_store import feature_store, field_key, window_start, window_counters
+from analytics import clustering
+from analytics.lease import RedisLease, worker_id
+from analytics.model_registry import ModelRegistry
 
 logger = logging.getLogger(__name__)
 
+# Categories with a dedicated preference column in the feature frame
+PREFERENCE_CATEGORIES = [
+    'Dominican Cinema', 'Classic Cinema', 'General Cinema', 'Workshops',
+    'Concerts', 'Talks/Conferences', 'Art Exhibitions', '3D Immersive Experiences'
+]
+
+# Only the fields feature extraction reads are loaded
+USER_PROJECTION = {'_id': 0, 'id': 1, 'age': 1, 'created_at': 1}
+USER_EVENT_PROJECTION = {'_id': 0, 'user_id': 1, 'event_type': 1, 'timestamp': 1, 'session_id': 1}
+RESERVATION_PROJECTION = {'_id': 0, 'user_id': 1, 'event_id': 1, 'status': 1}
+EVENT_PROJECTION = {'_id': 0, 'id': 1, 'category': 1}
+
+# Scheduled scoring and retraining run on one elected worker
+LEADER_KEY = "segmentation:leader"
+
+
+def _preference_column(category: str) -> str:
+    return f'prefers_{category.lower().replace(" ", "_").replace("/", "_")}'
+
+
+async def _load_docs(collection, query: Dict[str, Any], projection: Dict[str, int]) -> List[Dict[str, Any]]:
+    """Every projected document matching `query`"""
+    return await collection.find(query, projection).batch_size(10000).to_list(length=None)
+
+
+def _load_frame(docs: List[Dict[str, Any]], projection: Dict[str, int]) -> pd.DataFrame:
+    """DataFrame from projected documents, with every projected column present"""
+    columns = [field for field, include in projection.items() if include and field != '_id']
+    return pd.DataFrame(docs, columns=columns)
+
+
+def _parse_timestamps(values: pd.Series) -> pd.Series:
+    """ISO strings to naive UTC timestamps; unparseable values become NaT"""
+    parsed = pd.to_datetime(values, errors='coerce', utc=True, format='ISO8601')
+    return parsed.dt.tz_localize(None)
+
+
+def build_feature_frame(
+    users: pd.DataFrame,
+    user_events: pd.DataFrame,
+    reservations: pd.DataFrame,
+    event_categories: pd.Series,
+    now: datetime = None
+) -> Tuple[pd.DataFrame, sparse.csr_matrix, List[str]]:
+    """
+    Build one feature row per user with grouped operations
+
+    Every input is grouped once by user, so the cost is linear in the number
+    of users, analytics events and reservations instead of users × events.
+
+    Args:
+        users: columns id, age, created_at
+        user_events: columns user_id, event_type, timestamp, session_id
+        reservations: columns user_id, event_id, status
+        event_categories: event category indexed by event id
+        now: reference time for registration age (defaults to utcnow)
+
+    Returns:
+        (features, category_matrix, category_labels) where category_matrix is a
+        sparse users × categories matrix of reservation counts, with rows in
+        the order of `features`
+    """
+    now = now or datetime.utcnow()
+    users = users.drop_duplicates('id')
+    event_categories = event_categories[~event_categories.index.duplicated()]
+    user_ids = pd.Index(users['id'], name='user_id')
+    
+    features = pd.DataFrame(index=user_ids)
+    features['age'] = users['age'].fillna(25).values
+    created_at = _parse_timestamps(users['created_at'])
+    features['days_since_registration'] = (now - created_at).dt.days.fillna(30).astype(int).values
+    
+    # Event interaction features
+    events = user_events[user_events['user_id'].isin(user_ids)]
+    by_user = events['user_id']
+    features['total_events'] = by_user.value_counts()
+    features['unique_sessions'] = events['session_id'].fillna('default').groupby(by_user).nunique()
+    features['page_views'] = (events['event_type'] == 'page_view').groupby(by_user).sum()
+    features['event_bookings'] = (events['event_type'] == 'event_booking').groupby(by_user).sum()
+    features['checkins'] = (events['event_type'] == 'event_checkin').groupby(by_user).sum()
+    
+    # Time-based features
+    timed = pd.DataFrame({
+        'user_id': by_user.values,
+        'timestamp': _parse_timestamps(events['timestamp']).values
+    }).dropna()
+    span = timed.groupby('user_id')['timestamp'].agg(['min', 'max'])
+    features['days_active'] = (span['max'] - span['min']).dt.days + 1
+    features['avg_events_per_day'] = features['total_events'] / features['days_active'].clip(lower=1)
+    hours = timed['timestamp'].dt.hour
+    features['prefers_morning'] = ((hours >= 6) & (hours < 12)).groupby(timed['user_id']).mean()
+    features['prefers_afternoon'] = ((hours >= 12) & (hours < 18)).groupby(timed['user_id']).mean()
+    features['prefers_evening'] = ((hours >= 18) & (hours < 24)).groupby(timed['user_id']).mean()
+    
+    # Reservation features
+    user_reservations = reservations[reservations['user_id'].isin(user_ids)]
+    by_user = user_reservations['user_id']
+    features['total_reservations'] = by_user.value_counts()
+    features['confirmed_reservations'] = (user_reservations['status'] == 'confirmed').groupby(by_user).sum()
+    features['checked_in_reservations'] = (user_reservations['status'] == 'checked_in').groupby(by_user).sum()
+    features['cancelled_reservations'] = (user_reservations['status'] == 'cancelled').groupby(by_user).sum()
+    
+    features = features.fillna(0)
+    
+    total = features['total_reservations'].where(features['total_reservations'] > 0)
+    features['checkin_rate'] = (features['checked_in_reservations'] / total).fillna(0)
+    features['cancellation_rate'] = (features['cancelled_reservations'] / total).fillna(0)
+    
+    # Category preferences as a sparse users × categories count matrix
+    categories = user_reservations['event_id'].map(event_categories)
+    known = categories.notna()
+    category_codes, category_labels = pd.factorize(categories[known])
+    row_codes = user_ids.get_indexer(by_user[known])
+    category_matrix = sparse.csr_matrix(
+        (np.ones(len(row_codes)), (row_codes, category_codes)),
+        shape=(len(user_ids), len(category_labels))
+    )
+    
+    # Dense share columns for the categories the model was built around
+    positions = {label: position for position, label in enumerate(category_labels)}
+    for category in PREFERENCE_CATEGORIES:
+        if category in positions:
+            counts = pd.Series(category_matrix[:, positions[category]].toarray().ravel(), index=user_ids)
+            features[_preference_column(category)] = (counts / total).fillna(0)
+        else:
+            features[_preference_column(category)] = 0.0
+    
+    return features.reset_index(), category_matrix, list(category_labels)
+
+
+def features_from_store(
+    docs: List[Dict[str, Any]],
+    users: pd.DataFrame,
+    now: datetime = None
+) -> pd.DataFrame:
+    """
+    Build feature rows from feature store documents
+
+    Produces the same columns, in the same order, as `build_feature_frame`,
+    derived from the stored day buckets of the feature window instead of the
+    raw history. Only users present in `users` (columns id, age, created_at)
+    get a row.
+    """
+    now = now or datetime.utcnow()
+    start = window_start(now)
+    docs = [window_counters(doc, start) for doc in docs]
+    users = users.drop_duplicates('id').set_index('id')
+    docs = [doc for doc in docs if doc['user_id'] in users.index]
+    user_ids = pd.Index([doc['user_id'] for doc in docs], name='user_id')
+    users = users.reindex(user_ids)
+    
+    def counter(path: str) -> np.ndarray:
+        values = []
+        for doc in docs:
+            value = doc
+            for part in path.split('.'):
+                value = value.get(part) if isinstance(value, dict) else None
+            values.append(value or 0)
+        return np.asarray(values, dtype=float)
+    
+    features = pd.DataFrame(index=user_ids)
+    features['age'] = pd.to_numeric(users['age'], errors='coerce').fillna(25).values
+    created_at = _parse_timestamps(users['created_at'])
+    features['days_since_registration'] = (now - created_at).dt.days.fillna(30).astype(int).values
+    
+    total_events = counter('total_events')
+    features['total_events'] = total_events
+    features['unique_sessions'] = counter('sessions')
+    features['page_views'] = counter('page_views')
+    features['event_bookings'] = counter('event_bookings')
+    features['checkins'] = counter('checkins')
+    
+    first = _parse_timestamps(pd.Series([doc.get('first_event_at') for doc in docs], dtype=object))
+    last = _parse_timestamps(pd.Series([doc.get('last_event_at') for doc in docs], dtype=object))
+    days_active = ((last - first).dt.days + 1).fillna(0).values
+    features['days_active'] = days_active
+    features['avg_events_per_day'] = np.where(days_active > 0, total_events / np.maximum(days_active, 1), 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for bucket in ('morning', 'afternoon', 'evening'):
+            features[f'prefers_{bucket}'] = np.nan_to_num(counter(f'hours.{bucket}') / total_events)
+    
+    total_reservations = counter('total_reservations')
+    features['total_reservations'] = total_reservations
+    features['confirmed_reservations'] = counter('reservations.confirmed')
+    features['checked_in_reservations'] = counter('reservations.checked_in')
+    features['cancelled_reservations'] = counter('reservations.cancelled')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features['checkin_rate'] = np.nan_to_num(features['checked_in_reservations'].values / total_reservations)
+        features['cancellation_rate'] = np.nan_to_num(features['cancelled_reservations'].values / total_reservations)
+        for category in PREFERENCE_CATEGORIES:
+            features[_preference_column(category)] = np.nan_to_num(
+                counter(f'categories.{field_key(category)}') / total_reservations
+            )
+    
+    return features.reset_index()
+
+
 class UserSegmentation:
     """
     ML-based user segmentation system
@@ -23,22 +228,40 @@ class UserSegmentation:
     """
     
     def __init__(self):
-        self.mongo_client = None
         self.db = None
         self.analytics_db = None
         self.scaler = StandardScaler()
         self.pca = None  # Will be initialized dynamically
         self.kmeans = None  # Will be initialized dynamically
         self.is_trained = False
+        self.category_matrix = None  # Sparse users × categories reservation counts
+        self.category_labels: List[str] = []
+        self.feature_columns: List[str] = []
+        self.cluster_names: Dict[int, str] = {}
         self.min_users_for_ml = 5  # Minimum users needed for meaningful clustering
+        self.model_metadata: Dict[str, Any] = {}
+        self.registry: Optional[ModelRegistry] = None  # Bound to the database in initialize()
+        self._scorer_task: Optional[asyncio.Task] = None
+        self._score_task: Optional[asyncio.Task] = None
+        self._retrain_task: Optional[asyncio.Task] = None
+        self._lease_task: Optional[asyncio.Task] = None
+        self.redis_client = None
+        self.leadership = RedisLease(LEADER_KEY, worker_id())
+        self._scoring_lock = asyncio.Lock()
+        self._training_lock = asyncio.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
         
     async def initialize(self):
         """Initialize database connections"""
         try:
-            mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/')
-            self.mongo_client = MongoClient(mongo_url)
-            self.db = self.mongo_client.cultural_center
-            self.analytics_db = self.mongo_client.cultural_center_analytics
+            # The API's Motor client; user events live in the analytics database
+            self.db = database.connect()
+            self.analytics_db = database.client[settings.ANALYTICS_DATABASE_NAME]
+            self.registry = ModelRegistry(self.db, 'user_segmentation', keep=settings.MODEL_REGISTRY_KEEP)
+            self.redis_client = redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379'))
+            
+            # Warm start from the latest trained model
+            await self.load_model()
             
             logger.info("User segmentation system initialized")
             
@@ -57,54 +280,18 @@ class UserSegmentation:
             DataFrame with user features
         """
         try:
-            # Get users
-            users = list(self.db.users.find({}))
-            
-            # Get user events from analytics
-            cutoff_date = datetime.utcnow() - timedelta(days=days_back)
-            user_events = list(self.analytics_db.user_events.find({
-                'timestamp': {'$gte': cutoff_date.isoformat()}
-            }))
-            
-            # Get reservations
-            reservations = list(self.db.reservations.find({
-                'created_at': {'$gte': cutoff_date.isoformat()}
-            }))
-            
-            # Get events
-            events = list(self.db.events.find({}))
-            events_dict = {event['id']: event for event in events}
-            
-            # Process user data
-            user_features = []
-            
-            for user in users:
-                user_id = user['id']
-                
-                # Basic user info
-                features = {
-                    'user_id': user_id,
-                    'age': user.get('age', 25),
-                    'days_since_registration': self._days_since_registration(user.get('created_at')),
-                }
-                
-                # Event interaction features
-                user_event_data = [e for e in user_events if e['user_id'] == user_id]
-                features.update(self._extract_event_features(user_event_data))
-                
-                # Reservation features
-                user_reservations = [r for r in reservations if r['user_id'] == user_id]
-                features.update(self._extract_reservation_features(user_reservations, events_dict))
-                
-                user_features.append(features)
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(user_features)
-            
-            # Fill missing values
-            numeric_columns = df.select_dtypes(include=[np.number]).columns
-            df[numeric_columns] = df[numeric_columns].fillna(0)
+            cutoff = (datetime.utcnow() - timedelta(days=days_back)).isoformat()
+            users, user_events, reservations, events = await asyncio.gather(
+                _load_docs(self.db.users, {}, USER_PROJECTION),
+                _load_docs(self.analytics_db.user_events, {'timestamp': {'$gte': cutoff}}, USER_EVENT_PROJECTION),
+                _load_docs(self.db.reservations, {'created_at': {'$gte': cutoff}}, RESERVATION_PROJECTION),
+                _load_docs(self.db.events, {}, EVENT_PROJECTION)
+            )
             
+            # Grouping is CPU work: keep it off the event loop
+            df, self.category_matrix, self.category_labels = await asyncio.to_thread(
+                self._build_user_features, users, user_events, reservations, events
+            )
             logger.info(f"Extracted features for {len(df)} users")
             return df
             
@@ -112,165 +299,86 @@ class UserSegmentation:
             logger.error(f"Failed to extract user features: {e}")
             return pd.DataFrame()
 
-    def _extract_event_features(self, user_events: List[Dict]) -> Dict[str, Any]:
-        """Extract features from user events"""
-        features = {
-            'total_events': len(user_events),
-            'unique_sessions': len(set(e.get('session_id', 'default') for e in user_events)),
-            'page_views': sum(1 for e in user_events if e['event_type'] == 'page_view'),
-            'event_bookings': sum(1 for e in user_events if e['event_type'] == 'event_booking'),
-            'checkins': sum(1 for e in user_events if e['event_type'] == 'event_checkin'),
-        }
-        
-        # Time-based features
-        if user_events:
-            timestamps = [datetime.fromisoformat(e['timestamp'].replace('Z', '+00:00')) for e in user_events]
-            features['days_active'] = (max(timestamps) - min(timestamps)).days + 1
-            features['avg_events_per_day'] = len(user_events) / max(features['days_active'], 1)
-            
-            # Time of day preferences
-            hours = [t.hour for t in timestamps]
-            features['prefers_morning'] = sum(1 for h in hours if 6 <= h < 12) / len(hours)
-            features['prefers_afternoon'] = sum(1 for h in hours if 12 <= h < 18) / len(hours)
-            features['prefers_evening'] = sum(1 for h in hours if 18 <= h < 24) / len(hours)
-        else:
-            features.update({
-                'days_active': 0,
-                'avg_events_per_day': 0,
-                'prefers_morning': 0,
-                'prefers_afternoon': 0,
-                'prefers_evening': 0
-            })
-        
-        return features
-
-    def _extract_reservation_features(self, reservations: List[Dict], events_dict: Dict) -> Dict[str, Any]:
-        """Extract features from user reservations"""
-        features = {
-            'total_reservations': len(reservations),
-            'confirmed_reservations': sum(1 for r in reservations if r['status'] == 'confirmed'),
-            'checked_in_reservations': sum(1 for r in reservations if r['status'] == 'checked_in'),
-            'cancelled_reservations': sum(1 for r in reservations if r['status'] == 'cancelled'),
-        }
-        
-        # Calculate success rate
-        if features['total_reservations'] > 0:
-            features['checkin_rate'] = features['checked_in_reservations'] / features['total_reservations']
-            features['cancellation_rate'] = features['cancelled_reservations'] / features['total_reservations']
-        else:
-            features['checkin_rate'] = 0
-            features['cancellation_rate'] = 0
-        
-        # Category preferences
-        categories = {}
-        for reservation in reservations:
-            event_id = reservation['event_id']
-            if event_id in events_dict:
-                category = events_dict[event_id]['category']
-                categories[category] = categories.get(category, 0) + 1
-        
-        # Convert to preferences (most common category gets highest score)
-        total_reservations = len(reservations)
-        if total_reservations > 0:
-            for category in ['Dominican Cinema', 'Classic Cinema', 'General Cinema', 'Workshops', 
-                           'Concerts', 'Talks/Conferences', 'Art Exhibitions', '3D Immersive Experiences']:
-                features[f'prefers_{category.lower().replace(" ", "_").replace("/", "_")}'] = \
-                    categories.get(category, 0) / total_reservations
-        else:
-            for category in ['Dominican Cinema', 'Classic Cinema', 'General Cinema', 'Workshops',
-                           'Concerts', 'Talks/Conferences', 'Art Exhibitions', '3D Immersive Experiences']:
-                features[f'prefers_{category.lower().replace(" ", "_").replace("/", "_")}'] = 0
-        
-        return features
-
-    def _days_since_registration(self, created_at: str) -> int:
-        """Calculate days since user registration"""
-        try:
-            if created_at:
-                reg_date = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                return (datetime.utcnow() - reg_date).days
-        except:
-            pass
-        return 30  # Default value
+    @staticmethod
+    def _build_user_features(
+        users: List[Dict[str, Any]],
+        user_events: List[Dict[str, Any]],
+        reservations: List[Dict[str, Any]],
+        events: List[Dict[str, Any]]
+    ) -> Tuple[pd.DataFrame, sparse.csr_matrix, List[str]]:
+        """Feature frame from the loaded documents"""
+        events = _load_frame(events, EVENT_PROJECTION)
+        event_categories = pd.Series(events['category'].values, index=events['id'].values)
+        return build_feature_frame(
+            _load_frame(users, USER_PROJECTION),
+            _load_frame(user_events, USER_EVENT_PROJECTION),
+            _load_frame(reservations, RESERVATION_PROJECTION),
+            event_categories
+        )
 
     async def train_segmentation_model(self, days_back: int = 30) -> Dict[str, Any]:
         """
         Train the segmentation model on user data with dynamic clustering
         
+        Features are read from the feature store, so the model is fitted on
+        the same counters the batch scorer later assigns segments from. The
+        `days_back` window only applies while the store is still empty.
+        
         Args:
             days_back: Number of days to look back for training data
             
         Returns:
             Training results and model performance metrics
         """
+        async with self._training_lock:
+            return await self._train(days_back)
+
+    async def _train(self, days_back: int) -> Dict[str, Any]:
         try:
-            # Extract features
-            df = await self.extract_user_features(days_back)
-            
-            if df.empty:
-                raise ValueError("No user data available for training")
-            
-            num_users = len(df)
-            logger.info(f"Training with {num_users} users")
-            
-            # Check if we have enough users for meaningful ML
-            if num_users < self.min_users_for_ml:
-                logger.warning(f"Only {num_users} users available. Using simple statistical segmentation.")
-                return await self._simple_statistical_segmentation(df)
-            
-            # Prepare features for ML
-            feature_columns = [col for col in df.columns if col != 'user_id']
-            X = df[feature_columns].copy()
-            
-            # Validate feature matrix
-            if X.shape[1] == 0:
-                raise ValueError("No features available for training")
-            
-            # Scale features
-            X_scaled = self.scaler.fit_transform(X)
-            
-            # Dynamic PCA components (max 3 or number of features, whichever is smaller)
-            n_components = min(3, X.shape[1], X.shape[0] - 1)
-            if n_components < 1:
-                n_components = 1
+            if await feature_store.count() > settings.SEGMENT_MINIBATCH_THRESHOLD:
+                # Large member base: stream features to disk and fit in chunks
+                model, results = await self._fit_streamed()
+                from_store = True
+            else:
+                # Extract features
+                df = await self.store_features()
+                from_store = not df.empty
+                if not from_store:
+                    df = await self.extract_user_features(days_back)
                 
-            self.pca = PCA(n_components=n_components)
-            X_pca = self.pca.fit_transform(X_scaled)
-            
-            # Dynamic number of clusters based on data size
-            # Rule: max clusters = sqrt(n_users), min = 2, max = 5
-            optimal_clusters = max(2, min(5, int(np.sqrt(num_users))))
-            
-            logger.info(f"Using {optimal_clusters} clusters for {num_users} users")
-            
-            # Initialize KMeans with optimal clusters
-            self.kmeans = KMeans(n_clusters=optimal_clusters, random_state=42, n_init=10)
-            
-            # Fit K-means
-            self.kmeans.fit(X_pca)
-            
-            # Get cluster assignments
-            cluster_labels = self.kmeans.labels_
-            df['cluster'] = cluster_labels
-            
-            # Calculate cluster characteristics
-            cluster_analysis = self._analyze_clusters(df)
-            
-            # Save model
-            await self._save_model()
+                if df.empty:
+                    raise ValueError("No user data available for training")
+                
+                num_users = len(df)
+                logger.info(f"Training with {num_users} users")
+                
+                # Check if we have enough users for meaningful ML
+                if num_users < self.min_users_for_ml:
+                    logger.warning(f"Only {num_users} users available. Using simple statistical segmentation.")
+                    return await self._simple_statistical_segmentation(df)
+                
+                # Fitting is CPU-bound: run it in the training process
+                model, results = await asyncio.get_running_loop().run_in_executor(
+                    self._get_pool(), clustering.fit_full, df,
+                    settings.SEGMENT_MAX_CLUSTERS, settings.SEGMENT_SILHOUETTE_SAMPLE
+                )
+            
+            # Save as a new registry version, then swap it in
+            metadata = await self.registry.save(model, {
+                'num_users': results['num_users'],
+                'num_features': results['num_features'],
+                'num_clusters': results['num_clusters'],
+                'pca_components': results['pca_components'],
+                'silhouette_score': results['silhouette_score'],
+                'feature_source': 'feature_store' if from_store else 'history',
+                'model_type': results['model_type'],
+                'training_mode': results['training_mode']
+            })
+            self._install(model, metadata)
+            results['version'] = metadata['version']
             
-            self.is_trained = True
-            
-            results = {
-                'num_users': len(df),
-                'num_features': len(feature_columns),
-                'num_clusters': len(set(cluster_labels)),
-                'optimal_clusters': optimal_clusters,
-                'pca_components': n_components,
-                'cluster_analysis': cluster_analysis,
-                'silhouette_score': self._calculate_silhouette_score(X_pca, cluster_labels),
-                'model_type': 'ml_clustering'
-            }
+            # Refresh the stored assignments with the new model
+            self._score_task = asyncio.create_task(self.score_users())
             
             logger.info(f"Segmentation model trained successfully: {results}")
             return results
@@ -279,82 +387,233 @@ class UserSegmentation:
             logger.error(f"Failed to train segmentation model: {e}")
             raise
 
-    def _analyze_clusters(self, df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
-        """Analyze cluster characteristics and assign meaningful names"""
+    async def _fit_streamed(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Train from the whole feature store without holding it in memory
+        
+        Feature batches are appended to a temporary float64 matrix on disk,
+        which the training process memory-maps and fits chunk by chunk.
+        """
+        fd, path = tempfile.mkstemp(prefix='segmentation-', suffix='.f64')
         try:
-            cluster_analysis = {}
-            
-            for cluster_id in df['cluster'].unique():
-                cluster_data = df[df['cluster'] == cluster_id]
-                
-                # Calculate cluster characteristics
-                characteristics = {
-                    'size': len(cluster_data),
-                    'percentage': len(cluster_data) / len(df) * 100,
-                    'avg_age': cluster_data['age'].mean(),
-                    'avg_reservations': cluster_data['total_reservations'].mean(),
-                    'avg_checkin_rate': cluster_data['checkin_rate'].mean(),
-                    'avg_events_per_day': cluster_data['avg_events_per_day'].mean(),
-                    'avg_days_since_registration': cluster_data['days_since_registration'].mean()
-                }
-                
-                # Determine cluster name based on characteristics
-                name = self._determine_cluster_name(characteristics, cluster_data)
-                
-                cluster_analysis[name] = characteristics
-                cluster_analysis[name]['cluster_id'] = int(cluster_id)
+            feature_columns: List[str] = []
+            num_users = 0
+            with os.fdopen(fd, 'wb') as f:
+                async for docs in feature_store.iter_batches(settings.SEGMENT_SCORE_BATCH_SIZE):
+                    df = await self._features_for(docs)
+                    if df.empty:
+                        continue
+                    feature_columns = feature_columns or [col for col in df.columns if col != 'user_id']
+                    matrix = df[feature_columns].to_numpy(dtype=np.float64)
+                    await asyncio.to_thread(f.write, matrix.tobytes())
+                    num_users += len(matrix)
             
-            return cluster_analysis
+            if num_users < self.min_users_for_ml:
+                raise ValueError("No user data available for training")
+            logger.info(f"Training with {num_users} users (minibatch)")
             
-        except Exception as e:
-            logger.error(f"Failed to analyze clusters: {e}")
-            return {}
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(), clustering.fit_streamed, path, feature_columns,
+                settings.SEGMENT_MAX_CLUSTERS, settings.SEGMENT_MINIBATCH_SIZE,
+                settings.SEGMENT_SILHOUETTE_SAMPLE
+            )
+        finally:
+            os.unlink(path)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=1)
+        return self._pool
+
+    def shutdown(self):
+        """Release the training process"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _install(self, model: Dict[str, Any], metadata: Dict[str, Any]):
+        """Swap in a trained model; all attributes change together between awaits"""
+        self.scaler = model['scaler']
+        self.pca = model['pca']
+        self.kmeans = model['kmeans']
+        self.feature_columns = model.get('feature_columns', [])
+        self.cluster_names = model.get('cluster_names', {})
+        self.model_metadata = metadata
+        self.is_trained = True
 
-    def _determine_cluster_name(self, characteristics: Dict, cluster_data: pd.DataFrame) -> str:
-        """Determine meaningful name for cluster based on characteristics"""
+    def _snapshot(self) -> Dict[str, Any]:
+        """The model currently in use, for work handed to a thread"""
+        return {
+            'scaler': self.scaler,
+            'pca': self.pca,
+            'kmeans': self.kmeans,
+            'feature_columns': self.feature_columns,
+            'cluster_names': self.cluster_names
+        }
+
+    async def store_features(self) -> pd.DataFrame:
+        """Feature rows for every user in the feature store"""
+        frames = []
+        async for docs in feature_store.iter_batches(settings.SEGMENT_SCORE_BATCH_SIZE):
+            frames.append(await self._features_for(docs))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    async def _features_for(self, docs: List[Dict[str, Any]]) -> pd.DataFrame:
+        users = await database.users.find(
+            {'id': {'$in': [doc['user_id'] for doc in docs]}}, USER_PROJECTION
+        ).to_list(length=None)
+        return await asyncio.to_thread(
+            features_from_store, docs, pd.DataFrame(users, columns=['id', 'age', 'created_at'])
+        )
+
+    def _assign(self, df: pd.DataFrame, model: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Predict segments for a feature frame with a model snapshot"""
+        if df.empty:
+            return []
+        X = df[model['feature_columns'] or [col for col in df.columns if col != 'user_id']]
+        X_pca = model['pca'].transform(model['scaler'].transform(X))
+        kmeans = model['kmeans']
+        clusters = kmeans.predict(X_pca)
+        
+        # Confidence based on distance to cluster center
+        distances = np.linalg.norm(X_pca - kmeans.cluster_centers_[clusters], axis=1)
+        confidences = np.clip(1.0 - distances / 2.0, 0.0, None)
+        
+        return [
+            {
+                'user_id': user_id,
+                'segment': model['cluster_names'].get(int(cluster), f"Segment {cluster}"),
+                'cluster_id': int(cluster),
+                'confidence': round(float(confidence), 3),
+                'total_reservations': int(total_reservations),
+                'checkin_rate': round(float(checkin_rate), 3)
+            }
+            for user_id, cluster, confidence, total_reservations, checkin_rate in zip(
+                df['user_id'], clusters, confidences, df['total_reservations'], df['checkin_rate']
+            )
+        ]
+
+    async def score_users(self, batch_size: int = None) -> int:
+        """
+        Assign a segment to every user in the feature store
+        
+        Reads the store in batches, predicts each batch off the event loop
+        and writes `segment`/`cluster_id`/`confidence` back with one bulk
+        write per batch. Returns the number of users scored.
+        """
+        if not self.is_trained:
+            return 0
+        
+        async with self._scoring_lock:
+            scored = 0
+            try:
+                async for docs in feature_store.iter_batches(batch_size or settings.SEGMENT_SCORE_BATCH_SIZE):
+                    df = await self._features_for(docs)
+                    assignments = await asyncio.to_thread(self._assign, df, self._snapshot())
+                    await feature_store.save_assignments(assignments)
+                    scored += len(assignments)
+                logger.info(f"Scored segments for {scored} users")
+            except Exception as e:
+                logger.error(f"Failed to score user segments: {e}")
+            return scored
+
+    async def _hold_leadership(self) -> bool:
+        """
+        Take or renew the segmentation lease; True when this worker runs the scheduled jobs
+        
+        Without Redis every worker runs them itself, as a single worker would.
+        """
+        if self.redis_client is None:
+            return True
         try:
-            # High-value users: High reservations, high check-in rate
-            if (characteristics['avg_reservations'] > 3 and 
-                characteristics['avg_checkin_rate'] > 0.8):
-                return "VIP Members"
-            
-            # Regular attendees: Moderate reservations, good check-in rate
-            elif (characteristics['avg_reservations'] > 1 and 
-                  characteristics['avg_checkin_rate'] > 0.6):
-                return "Regular Attendees"
-            
-            # New users: Recently registered, low activity
-            elif characteristics['avg_days_since_registration'] < 7:
-                return "New Users"
-            
-            # Browsers: High page views, low reservations
-            elif (cluster_data['page_views'].mean() > cluster_data['total_reservations'].mean() * 3):
-                return "Browsers"
-            
-            # At-risk: Old users, low recent activity
-            elif (characteristics['avg_days_since_registration'] > 30 and 
-                  characteristics['avg_events_per_day'] < 0.1):
-                return "At Risk"
-            
-            else:
-                return f"Segment {characteristics.get('cluster_id', 0)}"
-                
+            was_leader = self.leadership.held
+            if await self.leadership.hold(self.redis_client, settings.SEGMENT_LEADER_LEASE * 1000) and not was_leader:
+                logger.info(f"Segmentation jobs now run on {self.leadership.holder}")
+            return self.leadership.held
         except Exception as e:
-            logger.error(f"Failed to determine cluster name: {e}")
-            return "Unknown Segment"
+            logger.warning(f"Segmentation lease unavailable, running scheduled jobs locally: {e}")
+            self.leadership.held = False
+            return True
 
-    def _calculate_silhouette_score(self, X: np.ndarray, labels: np.ndarray) -> float:
-        """Calculate silhouette score for cluster quality"""
-        try:
-            from sklearn.metrics import silhouette_score
-            return silhouette_score(X, labels)
-        except:
-            return 0.0
+    async def _lease_loop(self):
+        # Keeps the lease alive through rebuilds and training runs longer than it
+        while True:
+            await asyncio.sleep(settings.SEGMENT_LEADER_LEASE / 3)
+            if self.leadership.held:
+                await self._hold_leadership()
+
+    def _start_leadership(self):
+        if self._lease_task is None or self._lease_task.done():
+            self._lease_task = asyncio.create_task(self._lease_loop())
+
+    async def _stop_leadership(self):
+        """Once neither scheduled job runs, hand the lease to another worker"""
+        if self._scorer_task is not None or self._retrain_task is not None:
+            return
+        if self._lease_task is not None:
+            self._lease_task.cancel()
+            try:
+                await self._lease_task
+            except asyncio.CancelledError:
+                pass
+            self._lease_task = None
+        if self.redis_client is not None:
+            try:
+                await self.leadership.release(self.redis_client)
+                await self.redis_client.close()
+            except Exception as e:
+                logger.warning(f"Failed to release the segmentation lease: {e}")
+            self.redis_client = None
+
+    async def _scorer_loop(self, interval: int):
+        while True:
+            try:
+                # Pick up models trained by other workers
+                await self.load_model()
+                if await self._hold_leadership():
+                    if await feature_store.needs_rebuild():
+                        await feature_store.rebuild()
+                    await self.score_users()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Segment scoring run failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start_scorer(self):
+        """
+        Score all users now and then every SEGMENT_SCORE_INTERVAL seconds
+        
+        Every worker reloads new model versions; only the lease holder
+        rebuilds features and rescores.
+        """
+        self._start_leadership()
+        if self._scorer_task is None or self._scorer_task.done():
+            self._scorer_task = asyncio.create_task(
+                self._scorer_loop(settings.SEGMENT_SCORE_INTERVAL)
+            )
+
+    async def stop_scorer(self):
+        """Stop the background scoring task"""
+        if self._scorer_task is not None:
+            self._scorer_task.cancel()
+            try:
+                await self._scorer_task
+            except asyncio.CancelledError:
+                pass
+            self._scorer_task = None
+        await self._stop_leadership()
 
     async def segment_user(self, user_id: str) -> Dict[str, Any]:
         """
         Segment a specific user
         
+        Reads the stored assignment; a user the batch scorer has not reached
+        yet is scored on its own from the stored features, and an existing
+        user without a feature document gets an empty one.
+        
         Args:
             user_id: User ID to segment
             
@@ -362,39 +621,28 @@ class UserSegmentation:
             User segment information
         """
         try:
-            if not self.is_trained:
-                await self.train_segmentation_model()
-            
-            # Extract features for this user
-            df = await self.extract_user_features()
-            user_data = df[df['user_id'] == user_id]
-            
-            if user_data.empty:
+            doc = await feature_store.get(user_id)
+            if doc is None and await database.users.count_documents(
+                {'id': user_id, 'deleted': {'$ne': True}}, limit=1
+            ):
+                await feature_store.add_users([user_id])
+                doc = {'user_id': user_id, 'days': {}}
+            if doc and 'segment' not in doc and self.is_trained:
+                df = await self._features_for([doc])
+                assignments = await asyncio.to_thread(self._assign, df, self._snapshot())
+                if assignments:
+                    await feature_store.save_assignments(assignments)
+                    doc.update(assignments[0])
+            
+            if not doc or 'segment' not in doc:
                 return {'segment': 'Unknown', 'confidence': 0.0}
             
-            # Prepare features
-            feature_columns = [col for col in df.columns if col != 'user_id']
-            X = user_data[feature_columns].values
-            
-            # Transform and predict
-            X_scaled = self.scaler.transform(X)
-            X_pca = self.pca.transform(X_scaled)
-            
-            cluster = self.kmeans.predict(X_pca)[0]
-            
-            # Get cluster name (would need cluster analysis data)
-            # For now, return cluster number
-            segment = f"Segment {cluster}"
-            
-            # Calculate confidence based on distance to cluster center
-            distance = np.linalg.norm(X_pca[0] - self.kmeans.cluster_centers_[cluster])
-            confidence = max(0.0, 1.0 - distance / 2.0)  # Normalize distance
-            
             return {
                 'user_id': user_id,
-                'segment': segment,
-                'cluster_id': int(cluster),
-                'confidence': round(confidence, 3)
+                'segment': doc['segment'],
+                'cluster_id': doc['cluster_id'],
+                'confidence': doc['confidence'],
+                'scored_at': doc.get('scored_at')
             }
             
         except Exception as e:
@@ -402,77 +650,80 @@ class UserSegmentation:
             return {'segment': 'Unknown', 'confidence': 0.0}
 
     async def get_segment_analytics(self) -> Dict[str, Any]:
-        """Get analytics for all user segments"""
+        """Get analytics for all user segments from the stored assignments"""
         try:
-            if not self.is_trained:
-                await self.train_segmentation_model()
-            
-            df = await self.extract_user_features()
-            
-            if df.empty:
-                return {}
+            segments = await feature_store.segment_summary()
+            total_users = sum(segment['user_count'] for segment in segments)
             
-            # Get predictions for all users
-            feature_columns = [col for col in df.columns if col != 'user_id']
-            X = df[feature_columns].values
-            X_scaled = self.scaler.transform(X)
-            X_pca = self.pca.transform(X_scaled)
-            clusters = self.kmeans.predict(X_pca)
-            
-            df['cluster'] = clusters
-            
-            # Analyze segments
-            segment_analytics = {}
-            for cluster_id in df['cluster'].unique():
-                cluster_data = df[df['cluster'] == cluster_id]
-                
-                segment_analytics[f"Segment {cluster_id}"] = {
-                    'user_count': len(cluster_data),
-                    'percentage': len(cluster_data) / len(df) * 100,
-                    'avg_reservations': cluster_data['total_reservations'].mean(),
-                    'avg_checkin_rate': cluster_data['checkin_rate'].mean(),
-                    'top_users': cluster_data.nlargest(5, 'total_reservations')['user_id'].tolist()
+            return {
+                segment['_id']: {
+                    'user_count': segment['user_count'],
+                    'percentage': segment['user_count'] / total_users * 100,
+                    'avg_reservations': segment['avg_reservations'],
+                    'avg_checkin_rate': segment['avg_checkin_rate'],
+                    'top_users': segment['top_users']
                 }
-            
-            return segment_analytics
+                for segment in segments
+            }
             
         except Exception as e:
             logger.error(f"Failed to get segment analytics: {e}")
             return {}
 
-    async def _save_model(self):
-        """Save trained model to file"""
-        try:
-            model_data = {
-                'scaler': self.scaler,
-                'pca': self.pca,
-                'kmeans': self.kmeans,
-                'trained_at': datetime.utcnow().isoformat()
-            }
-            
-            with open('models/user_segmentation.pkl', 'wb') as f:
-                pickle.dump(model_data, f)
-                
-        except Exception as e:
-            logger.error(f"Failed to save model: {e}")
-
-    async def load_model(self):
-        """Load trained model from file"""
+    async def load_model(self) -> bool:
+        """
+        Load the latest registry version if it is not the one in use
+        
+        Returns True when a model was (re)loaded.
+        """
         try:
-            with open('models/user_segmentation.pkl', 'rb') as f:
-                model_data = pickle.load(f)
-                
-            self.scaler = model_data['scaler']
-            self.pca = model_data['pca']
-            self.kmeans = model_data['kmeans']
-            self.is_trained = True
-            
-            logger.info("Segmentation model loaded successfully")
+            version = await self.registry.latest_version()
+            if version is None:
+                logger.info("No saved segmentation model found, will train new model")
+                return False
+            if self.is_trained and self.model_metadata.get('version') == version:
+                return False
+            
+            model, metadata = await self.registry.load(version)
+            self._install(model, metadata)
+            logger.info(f"Segmentation model {version} loaded successfully")
+            return True
             
-        except FileNotFoundError:
-            logger.info("No saved model found, will train new model")
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
+            return False
+
+    async def _retrain_loop(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await self._hold_leadership():
+                    await self.train_segmentation_model()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduled segmentation retraining failed: {e}")
+
+    def start_retrainer(self):
+        """Retrain the model every SEGMENT_RETRAIN_INTERVAL seconds on the lease holder (0 disables)"""
+        if settings.SEGMENT_RETRAIN_INTERVAL <= 0:
+            return
+        self._start_leadership()
+        if self._retrain_task is None or self._retrain_task.done():
+            self._retrain_task = asyncio.create_task(
+                self._retrain_loop(settings.SEGMENT_RETRAIN_INTERVAL)
+            )
+
+    async def stop_retrainer(self):
+        """Stop the scheduled retraining task"""
+        if self._retrain_task is not None:
+            self._retrain_task.cancel()
+            try:
+                await self._retrain_task
+            except asyncio.CancelledError:
+                pass
+            self._retrain_task = None
+        await self._stop_leadership()
     
     async def _simple_statistical_segmentation(self, df: pd.DataFrame) -> Dict[str, Any]:
         """
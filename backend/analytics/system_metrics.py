@@ -0,0 +1,98 @@
+"""
+System metrics sampler
+Samples CPU, memory and disk usage in the background, off the event loop
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
+
+def _sample() -> Dict[str, Any]:
+    """One system metrics sample (runs in a worker thread)"""
+    # interval=None compares against the previous call instead of sleeping
+    cpu_percent = psutil.cpu_percent(interval=None)
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage('/')
+
+    return {
+        'cpu_percent': cpu_percent,
+        'memory_percent': memory.percent,
+        'memory_used_gb': round(memory.used / (1024**3), 2),
+        'memory_total_gb': round(memory.total / (1024**3), 2),
+        'disk_percent': disk.percent,
+        'disk_used_gb': round(disk.used / (1024**3), 2),
+        'disk_total_gb': round(disk.total / (1024**3), 2),
+        'sampled_at': time.time()
+    }
+
+
+class SystemMetricsSampler:
+    """
+    Rolling window of system metrics samples
+
+    A background task takes one sample every `interval` seconds in a worker
+    thread; readers get the latest sample plus window averages without any
+    blocking call on the event loop.
+    """
+
+    def __init__(self, interval: float = 1.0, window: int = 60):
+        self.interval = interval
+        self._samples: Deque[Dict[str, Any]] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    async def _sample_loop(self):
+        # Prime the CPU counter so the first real sample covers a full interval
+        await asyncio.to_thread(psutil.cpu_percent, None)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self._samples.append(await asyncio.to_thread(_sample))
+            except Exception as e:
+                logger.error(f"Failed to sample system metrics: {e}")
+
+    def start(self):
+        """Start sampling in the background (no-op without psutil)"""
+        if not PSUTIL_AVAILABLE:
+            logger.warning("psutil not available - system metrics disabled")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._sample_loop())
+
+    async def stop(self):
+        """Stop the sampling task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latest sample with CPU and memory averages over the window"""
+        if not self._samples:
+            return {}
+        latest = dict(self._samples[-1])
+        latest['cpu_percent_avg'] = round(
+            sum(sample['cpu_percent'] for sample in self._samples) / len(self._samples), 1
+        )
+        latest['memory_percent_avg'] = round(
+            sum(sample['memory_percent'] for sample in self._samples) / len(self._samples), 1
+        )
+        latest['window_samples'] = len(self._samples)
+        return latest
+
+    def history(self) -> List[Dict[str, Any]]:
+        """All samples in the window, oldest first"""
+        return list(self._samples)
@@ -1,6 +1,9 @@
 """
 Real-time Analytics Tracking System
 Tracks user events, performance metrics, and business KPIs
+
+Tracking calls only append to an in-process buffer; Redis and MongoDB
+writes are batched by a background flusher (see analytics.buffer).
 """
 import asyncio
 import json
@@ -10,9 +13,13 @@ from typing import Dict, Any, Optional, List
 from functools import wraps
 import logging
 import redis.asyncio as redis
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 import os
 
+from analytics.buffer import AnalyticsBuffer
+from core.config import settings
+from core.feature_store import feature_store
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -25,6 +32,11 @@ class RealTimeAnalytics:
         self.redis_client = None
         self.mongo_client = None
         self.db = None
+        self.buffer = AnalyticsBuffer(
+            max_size=settings.ANALYTICS_BUFFER_SIZE,
+            flush_size=settings.ANALYTICS_FLUSH_SIZE,
+            flush_interval=settings.ANALYTICS_FLUSH_INTERVAL_MS / 1000
+        )
         
     async def initialize(self):
         """Initialize connections to Redis and MongoDB"""
@@ -35,8 +47,11 @@ class RealTimeAnalytics:
             
             # MongoDB for historical data
             mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/')
-            self.mongo_client = MongoClient(mongo_url)
-            self.db = self.mongo_client.cultural_center_analytics
+            self.mongo_client = AsyncIOMotorClient(mongo_url)
+            self.db = self.mongo_client[settings.ANALYTICS_DATABASE_NAME]
+            
+            # Batched writes to both stores; flushed events also feed the per-user feature store
+            self.buffer.start(self.redis_client, self.db, on_flush=self._update_features)
             
             logger.info("Analytics tracker initialized successfully")
             
@@ -44,6 +59,19 @@ class RealTimeAnalytics:
             logger.error(f"Failed to initialize analytics tracker: {e}")
             raise
 
+    async def _update_features(self, documents: Dict[str, List[Dict[str, Any]]]):
+        events = documents.get("user_events")
+        if events:
+            await feature_store.apply_events(events)
+
+    async def close(self):
+        """Flush buffered analytics and close connections"""
+        await self.buffer.stop()
+        if self.redis_client:
+            await self.redis_client.close()
+        if self.mongo_client:
+            self.mongo_client.close()
+
     async def track_user_event(self, user_id: str, event_type: str, metadata: Dict[str, Any]):
         """
         Track user interaction events
@@ -61,16 +89,17 @@ class RealTimeAnalytics:
                 'metadata': metadata
             }
             
-            # Store in Redis for real-time access (TTL: 24 hours)
+            # Redis for real-time access (TTL: 24 hours), MongoDB for historical analysis
             redis_key = f"events:realtime:{event_type}"
-            await self.redis_client.lpush(redis_key, json.dumps(event_data))
-            await self.redis_client.expire(redis_key, 86400)  # 24 hours
-            
-            # Store in MongoDB for historical analysis
-            self.db.user_events.insert_one(event_data)
-            
-            # Update live counters
-            await self._update_live_counters(event_type, user_id)
+            self.buffer.append(
+                [
+                    ("lpush", redis_key, json.dumps(event_data)),
+                    ("expire", redis_key, 86400),  # 24 hours
+                    *self._live_counter_ops(event_type, user_id)
+                ],
+                "user_events",
+                event_data
+            )
             
         except Exception as e:
             logger.error(f"Failed to track user event: {e}")
@@ -92,13 +121,16 @@ class RealTimeAnalytics:
                 'tags': tags or {}
             }
             
-            # Store in Redis for real-time dashboard
+            # Redis for the real-time dashboard, MongoDB for analysis
             redis_key = f"metrics:realtime:{metric_name}"
-            await self.redis_client.lpush(redis_key, json.dumps(metric_data))
-            await self.redis_client.expire(redis_key, 86400)
-            
-            # Store in MongoDB for analysis
-            self.db.business_metrics.insert_one(metric_data)
+            self.buffer.append(
+                [
+                    ("lpush", redis_key, json.dumps(metric_data)),
+                    ("expire", redis_key, 86400)
+                ],
+                "business_metrics",
+                metric_data
+            )
             
         except Exception as e:
             logger.error(f"Failed to track business metric: {e}")
@@ -122,49 +154,42 @@ class RealTimeAnalytics:
                 'timestamp': datetime.utcnow().isoformat()
             }
             
-            # Store in Redis for real-time monitoring
+            # Redis for real-time monitoring, MongoDB for analysis
             redis_key = f"performance:realtime:{endpoint}"
-            await self.redis_client.lpush(redis_key, json.dumps(perf_data))
-            await self.redis_client.expire(redis_key, 3600)  # 1 hour
-            
-            # Store in MongoDB for analysis
-            self.db.performance_metrics.insert_one(perf_data)
-            
-            # Update performance counters
-            await self._update_performance_counters(endpoint, response_time, success)
+            self.buffer.append(
+                [
+                    ("lpush", redis_key, json.dumps(perf_data)),
+                    ("expire", redis_key, 3600),  # 1 hour
+                    *self._performance_counter_ops(endpoint, response_time, success)
+                ],
+                "performance_metrics",
+                perf_data
+            )
             
         except Exception as e:
             logger.error(f"Failed to track performance metric: {e}")
 
-    async def _update_live_counters(self, event_type: str, user_id: str):
-        """Update live counters for real-time dashboard"""
-        try:
+    def _live_counter_ops(self, event_type: str, user_id: str) -> list:
+        """Redis operations updating the live counters for the real-time dashboard"""
+        counter_key = f"counter:{event_type}:hourly"
+        return [
             # Active users counter
-            await self.redis_client.sadd("active_users", user_id)
-            await self.redis_client.expire("active_users", 300)  # 5 minutes
-            
+            ("sadd", "active_users", user_id),
+            ("expire", "active_users", 300),  # 5 minutes
             # Event type counters
-            counter_key = f"counter:{event_type}:hourly"
-            await self.redis_client.incr(counter_key)
-            await self.redis_client.expire(counter_key, 3600)  # 1 hour
-            
-        except Exception as e:
-            logger.error(f"Failed to update live counters: {e}")
+            ("incr", counter_key),
+            ("expire", counter_key, 3600)  # 1 hour
+        ]
 
-    async def _update_performance_counters(self, endpoint: str, response_time: float, success: bool):
-        """Update performance counters for monitoring"""
-        try:
-            # Average response time (using Redis for simplicity)
-            perf_key = f"perf:{endpoint}"
-            pipe = self.redis_client.pipeline()
-            pipe.lpush(f"{perf_key}:times", response_time)
-            pipe.ltrim(f"{perf_key}:times", 0, 99)  # Keep last 100 measurements
-            pipe.incr(f"{perf_key}:total")
-            pipe.incr(f"{perf_key}:success" if success else f"{perf_key}:errors")
-            await pipe.execute()
-            
-        except Exception as e:
-            logger.error(f"Failed to update performance counters: {e}")
+    def _performance_counter_ops(self, endpoint: str, response_time: float, success: bool) -> list:
+        """Redis operations updating the performance counters for monitoring"""
+        perf_key = f"perf:{endpoint}"
+        return [
+            ("lpush", f"{perf_key}:times", response_time),
+            ("ltrim", f"{perf_key}:times", 0, 99),  # Keep last 100 measurements
+            ("incr", f"{perf_key}:total"),
+            ("incr", f"{perf_key}:success" if success else f"{perf_key}:errors")
+        ]
 
     async def get_live_metrics(self) -> Dict[str, Any]:
         """Get current live metrics for dashboard"""
@@ -203,7 +228,7 @@ class RealTimeAnalytics:
         """Get user behavior data for segmentation"""
         try:
             # Get user events from MongoDB
-            events = list(self.db.user_events.find({'user_id': user_id}))
+            events = await self.db.user_events.find({'user_id': user_id}).to_list(length=None)
             
             # Calculate behavior metrics
             total_events = len(events)
@@ -2,7 +2,7 @@
 Admin API endpoints for administrative functions
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Body
 from typing import List, Dict, Any
 from datetime import datetime, timedelta
 
@@ -10,6 +10,9 @@ from models.common import SuccessResponse, SystemStatus
 from core.security import get_admin_user
 from core.database import database
 from core.config import settings
+from services.reservation_service import reservation_service
+from core.email_outbox import email_outbox
+from utils.dates import range_filter
 
 router = APIRouter()
 
@@ -25,8 +28,8 @@ async def get_system_info(admin_user: dict = Depends(get_admin_user)):
         collections_info = {}
         for collection_name in ["users", "events", "reservations", "checkins"]:
             collection = getattr(database, collection_name)
-            if collection:
-                count = collection.count_documents({})
+            if collection is not None:
+                count = await collection.count_documents({})
                 collections_info[collection_name] = {
                     "document_count": count,
                     "collection_exists": True
@@ -85,24 +88,24 @@ async def cleanup_data(admin_user: dict = Depends(get_admin_user)):
         
         # Remove soft-deleted users older than 90 days
         ninety_days_ago = (datetime.utcnow() - timedelta(days=90)).isoformat()
-        deleted_users_result = database.users.delete_many({
+        deleted_users_result = await database.users.delete_many({
             "deleted": True,
             "deleted_at": {"$lt": ninety_days_ago}
         })
         cleanup_results["deleted_users_removed"] = deleted_users_result.deleted_count
         
         # Clean up old cancelled reservations (older than 1 year)
-        one_year_ago = (datetime.utcnow() - timedelta(days=365)).isoformat()
-        cancelled_reservations_result = database.reservations.delete_many({
+        one_year_ago = datetime.utcnow() - timedelta(days=365)
+        cancelled_reservations_result = await database.reservations.delete_many({
             "status": "cancelled",
-            "created_at": {"$lt": one_year_ago}
+            "created_at_dt": range_filter(end=one_year_ago)
         })
         cleanup_results["cancelled_reservations_cleaned"] = cancelled_reservations_result.deleted_count
         
         # Clean up old analytics data if retention period is set
         if settings.ANALYTICS_RETENTION_DAYS > 0:
             retention_date = (datetime.utcnow() - timedelta(days=settings.ANALYTICS_RETENTION_DAYS)).isoformat()
-            analytics_result = database.analytics.delete_many({
+            analytics_result = await database.analytics.delete_many({
                 "timestamp": {"$lt": retention_date}
             })
             cleanup_results["old_analytics_removed"] = analytics_result.deleted_count
@@ -119,6 +122,27 @@ async def cleanup_data(admin_user: dict = Depends(get_admin_user)):
         )
 
 
+@router.post("/admin/maintenance/reconcile-capacity")
+async def reconcile_capacity(admin_user: dict = Depends(get_admin_user)):
+    """Rebuild event seat counters from reservations (Admin only)"""
+    try:
+        corrected = await reservation_service.reconcile_reserved_counts()
+        
+        return SuccessResponse(
+            message="Seat counters reconciled successfully",
+            data={
+                "events_corrected": corrected,
+                "reconciled_at": datetime.utcnow().isoformat()
+            }
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to reconcile seat counters"
+        )
+
+
 @router.get("/admin/database/indexes")
 async def get_database_indexes(admin_user: dict = Depends(get_admin_user)):
     """Get database indexes information (Admin only)"""
@@ -131,7 +155,7 @@ async def get_database_indexes(admin_user: dict = Depends(get_admin_user)):
         for collection_name in collections:
             try:
                 collection = database.db[collection_name]
-                indexes = list(collection.list_indexes())
+                indexes = await collection.list_indexes().to_list(length=None)
                 indexes_info[collection_name] = [
                     {
                         "name": idx.get("name"),
@@ -146,7 +170,10 @@ async def get_database_indexes(admin_user: dict = Depends(get_admin_user)):
         
         return SuccessResponse(
             message="Database indexes retrieved successfully",
-            data=indexes_info
+            data={
+                "indexes": indexes_info,
+                "audit": await database.audit_indexes()
+            }
         )
         
     except Exception as e:
@@ -166,15 +193,11 @@ async def optimize_database(admin_user: dict = Depends(get_admin_user)):
             "optimization_performed_at": datetime.utcnow().isoformat()
         }
         
-        # This is a placeholder for database optimization
-        # In a real implementation, you might:
-        # - Rebuild indexes
-        # - Analyze collection statistics
-        # - Optimize query performance
-        # - Compact collections
-        
-        collections = ["users", "events", "reservations", "checkins"]
-        optimization_results["collections_analyzed"] = len(collections)
+        # Bring indexes in line with the manifest and report remaining drift
+        optimization_results["indexes_created"] = await database.ensure_indexes()
+        index_audit = await database.audit_indexes()
+        optimization_results["collections_analyzed"] = len(index_audit)
+        optimization_results["index_audit"] = index_audit
         
         return SuccessResponse(
             message="Database optimization completed successfully",
@@ -279,6 +302,43 @@ async def get_application_settings(admin_user: dict = Depends(get_admin_user)):
         )
 
 
+@router.get("/admin/email/outbox")
+async def get_email_outbox_stats(admin_user: dict = Depends(get_admin_user)):
+    """Get email outbox queue depth and delivery counters (Admin only)"""
+    try:
+        return SuccessResponse(
+            message="Email outbox stats retrieved successfully",
+            data=await email_outbox.get_stats()
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve email outbox stats"
+        )
+
+
+@router.post("/admin/email/outbox/requeue")
+async def requeue_dead_emails(
+    message_ids: List[str] = Body(default=[]),
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Move dead-lettered emails back to the delivery queue (Admin only)"""
+    try:
+        requeued = await email_outbox.requeue_dead(message_ids or None)
+        
+        return SuccessResponse(
+            message=f"{requeued} emails requeued",
+            data={"requeued": requeued}
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to requeue emails"
+        )
+
+
 @router.post("/admin/test/email")
 async def test_email_service(
     test_email: str,
@@ -308,7 +368,7 @@ async def test_email_service(
         return SuccessResponse(
             message="Email test completed",
             data={
-                "status": "sent" if email_sent else "failed",
+                "status": "queued" if email_sent else "failed",
                 "recipient": test_email,
                 "timestamp": datetime.utcnow().isoformat()
             }
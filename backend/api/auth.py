@@ -16,6 +16,7 @@ from core.security import (
 )
 from core.database import database
 from core.config import settings
+from core.principal_cache import token_claims
 from services.user_service import user_service
 from utils.email import send_password_reset_email
 
@@ -78,7 +79,7 @@ async def refresh_access_token(current_user: dict = Depends(get_current_user)):
         # Create new access token
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": current_user["id"], "email": current_user["email"]},
+            data={**token_claims(current_user), "email": current_user["email"]},
             expires_delta=access_token_expires
         )
         
@@ -100,7 +101,7 @@ async def forgot_password(password_reset: PasswordReset):
     """Request password reset"""
     try:
         # Find user by email
-        user = database.users.find_one({
+        user = await database.users.find_one({
             "email": password_reset.email,
             "deleted": False
         })
@@ -146,7 +147,7 @@ async def reset_password(password_reset_data: PasswordResetConfirm):
         user_id = verify_password_reset_token(password_reset_data.token)
         
         # Find user
-        user = database.users.find_one({"id": user_id, "deleted": False})
+        user = await database.users.find_one({"id": user_id, "deleted": False})
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -154,10 +155,10 @@ async def reset_password(password_reset_data: PasswordResetConfirm):
             )
         
         # Hash new password
-        hashed_password = hash_password(password_reset_data.new_password)
+        hashed_password = await hash_password(password_reset_data.new_password)
         
         # Update password
-        result = database.users.update_one(
+        result = await database.users.update_one(
             {"id": user_id},
             {"$set": {"password": hashed_password}}
         )
@@ -6,12 +6,20 @@ from fastapi import APIRouter, HTTPException, status, Depends, Query
 from typing import Optional, List
 from datetime import datetime
 
-from models.reservations import CheckInRequest, CheckInResponse, CheckInStats
+from models.reservations import (
+    CheckInRequest, CheckInResponse, CheckInStats,
+    CheckInBatchRequest, CheckInBatchResponse
+)
 from models.common import SuccessResponse, PaginatedResponse
+from core.config import settings
 from core.security import get_current_user, get_admin_user
 from core.database import database
+from services.checkin_roster import checkin_roster, CHECKED_IN, ALREADY_CHECKED_IN
 from utils.qr_codes import decode_qr_data
 from utils.validation import validate_reservation_code, validate_pagination
+from utils.dates import with_native_dates, day_range, range_filter
+from utils.identifiers import find_user_by_identifier
+from utils.search import find_users_by_name, fold
 
 router = APIRouter()
 
@@ -36,9 +44,7 @@ async def check_in_user(
                 )
             
             # Find reservation by ID
-            reservation = database.reservations.find_one({
-                "id": qr_decoded["reservation_id"]
-            })
+            reservation = await checkin_roster.find_by_reservation(qr_decoded["reservation_id"])
             
         elif checkin_request.method == "reservation_code":
             # Validate code format
@@ -49,21 +55,20 @@ async def check_in_user(
                 )
             
             # Find reservation by checkin code
-            reservation = database.reservations.find_one({
-                "checkin_code": checkin_request.value.upper()
-            })
+            reservation = await checkin_roster.find_by_code(checkin_request.value)
             
-        elif checkin_request.method == "email":
-            # Find user by email first
-            user = database.users.find_one({
-                "email": checkin_request.value.lower(),
-                "deleted": {"$ne": True}
-            })
+        elif checkin_request.method in ("email", "phone"):
+            # Find user by normalized email or phone first
+            user = await find_user_by_identifier(
+                database.users,
+                checkin_request.value,
+                {"_id": 0, "id": 1}
+            )
             
             if not user:
                 return CheckInResponse(
                     success=False,
-                    message="User not found with this email"
+                    message=f"User not found with this {checkin_request.method}"
                 )
             
             # Find active reservations for this user
@@ -75,12 +80,12 @@ async def check_in_user(
             if checkin_request.event_id:
                 query["event_id"] = checkin_request.event_id
             
-            reservations = list(database.reservations.find(query))
+            reservations = await database.reservations.find(query).to_list(length=None)
             
             if len(reservations) == 0:
                 return CheckInResponse(
                     success=False,
-                    message="No active reservations found for this email"
+                    message=f"No active reservations found for this {checkin_request.method}"
                 )
             elif len(reservations) > 1 and not checkin_request.event_id:
                 return CheckInResponse(
@@ -88,14 +93,14 @@ async def check_in_user(
                     message="Multiple reservations found. Please specify event."
                 )
             
-            reservation = reservations[0]
+            reservation = await checkin_roster.find_by_reservation(reservations[0]["id"])
             
         elif checkin_request.method == "name":
-            # Find user by name (fuzzy match)
-            users = list(database.users.find({
-                "name": {"$regex": checkin_request.value, "$options": "i"},
-                "deleted": {"$ne": True}
-            }))
+            # Find user by name words; an exact (accent- and case-insensitive) name wins
+            users = await find_users_by_name(database.users, checkin_request.value)
+            exact = [user for user in users if fold(user.get("name")) == fold(checkin_request.value)]
+            if len(exact) == 1:
+                users = exact
             
             if len(users) == 0:
                 return CheckInResponse(
@@ -119,7 +124,7 @@ async def check_in_user(
             if checkin_request.event_id:
                 query["event_id"] = checkin_request.event_id
             
-            reservations = list(database.reservations.find(query))
+            reservations = await database.reservations.find(query).to_list(length=None)
             
             if len(reservations) == 0:
                 return CheckInResponse(
@@ -132,7 +137,7 @@ async def check_in_user(
                     message="Multiple reservations found. Please specify event."
                 )
             
-            reservation = reservations[0]
+            reservation = await checkin_roster.find_by_reservation(reservations[0]["id"])
             
         else:
             return CheckInResponse(
@@ -147,105 +152,43 @@ async def check_in_user(
                 message="Reservation not found"
             )
         
-        # Check if already checked in
-        if reservation["status"] == "checked_in":
+        # Check in with one conditional write; the roster answers known statuses
+        checkin_time = datetime.utcnow().isoformat()
+        result = await checkin_roster.check_in(
+            reservation,
+            {"checked_in_at": checkin_time, "checked_in_by": admin_user["id"]}
+        )
+        
+        if result == ALREADY_CHECKED_IN:
             return CheckInResponse(
                 success=False,
                 message="User already checked in"
             )
         
-        # Check if reservation is cancelled
-        if reservation["status"] == "cancelled":
+        if result != CHECKED_IN:
             return CheckInResponse(
                 success=False,
                 message="Reservation has been cancelled"
             )
         
-        # Get reservation details with event and user info
-        pipeline = [
-            {"$match": {"id": reservation["id"]}},
-            {
-                "$lookup": {
-                    "from": "events",
-                    "localField": "event_id",
-                    "foreignField": "id",
-                    "as": "event"
-                }
-            },
-            {"$unwind": "$event"},
-            {
-                "$lookup": {
-                    "from": "users",
-                    "localField": "user_id",
-                    "foreignField": "id",
-                    "as": "user"
-                }
-            },
-            {"$unwind": "$user"},
-            {
-                "$project": {
-                    "_id": 0,
-                    "id": 1,
-                    "status": 1,
-                    "checkin_code": 1,
-                    "created_at": 1,
-                    "event_id": "$event.id",
-                    "event_title": "$event.title",
-                    "event_date": "$event.date",
-                    "event_time": "$event.time",
-                    "event_location": "$event.location",
-                    "user_id": "$user.id",
-                    "user_name": "$user.name",
-                    "user_email": "$user.email"
-                }
-            }
-        ]
-        
-        reservation_details = list(database.reservations.aggregate(pipeline))
+        # Record check-in event
+        checkin_record = {
+            "reservation_id": reservation["reservation_id"],
+            "event_id": reservation["event_id"],
+            "user_id": reservation["user_id"],
+            "checked_in_by": admin_user["id"],
+            "method": checkin_request.method,
+            "timestamp": checkin_time
+        }
         
-        if not reservation_details:
-            return CheckInResponse(
-                success=False,
-                message="Reservation details not found"
-            )
+        await database.checkins.insert_one(with_native_dates(checkin_record))
         
-        # Update reservation status to checked_in
-        checkin_time = datetime.utcnow().isoformat()
-        result = database.reservations.update_one(
-            {"id": reservation["id"]},
-            {
-                "$set": {
-                    "status": "checked_in",
-                    "checked_in_at": checkin_time,
-                    "checked_in_by": admin_user["id"]
-                }
-            }
+        return CheckInResponse(
+            success=True,
+            message="Check-in successful",
+            reservation=checkin_roster.details(reservation),
+            timestamp=checkin_time
         )
-        
-        if result.modified_count > 0:
-            # Record check-in event
-            checkin_record = {
-                "reservation_id": reservation["id"],
-                "event_id": reservation["event_id"],
-                "user_id": reservation["user_id"],
-                "checked_in_by": admin_user["id"],
-                "method": checkin_request.method,
-                "timestamp": checkin_time
-            }
-            
-            database.checkins.insert_one(checkin_record)
-            
-            return CheckInResponse(
-                success=True,
-                message="Check-in successful",
-                reservation=reservation_details[0],
-                timestamp=checkin_time
-            )
-        else:
-            return CheckInResponse(
-                success=False,
-                message="Failed to update check-in status"
-            )
             
     except Exception as e:
         return CheckInResponse(
@@ -254,27 +197,75 @@ async def check_in_user(
         )
 
 
+@router.get("/checkin/roster/{event_id}")
+async def export_checkin_roster(
+    event_id: str,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Signed roster of an event for offline scanners (Admin only)"""
+    roster = await checkin_roster.export(event_id)
+    if roster is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event not found"
+        )
+    return roster
+
+
+@router.post("/checkin/batch", response_model=CheckInBatchResponse)
+async def check_in_batch(
+    batch: CheckInBatchRequest,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Apply scans collected offline, with one result per scan (Admin only)"""
+    if len(batch.scans) > settings.CHECKIN_BATCH_MAX_SCANS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.CHECKIN_BATCH_MAX_SCANS} scans per batch"
+        )
+    
+    results = await checkin_roster.check_in_batch(
+        batch.event_id,
+        [scan.dict() for scan in batch.scans],
+        admin_user["id"]
+    )
+    if results is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event not found"
+        )
+    
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    
+    return CheckInBatchResponse(
+        event_id=batch.event_id,
+        summary=summary,
+        results=results
+    )
+
+
 @router.get("/checkin/stats", response_model=CheckInStats)
 async def get_checkin_stats(admin_user: dict = Depends(get_admin_user)):
     """Get check-in statistics (Admin only)"""
     try:
         # Total check-ins
-        total_checkins = database.checkins.count_documents({})
+        total_checkins = await database.checkins.count_documents({})
         
         # Check-ins today
-        today = datetime.utcnow().date().isoformat()
-        checkins_today = database.checkins.count_documents({
-            "timestamp": {"$regex": f"^{today}"}
+        checkins_today = await database.checkins.count_documents({
+            "timestamp_dt": range_filter(*day_range(datetime.utcnow()))
         })
         
         # Calculate check-in rate
-        total_reservations = database.reservations.count_documents({
+        total_reservations = await database.reservations.count_documents({
             "status": {"$ne": "cancelled"}
         })
         
         checkin_rate = 0.0
         if total_reservations > 0:
-            checked_in_reservations = database.reservations.count_documents({
+            checked_in_reservations = await database.reservations.count_documents({
                 "status": "checked_in"
             })
             checkin_rate = (checked_in_reservations / total_reservations) * 100
@@ -312,7 +303,7 @@ async def get_checkin_stats(admin_user: dict = Depends(get_admin_user)):
             }
         ]
         
-        recent_checkins = list(database.checkins.aggregate(recent_checkins_pipeline))
+        recent_checkins = await database.checkins.aggregate(recent_checkins_pipeline).to_list(length=None)
         
         # Popular check-in methods
         methods_pipeline = [
@@ -322,7 +313,7 @@ async def get_checkin_stats(admin_user: dict = Depends(get_admin_user)):
         
         methods_stats = {
             doc["_id"]: doc["count"] 
-            for doc in database.checkins.aggregate(methods_pipeline)
+            async for doc in database.checkins.aggregate(methods_pipeline)
         }
         
         return CheckInStats(
@@ -406,10 +397,10 @@ async def get_checkin_history(
             {"$limit": limit}
         ]
         
-        checkins = list(database.checkins.aggregate(pipeline))
+        checkins = await database.checkins.aggregate(pipeline).to_list(length=None)
         
         # Get total count
-        total = database.checkins.count_documents(query)
+        total = await database.checkins.count_documents(query)
         
         return PaginatedResponse(
             items=checkins,
@@ -442,12 +433,9 @@ async def search_for_checkin(
         
         reservations = []
         
-        if checkin_request.method == "email":
-            # Find user by email
-            user = database.users.find_one({
-                "email": checkin_request.value.lower(),
-                "deleted": {"$ne": True}
-            })
+        if checkin_request.method in ("email", "phone"):
+            # Find user by normalized email or phone
+            user = await find_user_by_identifier(database.users, checkin_request.value)
             
             if user:
                 query = {
@@ -486,14 +474,11 @@ async def search_for_checkin(
                     }
                 ]
                 
-                reservations = list(database.reservations.aggregate(pipeline))
+                reservations = await database.reservations.aggregate(pipeline).to_list(length=None)
         
         elif checkin_request.method == "name":
-            # Find users by name
-            users = list(database.users.find({
-                "name": {"$regex": checkin_request.value, "$options": "i"},
-                "deleted": {"$ne": True}
-            }).limit(5))  # Limit to 5 users
+            # Find users by name words
+            users = await find_users_by_name(database.users, checkin_request.value, limit=5)  # Limit to 5 users
             
             for user in users:
                 query = {
@@ -504,11 +489,11 @@ async def search_for_checkin(
                 if checkin_request.event_id:
                     query["event_id"] = checkin_request.event_id
                 
-                user_reservations = list(database.reservations.find(query))
+                user_reservations = await database.reservations.find(query).to_list(length=None)
                 
                 for reservation in user_reservations:
                     # Get event details
-                    event = database.events.find_one({"id": reservation["event_id"]})
+                    event = await database.events.find_one({"id": reservation["event_id"]})
                     if event:
                         reservations.append({
                             "id": reservation["id"],
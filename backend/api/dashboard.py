@@ -4,15 +4,33 @@ Dashboard API endpoints
 
 from fastapi import APIRouter, HTTPException, status, Depends
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Optional, Dict, Any
 
 from models.common import SuccessResponse, DashboardStats
 from core.security import get_admin_user
 from core.database import database
+from core.dashboard_counters import dashboard_counters
+from core.passwords import password_hasher
+from utils.dates import add_months, day_start, month_start, range_filter
 
 router = APIRouter()
 
 
+async def _count_by_period(
+    collection,
+    field: str,
+    unit: str,
+    start: datetime,
+    match: Optional[Dict[str, Any]] = None
+) -> Dict[datetime, int]:
+    """Documents per day or month since `start`, bucketed with $dateTrunc on a native date field"""
+    pipeline = [
+        {"$match": {**(match or {}), field: range_filter(start)}},
+        {"$group": {"_id": {"$dateTrunc": {"date": f"${field}", "unit": unit}}, "count": {"$sum": 1}}}
+    ]
+    return {doc["_id"]: doc["count"] async for doc in collection.aggregate(pipeline)}
+
+
 @router.get("/dashboard/stats", response_model=SuccessResponse)
 async def get_dashboard_stats(admin_user: dict = Depends(get_admin_user)):
     """Get comprehensive dashboard statistics (Admin only)"""
@@ -20,139 +38,48 @@ async def get_dashboard_stats(admin_user: dict = Depends(get_admin_user)):
         # Get current date references
         now = datetime.utcnow()
         today = now.date().isoformat()
-        this_month_start = now.replace(day=1).isoformat()
-        
-        # Total counts
-        total_users = database.users.count_documents({"deleted": {"$ne": True}})
-        total_events = database.events.count_documents({})
-        total_reservations = database.reservations.count_documents({"status": {"$ne": "cancelled"}})
-        total_checkins = database.checkins.count_documents({})
-        
-        # Today's counts
-        users_today = database.users.count_documents({
-            "created_at": {"$regex": f"^{today}"},
-            "deleted": {"$ne": True}
-        })
+        this_month_start = now.replace(day=1).date().isoformat()
         
-        reservations_today = database.reservations.count_documents({
-            "created_at": {"$regex": f"^{today}"},
-            "status": {"$ne": "cancelled"}
-        })
-        
-        checkins_today = database.checkins.count_documents({
-            "timestamp": {"$regex": f"^{today}"}
-        })
+        # Totals and today's counts from the write-time counters
+        counters = await dashboard_counters.read([today])
+        totals = counters["totals"]
+        today_counts = counters["days"][today]
+        month_counts = await dashboard_counters.read_range(this_month_start, today)
         
-        # This month's events
-        events_this_month = database.events.count_documents({
-            "created_at": {"$gte": this_month_start}
+        total_events = await database.events.estimated_document_count()
+        events_this_month = await database.events.count_documents({
+            "created_at_dt": range_filter(month_start(now))
         })
         
-        # Calculate revenue
-        revenue_today_pipeline = [
-            {
-                "$match": {
-                    "created_at": {"$regex": f"^{today}"},
-                    "status": {"$ne": "cancelled"}
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "events",
-                    "localField": "event_id",
-                    "foreignField": "id",
-                    "as": "event"
-                }
-            },
-            {"$unwind": "$event"},
-            {
-                "$group": {
-                    "_id": None,
-                    "total": {"$sum": {"$ifNull": ["$event.price", 0]}}
-                }
-            }
-        ]
-        
-        revenue_month_pipeline = [
-            {
-                "$match": {
-                    "created_at": {"$gte": this_month_start},
-                    "status": {"$ne": "cancelled"}
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "events",
-                    "localField": "event_id",
-                    "foreignField": "id",
-                    "as": "event"
-                }
-            },
-            {"$unwind": "$event"},
-            {
-                "$group": {
-                    "_id": None,
-                    "total": {"$sum": {"$ifNull": ["$event.price", 0]}}
-                }
-            }
-        ]
-        
-        revenue_today_result = list(database.reservations.aggregate(revenue_today_pipeline))
-        revenue_month_result = list(database.reservations.aggregate(revenue_month_pipeline))
-        
-        revenue_today = revenue_today_result[0]["total"] if revenue_today_result else 0
-        revenue_this_month = revenue_month_result[0]["total"] if revenue_month_result else 0
-        
         # Calculate check-in rate
         checkin_rate = 0.0
-        if total_reservations > 0:
-            checked_in_count = database.reservations.count_documents({"status": "checked_in"})
-            checkin_rate = (checked_in_count / total_reservations) * 100
+        if totals["reservations"] > 0:
+            checkin_rate = (totals["checkins"] / totals["reservations"]) * 100
         
-        # Popular events (top 5 by reservations)
-        popular_events_pipeline = [
+        # Popular events (top 5 by seats taken)
+        popular_events = [
             {
-                "$match": {"status": {"$ne": "cancelled"}}
-            },
-            {
-                "$group": {
-                    "_id": "$event_id",
-                    "reservation_count": {"$sum": 1}
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "events",
-                    "localField": "_id",
-                    "foreignField": "id",
-                    "as": "event"
-                }
-            },
-            {"$unwind": "$event"},
-            {
-                "$project": {
-                    "event_id": "$_id",
-                    "event_title": "$event.title",
-                    "event_category": "$event.category",
-                    "event_date": "$event.date",
-                    "reservation_count": 1,
-                    "capacity": "$event.capacity"
-                }
-            },
-            {"$sort": {"reservation_count": -1}},
-            {"$limit": 5}
+                "event_id": event["id"],
+                "event_title": event.get("title"),
+                "event_category": event.get("category"),
+                "event_date": event.get("date"),
+                "reservation_count": event.get("reserved_count", 0),
+                "capacity": event.get("capacity")
+            }
+            for event in await database.events.find(
+                {"reserved_count": {"$gt": 0}},
+                {"_id": 0, "id": 1, "title": 1, "category": 1, "date": 1, "capacity": 1, "reserved_count": 1}
+            ).sort("reserved_count", -1).limit(5).to_list(length=None)
         ]
         
-        popular_events = list(database.reservations.aggregate(popular_events_pipeline))
-        
         # Recent activity (last 10 activities)
         recent_activity = []
         
         # Recent users
-        recent_users = list(database.users.find(
+        recent_users = await database.users.find(
             {"deleted": {"$ne": True}},
             {"name": 1, "email": 1, "created_at": 1}
-        ).sort("created_at", -1).limit(3))
+        ).sort("created_at", -1).limit(3).to_list(length=None)
         
         for user in recent_users:
             recent_activity.append({
@@ -162,9 +89,11 @@ async def get_dashboard_stats(admin_user: dict = Depends(get_admin_user)):
                 "icon": "user-plus"
             })
         
-        # Recent reservations
-        recent_reservations = list(database.reservations.aggregate([
+        # Recent reservations (limit before joining users and events)
+        recent_reservations = await database.reservations.aggregate([
             {"$match": {"status": {"$ne": "cancelled"}}},
+            {"$sort": {"created_at": -1}},
+            {"$limit": 3},
             {
                 "$lookup": {
                     "from": "users",
@@ -190,10 +119,8 @@ async def get_dashboard_stats(admin_user: dict = Depends(get_admin_user)):
                     "created_at": 1,
                     "status": 1
                 }
-            },
-            {"$sort": {"created_at": -1}},
-            {"$limit": 3}
-        ]))
+            }
+        ]).to_list(length=None)
         
         for reservation in recent_reservations:
             icon = "check-circle" if reservation["status"] == "checked_in" else "calendar"
@@ -205,10 +132,10 @@ async def get_dashboard_stats(admin_user: dict = Depends(get_admin_user)):
             })
         
         # Recent events
-        recent_events = list(database.events.find(
+        recent_events = await database.events.find(
             {},
             {"title": 1, "category": 1, "created_at": 1}
-        ).sort("created_at", -1).limit(2))
+        ).sort("created_at", -1).limit(2).to_list(length=None)
         
         for event in recent_events:
             recent_activity.append({
@@ -224,16 +151,16 @@ async def get_dashboard_stats(admin_user: dict = Depends(get_admin_user)):
         
         # Create dashboard stats object
         stats = DashboardStats(
-            total_users=total_users,
+            total_users=totals["users"],
             total_events=total_events,
-            total_reservations=total_reservations,
-            total_checkins=total_checkins,
-            users_today=users_today,
+            total_reservations=totals["reservations"],
+            total_checkins=totals["checkins"],
+            users_today=today_counts["users"],
             events_this_month=events_this_month,
-            reservations_today=reservations_today,
-            checkins_today=checkins_today,
-            revenue_today=revenue_today,
-            revenue_this_month=revenue_this_month,
+            reservations_today=today_counts["reservations"],
+            checkins_today=today_counts["checkins"],
+            revenue_today=today_counts["revenue"],
+            revenue_this_month=month_counts["revenue"],
             checkin_rate=round(checkin_rate, 1),
             popular_events=popular_events,
             recent_activity=recent_activity
@@ -256,32 +183,27 @@ async def get_quick_stats(admin_user: dict = Depends(get_admin_user)):
     """Get quick stats for dashboard widgets (Admin only)"""
     try:
         today = datetime.utcnow().date().isoformat()
+        counters = await dashboard_counters.read([today])
+        totals = counters["totals"]
+        today_counts = counters["days"][today]
         
         # Quick counts
         stats = {
             "users": {
-                "total": database.users.count_documents({"deleted": {"$ne": True}}),
-                "today": database.users.count_documents({
-                    "created_at": {"$regex": f"^{today}"},
-                    "deleted": {"$ne": True}
-                })
+                "total": totals["users"],
+                "today": today_counts["users"]
             },
             "events": {
-                "total": database.events.count_documents({}),
-                "published": database.events.count_documents({"published": True})
+                "total": await database.events.estimated_document_count(),
+                "published": await database.events.count_documents({"published": True})
             },
             "reservations": {
-                "total": database.reservations.count_documents({"status": {"$ne": "cancelled"}}),
-                "today": database.reservations.count_documents({
-                    "created_at": {"$regex": f"^{today}"},
-                    "status": {"$ne": "cancelled"}
-                })
+                "total": totals["reservations"],
+                "today": today_counts["reservations"]
             },
             "checkins": {
-                "total": database.checkins.count_documents({}),
-                "today": database.checkins.count_documents({
-                    "timestamp": {"$regex": f"^{today}"}
-                })
+                "total": totals["checkins"],
+                "today": today_counts["checkins"]
             }
         }
         
@@ -311,6 +233,7 @@ async def get_system_status(admin_user: dict = Depends(get_admin_user)):
             "status": "healthy" if db_health.get("status") == "connected" else "unhealthy",
             "timestamp": database.get_current_timestamp(),
             "environment": "development",  # This could come from settings
+            "password_hashing": password_hasher.stats(),
             "features": {
                 "analytics": True,
                 "email_notifications": True,
@@ -341,7 +264,7 @@ async def get_activity_feed(
         activities = []
         
         # Recent check-ins
-        recent_checkins = list(database.checkins.aggregate([
+        recent_checkins = await database.checkins.aggregate([
             {
                 "$lookup": {
                     "from": "users",
@@ -378,12 +301,12 @@ async def get_activity_feed(
             },
             {"$sort": {"timestamp": -1}},
             {"$limit": limit // 2}
-        ]))
+        ]).to_list(length=None)
         
         activities.extend(recent_checkins)
         
         # Recent reservations
-        recent_reservations = list(database.reservations.aggregate([
+        recent_reservations = await database.reservations.aggregate([
             {"$match": {"status": {"$ne": "cancelled"}}},
             {
                 "$lookup": {
@@ -421,7 +344,7 @@ async def get_activity_feed(
             },
             {"$sort": {"timestamp": -1}},
             {"$limit": limit // 2}
-        ]))
+        ]).to_list(length=None)
         
         activities.extend(recent_reservations)
         
@@ -447,24 +370,21 @@ async def get_monthly_attendance_chart(admin_user: dict = Depends(get_admin_user
     """Get monthly attendance data for charts"""
     try:
         # Get last 12 months of data
-        now = datetime.utcnow()
+        months = [add_months(datetime.utcnow(), offset) for offset in range(-11, 1)]
         months_data = []
         
-        for i in range(11, -1, -1):
-            month_date = now - timedelta(days=30 * i)
-            month_str = month_date.strftime("%Y-%m")
-            month_name = month_date.strftime("%b %Y")
-            
-            # Count check-ins for this month
-            checkins_count = database.checkins.count_documents({
-                "timestamp": {"$regex": f"^{month_str}"}
-            })
-            
-            # Count reservations for this month
-            reservations_count = database.reservations.count_documents({
-                "created_at": {"$regex": f"^{month_str}"},
-                "status": {"$ne": "cancelled"}
-            })
+        checkins_by_month = await _count_by_period(
+            database.checkins, "timestamp_dt", "month", months[0]
+        )
+        reservations_by_month = await _count_by_period(
+            database.reservations, "created_at_dt", "month", months[0],
+            {"status": {"$ne": "cancelled"}}
+        )
+        
+        for month in months:
+            month_name = month.strftime("%b %Y")
+            checkins_count = checkins_by_month.get(month, 0)
+            reservations_count = reservations_by_month.get(month, 0)
             
             months_data.append({
                 "month": month_name,
@@ -532,7 +452,7 @@ async def get_categories_distribution_chart(admin_user: dict = Depends(get_admin
             {"$sort": {"total_reservations": -1}}
         ]
         
-        categories_data = list(database.events.aggregate(categories_pipeline))
+        categories_data = await database.events.aggregate(categories_pipeline).to_list(length=None)
         
         # Format for chart
         chart_data = []
@@ -573,34 +493,26 @@ async def get_weekly_trends_chart(admin_user: dict = Depends(get_admin_user)):
     """Get weekly trends data for line chart"""
     try:
         # Get last 7 days of data
+        days = [day_start(datetime.utcnow()) - timedelta(days=i) for i in range(6, -1, -1)]
         trends_data = []
         
-        for i in range(6, -1, -1):
-            date = datetime.utcnow() - timedelta(days=i)
-            date_str = date.strftime("%Y-%m-%d")
-            day_name = date.strftime("%a")
-            
-            # Count various activities for each day
-            new_users = database.users.count_documents({
-                "created_at": {"$regex": f"^{date_str}"},
-                "deleted": {"$ne": True}
-            })
-            
-            new_reservations = database.reservations.count_documents({
-                "created_at": {"$regex": f"^{date_str}"},
-                "status": {"$ne": "cancelled"}
-            })
-            
-            checkins = database.checkins.count_documents({
-                "timestamp": {"$regex": f"^{date_str}"}
-            })
-            
+        users_by_day = await _count_by_period(
+            database.users, "created_at_dt", "day", days[0], {"deleted": {"$ne": True}}
+        )
+        reservations_by_day = await _count_by_period(
+            database.reservations, "created_at_dt", "day", days[0], {"status": {"$ne": "cancelled"}}
+        )
+        checkins_by_day = await _count_by_period(
+            database.checkins, "timestamp_dt", "day", days[0]
+        )
+        
+        for date in days:
             trends_data.append({
-                "day": day_name,
-                "date": date_str,
-                "new_users": new_users,
-                "new_reservations": new_reservations,
-                "checkins": checkins
+                "day": date.strftime("%a"),
+                "date": date.strftime("%Y-%m-%d"),
+                "new_users": users_by_day.get(date, 0),
+                "new_reservations": reservations_by_day.get(date, 0),
+                "checkins": checkins_by_day.get(date, 0)
             })
         
         return SuccessResponse(
@@ -649,7 +561,7 @@ async def get_occupancy_rates_chart(admin_user: dict = Depends(get_admin_user)):
             {"$limit": 10}
         ]
         
-        occupancy_data = list(database.events.aggregate(occupancy_pipeline))
+        occupancy_data = await database.events.aggregate(occupancy_pipeline).to_list(length=None)
         
         # Format for chart
         chart_data = []
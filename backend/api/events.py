@@ -2,45 +2,35 @@
 Events API endpoints
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
 from typing import Optional
 from datetime import datetime
 
 from models.events import EventCreate, EventUpdate, Event, EventStats
 from models.common import SuccessResponse, PaginatedResponse
 from core.security import get_current_user, get_admin_user
+from core.config import settings
 from core.database import database
 from services.event_service import event_service
 from utils.validation import validate_pagination, validate_search_query
+from utils.dates import month_start, range_filter
 
 router = APIRouter()
 
 
 @router.get("/events")
-async def get_events():
-    """Get events - Compatible with original API"""
+async def get_events(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=settings.MAX_PAGE_SIZE)
+):
+    """Get events - Compatible with original API (plain list, optional paging)"""
     try:
-        # Get events from database using direct db access
-        events_cursor = database.db.events.find({})
-        event_list = []
-        
-        for event in events_cursor:
-            # Remove MongoDB ObjectId
-            if "_id" in event:
-                del event["_id"]
-            
-            # Calculate available spots
-            try:
-                reservations_count = database.db.reservations.count_documents({
-                    "event_id": event["id"],
-                    "status": {"$ne": "cancelled"}
-                })
-                event["available_spots"] = max(0, event["capacity"] - reservations_count)
-            except:
-                # Fallback if reservation count fails
-                event["available_spots"] = event["capacity"]
-            
-            event_list.append(event)
+        event_list = await event_service.list_events(skip=skip, limit=limit)
+        
+        if limit:
+            # Paged callers get the catalogue size without changing the body
+            response.headers["X-Total-Count"] = str(await database.events.count_documents({}))
         
         return event_list
         
@@ -175,13 +165,13 @@ async def get_event_stats(admin_user: dict = Depends(get_admin_user)):
     """Get event statistics overview (Admin only)"""
     try:
         # Total events
-        total_events = database.events.count_documents({})
+        total_events = await database.events.count_documents({})
         
         # Published events
-        published_events = database.events.count_documents({"published": True})
+        published_events = await database.events.count_documents({"published": True})
         
         # Draft events
-        draft_events = database.events.count_documents({"published": False})
+        draft_events = await database.events.count_documents({"published": False})
         
         # Events by category
         category_pipeline = [
@@ -190,17 +180,16 @@ async def get_event_stats(admin_user: dict = Depends(get_admin_user)):
         ]
         events_by_category = {
             doc["_id"]: doc["count"] 
-            for doc in database.events.aggregate(category_pipeline)
+            async for doc in database.events.aggregate(category_pipeline)
         }
         
         # Events this month
-        this_month = datetime.utcnow().replace(day=1).isoformat()
-        events_this_month = database.events.count_documents({
-            "created_at": {"$gte": this_month}
+        events_this_month = await database.events.count_documents({
+            "created_at_dt": range_filter(month_start(datetime.utcnow()))
         })
         
         # Total reservations across all events
-        total_reservations = database.reservations.count_documents({
+        total_reservations = await database.reservations.count_documents({
             "status": {"$ne": "cancelled"}
         })
         
@@ -228,7 +217,7 @@ async def get_event_stats(admin_user: dict = Depends(get_admin_user)):
             }
         ]
         
-        revenue_result = list(database.reservations.aggregate(revenue_pipeline))
+        revenue_result = await database.reservations.aggregate(revenue_pipeline).to_list(length=None)
         total_revenue = revenue_result[0]["total_revenue"] if revenue_result else 0
         
         # Most popular events (by reservation count)
@@ -265,7 +254,7 @@ async def get_event_stats(admin_user: dict = Depends(get_admin_user)):
             {"$limit": 5}
         ]
         
-        popular_events = list(database.reservations.aggregate(popular_events_pipeline))
+        popular_events = await database.reservations.aggregate(popular_events_pipeline).to_list(length=None)
         
         return SuccessResponse(
             message="Event statistics retrieved successfully",
@@ -337,10 +326,10 @@ async def get_event_reservations(
             {"$limit": limit}
         ]
         
-        reservations = list(database.reservations.aggregate(pipeline))
+        reservations = await database.reservations.aggregate(pipeline).to_list(length=None)
         
         # Get total count
-        total = database.reservations.count_documents({"event_id": event_id})
+        total = await database.reservations.count_documents({"event_id": event_id})
         
         return PaginatedResponse(
             items=reservations,
@@ -8,6 +8,8 @@ from datetime import datetime, timedelta
 from models.common import SuccessResponse
 from core.security import get_admin_user
 from core.database import database
+from reports import report_data
+from utils.dates import range_filter
 
 router = APIRouter()
 
@@ -78,69 +80,25 @@ async def get_events_summary_report(
         if category:
             query["category"] = category
         
-        # Get events with reservation stats
-        pipeline = [
-            {"$match": query},
-            {
-                "$lookup": {
-                    "from": "reservations",
-                    "localField": "id",
-                    "foreignField": "event_id",
-                    "as": "reservations"
-                }
-            },
-            {
-                "$addFields": {
-                    "total_reservations": {"$size": "$reservations"},
-                    "confirmed_reservations": {
-                        "$size": {
-                            "$filter": {
-                                "input": "$reservations",
-                                "cond": {"$ne": ["$$this.status", "cancelled"]}
-                            }
-                        }
-                    },
-                    "checked_in_count": {
-                        "$size": {
-                            "$filter": {
-                                "input": "$reservations", 
-                                "cond": {"$eq": ["$$this.status", "checked_in"]}
-                            }
-                        }
-                    }
-                }
-            },
-            {
-                "$addFields": {
-                    "occupancy_rate": {
-                        "$cond": [
-                            {"$gt": ["$capacity", 0]},
-                            {"$multiply": [{"$divide": ["$confirmed_reservations", "$capacity"]}, 100]},
-                            0
-                        ]
-                    },
-                    "checkin_rate": {
-                        "$cond": [
-                            {"$gt": ["$confirmed_reservations", 0]},
-                            {"$multiply": [{"$divide": ["$checked_in_count", "$confirmed_reservations"]}, 100]},
-                            0
-                        ]
-                    },
-                    "revenue": {
-                        "$multiply": ["$confirmed_reservations", {"$ifNull": ["$price", 0]}]
-                    }
-                }
-            },
-            {
-                "$project": {
-                    "_id": 0,
-                    "reservations": 0
-                }
-            },
-            {"$sort": {"date": 1}}
-        ]
+        # Events, then their reservation counts in one aggregation
+        events_data = await database.events.find(query, {"_id": 0}).sort("date", 1).to_list(length=None)
+        data = await report_data.fetch_report_data(
+            [event["id"] for event in events_data],
+            report_data.ATTENDANCE_AGE_GROUPS
+        )
         
-        events_data = list(database.events.aggregate(pipeline))
+        for event in events_data:
+            counts = data["status_counts"].get(event["id"], {})
+            event.pop("reserved_count", None)
+            event["total_reservations"] = sum(counts.values())
+            event["confirmed_reservations"] = event["total_reservations"] - counts.get("cancelled", 0)
+            event["checked_in_count"] = counts.get("checked_in", 0)
+            capacity = event.get("capacity", 0)
+            event["occupancy_rate"] = (event["confirmed_reservations"] / capacity * 100) if capacity > 0 else 0
+            event["checkin_rate"] = (
+                event["checked_in_count"] / event["confirmed_reservations"] * 100
+            ) if event["confirmed_reservations"] > 0 else 0
+            event["revenue"] = event["confirmed_reservations"] * (event.get("price") or 0)
         
         # Calculate summary stats
         total_events = len(events_data)
@@ -166,7 +124,7 @@ async def get_events_summary_report(
             category_stats[cat]["reservations"] += event.get("confirmed_reservations", 0)
             category_stats[cat]["revenue"] += event.get("revenue", 0)
         
-        report_data = {
+        report = {
             "period": {
                 "start_date": start_date,
                 "end_date": end_date,
@@ -187,7 +145,7 @@ async def get_events_summary_report(
         
         return SuccessResponse(
             message="Events summary report generated successfully",
-            data=report_data
+            data=report
         )
         
     except Exception as e:
@@ -197,6 +155,55 @@ async def get_events_summary_report(
         )
 
 
+@router.get("/reports/events/{event_id}/attendance")
+async def get_event_attendance_report(
+    event_id: str,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Generate detailed attendance report for an event (Admin only)"""
+    event = await report_data.get_event(event_id)
+    if not event:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event not found"
+        )
+    
+    try:
+        report = await report_data.event_attendance_report(event)
+        return SuccessResponse(
+            message="Attendance report generated successfully",
+            data=report
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate attendance report"
+        )
+
+
+@router.get("/reports/attendance-summary")
+async def get_attendance_summary_report(
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Generate attendance summary report across events (Admin only)"""
+    try:
+        report = await report_data.attendance_summary_report(start_date, end_date, category)
+        return SuccessResponse(
+            message="Attendance summary report generated successfully",
+            data=report
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate attendance summary report"
+        )
+
+
 @router.get("/reports/revenue-analysis")
 async def get_revenue_analysis_report(
     period: str = Query("90", regex="^(30|90|365)$"),
@@ -206,13 +213,13 @@ async def get_revenue_analysis_report(
     try:
         # Calculate date range
         days = int(period)
-        start_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
+        start_date = datetime.utcnow() - timedelta(days=days)
         
         # Revenue by month
         revenue_pipeline = [
             {
                 "$match": {
-                    "created_at": {"$gte": start_date},
+                    "created_at_dt": range_filter(start_date),
                     "status": {"$ne": "cancelled"}
                 }
             },
@@ -228,7 +235,7 @@ async def get_revenue_analysis_report(
             {
                 "$group": {
                     "_id": {
-                        "$substr": ["$created_at", 0, 7]  # YYYY-MM
+                        "$dateToString": {"format": "%Y-%m", "date": "$created_at_dt"}
                     },
                     "revenue": {"$sum": {"$ifNull": ["$event.price", 0]}},
                     "reservations": {"$sum": 1}
@@ -237,13 +244,13 @@ async def get_revenue_analysis_report(
             {"$sort": {"_id": 1}}
         ]
         
-        monthly_revenue = list(database.reservations.aggregate(revenue_pipeline))
+        monthly_revenue = await database.reservations.aggregate(revenue_pipeline).to_list(length=None)
         
         # Revenue by category
         category_revenue_pipeline = [
             {
                 "$match": {
-                    "created_at": {"$gte": start_date},
+                    "created_at_dt": range_filter(start_date),
                     "status": {"$ne": "cancelled"}
                 }
             },
@@ -266,7 +273,7 @@ async def get_revenue_analysis_report(
             {"$sort": {"revenue": -1}}
         ]
         
-        category_revenue = list(database.reservations.aggregate(category_revenue_pipeline))
+        category_revenue = await database.reservations.aggregate(category_revenue_pipeline).to_list(length=None)
         
         # Calculate totals
         total_revenue = sum(item["revenue"] for item in monthly_revenue)
@@ -276,7 +283,7 @@ async def get_revenue_analysis_report(
         report_data = {
             "period": {
                 "days": days,
-                "start_date": start_date,
+                "start_date": start_date.isoformat(),
                 "generated_at": datetime.utcnow().isoformat()
             },
             "summary": {
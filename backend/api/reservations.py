@@ -13,9 +13,11 @@ from core.security import get_current_user, get_admin_user
 from core.database import database
 from services.event_service import event_service
 from services.user_service import user_service
+from services.reservation_service import reservation_service
 from utils.qr_codes import generate_reservation_code, generate_reservation_qr_code
 from utils.email import send_reservation_confirmation_email
 from utils.validation import validate_pagination
+from utils.dates import day_range, range_filter
 
 router = APIRouter()
 
@@ -50,7 +52,7 @@ async def create_reservation(
             )
         
         # Check if user already has a reservation for this event
-        existing_reservation = database.reservations.find_one({
+        existing_reservation = await database.reservations.find_one({
             "event_id": reservation_data.event_id,
             "user_id": current_user["id"],
             "status": {"$ne": "cancelled"}
@@ -62,13 +64,6 @@ async def create_reservation(
                 detail="You already have a reservation for this event"
             )
         
-        # Check available capacity
-        if event["available_spots"] <= 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Event is fully booked"
-            )
-        
         # Create reservation
         reservation_id = str(uuid.uuid4())
         checkin_code = generate_reservation_code()
@@ -85,36 +80,38 @@ async def create_reservation(
             "notes": reservation_data.notes
         }
         
-        # Insert reservation
-        result = database.reservations.insert_one(reservation_doc)
-        
-        if result.inserted_id:
-            # Send confirmation email
-            try:
-                await send_reservation_confirmation_email(
-                    current_user["email"],
-                    current_user["name"],
-                    event["title"],
-                    event["date"],
-                    event["time"],
-                    checkin_code,
-                    qr_code
-                )
-            except Exception as e:
-                # Don't fail reservation if email fails
-                pass
-            
-            reservation_doc.pop("_id", None)
-            
-            return SuccessResponse(
-                message="Reservation created successfully",
-                data=reservation_doc
+        # Take a seat atomically and insert the reservation
+        await reservation_service.book(reservation_doc, generate_reservation_code)
+        
+        if reservation_doc["checkin_code"] != checkin_code:
+            # Code was redrawn after a collision: the QR must carry the new one
+            checkin_code = reservation_doc["checkin_code"]
+            qr_code = generate_reservation_qr_code(reservation_id, checkin_code)
+            reservation_doc["qr_code"] = qr_code
+            await database.reservations.update_one(
+                {"id": reservation_id},
+                {"$set": {"qr_code": qr_code}}
             )
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create reservation"
+        
+        # Send confirmation email
+        try:
+            await send_reservation_confirmation_email(
+                current_user["email"],
+                current_user["name"],
+                event["title"],
+                event["date"],
+                event["time"],
+                checkin_code,
+                qr_code
             )
+        except Exception as e:
+            # Don't fail reservation if email fails
+            pass
+        
+        return SuccessResponse(
+            message="Reservation created successfully",
+            data=reservation_doc
+        )
             
     except HTTPException:
         raise
@@ -176,10 +173,10 @@ async def get_user_reservations(
             {"$limit": limit}
         ]
         
-        reservations = list(database.reservations.aggregate(pipeline))
+        reservations = await database.reservations.aggregate(pipeline).to_list(length=None)
         
         # Get total count
-        total = database.reservations.count_documents(query)
+        total = await database.reservations.count_documents(query)
         
         return PaginatedResponse(
             items=reservations,
@@ -249,7 +246,7 @@ async def get_reservation(
             }
         ]
         
-        reservations = list(database.reservations.aggregate(pipeline))
+        reservations = await database.reservations.aggregate(pipeline).to_list(length=None)
         
         if not reservations:
             raise HTTPException(
@@ -289,7 +286,7 @@ async def cancel_reservation(
     """Cancel a reservation"""
     try:
         # Get reservation
-        reservation = database.reservations.find_one({"id": reservation_id})
+        reservation = await database.reservations.find_one({"id": reservation_id})
         
         if not reservation:
             raise HTTPException(
@@ -322,18 +319,13 @@ async def cancel_reservation(
                     detail="Cannot cancel reservation for past events"
                 )
         
-        # Cancel reservation
-        result = database.reservations.update_one(
-            {"id": reservation_id},
-            {
-                "$set": {
-                    "status": "cancelled",
-                    "cancelled_at": datetime.utcnow().isoformat()
-                }
-            }
+        # Cancel reservation and release its seat
+        cancelled = await reservation_service.cancel(
+            reservation_id,
+            {"cancelled_at": datetime.utcnow().isoformat()}
         )
         
-        if result.modified_count > 0:
+        if cancelled:
             return SuccessResponse(
                 message="Reservation cancelled successfully"
             )
@@ -357,27 +349,26 @@ async def get_reservation_stats(admin_user: dict = Depends(get_admin_user)):
     """Get reservation statistics overview (Admin only)"""
     try:
         # Total reservations
-        total_reservations = database.reservations.count_documents({})
+        total_reservations = await database.reservations.count_documents({})
         
         # Confirmed reservations
-        confirmed_reservations = database.reservations.count_documents({
+        confirmed_reservations = await database.reservations.count_documents({
             "status": "confirmed"
         })
         
         # Checked-in reservations
-        checked_in_reservations = database.reservations.count_documents({
+        checked_in_reservations = await database.reservations.count_documents({
             "status": "checked_in"
         })
         
         # Cancelled reservations
-        cancelled_reservations = database.reservations.count_documents({
+        cancelled_reservations = await database.reservations.count_documents({
             "status": "cancelled"
         })
         
         # Reservations today
-        today = datetime.utcnow().date().isoformat()
-        reservations_today = database.reservations.count_documents({
-            "created_at": {"$regex": f"^{today}"}
+        reservations_today = await database.reservations.count_documents({
+            "created_at_dt": range_filter(*day_range(datetime.utcnow()))
         })
         
         # Calculate revenue
@@ -404,7 +395,7 @@ async def get_reservation_stats(admin_user: dict = Depends(get_admin_user)):
             }
         ]
         
-        revenue_result = list(database.reservations.aggregate(revenue_pipeline))
+        revenue_result = await database.reservations.aggregate(revenue_pipeline).to_list(length=None)
         total_revenue = revenue_result[0]["total_revenue"] if revenue_result else 0
         
         return SuccessResponse(
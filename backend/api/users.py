@@ -4,15 +4,22 @@ Users API endpoints
 
 from fastapi import APIRouter, HTTPException, status, Depends, Query, UploadFile, File
 from typing import Optional, List
-import csv
-import io
 
-from models.users import User, UserUpdate, BulkUserAction, BulkImportResult
+from models.users import User, UserUpdate, BulkUserAction
 from models.common import SuccessResponse, PaginatedResponse
 from core.security import get_current_user, get_admin_user
+from core.dashboard_counters import dashboard_counters
+from core.principal_cache import principal_cache
 from core.database import database
 from services.user_service import user_service
+from services.user_import import user_import_service
+from utils.email import send_welcome_email
 from utils.validation import validate_pagination, validate_search_query
+from utils.dates import month_start, range_filter
+from utils.search import (
+    search_filter, text_search, escape_regex,
+    HIDDEN_SEARCH_FIELDS, TEXT_SCORE, RELEVANCE_SORT
+)
 
 router = APIRouter()
 
@@ -24,9 +31,15 @@ async def get_users(
     search: Optional[str] = Query(None),
     location: Optional[str] = Query(None),
     is_admin: Optional[bool] = Query(None),
+    sort: str = Query("created_at", regex="^(created_at|relevance)$"),
     admin_user: dict = Depends(get_admin_user)
 ):
-    """Get users with filtering and pagination (Admin only)"""
+    """
+    Get users with filtering and pagination (Admin only)
+    
+    `search` matches name, email and location words by prefix;
+    sort=relevance ranks full-word matches by text score.
+    """
     try:
         # Validate pagination
         skip, limit = validate_pagination(skip, limit)
@@ -35,30 +48,39 @@ async def get_users(
         # Build query
         query = {"deleted": {"$ne": True}}
         
+        ranked = False
         if search:
-            query["$or"] = [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"email": {"$regex": search, "$options": "i"}},
-                {"location": {"$regex": search, "$options": "i"}}
-            ]
+            ranked = sort == "relevance"
+            search_query = text_search(search) if ranked else search_filter(search)
+            if search_query:
+                query.update(search_query)
+            else:
+                ranked = False
         
         if location:
-            query["location"] = {"$regex": location, "$options": "i"}
+            query["location"] = {"$regex": escape_regex(location), "$options": "i"}
         
         if is_admin is not None:
             query["is_admin"] = is_admin
         
         # Get total count
-        total = database.users.count_documents(query)
+        total = await database.users.count_documents(query)
         
         # Get users
-        users_cursor = database.users.find(
-            query,
-            {"password": 0}  # Exclude password field
-        ).sort("created_at", -1).skip(skip).limit(limit)
+        if ranked:
+            users_cursor = database.users.find(
+                query,
+                {"password": 0, **HIDDEN_SEARCH_FIELDS, "score": TEXT_SCORE}
+            ).sort(RELEVANCE_SORT)
+        else:
+            users_cursor = database.users.find(
+                query,
+                {"password": 0, **HIDDEN_SEARCH_FIELDS}  # Exclude password and search fields
+            ).sort("created_at", -1)
+        users_cursor = users_cursor.skip(skip).limit(limit)
         
         users = []
-        for user in users_cursor:
+        async for user in users_cursor:
             user.pop("_id", None)
             users.append(user)
         
@@ -104,12 +126,12 @@ async def get_user(
             )
         
         # Get additional stats for profile
-        reservations_count = database.reservations.count_documents({
+        reservations_count = await database.reservations.count_documents({
             "user_id": user_id,
             "status": {"$ne": "cancelled"}
         })
         
-        checkins_count = database.checkins.count_documents({
+        checkins_count = await database.checkins.count_documents({
             "user_id": user_id
         })
         
@@ -188,12 +210,14 @@ async def delete_user(
             )
         
         # Soft delete user
-        result = database.users.update_one(
+        result = await database.users.update_one(
             {"id": user_id},
             {"$set": {"deleted": True, "deleted_at": database.get_current_timestamp()}}
         )
         
         if result.modified_count > 0:
+            await dashboard_counters.record_users_removed([user])
+            await principal_cache.revoke([user_id])
             return SuccessResponse(
                 message="User deleted successfully"
             )
@@ -252,11 +276,17 @@ async def bulk_user_action(
             )
         
         # Perform bulk update
-        result = database.users.update_many(
+        result = await database.users.update_many(
             {"id": {"$in": action_data.user_ids}},
             {"$set": update_doc}
         )
         
+        # Deletions and role changes invalidate the affected users' tokens
+        if action_data.action == "activate":
+            await principal_cache.invalidate(*action_data.user_ids)
+        else:
+            await principal_cache.revoke(action_data.user_ids)
+        
         return SuccessResponse(
             message=f"Bulk action completed successfully. {result.modified_count} users updated.",
             data={"modified_count": result.modified_count}
@@ -271,86 +301,34 @@ async def bulk_user_action(
         )
 
 
-@router.post("/users/import", response_model=BulkImportResult)
+@router.post("/users/import", response_model=SuccessResponse, status_code=status.HTTP_202_ACCEPTED)
 async def import_users(
     file: UploadFile = File(...),
     admin_user: dict = Depends(get_admin_user)
 ):
-    """Import users from CSV file (Admin only)"""
+    """Start a background import of users from a CSV/Excel file (Admin only)"""
     try:
-        if not file.filename.endswith('.csv'):
+        if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Only CSV files are supported"
+                detail="Only CSV and Excel files are supported"
             )
         
-        # Read CSV content
         content = await file.read()
-        csv_content = content.decode('utf-8')
-        
-        # Parse CSV
-        csv_reader = csv.DictReader(io.StringIO(csv_content))
-        
-        results = {
-            "total_processed": 0,
-            "successful_imports": 0,
-            "failed_imports": 0,
-            "duplicate_emails": 0,
-            "errors": [],
-            "imported_users": []
-        }
-        
-        for row_num, row in enumerate(csv_reader, start=2):
-            results["total_processed"] += 1
-            
-            try:
-                # Validate required fields
-                required_fields = ["name", "email", "phone", "age", "location"]
-                for field in required_fields:
-                    if not row.get(field):
-                        raise ValueError(f"Missing required field: {field}")
-                
-                # Check for duplicate email
-                existing_user = database.users.find_one({"email": row["email"]})
-                if existing_user:
-                    results["duplicate_emails"] += 1
-                    results["errors"].append({
-                        "row": row_num,
-                        "email": row["email"],
-                        "error": "Email already exists"
-                    })
-                    continue
-                
-                # Create user (with default password)
-                user_data = {
-                    "name": row["name"],
-                    "email": row["email"],
-                    "password": "TempPass123!",  # Users will need to reset
-                    "phone": row["phone"],
-                    "age": int(row["age"]),
-                    "location": row["location"]
-                }
-                
-                # Create user using service (will validate and hash password)
-                from models.users import UserCreate
-                user_create = UserCreate(**user_data)
-                new_user = await user_service.create_user(user_create)
-                
-                results["successful_imports"] += 1
-                results["imported_users"].append({
-                    "email": new_user["email"],
-                    "name": new_user["name"]
-                })
-                
-            except Exception as e:
-                results["failed_imports"] += 1
-                results["errors"].append({
-                    "row": row_num,
-                    "email": row.get("email", "unknown"),
-                    "error": str(e)
-                })
-        
-        return BulkImportResult(**results)
+        
+        # Users will need to reset the default password
+        job = await user_import_service.start_import(
+            content,
+            file.filename,
+            "TempPass123!",
+            requested_by=admin_user["id"],
+            send_welcome=send_welcome_email
+        )
+        
+        return SuccessResponse(
+            message="Import started",
+            data=job
+        )
         
     except HTTPException:
         raise
@@ -361,30 +339,48 @@ async def import_users(
         )
 
 
+@router.get("/users/import/{job_id}", response_model=SuccessResponse)
+async def get_import_job(
+    job_id: str,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Get progress and results of a user import job (Admin only)"""
+    job = await user_import_service.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import job not found"
+        )
+    
+    return SuccessResponse(
+        message="Import job retrieved",
+        data=job
+    )
+
+
 @router.get("/users/stats/overview")
 async def get_user_stats(admin_user: dict = Depends(get_admin_user)):
     """Get user statistics overview (Admin only)"""
     try:
         # Total users
-        total_users = database.users.count_documents({"deleted": {"$ne": True}})
+        total_users = await database.users.count_documents({"deleted": {"$ne": True}})
         
         # Active users (logged in last 30 days)
         from datetime import datetime, timedelta
-        thirty_days_ago = (datetime.utcnow() - timedelta(days=30)).isoformat()
-        active_users = database.users.count_documents({
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        active_users = await database.users.count_documents({
             "deleted": {"$ne": True},
-            "last_login": {"$gte": thirty_days_ago}
+            "last_login_dt": range_filter(thirty_days_ago)
         })
         
         # New users this month
-        this_month = datetime.utcnow().replace(day=1).isoformat()
-        new_users_this_month = database.users.count_documents({
+        new_users_this_month = await database.users.count_documents({
             "deleted": {"$ne": True},
-            "created_at": {"$gte": this_month}
+            "created_at_dt": range_filter(month_start(datetime.utcnow()))
         })
         
         # Admin users
-        admin_users = database.users.count_documents({
+        admin_users = await database.users.count_documents({
             "deleted": {"$ne": True},
             "is_admin": True
         })
@@ -397,7 +393,7 @@ async def get_user_stats(admin_user: dict = Depends(get_admin_user)):
             {"$limit": 5}
         ]
         
-        location_stats = list(database.users.aggregate(location_pipeline))
+        location_stats = await database.users.aggregate(location_pipeline).to_list(length=None)
         
         return SuccessResponse(
             message="User statistics retrieved successfully",
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the events listing: MongoDB round trips and latency per page
+
+Seeds a scratch database with catalogues of growing size and lists one page
+through EventService.list_events, counting the commands sent to the server.
+The round trips per page must stay constant as the catalogue grows.
+
+Usage: python benchmark_events_listing.py [--sizes 100 1000 10000] [--page-size 20]
+"""
+
+import sys
+import os
+import time
+import uuid
+import random
+import asyncio
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Never touch the real database
+os.environ["DATABASE_NAME"] = os.environ.get("BENCHMARK_DATABASE_NAME", "cultural_center_benchmark")
+
+from pymongo import monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the commands sent to MongoDB"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+counter = CommandCounter()
+monitoring.register(counter)
+
+from core.database import database
+from services.event_service import event_service
+
+
+async def seed(size: int, with_counters: bool):
+    """Create `size` events with a few reservations each"""
+    await database.events.delete_many({})
+    await database.reservations.delete_many({})
+
+    events = []
+    reservations = []
+    for i in range(size):
+        event_id = str(uuid.uuid4())
+        booked = random.randint(0, 5)
+        event = {
+            "id": event_id,
+            "title": f"Evento {i}",
+            "description": "Descripción " * 20,
+            "category": "Talleres",
+            "date": f"2026-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+            "time": "19:00",
+            "capacity": 50,
+            "location": "Sala Principal",
+            "published": True,
+            "created_at": "2026-01-01T00:00:00"
+        }
+        if with_counters:
+            event["reserved_count"] = booked
+        events.append(event)
+        for _ in range(booked):
+            reservations.append({
+                "id": str(uuid.uuid4()),
+                "event_id": event_id,
+                "user_id": str(uuid.uuid4()),
+                "status": "confirmed",
+                "created_at": "2026-01-01T00:00:00"
+            })
+
+    await database.events.insert_many(events)
+    if reservations:
+        await database.reservations.insert_many(reservations)
+
+
+async def measure(page_size: int):
+    """List one page and return (round trips, milliseconds)"""
+    counter.commands.clear()
+    start = time.perf_counter()
+    events = await event_service.list_events(skip=0, limit=page_size)
+    elapsed = (time.perf_counter() - start) * 1000
+    assert len(events) <= page_size
+    return len(counter.commands), elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    await database.initialize()
+
+    print(f"{'events':>8} {'counters':>9} {'round trips':>12} {'ms/page':>9} {'N+1 would be':>13}")
+    try:
+        for size in args.sizes:
+            for with_counters in (True, False):
+                await seed(size, with_counters)
+                # Warm up connections and caches before timing
+                await measure(args.page_size)
+                round_trips, elapsed = await measure(args.page_size)
+                print(
+                    f"{size:>8} {'yes' if with_counters else 'legacy':>9} "
+                    f"{round_trips:>12} {elapsed:>9.1f} {1 + min(size, args.page_size):>13}"
+                )
+    finally:
+        await database.client.drop_database(os.environ["DATABASE_NAME"])
+        await database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark for segmentation feature extraction: time versus data volume
+
+Builds synthetic users, analytics events and reservations in memory and times
+build_feature_frame at growing sizes. The time per event must stay roughly
+constant (linear scaling) as the volume grows to a million events.
+
+Usage: python benchmark_segmentation.py [--events 10000 100000 1000000] [--events-per-user 20]
+"""
+
+import sys
+import os
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from analytics.segmentation import build_feature_frame, PREFERENCE_CATEGORIES
+
+EVENT_TYPES = ['page_view', 'event_booking', 'event_checkin', 'login']
+STATUSES = ['confirmed', 'checked_in', 'cancelled']
+
+
+def synthetic_data(num_events: int, events_per_user: int, seed: int = 42):
+    """Users, analytics events, reservations and event categories of the given size"""
+    rng = np.random.default_rng(seed)
+    num_users = max(1, num_events // events_per_user)
+    num_catalogue = max(10, num_users // 50)
+    now = pd.Timestamp('2026-01-31T00:00:00')
+
+    user_ids = np.array([f"user-{i}" for i in range(num_users)])
+    users = pd.DataFrame({
+        'id': user_ids,
+        'age': rng.integers(16, 80, num_users),
+        'created_at': (now - pd.to_timedelta(rng.integers(0, 365, num_users), unit='D')).strftime('%Y-%m-%dT%H:%M:%S')
+    })
+
+    user_events = pd.DataFrame({
+        'user_id': user_ids[rng.integers(0, num_users, num_events)],
+        'event_type': np.array(EVENT_TYPES)[rng.integers(0, len(EVENT_TYPES), num_events)],
+        'timestamp': (now - pd.to_timedelta(rng.integers(0, 30 * 86400, num_events), unit='s')).strftime('%Y-%m-%dT%H:%M:%S'),
+        'session_id': np.char.add('session-', rng.integers(0, num_events // 5 + 1, num_events).astype(str))
+    })
+
+    event_ids = np.array([f"event-{i}" for i in range(num_catalogue)])
+    num_reservations = num_events // 10
+    reservations = pd.DataFrame({
+        'user_id': user_ids[rng.integers(0, num_users, num_reservations)],
+        'event_id': event_ids[rng.integers(0, num_catalogue, num_reservations)],
+        'status': np.array(STATUSES)[rng.integers(0, len(STATUSES), num_reservations)]
+    })
+    event_categories = pd.Series(
+        np.array(PREFERENCE_CATEGORIES)[rng.integers(0, len(PREFERENCE_CATEGORIES), num_catalogue)],
+        index=event_ids
+    )
+    return users, user_events, reservations, event_categories
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--events-per-user", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'events':>10} {'users':>8} {'reservations':>13} {'seconds':>9} {'µs/event':>9}")
+    for num_events in args.events:
+        users, user_events, reservations, event_categories = synthetic_data(num_events, args.events_per_user)
+
+        start = time.perf_counter()
+        features, category_matrix, _ = build_feature_frame(users, user_events, reservations, event_categories)
+        elapsed = time.perf_counter() - start
+
+        assert len(features) == len(users)
+        assert category_matrix.shape[0] == len(users)
+        print(
+            f"{num_events:>10} {len(users):>8} {len(reservations):>13} "
+            f"{elapsed:>9.2f} {elapsed / num_events * 1e6:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
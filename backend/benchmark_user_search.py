@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark for user search: legacy regex scan against the indexed search fields
+
+Seeds a scratch database with users carrying the derived search fields (see
+utils/search.py), then runs the same searches three ways: the old
+case-insensitive `$regex` over name/email/location, the `search_prefixes`
+filter used by the admin lists, and the ranked `$text` query. For each it
+reports the median latency of one 20-user page plus its count, and the
+documents MongoDB examined.
+
+Usage: python benchmark_user_search.py [--users 500000] [--runs 5] [--keep]
+"""
+
+import sys
+import os
+import time
+import random
+import asyncio
+import argparse
+import statistics
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Never touch the real database
+os.environ["DATABASE_NAME"] = os.environ.get("BENCHMARK_DATABASE_NAME", "cultural_center_benchmark")
+
+from core.database import database
+from utils.search import search_fields, search_filter, text_search, RELEVANCE_SORT, TEXT_SCORE
+
+FIRST_NAMES = ["José", "María", "Ana", "Luis", "Carmen", "Pedro", "Lucía", "Andrés", "Sofía", "Ramón", "Inés", "Julián"]
+LAST_NAMES = ["Núñez", "Pérez", "Gómez", "Rodríguez", "Martínez", "Sánchez", "Peña", "Díaz", "Castillo", "Guzmán"]
+LOCATIONS = ["Santo Domingo", "Santiago", "La Romana", "San Pedro de Macorís", "Puerto Plata", "Higüey"]
+
+SEARCHES = ["maria", "jose nunez", "Pérez", "guzm", "castillo santiago", "user123456"]
+
+SEED_BATCH_SIZE = 10000
+
+
+async def seed(size: int):
+    """Create `size` users with their search fields"""
+    await database.users.delete_many({})
+    for start in range(0, size, SEED_BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + SEED_BATCH_SIZE, size)):
+            user = {
+                "id": f"user-{i}",
+                "name": f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}",
+                "email": f"user{i}@example.com",
+                "location": random.choice(LOCATIONS),
+                "deleted": False,
+                "created_at": "2026-01-01T00:00:00"
+            }
+            user.update(search_fields(user))
+            batch.append(user)
+        await database.users.insert_many(batch, ordered=False)
+        print(f"seeded {start + len(batch)} users", end="\r")
+    print()
+
+
+def legacy_query(search: str):
+    return {"deleted": {"$ne": True}, "$or": [
+        {"name": {"$regex": search, "$options": "i"}},
+        {"email": {"$regex": search, "$options": "i"}},
+        {"location": {"$regex": search, "$options": "i"}}
+    ]}
+
+
+async def measure(query, runs: int, ranked: bool = False):
+    """Median ms for one page plus count, and documents examined"""
+    projection = {"_id": 0, "id": 1, "name": 1}
+    if ranked:
+        projection["score"] = TEXT_SCORE
+
+    def cursor():
+        found = database.users.find(query, projection)
+        if ranked:
+            found = found.sort(RELEVANCE_SORT)
+        return found.limit(20)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await cursor().to_list(length=20)
+        await database.users.count_documents(query)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    explain = await cursor().explain()
+    examined = explain.get("executionStats", {}).get("totalDocsExamined", "?")
+    return statistics.median(timings), examined
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=500000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database for another run")
+    args = parser.parse_args()
+
+    await database.initialize()
+
+    try:
+        if await database.users.estimated_document_count() != args.users:
+            await seed(args.users)
+
+        print(f"{'search':<20} {'regex ms':>9} {'examined':>9} {'prefix ms':>10} {'examined':>9} {'text ms':>8} {'examined':>9}")
+        for search in SEARCHES:
+            regex_ms, regex_examined = await measure(legacy_query(search), args.runs)
+            prefix_ms, prefix_examined = await measure(
+                {"deleted": {"$ne": True}, **search_filter(search)}, args.runs
+            )
+            text_ms, text_examined = await measure(
+                {"deleted": {"$ne": True}, **text_search(search)}, args.runs, ranked=True
+            )
+            print(
+                f"{search:<20} {regex_ms:>9.1f} {regex_examined:>9} {prefix_ms:>10.1f} {prefix_examined:>9} "
+                f"{text_ms:>8.1f} {text_examined:>9}"
+            )
+    finally:
+        if not args.keep:
+            await database.client.drop_database(os.environ["DATABASE_NAME"])
+        await database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -14,15 +14,26 @@ from .security import (
     generate_password_reset_token,
     verify_password_reset_token
 )
-from .analytics_init import (
-    initialize_analytics,
-    cleanup_analytics,
-    get_analytics_tracker,
-    get_performance_tracker,
-    get_dashboard_manager,
-    get_user_segmentation
+
+# The analytics modules import from `core` themselves, so the analytics
+# helpers are loaded on first access rather than while `core` is initializing
+_ANALYTICS_EXPORTS = (
+    "initialize_analytics",
+    "cleanup_analytics",
+    "get_analytics_tracker",
+    "get_performance_tracker",
+    "get_dashboard_manager",
+    "get_user_segmentation"
 )
 
+
+def __getattr__(name):
+    if name in _ANALYTICS_EXPORTS:
+        from . import analytics_init
+        return getattr(analytics_init, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = [
     "settings",
     "database",
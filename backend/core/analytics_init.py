@@ -41,6 +41,8 @@ async def initialize_analytics():
         
         if user_segmentation:
             await user_segmentation.initialize()
+            user_segmentation.start_scorer()
+            user_segmentation.start_retrainer()
             logger.info("✅ User segmentation initialized")
             
         logger.info("📊 All analytics systems initialized successfully")
@@ -59,7 +61,17 @@ async def cleanup_analytics():
     try:
         if dashboard_manager:
             await dashboard_manager.cleanup()
-            logger.info("✅ Analytics cleanup completed")
+        
+        if user_segmentation:
+            await user_segmentation.stop_scorer()
+            await user_segmentation.stop_retrainer()
+            user_segmentation.shutdown()
+        
+        if analytics:
+            # Flush buffered events before the connections go away
+            await analytics.close()
+        
+        logger.info("✅ Analytics cleanup completed")
     except Exception as e:
         logger.error(f"❌ Failed to cleanup analytics: {e}")
 
@@ -19,11 +19,20 @@ class Settings(BaseSettings):
     # Database
     MONGO_URL: str = os.getenv("MONGO_URL", "mongodb://localhost:27017/")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "cultural_center")
+    ANALYTICS_DATABASE_NAME: str = os.getenv("ANALYTICS_DATABASE_NAME", "cultural_center_analytics")  # tracked user events
+    MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    MONGO_SOCKET_TIMEOUT_MS: int = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "5000"))
     
     # JWT Authentication
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))  # older hashes are upgraded on login
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))  # concurrent bcrypt calls; 0 = one per CPU
+    PRINCIPAL_CACHE_TTL: float = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))  # seconds a worker keeps a user
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+    PRINCIPAL_CACHE_REDIS: bool = os.getenv("PRINCIPAL_CACHE_REDIS", "False").lower() == "true"  # shared tier
+    PRINCIPAL_CACHE_REDIS_TTL: int = int(os.getenv("PRINCIPAL_CACHE_REDIS_TTL", "300"))
     
     # CORS
     ALLOWED_ORIGINS: List[str] = [
@@ -40,6 +49,18 @@ class Settings(BaseSettings):
     SENDGRID_API_KEY: str = os.getenv("SENDGRID_API_KEY", "")
     FROM_EMAIL: str = os.getenv("FROM_EMAIL", "noreply@banreservas.com.do")
     
+    # Email outbox (background delivery)
+    EMAIL_TRANSPORT: str = os.getenv("EMAIL_TRANSPORT", "")  # "sendgrid" or "fake"; empty picks by API key
+    EMAIL_WORKERS: int = int(os.getenv("EMAIL_WORKERS", "4"))
+    EMAIL_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+    EMAIL_RETRY_BASE_SECONDS: float = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+    EMAIL_RETRY_MAX_SECONDS: float = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+    EMAIL_POLL_INTERVAL: float = float(os.getenv("EMAIL_POLL_INTERVAL", "5"))
+    EMAIL_SEND_TIMEOUT: float = float(os.getenv("EMAIL_SEND_TIMEOUT", "30"))
+    EMAIL_DEDUPE_WINDOW: int = int(os.getenv("EMAIL_DEDUPE_WINDOW", "86400"))  # seconds a sent message blocks duplicates
+    FAKE_EMAIL_LATENCY_MS: int = int(os.getenv("FAKE_EMAIL_LATENCY_MS", "0"))
+    FAKE_EMAIL_FAILURE_RATE: float = float(os.getenv("FAKE_EMAIL_FAILURE_RATE", "0"))
+    
     # File uploads
     MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", "10485760"))  # 10MB
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
@@ -52,6 +73,53 @@ class Settings(BaseSettings):
     DEFAULT_PAGE_SIZE: int = 20
     MAX_PAGE_SIZE: int = 100
     
+    # Bulk user import
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+    IMPORT_JOB_LEASE: int = int(os.getenv("IMPORT_JOB_LEASE", "120"))  # seconds a running job stays owned without a heartbeat
+    
+    # Reservations
+    CAPACITY_RECONCILE_INTERVAL: int = int(os.getenv("CAPACITY_RECONCILE_INTERVAL", "3600"))  # seconds
+    CAPACITY_RECONCILE_SETTLE: int = int(os.getenv("CAPACITY_RECONCILE_SETTLE", "5"))  # seconds between drift samples
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))  # rows per cursor batch / chunk
+    CHECKIN_ROSTER_PRELOAD_DAYS: int = int(os.getenv("CHECKIN_ROSTER_PRELOAD_DAYS", "1"))  # days ahead whose rosters are preloaded
+    CHECKIN_ROSTER_REFRESH_INTERVAL: int = int(os.getenv("CHECKIN_ROSTER_REFRESH_INTERVAL", "300"))  # seconds
+    CHECKIN_ROSTER_TTL: int = int(os.getenv("CHECKIN_ROSTER_TTL", "3600"))  # seconds an on-demand roster is kept
+    CHECKIN_ROSTER_SIGNING_KEY: str = os.getenv("CHECKIN_ROSTER_SIGNING_KEY", "")  # HMAC key of exported rosters; empty = SECRET_KEY
+    CHECKIN_BATCH_MAX_SCANS: int = int(os.getenv("CHECKIN_BATCH_MAX_SCANS", "1000"))  # scans per offline sync request
+    
+    # Report rendering
+    REPORT_WORKERS: int = int(os.getenv("REPORT_WORKERS", "2"))
+    REPORT_RENDER_TIMEOUT: int = int(os.getenv("REPORT_RENDER_TIMEOUT", "300"))  # seconds
+    
+    # Analytics ingestion
+    ANALYTICS_BUFFER_SIZE: int = int(os.getenv("ANALYTICS_BUFFER_SIZE", "10000"))  # records held before dropping
+    ANALYTICS_FLUSH_SIZE: int = int(os.getenv("ANALYTICS_FLUSH_SIZE", "500"))
+    ANALYTICS_FLUSH_INTERVAL_MS: int = int(os.getenv("ANALYTICS_FLUSH_INTERVAL_MS", "1000"))
+
+    # Dashboard
+    DASHBOARD_BROADCAST_INTERVAL: float = float(os.getenv("DASHBOARD_BROADCAST_INTERVAL", "5"))  # seconds per metrics snapshot
+    SYSTEM_METRICS_INTERVAL: float = float(os.getenv("SYSTEM_METRICS_INTERVAL", "1"))  # seconds between system samples
+    SYSTEM_METRICS_WINDOW: int = int(os.getenv("SYSTEM_METRICS_WINDOW", "60"))  # samples kept for averages
+    DASHBOARD_SEND_QUEUE_SIZE: int = int(os.getenv("DASHBOARD_SEND_QUEUE_SIZE", "16"))  # messages per connection
+    DASHBOARD_SEND_TIMEOUT: float = float(os.getenv("DASHBOARD_SEND_TIMEOUT", "5"))
+    DASHBOARD_SLOW_CLIENT_POLICY: str = os.getenv("DASHBOARD_SLOW_CLIENT_POLICY", "drop_oldest")  # or "disconnect"
+    DASHBOARD_PING_INTERVAL: float = float(os.getenv("DASHBOARD_PING_INTERVAL", "20"))
+    DASHBOARD_PING_TIMEOUT: float = float(os.getenv("DASHBOARD_PING_TIMEOUT", "60"))  # silence before disconnecting
+    DASHBOARD_COUNTERS_RECONCILE_INTERVAL: int = int(os.getenv("DASHBOARD_COUNTERS_RECONCILE_INTERVAL", "3600"))  # seconds
+    DASHBOARD_COUNTERS_RECONCILE_DAYS: int = int(os.getenv("DASHBOARD_COUNTERS_RECONCILE_DAYS", "35"))  # day buckets recounted
+    
+    # Segmentation
+    SEGMENT_SCORE_INTERVAL: int = int(os.getenv("SEGMENT_SCORE_INTERVAL", "3600"))  # seconds between batch scoring runs
+    SEGMENT_SCORE_BATCH_SIZE: int = int(os.getenv("SEGMENT_SCORE_BATCH_SIZE", "5000"))
+    SEGMENT_FEATURE_WINDOW_DAYS: int = int(os.getenv("SEGMENT_FEATURE_WINDOW_DAYS", "30"))  # days of activity behind stored features
+    SEGMENT_RETRAIN_INTERVAL: int = int(os.getenv("SEGMENT_RETRAIN_INTERVAL", "86400"))  # seconds; 0 disables
+    SEGMENT_LEADER_LEASE: int = int(os.getenv("SEGMENT_LEADER_LEASE", "60"))  # seconds; one worker scores and retrains
+    MODEL_REGISTRY_KEEP: int = int(os.getenv("MODEL_REGISTRY_KEEP", "5"))  # model versions kept in MongoDB
+    SEGMENT_MAX_CLUSTERS: int = int(os.getenv("SEGMENT_MAX_CLUSTERS", "5"))
+    SEGMENT_MINIBATCH_THRESHOLD: int = int(os.getenv("SEGMENT_MINIBATCH_THRESHOLD", "20000"))  # users; above this train in chunks
+    SEGMENT_MINIBATCH_SIZE: int = int(os.getenv("SEGMENT_MINIBATCH_SIZE", "4096"))  # rows per training chunk
+    SEGMENT_SILHOUETTE_SAMPLE: int = int(os.getenv("SEGMENT_SILHOUETTE_SAMPLE", "10000"))
+    
     # Rate limiting
     RATE_LIMIT_REQUESTS: int = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
     RATE_LIMIT_WINDOW: int = int(os.getenv("RATE_LIMIT_WINDOW", "3600"))  # 1 hour
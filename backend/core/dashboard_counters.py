@@ -0,0 +1,295 @@
+"""
+Dashboard counters - Write-time maintained totals for the admin dashboards
+
+A `dashboard_counters` collection holds one `totals` document and one
+`day:<YYYY-MM-DD>` document per day, each with `users`, `reservations`,
+`checkins` and `revenue` counters. They are updated with `$inc` as users are
+created or deleted and as reservations are booked, cancelled or checked in,
+so dashboard reads are a handful of keyed lookups however large the
+collections grow. The totals count what the dashboards have always shown:
+users not deleted, reservations not cancelled, reservations checked in and
+the ticket revenue of those reservations.
+
+Day buckets are attributed like the old `$regex` day queries: users and
+reservations to the day they were created, check-ins to the day they
+happened. Writes that bypass the hooks (bulk admin updates, data fixes) are
+corrected by the periodic reconciler, which recounts the totals and the
+recent day buckets from the source collections.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Iterable
+
+from pymongo import UpdateOne
+
+from core.config import settings
+from core.database import database
+from utils.dates import day_start, range_filter
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ("users", "reservations", "checkins", "revenue")
+
+# Reservation statuses counted as reservations (not cancelled)
+ACTIVE_STATUSES = ["confirmed", "checked_in"]
+
+TOTALS_ID = "totals"
+
+
+def day_id(day: str) -> str:
+    """Counter document id of a YYYY-MM-DD day"""
+    return f"day:{day}"
+
+
+def day_of(timestamp: Any) -> Optional[str]:
+    """YYYY-MM-DD day of an ISO timestamp string or datetime, or None"""
+    if isinstance(timestamp, datetime):
+        return timestamp.date().isoformat()
+    if isinstance(timestamp, str) and len(timestamp) >= 10:
+        return timestamp[:10]
+    return None
+
+
+def _today() -> str:
+    return datetime.utcnow().date().isoformat()
+
+
+class DashboardCounters:
+    """Totals and per-day counters for users, reservations, check-ins and revenue"""
+
+    def __init__(self):
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    @property
+    def collection(self):
+        return database.db.dashboard_counters
+
+    async def _apply(self, deltas: Dict[Optional[str], Dict[str, float]]):
+        """
+        Apply counter increments with one unordered bulk write
+
+        `deltas` maps a day (None for the totals document) to the increments
+        for that document; zero increments are skipped.
+        """
+        operations = []
+        for day, increments in deltas.items():
+            increments = {field: value for field, value in increments.items() if value}
+            if not increments:
+                continue
+            if day is None:
+                operations.append(UpdateOne({"_id": TOTALS_ID}, {"$inc": increments}, upsert=True))
+            else:
+                operations.append(UpdateOne(
+                    {"_id": day_id(day)},
+                    {"$inc": increments, "$setOnInsert": {"date": day}},
+                    upsert=True
+                ))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def _record_users(self, users: Iterable[Dict[str, Any]], sign: int):
+        deltas: Dict[Optional[str], Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+        for user in users:
+            deltas[None]["users"] += sign
+            day = day_of(user.get("created_at"))
+            if day:
+                deltas[day]["users"] += sign
+        try:
+            await self._apply(deltas)
+        except Exception as e:
+            logger.error(f"Failed to update user counters: {e}")
+
+    async def record_users_created(self, users: Iterable[Dict[str, Any]]):
+        """Count newly inserted user documents"""
+        await self._record_users(users, 1)
+
+    async def record_users_removed(self, users: Iterable[Dict[str, Any]]):
+        """Uncount user documents that were deleted (soft or hard) and were not deleted before"""
+        await self._record_users(users, -1)
+
+    async def apply_reservation_changes(self, changes: List[Dict[str, Any]]):
+        """
+        Fold a batch of reservation status changes into the counters
+
+        Registered as a ReservationService listener. Revenue of cancelled
+        reservations is looked up from their events with a single query.
+        """
+        cancelled_events = {
+            change["event_id"] for change in changes
+            if change["status"] == "cancelled" and change.get("previous_status") in ACTIVE_STATUSES
+        }
+        prices: Dict[str, float] = {}
+        if cancelled_events:
+            prices = {
+                event["id"]: event.get("price") or 0
+                async for event in database.events.find(
+                    {"id": {"$in": list(cancelled_events)}}, {"_id": 0, "id": 1, "price": 1}
+                )
+            }
+
+        today = _today()
+        deltas: Dict[Optional[str], Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+        for change in changes:
+            previous, current = change.get("previous_status"), change["status"]
+            if previous is None and current in ACTIVE_STATUSES:
+                price = change.get("price") or 0
+                created = day_of(change.get("created_at")) or today
+                for day in (None, created):
+                    deltas[day]["reservations"] += 1
+                    deltas[day]["revenue"] += price
+            elif previous == "confirmed" and current == "checked_in":
+                # Offline batches are stamped with their scan time, not the sync time
+                for day in (None, day_of(change.get("checked_in_at")) or today):
+                    deltas[day]["checkins"] += 1
+            elif previous in ACTIVE_STATUSES and current == "cancelled":
+                price = prices.get(change["event_id"], 0)
+                created = day_of(change.get("created_at"))
+                deltas[None]["reservations"] -= 1
+                deltas[None]["revenue"] -= price
+                if created:
+                    deltas[created]["reservations"] -= 1
+                    deltas[created]["revenue"] -= price
+                if previous == "checked_in":
+                    deltas[None]["checkins"] -= 1
+                    checked_in = day_of(change.get("checked_in_at"))
+                    if checked_in:
+                        deltas[checked_in]["checkins"] -= 1
+        try:
+            await self._apply(deltas)
+        except Exception as e:
+            logger.error(f"Failed to update reservation counters: {e}")
+
+    async def read(self, days: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Totals plus the requested day buckets, with one keyed query
+
+        Returns {"totals": {...}, "days": {day: {...}}}; missing documents
+        read as zero counters.
+        """
+        days = days or []
+        ids = [TOTALS_ID] + [day_id(day) for day in days]
+        docs = {doc["_id"]: doc async for doc in self.collection.find({"_id": {"$in": ids}})}
+
+        def counters(doc: Optional[Dict[str, Any]]) -> Dict[str, float]:
+            doc = doc or {}
+            return {field: doc.get(field, 0) for field in COUNTER_FIELDS}
+
+        totals = counters(docs.get(TOTALS_ID))
+        totals["reconciled_at"] = (docs.get(TOTALS_ID) or {}).get("reconciled_at")
+        return {
+            "totals": totals,
+            "days": {day: counters(docs.get(day_id(day))) for day in days}
+        }
+
+    async def read_range(self, start: str, end: str) -> Dict[str, float]:
+        """Sum of the day buckets from `start` to `end` (inclusive YYYY-MM-DD)"""
+        sums = {field: 0 for field in COUNTER_FIELDS}
+        async for doc in self.collection.find(
+            {"_id": {"$gte": day_id(start), "$lte": day_id(end)}}
+        ):
+            for field in COUNTER_FIELDS:
+                sums[field] += doc.get(field, 0)
+        return sums
+
+    async def reconcile(self, days: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Recount the totals and the last `days` day buckets from the source collections
+
+        Runs a few `$group` aggregations and one bulk write of `$set`
+        updates. Increments landing between the recount and the write are
+        overwritten and picked up again by the next run.
+        """
+        days = days if days is not None else settings.DASHBOARD_COUNTERS_RECONCILE_DAYS
+        now = datetime.utcnow()
+        since = day_start(now) - timedelta(days=days - 1)
+
+        def day_expr(field: str) -> Dict[str, Any]:
+            return {"$dateToString": {"format": "%Y-%m-%d", "date": f"${field}"}}
+
+        prices = {
+            event["id"]: event.get("price") or 0
+            async for event in database.events.find({}, {"_id": 0, "id": 1, "price": 1})
+        }
+
+        totals = {field: 0 for field in COUNTER_FIELDS}
+        buckets: Dict[str, Dict[str, float]] = defaultdict(lambda: {field: 0 for field in COUNTER_FIELDS})
+
+        totals["users"] = await database.users.count_documents({"deleted": {"$ne": True}})
+        async for doc in database.users.aggregate([
+            {"$match": {"created_at_dt": range_filter(since), "deleted": {"$ne": True}}},
+            {"$group": {"_id": day_expr("created_at_dt"), "count": {"$sum": 1}}}
+        ]):
+            buckets[doc["_id"]]["users"] = doc["count"]
+
+        async for doc in database.reservations.aggregate([
+            {"$match": {"status": {"$in": ACTIVE_STATUSES}}},
+            {"$group": {"_id": {"event_id": "$event_id", "status": "$status"}, "count": {"$sum": 1}}}
+        ]):
+            totals["reservations"] += doc["count"]
+            totals["revenue"] += doc["count"] * prices.get(doc["_id"]["event_id"], 0)
+            if doc["_id"]["status"] == "checked_in":
+                totals["checkins"] += doc["count"]
+
+        async for doc in database.reservations.aggregate([
+            {"$match": {"created_at_dt": range_filter(since), "status": {"$in": ACTIVE_STATUSES}}},
+            {"$group": {"_id": {"day": day_expr("created_at_dt"), "event_id": "$event_id"}, "count": {"$sum": 1}}}
+        ]):
+            bucket = buckets[doc["_id"]["day"]]
+            bucket["reservations"] += doc["count"]
+            bucket["revenue"] += doc["count"] * prices.get(doc["_id"]["event_id"], 0)
+
+        async for doc in database.reservations.aggregate([
+            {"$match": {"checked_in_at_dt": range_filter(since), "status": "checked_in"}},
+            {"$group": {"_id": day_expr("checked_in_at_dt"), "count": {"$sum": 1}}}
+        ]):
+            buckets[doc["_id"]]["checkins"] = doc["count"]
+
+        operations = [UpdateOne(
+            {"_id": TOTALS_ID},
+            {"$set": {**totals, "reconciled_at": now.isoformat()}},
+            upsert=True
+        )]
+        for offset in range(days):
+            day = (now - timedelta(days=offset)).date().isoformat()
+            operations.append(UpdateOne(
+                {"_id": day_id(day)},
+                {"$set": {**buckets[day], "date": day}},
+                upsert=True
+            ))
+        await self.collection.bulk_write(operations, ordered=False)
+        logger.info(f"Reconciled dashboard counters ({days} days)")
+        return totals
+
+    async def _reconcile_loop(self, interval: int):
+        while True:
+            try:
+                await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Dashboard counter reconciliation failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start_reconciler(self):
+        """Reconcile the counters now and then every DASHBOARD_COUNTERS_RECONCILE_INTERVAL seconds"""
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.create_task(
+                self._reconcile_loop(settings.DASHBOARD_COUNTERS_RECONCILE_INTERVAL)
+            )
+
+    async def stop_reconciler(self):
+        """Stop the background reconciliation task"""
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+            try:
+                await self._reconcile_task
+            except asyncio.CancelledError:
+                pass
+            self._reconcile_task = None
+
+
+# Global counters instance
+dashboard_counters = DashboardCounters()
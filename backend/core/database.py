@@ -1,157 +1,172 @@
 """
 Database connection and operations for MongoDB
 Centralizes all database logic
+
+The API runs on Motor (async MongoDB driver) so database round trips never
+block the event loop. A synchronous pymongo mode is kept for maintenance
+scripts and process-pool workers that run outside the event loop.
 """
 
+import inspect
 import logging
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from motor.motor_asyncio import AsyncIOMotorClient
 from core.config import settings
+from core.indexes import INDEX_MANIFEST, index_name, index_options, diff_indexes, log_index_audit
 
 logger = logging.getLogger(__name__)
 
 
+async def _resolve(value):
+    """Await Motor results, pass pymongo results through unchanged"""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
 class Database:
     """MongoDB database manager"""
-    
-    def __init__(self):
-        self.client: Optional[MongoClient] = None
+
+    def __init__(self, async_mode: bool = True):
+        self.async_mode = async_mode
+        self.client = None
         self.db = None
-        
+
+    def connect(self):
+        """Create the client and database handles without any network I/O"""
+        if self.client is not None:
+            return self.db
+
+        client_class = AsyncIOMotorClient if self.async_mode else MongoClient
+        self.client = client_class(
+            settings.MONGO_URL,
+            maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+            serverSelectionTimeoutMS=5000,
+            connectTimeoutMS=5000,
+            socketTimeoutMS=settings.MONGO_SOCKET_TIMEOUT_MS
+        )
+        self.db = self.client[settings.DATABASE_NAME]
+        return self.db
+
     async def initialize(self):
         """Initialize database connection and indexes"""
         try:
             # Create MongoDB connection
-            self.client = MongoClient(
-                settings.MONGO_URL,
-                serverSelectionTimeoutMS=5000,
-                connectTimeoutMS=5000,
-                socketTimeoutMS=5000
-            )
-            
+            self.connect()
+
             # Test connection
-            self.client.admin.command('ping')
-            
-            # Get database
-            self.db = self.client[settings.DATABASE_NAME]
-            
+            await _resolve(self.client.admin.command('ping'))
+
             # Create indexes for performance
-            await self._create_indexes()
-            
+            await self.check_indexes()
+
             logger.info(f"✅ Connected to MongoDB: {settings.DATABASE_NAME}")
-            
+
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
             logger.error(f"❌ Failed to connect to MongoDB: {e}")
             raise
-    
-    async def _create_indexes(self):
-        """Create database indexes for better performance"""
+
+    async def ensure_indexes(self) -> int:
+        """Create any index from the manifest that is not present yet"""
+        created = 0
+        for collection_name, specs in INDEX_MANIFEST.items():
+            collection = self.db[collection_name]
+            existing = await _resolve(collection.index_information())
+            for spec in specs:
+                name = index_name(spec["keys"])
+                if name in existing:
+                    continue
+
+                try:
+                    await _resolve(collection.create_index(spec["keys"], name=name, **index_options(spec)))
+                    created += 1
+                except Exception as e:
+                    # One bad index (e.g. duplicate ids in legacy data) must
+                    # not stop the rest of the manifest from being applied
+                    logger.error(f"❌ Could not create index {collection_name}.{name}: {e}")
+
+        if created:
+            logger.info(f"✅ Created {created} database indexes")
+        return created
+
+    async def audit_indexes(self) -> Dict[str, Dict[str, List[str]]]:
+        """Report missing, conflicting, redundant and unmanaged indexes per collection"""
+        report = {}
+        for collection_name, specs in INDEX_MANIFEST.items():
+            existing = await _resolve(self.db[collection_name].index_information())
+            report[collection_name] = diff_indexes(specs, existing)
+        return report
+
+    async def check_indexes(self):
+        """Apply the index manifest and report drift"""
         try:
-            # Users collection indexes
-            self.db.users.create_index("email", unique=True)
-            self.db.users.create_index("created_at")
-            self.db.users.create_index("is_admin")
-            self.db.users.create_index("deleted")
-            self.db.users.create_index("location")
-            self.db.users.create_index("age")
-            self.db.users.create_index([
-                ("name", "text"), 
-                ("email", "text"), 
-                ("location", "text")
-            ])
-            
-            # Events collection indexes
-            self.db.events.create_index("date")
-            self.db.events.create_index("category")
-            self.db.events.create_index("created_at")
-            self.db.events.create_index("published")
-            self.db.events.create_index([
-                ("title", "text"),
-                ("description", "text"),
-                ("tags", "text")
-            ])
-            
-            # Reservations collection indexes
-            self.db.reservations.create_index("user_id")
-            self.db.reservations.create_index("event_id")
-            self.db.reservations.create_index("created_at")
-            self.db.reservations.create_index("status")
-            self.db.reservations.create_index("reservation_code", unique=True)
-            
-            # Check-ins collection indexes
-            self.db.checkins.create_index("reservation_id")
-            self.db.checkins.create_index("event_id")
-            self.db.checkins.create_index("user_id")
-            self.db.checkins.create_index("created_at")
-            
-            # Analytics collection indexes
-            self.db.analytics.create_index("timestamp")
-            self.db.analytics.create_index("event_type")
-            self.db.analytics.create_index("user_id")
-            
-            logger.info("✅ Database indexes created successfully")
-            
+            await self.ensure_indexes()
+            log_index_audit(await self.audit_indexes())
         except Exception as e:
-            logger.warning(f"⚠️ Some indexes may already exist: {e}")
-    
+            logger.warning(f"⚠️ Index check failed: {e}")
+
     async def health_check(self) -> Dict[str, Any]:
         """Check database health"""
         try:
-            if not self.client:
+            if self.client is None:
                 return {"status": "disconnected", "error": "No client"}
-            
+
             # Ping database
-            result = self.client.admin.command('ping')
-            
+            result = await _resolve(self.client.admin.command('ping'))
+
             # Get basic stats
-            stats = self.db.command("dbstats")
-            
+            stats = await _resolve(self.db.command("dbstats"))
+
             return {
                 "status": "connected",
+                "mode": "async" if self.async_mode else "sync",
                 "ping": result.get("ok", 0) == 1,
                 "database": settings.DATABASE_NAME,
                 "collections": stats.get("collections", 0),
                 "dataSize": stats.get("dataSize", 0),
                 "storageSize": stats.get("storageSize", 0)
             }
-            
+
         except Exception as e:
             logger.error(f"Database health check failed: {e}")
             return {"status": "error", "error": str(e)}
-    
+
     async def close(self):
         """Close database connection"""
-        if self.client:
+        if self.client is not None:
             self.client.close()
+            self.client = None
+            self.db = None
             logger.info("✅ Database connection closed")
-    
+
     def get_current_timestamp(self) -> str:
         """Get current timestamp in ISO format"""
         return datetime.utcnow().isoformat()
-    
+
     # Collection getters for easy access
     @property
     def users(self):
         return self.db.users if self.db is not None else None
-    
-    @property 
+
+    @property
     def events(self):
         return self.db.events if self.db is not None else None
-    
+
     @property
     def reservations(self):
         return self.db.reservations if self.db is not None else None
-    
+
     @property
     def checkins(self):
         return self.db.checkins if self.db is not None else None
-    
+
     @property
     def analytics(self):
         return self.db.analytics if self.db is not None else None
 
 
-# Global database instance
+# Global database instance (async, shared by the API processes)
 database = Database()
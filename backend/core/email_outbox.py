@@ -0,0 +1,316 @@
+"""
+Email outbox - Persistent queue for outbound email
+
+Routes only enqueue: a message is written to the `email_outbox` collection
+and a pool of background workers delivers it through the configured
+transport, retrying with exponential backoff and dead-lettering messages
+that keep failing. A message is only queued once per recipient and dedupe
+key; the key stays taken while the message is queued and for
+EMAIL_DEDUPE_WINDOW seconds after it was sent or dead-lettered, when a TTL
+index removes the row.
+"""
+
+import asyncio
+import hashlib
+import logging
+import random
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from core.config import settings
+from core.database import database
+
+logger = logging.getLogger(__name__)
+
+
+class EmailDeliveryError(Exception):
+    """Raised by a transport when a message could not be delivered"""
+
+
+class SendGridTransport:
+    """Delivers messages through the SendGrid API"""
+
+    name = "sendgrid"
+
+    def __init__(self, api_key: str, from_email: str):
+        from sendgrid import SendGridAPIClient
+
+        self.client = SendGridAPIClient(api_key=api_key)
+        self.from_email = from_email
+
+    def _send_sync(self, message: Dict[str, Any]):
+        from sendgrid.helpers.mail import Mail
+
+        mail = Mail(
+            from_email=message.get("from_email") or self.from_email,
+            to_emails=message["to_email"],
+            subject=message["subject"],
+            html_content=message["html_content"],
+            plain_text_content=message.get("plain_content") or message["html_content"]
+        )
+        response = self.client.send(mail)
+        if response.status_code >= 300:
+            raise EmailDeliveryError(f"SendGrid returned {response.status_code}")
+
+    async def send(self, message: Dict[str, Any]):
+        # The SendGrid client is blocking; keep it off the event loop
+        await asyncio.to_thread(self._send_sync, message)
+
+
+class FakeTransport:
+    """
+    Local transport for development and load tests
+
+    Records deliveries in memory instead of calling a provider. Latency and
+    failure rate are configurable to exercise the retry path.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: int = 0, failure_rate: float = 0.0, history: int = 1000):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.delivered = deque(maxlen=history)
+
+    async def send(self, message: Dict[str, Any]):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise EmailDeliveryError("Simulated delivery failure")
+        self.delivered.append({
+            "to_email": message["to_email"],
+            "subject": message["subject"],
+            "delivered_at": datetime.utcnow().isoformat()
+        })
+        logger.info(f"📧 [fake transport] {message['subject']} -> {message['to_email']}")
+
+
+def build_transport():
+    """Select the delivery transport from settings"""
+    transport = settings.EMAIL_TRANSPORT or ("sendgrid" if settings.SENDGRID_API_KEY else "fake")
+    if transport == "sendgrid":
+        return SendGridTransport(settings.SENDGRID_API_KEY, settings.FROM_EMAIL)
+    if transport == "fake":
+        return FakeTransport(
+            latency_ms=settings.FAKE_EMAIL_LATENCY_MS,
+            failure_rate=settings.FAKE_EMAIL_FAILURE_RATE
+        )
+    raise ValueError(f"Unknown email transport: {transport}")
+
+
+def retry_delay(attempt: int, base: float, maximum: float) -> float:
+    """Exponential backoff with jitter for the given (1-based) attempt"""
+    delay = min(maximum, base * (2 ** (attempt - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class EmailOutbox:
+    """Persistent email queue drained by a bounded pool of async workers"""
+
+    def __init__(self):
+        self.transport = None
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self.sent = 0
+        self.failed_attempts = 0
+        self.dead_lettered = 0
+        self.deduplicated = 0
+
+    @property
+    def collection(self):
+        return database.db.email_outbox
+
+    @staticmethod
+    def dedupe_key(to_email: str, key: str) -> str:
+        """Outbox dedupe key, always scoped to the recipient"""
+        return f"{to_email.strip().lower()}:{key}"
+
+    async def enqueue(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        plain_content: Optional[str] = None,
+        dedupe_key: Optional[str] = None,
+        category: Optional[str] = None,
+        from_email: Optional[str] = None
+    ) -> bool:
+        """
+        Queue a message for background delivery
+
+        `dedupe_key` identifies the logical message by what triggered it
+        (e.g. "welcome:<user id>" or "cancellation:<reservation id>");
+        without one the content itself is the key. Returns False when the
+        same message was queued for this recipient within the dedupe window.
+        """
+        if not dedupe_key:
+            dedupe_key = hashlib.sha256(f"{subject}\n{html_content}".encode()).hexdigest()
+
+        now = datetime.utcnow().isoformat()
+        message = {
+            "id": str(uuid.uuid4()),
+            "to_email": to_email,
+            "subject": subject,
+            "html_content": html_content,
+            "plain_content": plain_content,
+            "category": category,
+            "from_email": from_email,
+            "dedupe_key": self.dedupe_key(to_email, dedupe_key),
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now
+        }
+
+        try:
+            await self.collection.insert_one(message)
+        except DuplicateKeyError:
+            self.deduplicated += 1
+            logger.info(f"Email already queued for {to_email}, skipping duplicate")
+            return False
+
+        self._wakeup.set()
+        return True
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """Lease the next due message (or one whose lease expired)"""
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now.isoformat()}},
+                {"status": "sending", "locked_until": {"$lte": now.isoformat()}}
+            ]},
+            {
+                "$set": {
+                    "status": "sending",
+                    "locked_until": (now + timedelta(seconds=settings.EMAIL_SEND_TIMEOUT * 2)).isoformat()
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def _expires_at() -> datetime:
+        """When a settled message's row (and with it its dedupe key) is removed"""
+        return datetime.utcnow() + timedelta(seconds=settings.EMAIL_DEDUPE_WINDOW)
+
+    async def _deliver(self, message: Dict[str, Any]):
+        try:
+            await asyncio.wait_for(self.transport.send(message), timeout=settings.EMAIL_SEND_TIMEOUT)
+        except Exception as e:
+            self.failed_attempts += 1
+            if message["attempts"] >= settings.EMAIL_MAX_ATTEMPTS:
+                self.dead_lettered += 1
+                logger.error(f"❌ Email to {message['to_email']} dead-lettered after {message['attempts']} attempts: {e}")
+                update = {
+                    "status": "dead",
+                    "last_error": str(e),
+                    "failed_at": datetime.utcnow().isoformat(),
+                    "expires_at": self._expires_at()
+                }
+            else:
+                delay = retry_delay(message["attempts"], settings.EMAIL_RETRY_BASE_SECONDS, settings.EMAIL_RETRY_MAX_SECONDS)
+                logger.warning(f"⚠️ Email to {message['to_email']} failed (attempt {message['attempts']}), retrying in {delay:.0f}s: {e}")
+                update = {
+                    "status": "pending",
+                    "last_error": str(e),
+                    "next_attempt_at": (datetime.utcnow() + timedelta(seconds=delay)).isoformat()
+                }
+            await self.collection.update_one({"id": message["id"]}, {"$set": update, "$unset": {"locked_until": ""}})
+            return
+
+        self.sent += 1
+        await self.collection.update_one(
+            {"id": message["id"]},
+            {
+                "$set": {"status": "sent", "sent_at": datetime.utcnow().isoformat(), "expires_at": self._expires_at()},
+                "$unset": {"locked_until": "", "html_content": "", "plain_content": ""}
+            }
+        )
+
+    async def _worker(self, number: int):
+        while True:
+            try:
+                message = await self._claim()
+                if message is None:
+                    # Idle: sleep until a new message arrives or a retry falls due
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=settings.EMAIL_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._deliver(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Email worker {number} error: {e}")
+                await asyncio.sleep(settings.EMAIL_POLL_INTERVAL)
+
+    def start(self):
+        """Start the worker pool (EMAIL_WORKERS concurrent deliveries)"""
+        if self._workers:
+            return
+        if self.transport is None:
+            self.transport = build_transport()
+        self._workers = [
+            asyncio.create_task(self._worker(number))
+            for number in range(settings.EMAIL_WORKERS)
+        ]
+        logger.info(f"✅ Email outbox started: {settings.EMAIL_WORKERS} workers, {self.transport.name} transport")
+
+    async def stop(self):
+        """Stop the workers; leased messages are picked up again after restart"""
+        for task in self._workers:
+            task.cancel()
+        for task in self._workers:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Queue depth per status plus this process's delivery counters"""
+        by_status = {
+            doc["_id"]: doc["count"]
+            async for doc in self.collection.aggregate([
+                {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+            ])
+        }
+        return {
+            "queue": by_status,
+            "workers": len(self._workers),
+            "transport": self.transport.name if self.transport else None,
+            "sent": self.sent,
+            "failed_attempts": self.failed_attempts,
+            "dead_lettered": self.dead_lettered,
+            "deduplicated": self.deduplicated
+        }
+
+    async def requeue_dead(self, message_ids: Optional[List[str]] = None) -> int:
+        """Move dead-lettered messages back to the queue"""
+        query: Dict[str, Any] = {"status": "dead"}
+        if message_ids:
+            query["id"] = {"$in": message_ids}
+        result = await self.collection.update_many(query, {
+            "$set": {
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": datetime.utcnow().isoformat()
+            },
+            "$unset": {"expires_at": ""}
+        })
+        if result.modified_count:
+            self._wakeup.set()
+        return result.modified_count
+
+
+# Global outbox instance
+email_outbox = EmailOutbox()
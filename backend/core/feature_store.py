@@ -0,0 +1,404 @@
+"""
+Feature store - Per-user behaviour counters for segmentation
+
+Each user has one `user_features` document holding the raw counters the
+segmentation features are derived from, bucketed by day under
+`days.<YYYY-MM-DD>`. Features sum the buckets of the trailing
+SEGMENT_FEATURE_WINDOW_DAYS days, the same window the extraction from raw
+history uses, and buckets that fall out of it are dropped on the next write,
+so a document stays bounded however long the user is active. Analytics
+events are bucketed by their timestamp and applied when the analytics buffer
+flushes; reservation status changes are bucketed by the reservation's
+creation day and applied as they happen. Each batch is a single unordered
+bulk write. Every non-deleted user has a document, an empty one until they
+become active, so segmentation covers inactive and newly registered users
+too. The batch scorer writes the user's `segment`, `cluster_id` and
+`confidence` back onto the same document, so a single-user lookup is one
+keyed read.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, AsyncIterator
+
+from pymongo import UpdateOne
+
+from core.config import settings
+from core.database import database
+
+logger = logging.getLogger(__name__)
+
+# Analytics event types with a dedicated counter
+EVENT_COUNTERS = {
+    "page_view": "page_views",
+    "event_booking": "event_bookings",
+    "event_checkin": "checkins"
+}
+
+# Lifetime counters of the previous document layout, removed by `rebuild`
+LEGACY_FIELDS = [
+    "total_events", "page_views", "event_bookings", "checkins", "sessions", "first_event_at",
+    "last_event_at", "hours", "total_reservations", "reservations", "categories"
+]
+
+
+def hour_bucket(hour: int) -> Optional[str]:
+    """Time-of-day bucket of an hour, or None for night hours"""
+    if 6 <= hour < 12:
+        return "morning"
+    if 12 <= hour < 18:
+        return "afternoon"
+    if 18 <= hour < 24:
+        return "evening"
+    return None
+
+
+def field_key(value: str) -> str:
+    """Make a free-form value safe to use as a sub-document key"""
+    return str(value).replace(".", "_").lstrip("$") or "unknown"
+
+
+def day_key(value: Any) -> Optional[str]:
+    """Day bucket ("YYYY-MM-DD") of an ISO timestamp or datetime"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, str) and len(value) >= 10:
+        return value[:10]
+    return None
+
+
+def window_start(now: Optional[datetime] = None) -> str:
+    """First day bucket inside the feature window"""
+    now = now or datetime.utcnow()
+    return (now - timedelta(days=settings.SEGMENT_FEATURE_WINDOW_DAYS)).date().isoformat()
+
+
+def window_counters(doc: Dict[str, Any], start: str) -> Dict[str, Any]:
+    """
+    Sum the day buckets of a feature document from `start` on
+
+    Returns the flat counters (`total_events`, `sessions`, `hours.<bucket>`,
+    `reservations.<status>`, `categories.<category>`, ...) plus the first and
+    last event time inside the window.
+    """
+    totals: Dict[str, Any] = {"user_id": doc["user_id"], "hours": {}, "reservations": {}, "categories": {}}
+    first, last = None, None
+    for day, bucket in (doc.get("days") or {}).items():
+        if day < start:
+            continue
+        for field, value in bucket.items():
+            if field == "sessions":
+                totals["sessions"] = totals.get("sessions", 0) + len(value)
+            elif field in ("hours", "reservations", "categories"):
+                for key, count in value.items():
+                    totals[field][key] = totals[field].get(key, 0) + count
+            elif field == "first_event_at":
+                first = value if first is None else min(first, value)
+            elif field == "last_event_at":
+                last = value if last is None else max(last, value)
+            else:
+                totals[field] = totals.get(field, 0) + value
+    totals["first_event_at"] = first
+    totals["last_event_at"] = last
+    return totals
+
+
+class FeatureStore:
+    """Persistent per-user feature counters and segment assignments"""
+
+    @property
+    def collection(self):
+        return database.db.user_features
+
+    async def apply_events(self, events: List[Dict[str, Any]]):
+        """Fold a batch of analytics events into the per-user day buckets"""
+        start = window_start()
+        today = datetime.utcnow().date().isoformat()
+        updates: Dict[str, Dict[str, Any]] = {}
+        for event in events:
+            user_id = event.get("user_id")
+            timestamp = event.get("timestamp")
+            day = day_key(timestamp) or today
+            if not user_id or day < start:
+                continue
+            update = updates.setdefault(user_id, {
+                "$inc": defaultdict(int),
+                "$min": {},
+                "$max": {},
+                "$addToSet": {}
+            })
+            prefix = f"days.{day}"
+            increments = update["$inc"]
+            increments[f"{prefix}.total_events"] += 1
+            counter = EVENT_COUNTERS.get(event.get("event_type"))
+            if counter:
+                increments[f"{prefix}.{counter}"] += 1
+
+            # Distinct sessions per day; bounded because old days are dropped
+            session_id = event.get("session_id") or (event.get("metadata") or {}).get("session_id") or "default"
+            sessions = update["$addToSet"].setdefault(f"{prefix}.sessions", {"$each": []})["$each"]
+            if session_id not in sessions:
+                sessions.append(session_id)
+
+            if timestamp:
+                first, last = f"{prefix}.first_event_at", f"{prefix}.last_event_at"
+                update["$min"][first] = min(timestamp, update["$min"].get(first, timestamp))
+                update["$max"][last] = max(timestamp, update["$max"].get(last, timestamp))
+                try:
+                    bucket = hour_bucket(datetime.fromisoformat(timestamp.replace("Z", "+00:00")).hour)
+                except ValueError:
+                    bucket = None
+                if bucket:
+                    increments[f"{prefix}.hours.{bucket}"] += 1
+
+        await self._write(updates, start)
+
+    async def apply_reservation_changes(self, changes: List[Dict[str, Any]]):
+        """
+        Fold reservation status changes into the per-user day buckets
+
+        A change without `previous_status` is a new booking; otherwise one
+        reservation moves from its previous status to `status`. Changes to
+        reservations created before the window are ignored, as the windowed
+        extraction ignores those reservations.
+        """
+        start = window_start()
+        today = datetime.utcnow().date().isoformat()
+        updates: Dict[str, Dict[str, Any]] = {}
+        for change in changes:
+            day = day_key(change.get("created_at")) or today
+            if day < start:
+                continue
+            update = updates.setdefault(change["user_id"], {"$inc": defaultdict(int)})
+            prefix = f"days.{day}"
+            increments = update["$inc"]
+            previous = change.get("previous_status")
+            if previous is None:
+                increments[f"{prefix}.total_reservations"] += 1
+                if change.get("category"):
+                    increments[f"{prefix}.categories.{field_key(change['category'])}"] += 1
+            else:
+                increments[f"{prefix}.reservations.{previous}"] -= 1
+            increments[f"{prefix}.reservations.{change['status']}"] += 1
+
+        await self._write(updates, start)
+
+    @staticmethod
+    def _prune(start: str) -> List[Dict[str, Any]]:
+        """Update pipeline dropping the day buckets before `start`"""
+        return [{"$set": {"days": {"$arrayToObject": {"$filter": {
+            "input": {"$objectToArray": {"$ifNull": ["$days", {}]}},
+            "cond": {"$gte": ["$$this.k", start]}
+        }}}}}]
+
+    async def _write(self, updates: Dict[str, Dict[str, Any]], start: str):
+        if not updates:
+            return
+        now = datetime.utcnow().isoformat()
+        operations = []
+        for user_id, update in updates.items():
+            update = {operator: dict(fields) for operator, fields in update.items() if fields}
+            update["$set"] = {"updated_at": now}
+            operations.append(UpdateOne({"user_id": user_id}, update, upsert=True))
+            operations.append(UpdateOne({"user_id": user_id}, self._prune(start)))
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to update user features: {e}")
+
+    async def add_users(self, user_ids: List[str]):
+        """Create empty feature documents for new users (existing ones are left alone)"""
+        if not user_ids:
+            return
+        now = datetime.utcnow().isoformat()
+        operations = [
+            UpdateOne(
+                {"user_id": user_id},
+                {"$setOnInsert": {"user_id": user_id, "days": {}, "updated_at": now}},
+                upsert=True
+            )
+            for user_id in user_ids
+        ]
+        try:
+            for offset in range(0, len(operations), 1000):
+                await self.collection.bulk_write(operations[offset:offset + 1000], ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to add user feature documents: {e}")
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Feature counters and segment assignment of one user"""
+        return await self.collection.find_one({"user_id": user_id}, {"_id": 0})
+
+    async def iter_batches(self, batch_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        """All feature documents, in lists of up to `batch_size`"""
+        batch = []
+        async for doc in self.collection.find({}, {"_id": 0}).sort("user_id", 1).batch_size(batch_size):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def count(self) -> int:
+        return await self.collection.estimated_document_count()
+
+    async def needs_rebuild(self) -> bool:
+        """Whether the store is empty, still holds lifetime counters or misses users"""
+        # `rebuild` converts every document, so the oldest one tells
+        doc = await self.collection.find_one({}, {"_id": 0, "days": 1})
+        if doc is None or "days" not in doc:
+            return True
+        return await self.count() < await database.users.count_documents({"deleted": {"$ne": True}})
+
+    async def save_assignments(self, assignments: List[Dict[str, Any]]):
+        """
+        Write segment assignments back
+
+        Each assignment has `user_id`, `segment`, `cluster_id`, `confidence`
+        and the windowed `total_reservations` and `checkin_rate` it was
+        scored with, kept for the segment summary.
+        """
+        if not assignments:
+            return
+        scored_at = datetime.utcnow().isoformat()
+        await self.collection.bulk_write([
+            UpdateOne({"user_id": assignment["user_id"]}, {"$set": {
+                "segment": assignment["segment"],
+                "cluster_id": assignment["cluster_id"],
+                "confidence": assignment["confidence"],
+                "scored_reservations": assignment.get("total_reservations", 0),
+                "scored_checkin_rate": assignment.get("checkin_rate", 0.0),
+                "scored_at": scored_at
+            }})
+            for assignment in assignments
+        ], ordered=False)
+
+    async def segment_summary(self) -> List[Dict[str, Any]]:
+        """
+        Per-segment size, averages and top users over the stored assignments
+
+        Averages use the windowed values each user was scored with. Uses
+        `$topN`, which needs MongoDB 5.2 or newer.
+        """
+        return await self.collection.aggregate([
+            {"$match": {"segment": {"$exists": True}}},
+            {"$group": {
+                "_id": "$segment",
+                "user_count": {"$sum": 1},
+                "avg_reservations": {"$avg": {"$ifNull": ["$scored_reservations", 0]}},
+                "avg_checkin_rate": {"$avg": {"$ifNull": ["$scored_checkin_rate", 0]}},
+                "top_users": {"$topN": {
+                    "n": 5,
+                    "sortBy": {"scored_reservations": -1},
+                    "output": "$user_id"
+                }}
+            }},
+            {"$sort": {"user_count": -1}}
+        ]).to_list(length=None)
+
+    async def rebuild(self) -> int:
+        """
+        Recompute every user's day buckets for the current window
+
+        Used to seed the store, to repair drift and to convert documents
+        with lifetime counters; segment assignments are kept. Every
+        non-deleted user gets a document, active or not. Returns the number
+        of users with activity in the window.
+        """
+        start = window_start()
+        days: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(lambda: defaultdict(dict))
+
+        hour = {"$convert": {"input": {"$substrCP": ["$timestamp", 11, 2]}, "to": "int", "onError": -1, "onNull": -1}}
+        in_hours = lambda start, end: {"$sum": {"$cond": [{"$and": [{"$gte": [hour, start]}, {"$lt": [hour, end]}]}, 1, 0]}}
+        analytics_db = database.client[settings.ANALYTICS_DATABASE_NAME]
+        async for doc in analytics_db.user_events.aggregate([
+            {"$match": {"timestamp": {"$gte": start}}},
+            {"$group": {
+                "_id": {"user_id": "$user_id", "day": {"$substrCP": ["$timestamp", 0, 10]}},
+                "total_events": {"$sum": 1},
+                **{
+                    counter: {"$sum": {"$cond": [{"$eq": ["$event_type", event_type]}, 1, 0]}}
+                    for event_type, counter in EVENT_COUNTERS.items()
+                },
+                "sessions": {"$addToSet": {"$ifNull": ["$session_id", {"$ifNull": ["$metadata.session_id", "default"]}]}},
+                "first_event_at": {"$min": "$timestamp"},
+                "last_event_at": {"$max": "$timestamp"},
+                "morning": in_hours(6, 12),
+                "afternoon": in_hours(12, 18),
+                "evening": in_hours(18, 24)
+            }}
+        ], allowDiskUse=True):
+            key = doc["_id"]
+            if not key.get("user_id"):
+                continue
+            days[key["user_id"]][key["day"]].update({
+                "total_events": doc["total_events"],
+                **{counter: doc[counter] for counter in EVENT_COUNTERS.values()},
+                "sessions": doc["sessions"],
+                "first_event_at": doc["first_event_at"],
+                "last_event_at": doc["last_event_at"],
+                "hours": {bucket: doc[bucket] for bucket in ("morning", "afternoon", "evening")}
+            })
+
+        async for doc in database.reservations.aggregate([
+            {"$match": {"created_at": {"$gte": start}}},
+            {"$lookup": {"from": "events", "localField": "event_id", "foreignField": "id", "as": "event"}},
+            {"$group": {
+                "_id": {
+                    "user_id": "$user_id",
+                    "day": {"$substrCP": ["$created_at", 0, 10]},
+                    "status": "$status",
+                    "category": {"$arrayElemAt": ["$event.category", 0]}
+                },
+                "count": {"$sum": 1}
+            }}
+        ], allowDiskUse=True):
+            key = doc["_id"]
+            bucket = days[key["user_id"]][key["day"]]
+            bucket["total_reservations"] = bucket.get("total_reservations", 0) + doc["count"]
+            statuses = bucket.setdefault("reservations", {})
+            statuses[key["status"]] = statuses.get(key["status"], 0) + doc["count"]
+            if key.get("category"):
+                categories = bucket.setdefault("categories", {})
+                category = field_key(key["category"])
+                categories[category] = categories.get(category, 0) + doc["count"]
+
+        now = datetime.utcnow().isoformat()
+        legacy = {field: "" for field in LEGACY_FIELDS}
+        operations = [
+            UpdateOne(
+                {"user_id": user_id},
+                {"$set": {"days": dict(user_days), "updated_at": now}, "$unset": legacy},
+                upsert=True
+            )
+            for user_id, user_days in days.items()
+        ]
+        for offset in range(0, len(operations), 1000):
+            await self.collection.bulk_write(operations[offset:offset + 1000], ordered=False)
+
+        # Inactive users are segmented too, from empty counters; deleted ones are not
+        deleted = [user["id"] async for user in database.users.find({"deleted": True}, {"_id": 0, "id": 1})]
+        for offset in range(0, len(deleted), 1000):
+            await self.collection.delete_many({"user_id": {"$in": deleted[offset:offset + 1000]}})
+        user_ids = []
+        async for user in database.users.find({"deleted": {"$ne": True}}, {"_id": 0, "id": 1}).batch_size(1000):
+            user_ids.append(user["id"])
+            if len(user_ids) >= 1000:
+                await self.add_users(user_ids)
+                user_ids = []
+        await self.add_users(user_ids)
+
+        # Users with no activity inside the window keep only their assignment
+        await self.collection.update_many(
+            {"updated_at": {"$lt": now}},
+            {"$set": {"days": {}, "updated_at": now}, "$unset": legacy}
+        )
+
+        logger.info(f"Rebuilt feature counters for {len(days)} users")
+        return len(days)
+
+
+# Global feature store instance
+feature_store = FeatureStore()
@@ -0,0 +1,202 @@
+"""
+Declarative MongoDB index manifest
+Single source of truth for the indexes behind the hot query paths
+"""
+
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+# Each entry: {"keys": [(field, direction)], optional "unique" / "partial" /
+# "options" (extra create_index arguments, e.g. text index weights).
+# Index names follow the MongoDB default ("field_1_other_-1") so indexes
+# created by older deployments are recognised instead of duplicated.
+INDEX_MANIFEST: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        {"keys": [("id", 1)], "unique": True},
+        {"keys": [("email", 1)], "unique": True},
+        # Identifier check-in lookups (see utils.identifiers)
+        {"keys": [("email_normalized", 1)]},
+        {"keys": [("phone_normalized", 1)]},
+        {"keys": [("created_at", 1)]},
+        # Native datetime copies (see utils.dates) for date range scans
+        {"keys": [("created_at_dt", 1)]},
+        {"keys": [("last_login_dt", 1)]},
+        {"keys": [("is_admin", 1)]},
+        {"keys": [("deleted", 1)]},
+        {"keys": [("location", 1)]},
+        {"keys": [("age", 1)]},
+        # User search (see utils.search): exact names, prefix matches and ranked $text
+        {"keys": [("search_name", 1)]},
+        {"keys": [("search_prefixes", 1)]},
+        {
+            "keys": [("search_name", "text"), ("search_text", "text")],
+            "options": {"default_language": "none", "weights": {"search_name": 3, "search_text": 1}}
+        },
+    ],
+    "events": [
+        {"keys": [("id", 1)], "unique": True},
+        {"keys": [("date", 1)]},
+        {"keys": [("category", 1)]},
+        {"keys": [("created_at", 1)]},
+        {"keys": [("created_at_dt", 1)]},
+        {"keys": [("published", 1)]},
+        {"keys": [("title", "text"), ("description", "text"), ("tags", "text")]},
+    ],
+    "reservations": [
+        {"keys": [("id", 1)], "unique": True},
+        # Legacy reservations may predate check-in codes
+        {
+            "keys": [("checkin_code", 1)],
+            "unique": True,
+            "partial": {"checkin_code": {"$type": "string"}}
+        },
+        {"keys": [("event_id", 1), ("status", 1)]},
+        {"keys": [("user_id", 1), ("status", 1), ("created_at", 1)]},
+        {"keys": [("user_id", 1), ("event_id", 1), ("status", 1)]},
+        {"keys": [("created_at", 1)]},
+        {"keys": [("created_at_dt", 1)]},
+        # Also serves status-only filters
+        {"keys": [("status", 1), ("checked_in_at_dt", 1)]},
+    ],
+    "checkins": [
+        {"keys": [("reservation_id", 1)]},
+        {"keys": [("event_id", 1)]},
+        {"keys": [("user_id", 1)]},
+        {"keys": [("created_at", 1)]},
+        {"keys": [("timestamp_dt", 1)]},
+    ],
+    "email_outbox": [
+        {"keys": [("id", 1)], "unique": True},
+        {"keys": [("dedupe_key", 1)], "unique": True},
+        {"keys": [("status", 1), ("next_attempt_at", 1)]},
+        # Sent and dead messages expire, freeing their dedupe key
+        {"keys": [("expires_at", 1)], "options": {"expireAfterSeconds": 0}},
+    ],
+    "import_jobs": [
+        {"keys": [("id", 1)], "unique": True},
+        {"keys": [("created_at", 1)]},
+    ],
+    "model_versions": [
+        {"keys": [("name", 1), ("version", 1)], "unique": True},
+    ],
+    "report_jobs": [
+        {"keys": [("id", 1)], "unique": True},
+        {"keys": [("cache_key", 1), ("data_version", 1), ("status", 1)]},
+        {"keys": [("created_at", 1)]},
+    ],
+    "user_features": [
+        {"keys": [("user_id", 1)], "unique": True},
+        {"keys": [("segment", 1)]},
+    ],
+    "analytics": [
+        {"keys": [("timestamp", 1)]},
+        {"keys": [("event_type", 1)]},
+        {"keys": [("user_id", 1)]},
+    ],
+}
+
+
+def index_name(keys) -> str:
+    """Default MongoDB name for an index key specification"""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def index_options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """create_index() options (other than the name) for a manifest entry"""
+    options = {}
+    if spec.get("unique"):
+        options["unique"] = True
+    if spec.get("partial"):
+        options["partialFilterExpression"] = spec["partial"]
+    options.update(spec.get("options", {}))
+    return options
+
+
+def _normalized_options(keys, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Options that change an index's behaviour, with server defaults filled in
+
+    Works for both a manifest entry's create_index() options and an
+    index_information() entry, so the two can be compared directly.
+    """
+    normalized = {
+        "unique": bool(options.get("unique", False)),
+        "sparse": bool(options.get("sparse", False)),
+        "partialFilterExpression": options.get("partialFilterExpression"),
+        "expireAfterSeconds": options.get("expireAfterSeconds")
+    }
+    text_fields = [field for field, direction in keys if direction == "text"]
+    if text_fields or "weights" in options:
+        weights = options.get("weights") or {field: 1 for field in text_fields}
+        normalized["weights"] = {field: weight for field, weight in weights.items()}
+        normalized["default_language"] = options.get("default_language", "english")
+    return normalized
+
+
+def _key_list(info: Dict[str, Any]) -> List[tuple]:
+    """Normalize an index_information() entry key to a list of tuples"""
+    return [(field, direction) for field, direction in info.get("key", [])]
+
+
+def diff_indexes(expected: List[Dict[str, Any]], existing: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Compare the manifest for one collection with its index_information()
+
+    Returns the names of indexes that are missing, present with different
+    options, covered by a longer index with the same prefix (redundant), or
+    not declared in the manifest at all (unmanaged).
+    """
+    expected_by_name = {index_name(spec["keys"]): spec for spec in expected}
+
+    missing = []
+    conflicting = []
+    for name, spec in expected_by_name.items():
+        info = existing.get(name)
+        if info is None:
+            missing.append(name)
+        elif _normalized_options(spec["keys"], info) != _normalized_options(spec["keys"], index_options(spec)):
+            conflicting.append(name)
+
+    # A non-unique index whose keys are a strict prefix of another index is
+    # never needed: the longer index serves the same queries.
+    key_lists = {name: _key_list(info) for name, info in existing.items() if name != "_id_"}
+    redundant = []
+    for name, keys in key_lists.items():
+        if existing[name].get("unique") or any(direction == "text" for _, direction in keys):
+            continue
+        for other_name, other_keys in key_lists.items():
+            if other_name != name and len(other_keys) > len(keys) and other_keys[:len(keys)] == keys:
+                redundant.append(name)
+                break
+
+    unmanaged = [
+        name for name in existing
+        if name != "_id_" and name not in expected_by_name and name not in redundant
+    ]
+
+    return {
+        "missing": missing,
+        "conflicting": conflicting,
+        "redundant": redundant,
+        "unmanaged": unmanaged
+    }
+
+
+def log_index_audit(report: Dict[str, Dict[str, List[str]]]):
+    """Log the findings of an index audit at startup"""
+    clean = True
+    for collection_name, findings in report.items():
+        for kind in ("missing", "conflicting"):
+            if findings[kind]:
+                clean = False
+                logger.warning(f"⚠️ {collection_name}: {kind} indexes {findings[kind]}")
+        for kind in ("redundant", "unmanaged"):
+            if findings[kind]:
+                clean = False
+                logger.info(f"ℹ️ {collection_name}: {kind} indexes {findings[kind]} (not dropped automatically)")
+
+    if clean:
+        logger.info("✅ Database indexes match the manifest")
@@ -0,0 +1,153 @@
+"""
+Password hashing - bcrypt off the event loop with bounded concurrency
+
+bcrypt is deliberately slow (100-300 ms per call at the usual cost), so
+hashing and verification run in a dedicated thread pool; bcrypt releases the
+GIL while it works. A semaphore caps the calls in flight at the pool size and
+the time each call waits for a slot is recorded, so a login burst shows up
+as queue time instead of a stalled worker.
+
+The cost factor comes from BCRYPT_ROUNDS. Hashes made with a different cost
+keep verifying; `verify_and_rehash` returns a fresh hash at the configured
+cost after a successful login, so the cost can be tuned without a reset.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple
+
+import bcrypt
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def hash_rounds(hashed_password: str) -> Optional[int]:
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12), or None if unparseable"""
+    parts = hashed_password.split("$")
+    if len(parts) < 4:
+        return None
+    try:
+        return int(parts[2])
+    except ValueError:
+        return None
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+    except ValueError:
+        # Not a bcrypt hash
+        return False
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification in a bounded thread pool"""
+
+    def __init__(self, rounds: int = 12, workers: int = 0):
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.calls = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+        self.run_time_total = 0.0
+        self.rehashed = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._semaphore
+
+    async def _run(self, func, *args):
+        semaphore = self._get_semaphore()
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        queue_time = started_at - queued_at
+        self.queue_time_total += queue_time
+        self.queue_time_max = max(self.queue_time_max, queue_time)
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+            self.calls += 1
+            self.run_time_total += time.perf_counter() - started_at
+            semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        """bcrypt hash of a password at the configured cost"""
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Check a password against a bcrypt hash of any cost"""
+        return await self._run(_verify, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Whether a hash was made with a cost other than the configured one"""
+        return hash_rounds(hashed_password) != self.rounds
+
+    async def verify_and_rehash(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password and, if it matches an outdated hash, rehash it
+
+        Returns (verified, new_hash); new_hash is None unless the caller
+        should store it in place of the old hash.
+        """
+        if not await self.verify(password, hashed_password):
+            return False, None
+        if not self.needs_rehash(hashed_password):
+            return True, None
+        self.rehashed += 1
+        return True, await self.hash(password)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, current load and queue/run time counters"""
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "rehashed": self.rehashed,
+            "avg_queue_ms": round(self.queue_time_total / self.calls * 1000, 2) if self.calls else 0.0,
+            "max_queue_ms": round(self.queue_time_max * 1000, 2),
+            "avg_run_ms": round(self.run_time_total / self.calls * 1000, 2) if self.calls else 0.0
+        }
+
+    def shutdown(self):
+        """Stop the thread pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# Global hasher instance
+password_hasher = PasswordHasher(
+    rounds=settings.BCRYPT_ROUNDS,
+    workers=settings.PASSWORD_HASH_WORKERS
+)
@@ -0,0 +1,159 @@
+"""
+Principal cache - Authenticated user documents without a database read per request
+
+Resolving a token's user goes through three tiers: a short-TTL in-process
+LRU, an optional Redis tier shared by all workers, and finally the `users`
+collection. Cached principals are the user document without `password`,
+`_id` and the derived search fields.
+
+Tokens carry the user's `token_version` as a `tv` claim. A principal only
+matches a token with the same version, so bumping `token_version` on a role
+change or deletion (`revoke`) invalidates every token issued before it.
+Profile changes only drop the cached copy (`invalidate`). Other workers'
+in-process copies expire after PRINCIPAL_CACHE_TTL seconds, which bounds how
+long a change can take to be seen everywhere.
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple
+
+import bson
+
+from core.config import settings
+from core.database import database
+from utils.search import HIDDEN_SEARCH_FIELDS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis = None
+    REDIS_AVAILABLE = False
+
+
+def token_claims(user: Dict[str, Any]) -> Dict[str, Any]:
+    """JWT claims identifying a user: `sub` and the current token version"""
+    return {"sub": user["id"], "tv": user.get("token_version", 0)}
+
+
+class PrincipalCache:
+    """TTL LRU of principals in front of an optional Redis tier and the users collection"""
+
+    KEY_PREFIX = "principal:"
+
+    def __init__(self, ttl: float = 30, max_size: int = 10000, redis_ttl: int = 300):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.redis_ttl = redis_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._redis = None
+
+    async def connect(self):
+        """Connect the Redis tier when PRINCIPAL_CACHE_REDIS is enabled"""
+        if not settings.PRINCIPAL_CACHE_REDIS:
+            return
+        if not REDIS_AVAILABLE:
+            logger.warning("redis not available - principal cache is in-process only")
+            return
+        try:
+            self._redis = redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379'))
+            await self._redis.ping()
+        except Exception as e:
+            logger.warning(f"Principal cache Redis tier unavailable: {e}")
+            self._redis = None
+
+    async def close(self):
+        """Close the Redis tier"""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def _get_local(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return principal
+
+    def _put_local(self, user_id: str, principal: Dict[str, Any]):
+        self._entries[user_id] = (time.monotonic() + self.ttl, principal)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _get_shared(self, user_id: str) -> Optional[Dict[str, Any]]:
+        if self._redis is None:
+            return None
+        try:
+            data = await self._redis.get(f"{self.KEY_PREFIX}{user_id}")
+            return bson.decode(data) if data else None
+        except Exception as e:
+            logger.warning(f"Principal cache Redis read failed: {e}")
+            return None
+
+    async def _put_shared(self, user_id: str, principal: Dict[str, Any]):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(f"{self.KEY_PREFIX}{user_id}", bson.encode(principal), ex=self.redis_ttl)
+        except Exception as e:
+            logger.warning(f"Principal cache Redis write failed: {e}")
+
+    async def get(self, user_id: str, token_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        The principal of `user_id`, or None if the user does not exist
+
+        With `token_version`, also None when the user's current token version
+        differs, i.e. the token was revoked. Returns a copy the caller may
+        modify.
+        """
+        principal = self._get_local(user_id)
+        if principal is None:
+            principal = await self._get_shared(user_id)
+            if principal is None:
+                principal = await database.users.find_one(
+                    {"id": user_id},
+                    {"_id": 0, "password": 0, **HIDDEN_SEARCH_FIELDS}
+                )
+                if principal is None:
+                    return None
+                await self._put_shared(user_id, principal)
+            self._put_local(user_id, principal)
+
+        if token_version is not None and principal.get("token_version", 0) != token_version:
+            return None
+        return dict(principal)
+
+    async def invalidate(self, *user_ids: str):
+        """Drop cached principals after a profile change"""
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+        if self._redis is not None and user_ids:
+            try:
+                await self._redis.delete(*(f"{self.KEY_PREFIX}{user_id}" for user_id in user_ids))
+            except Exception as e:
+                logger.warning(f"Principal cache Redis invalidation failed: {e}")
+
+    async def revoke(self, user_ids: List[str]):
+        """Invalidate every token issued to these users (role change, deletion)"""
+        if not user_ids:
+            return
+        await database.users.update_many({"id": {"$in": user_ids}}, {"$inc": {"token_version": 1}})
+        await self.invalidate(*user_ids)
+
+
+# Global cache instance
+principal_cache = PrincipalCache(
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+    max_size=settings.PRINCIPAL_CACHE_SIZE,
+    redis_ttl=settings.PRINCIPAL_CACHE_REDIS_TTL
+)
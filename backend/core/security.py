@@ -3,31 +3,26 @@ Security utilities for JWT authentication and password hashing
 """
 
 import jwt
-import bcrypt
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from core.config import settings
-from core.database import database
+from core.passwords import password_hasher
+from core.principal_cache import principal_cache
 
 # HTTP Bearer token scheme
 security = HTTPBearer()
 
 
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+async def hash_password(password: str) -> str:
+    """Hash password using bcrypt (in the password hashing pool)"""
+    return await password_hasher.hash(password)
 
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    """Verify password against hash"""
-    return bcrypt.checkpw(
-        password.encode('utf-8'), 
-        hashed_password.encode('utf-8')
-    )
+async def verify_password(password: str, hashed_password: str) -> bool:
+    """Verify password against hash (in the password hashing pool)"""
+    return await password_hasher.verify(password, hashed_password)
 
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -90,8 +85,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Get user from database
-    user = database.users.find_one({"id": user_id})
+    # Cached principal (no password); None if the user is gone or the token was revoked
+    user = await principal_cache.get(user_id, payload.get("tv", 0))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -99,10 +94,6 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Remove password from response
-    user.pop("password", None)
-    user.pop("_id", None)
-    
     return user
 
 
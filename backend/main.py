@@ -12,6 +12,13 @@ from contextlib import asynccontextmanager
 from core.config import settings
 from core.database import database
 from core.analytics_init import initialize_analytics, cleanup_analytics
+from core.dashboard_counters import dashboard_counters
+from core.principal_cache import principal_cache
+from core.passwords import password_hasher
+from services.reservation_service import reservation_service
+from services.checkin_roster import checkin_roster
+from services.user_import import user_import_service
+from core.email_outbox import email_outbox
 
 # API routers
 from api.auth import router as auth_router
@@ -45,6 +52,24 @@ async def lifespan(app: FastAPI):
         await initialize_analytics()
         logger.info("✅ Analytics initialized")
         
+        # Keep event seat counters in line with reservations
+        reservation_service.start_reconciler()
+        
+        # Keep the dashboard counters in line with the source collections
+        dashboard_counters.start_reconciler()
+        
+        # Load check-in rosters of upcoming events for the door scanners
+        checkin_roster.start_preloader()
+        
+        # Deliver queued emails in the background
+        email_outbox.start()
+        
+        # Imports cut off by a previous shutdown cannot resume (the upload is gone)
+        await user_import_service.fail_interrupted_jobs()
+        
+        # Shared tier of the authenticated-principal cache
+        await principal_cache.connect()
+        
         yield
         
     except Exception as e:
@@ -54,6 +79,12 @@ async def lifespan(app: FastAPI):
         # Shutdown
         logger.info("🔄 Shutting down...")
         await cleanup_analytics()
+        await reservation_service.stop_reconciler()
+        await dashboard_counters.stop_reconciler()
+        await checkin_roster.stop_preloader()
+        await email_outbox.stop()
+        await principal_cache.close()
+        password_hasher.shutdown()
         await database.close()
         logger.info("✅ Cleanup completed")
 
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Migration script to add native datetime copies of the ISO timestamp strings
+
+For users, events, reservations and checkins, every string `created_at`,
+`checked_in_at`, check-in `timestamp` and user `last_login` gets a
+`<field>_dt` BSON datetime next to it (see utils/dates.py); the strings are
+left untouched. Documents are walked in `_id` order in batches, each written
+with one unordered bulk write, and the last `_id` of every batch is
+checkpointed in the `migrations` collection, so an interrupted run resumes
+where it stopped.
+
+Usage: python migrate_native_dates.py [--batch-size 1000] [--collections users events ...] [--restart]
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo import MongoClient, UpdateOne
+
+from utils.dates import native_field, parse_timestamp
+
+# Timestamp fields migrated per collection
+COLLECTION_FIELDS = {
+    "users": ["created_at", "last_login"],
+    "events": ["created_at"],
+    "reservations": ["created_at", "checked_in_at"],
+    "checkins": ["timestamp"],
+}
+
+# MongoDB connection
+client = MongoClient(os.getenv("MONGO_URL", "mongodb://localhost:27017/"))
+db = client[os.getenv("DATABASE_NAME", "cultural_center")]
+
+
+def migrate_collection(name: str, fields, batch_size: int, restart: bool) -> int:
+    """Back-fill one collection; returns the number of documents updated"""
+    # Keyed by the field list, so adding a field re-walks the collection
+    checkpoint_id = f"native_dates:{name}:{','.join(fields)}"
+    if restart:
+        db.migrations.delete_one({"_id": checkpoint_id})
+    checkpoint = db.migrations.find_one({"_id": checkpoint_id}) or {}
+    if checkpoint.get("completed"):
+        print(f"{name}: already migrated")
+        return 0
+
+    last_id = checkpoint.get("last_id")
+    updated = 0
+    projection = {field: 1 for field in fields}
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = list(db[name].find(query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for doc in batch:
+            values = {}
+            for field in fields:
+                parsed = parse_timestamp(doc.get(field))
+                if parsed is not None:
+                    values[native_field(field)] = parsed
+            if values:
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": values}))
+
+        if operations:
+            result = db[name].bulk_write(operations, ordered=False)
+            updated += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        db.migrations.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"last_id": last_id}, "$inc": {"updated": len(operations)}},
+            upsert=True
+        )
+        print(f"{name}: {updated} documents updated (through _id {last_id})")
+
+    db.migrations.update_one({"_id": checkpoint_id}, {"$set": {"completed": True}}, upsert=True)
+    return updated
+
+
+def migrate_native_dates(collections, batch_size: int, restart: bool):
+    """Add `<field>_dt` datetimes to every selected collection"""
+    print("Starting migration to native datetime fields...")
+    total = 0
+    for name in collections:
+        total += migrate_collection(name, COLLECTION_FIELDS[name], batch_size, restart)
+    print(f"\nMigration completed! Updated {total} documents.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--collections", nargs="+", choices=list(COLLECTION_FIELDS), default=list(COLLECTION_FIELDS))
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints and start over")
+    args = parser.parse_args()
+    migrate_native_dates(args.collections, args.batch_size, args.restart)
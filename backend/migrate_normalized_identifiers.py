@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Migration script to add normalized email and phone lookup keys to users
+
+Every user gets `email_normalized` (trimmed, lowercase) and
+`phone_normalized` (E.164) computed from `email` and `phone` (see
+utils/identifiers.py); the raw fields are left untouched. Users are walked in
+`_id` order in batches, each written with one unordered bulk write, and the
+last `_id` of every batch is checkpointed in the `migrations` collection, so
+an interrupted run resumes where it stopped. Phone numbers that cannot be
+normalized are counted and stored as null.
+
+Usage: python migrate_normalized_identifiers.py [--batch-size 1000] [--restart]
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo import MongoClient, UpdateOne
+
+from utils.identifiers import normalize_email, normalize_phone
+
+CHECKPOINT_ID = "normalized_identifiers:users"
+
+# MongoDB connection
+client = MongoClient(os.getenv("MONGO_URL", "mongodb://localhost:27017/"))
+db = client[os.getenv("DATABASE_NAME", "cultural_center")]
+
+
+def migrate_normalized_identifiers(batch_size: int, restart: bool) -> int:
+    """Back-fill the normalized identifiers; returns the number of users updated"""
+    print("Starting migration to normalized email and phone keys...")
+    if restart:
+        db.migrations.delete_one({"_id": CHECKPOINT_ID})
+    checkpoint = db.migrations.find_one({"_id": CHECKPOINT_ID}) or {}
+    if checkpoint.get("completed"):
+        print("users: already migrated")
+        return 0
+
+    last_id = checkpoint.get("last_id")
+    updated = 0
+    unparseable_phones = 0
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = list(db.users.find(query, {"email": 1, "phone": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for doc in batch:
+            values = {
+                "email_normalized": normalize_email(doc.get("email")),
+                "phone_normalized": normalize_phone(doc.get("phone"))
+            }
+            if doc.get("phone") and values["phone_normalized"] is None:
+                unparseable_phones += 1
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": values}))
+
+        result = db.users.bulk_write(operations, ordered=False)
+        updated += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        db.migrations.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {"last_id": last_id}, "$inc": {"updated": result.modified_count}},
+            upsert=True
+        )
+        print(f"users: {updated} documents updated (through _id {last_id})")
+
+    db.migrations.update_one({"_id": CHECKPOINT_ID}, {"$set": {"completed": True}}, upsert=True)
+    print(f"\nMigration completed! Updated {updated} users; {unparseable_phones} phone numbers could not be normalized.")
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint and start over")
+    args = parser.parse_args()
+    migrate_normalized_identifiers(args.batch_size, args.restart)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the derived user search fields
+
+Every user gets `search_name`, `search_text` and `search_prefixes` computed
+from `name`, `email` and `location` (see utils/search.py). Users are walked
+in `_id` order in batches, each written with one unordered bulk write, and
+the last `_id` of every batch is checkpointed in the `migrations`
+collection, so an interrupted run resumes where it stopped.
+
+A collection holds a single text index, so the legacy one over
+name/email/location is dropped first; the search indexes from the manifest
+are built once the back-fill is done.
+
+Usage: python migrate_search_fields.py [--batch-size 1000] [--restart]
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo import MongoClient, UpdateOne
+
+from core.indexes import INDEX_MANIFEST, index_name, index_options
+from utils.search import search_fields
+
+# Versioned: a new id recomputes every user when the derived fields change
+CHECKPOINT_ID = "search_fields:users:v2"
+LEGACY_TEXT_INDEX = "name_text_email_text_location_text"
+
+# MongoDB connection
+client = MongoClient(os.getenv("MONGO_URL", "mongodb://localhost:27017/"))
+db = client[os.getenv("DATABASE_NAME", "cultural_center")]
+
+
+def create_search_indexes():
+    """Build the users search indexes declared in the manifest"""
+    for spec in INDEX_MANIFEST["users"]:
+        if not any(field.startswith("search_") for field, _ in spec["keys"]):
+            continue
+        name = index_name(spec["keys"])
+        db.users.create_index(spec["keys"], name=name, **index_options(spec))
+        print(f"users: index {name} ready")
+
+
+def migrate_search_fields(batch_size: int, restart: bool) -> int:
+    """Back-fill the search fields; returns the number of users updated"""
+    print("Starting migration to indexed user search fields...")
+    if LEGACY_TEXT_INDEX in db.users.index_information():
+        db.users.drop_index(LEGACY_TEXT_INDEX)
+        print(f"users: dropped legacy index {LEGACY_TEXT_INDEX}")
+
+    if restart:
+        db.migrations.delete_one({"_id": CHECKPOINT_ID})
+    checkpoint = db.migrations.find_one({"_id": CHECKPOINT_ID}) or {}
+    last_id = checkpoint.get("last_id")
+    updated = 0
+
+    while not checkpoint.get("completed"):
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = list(
+            db.users.find(query, {"name": 1, "email": 1, "location": 1}).sort("_id", 1).limit(batch_size)
+        )
+        if not batch:
+            db.migrations.update_one({"_id": CHECKPOINT_ID}, {"$set": {"completed": True}}, upsert=True)
+            break
+
+        result = db.users.bulk_write(
+            [UpdateOne({"_id": doc["_id"]}, {"$set": search_fields(doc)}) for doc in batch],
+            ordered=False
+        )
+        updated += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        db.migrations.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {"last_id": last_id}, "$inc": {"updated": result.modified_count}},
+            upsert=True
+        )
+        print(f"users: {updated} documents updated (through _id {last_id})")
+
+    create_search_indexes()
+    print(f"\nMigration completed! Updated {updated} users.")
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint and start over")
+    args = parser.parse_args()
+    migrate_search_fields(args.batch_size, args.restart)
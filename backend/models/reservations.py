@@ -45,7 +45,7 @@ class ReservationWithDetails(BaseModel):
 
 class CheckInRequest(BaseModel):
     """Model for check-in requests"""
-    method: str  # "qr_code", "reservation_code", "email", "name"
+    method: str  # "qr_code", "reservation_code", "email", "phone", "name"
     value: str  # The actual value to search for
     event_id: Optional[str] = None  # Optional event filter
 
@@ -73,6 +73,35 @@ class BulkCheckIn(BaseModel):
     event_id: Optional[str] = None
 
 
+class OfflineScan(BaseModel):
+    """A scan recorded by a scanner while offline"""
+    checkin_code: Optional[str] = None
+    reservation_id: Optional[str] = None
+    scanned_at: str  # ISO timestamp taken on the device
+    device_id: Optional[str] = None
+
+
+class CheckInBatchRequest(BaseModel):
+    """Model for syncing offline scans of one event"""
+    event_id: str
+    scans: List[OfflineScan]
+
+
+class CheckInBatchResult(BaseModel):
+    """Outcome of one offline scan"""
+    index: int
+    reservation_id: Optional[str] = None
+    status: str  # checked_in, already_checked_in, duplicate, cancelled, cancelled_after_scan, not_found, invalid
+    checked_in_at: Optional[str] = None
+
+
+class CheckInBatchResponse(BaseModel):
+    """Model for offline sync responses"""
+    event_id: str
+    summary: dict  # result status -> number of scans
+    results: List[CheckInBatchResult]
+
+
 class ReservationStats(BaseModel):
     """Reservation statistics model"""
     total_reservations: int
@@ -0,0 +1,268 @@
+"""
+Report jobs - Background PDF rendering with cached artifacts
+
+Report data is gathered on the event loop (one aggregation, see
+`reports.report_data`), while the matplotlib/ReportLab rendering runs in a
+process pool. Rendered PDFs are stored in GridFS under a cache key made of the
+report type, its parameters and a hash of the report data, so repeat requests
+are served from the cache until the underlying reservations change.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Tuple, Callable
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from core.config import settings
+from core.database import database
+from reports import report_data
+
+logger = logging.getLogger(__name__)
+
+
+def _render_event(event_data: Dict[str, Any], participants: list) -> bytes:
+    """Render the event report PDF (runs inside a pool process)"""
+    from reports.pdfdocument_generator import PDFDocumentReportGenerator
+    return PDFDocumentReportGenerator().generate_event_report(event_data, participants)
+
+
+def _render_monthly(monthly_data: Dict[str, Any]) -> bytes:
+    """Render the monthly report PDF (runs inside a pool process)"""
+    from reports.professional_generator import ProfessionalReportGenerator
+    return ProfessionalReportGenerator().generate_monthly_report(monthly_data)
+
+
+RENDERERS: Dict[str, Callable[..., bytes]] = {
+    "event": _render_event,
+    "monthly": _render_monthly
+}
+
+PENDING_STATUSES = ["queued", "running"]
+
+
+def data_version(payload: Any) -> str:
+    """Stable hash of the data a report is rendered from"""
+    encoded = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ReportJobService:
+    """Service for queued report rendering and the PDF artifact cache"""
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._bucket: Optional[AsyncIOMotorGridFSBucket] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def jobs(self):
+        return database.db.report_jobs
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(database.db, bucket_name="report_artifacts")
+        return self._bucket
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=settings.REPORT_WORKERS)
+        return self._pool
+
+    async def _collect(self, report_type: str, params: Dict[str, Any]) -> Tuple[tuple, str]:
+        """Gather the renderer arguments and download filename for a report"""
+        if report_type == "event":
+            event = await report_data.get_event(params.get("event_id"))
+            if not event:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Event not found"
+                )
+            event_data, participants = await report_data.professional_event_data(event)
+            filename = f"Reporte_Evento_{event['title'].replace(' ', '_')}.pdf"
+            return (event_data, participants), filename
+
+        if report_type == "monthly":
+            month, year = params["month"], params["year"]
+            if month not in report_data.MONTH_NAMES:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="month must be between 1 and 12"
+                )
+            monthly_data = await report_data.professional_monthly_data(month, year)
+            filename = f"Reporte_Mensual_{report_data.MONTH_NAMES[month]}_{year}.pdf"
+            return (monthly_data,), filename
+
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown report type. Use one of: {', '.join(RENDERERS)}"
+        )
+
+    async def submit(
+        self,
+        report_type: str,
+        params: Dict[str, Any],
+        requested_by: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Return a job for the report, reusing a cached or in-flight one when possible
+
+        A completed job with the same cache key and data version is returned
+        as-is (its PDF is reused); otherwise a new job is queued.
+        """
+        args, filename = await self._collect(report_type, params)
+        cache_key = f"{report_type}:{json.dumps(params, sort_keys=True)}"
+        version = data_version(args)
+
+        # Pending jobs older than the render timeout are presumed lost
+        stale_before = (datetime.utcnow() - timedelta(seconds=settings.REPORT_RENDER_TIMEOUT)).isoformat()
+        existing = await self.jobs.find_one(
+            {
+                "cache_key": cache_key,
+                "data_version": version,
+                "$or": [
+                    {"status": "completed"},
+                    {"status": {"$in": PENDING_STATUSES}, "created_at": {"$gte": stale_before}}
+                ]
+            },
+            {"_id": 0},
+            sort=[("created_at", -1)]
+        )
+        if existing:
+            return existing
+
+        now = datetime.utcnow().isoformat()
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": report_type,
+            "params": params,
+            "cache_key": cache_key,
+            "data_version": version,
+            "filename": filename,
+            "status": "queued",
+            "requested_by": requested_by,
+            "created_at": now,
+            "updated_at": now
+        }
+        await self.jobs.insert_one(job)
+        job.pop("_id", None)
+
+        task = asyncio.create_task(self._run(job, args))
+        self._tasks[job["id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["id"], None))
+        return job
+
+    async def _run(self, job: Dict[str, Any], args: tuple):
+        await self.jobs.update_one({"id": job["id"]}, {"$set": {
+            "status": "running",
+            "updated_at": datetime.utcnow().isoformat()
+        }})
+
+        try:
+            loop = asyncio.get_running_loop()
+            pdf_bytes = await loop.run_in_executor(self._get_pool(), RENDERERS[job["type"]], *args)
+
+            artifact_id = await self.bucket.upload_from_stream(
+                job["filename"],
+                pdf_bytes,
+                metadata={"job_id": job["id"], "cache_key": job["cache_key"], "content_type": "application/pdf"}
+            )
+            now = datetime.utcnow().isoformat()
+            await self.jobs.update_one({"id": job["id"]}, {"$set": {
+                "status": "completed",
+                "artifact_id": str(artifact_id),
+                "size": len(pdf_bytes),
+                "completed_at": now,
+                "updated_at": now
+            }})
+            await self._expire_previous(job)
+
+        except Exception as e:
+            logger.error(f"Report job {job['id']} failed: {e}")
+            await self.jobs.update_one({"id": job["id"]}, {"$set": {
+                "status": "failed",
+                "error": str(e),
+                "updated_at": datetime.utcnow().isoformat()
+            }})
+
+    async def _expire_previous(self, job: Dict[str, Any]):
+        """Drop the artifacts of earlier data versions of the same report"""
+        async for previous in self.jobs.find(
+            {"cache_key": job["cache_key"], "data_version": {"$ne": job["data_version"]}, "status": "completed"},
+            {"_id": 0, "id": 1, "artifact_id": 1}
+        ):
+            try:
+                await self.bucket.delete(ObjectId(previous["artifact_id"]))
+            except Exception as e:
+                logger.warning(f"Could not delete report artifact {previous['artifact_id']}: {e}")
+            await self.jobs.update_one({"id": previous["id"]}, {"$set": {
+                "status": "expired",
+                "updated_at": datetime.utcnow().isoformat()
+            }, "$unset": {"artifact_id": ""}})
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a report job"""
+        return await self.jobs.find_one({"id": job_id}, {"_id": 0})
+
+    async def wait(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Wait for a job to finish, up to REPORT_RENDER_TIMEOUT seconds"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.REPORT_RENDER_TIMEOUT
+        while job["status"] in PENDING_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail="Report rendering timed out"
+                )
+            task = self._tasks.get(job["id"])
+            if task is not None:
+                await asyncio.wait({task}, timeout=remaining)
+            else:
+                # Rendered by another worker process: poll its progress
+                await asyncio.sleep(min(0.5, remaining))
+            job = await self.get_job(job["id"])
+        return job
+
+    async def download(self, job: Dict[str, Any]) -> bytes:
+        """PDF bytes of a completed job"""
+        if job["status"] != "completed":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Report is not ready (status: {job['status']})"
+            )
+        stream = await self.bucket.open_download_stream(ObjectId(job["artifact_id"]))
+        return await stream.read()
+
+    async def render(
+        self,
+        report_type: str,
+        params: Dict[str, Any],
+        requested_by: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bytes]:
+        """Submit a report and wait for its PDF; served from the cache when the data is unchanged"""
+        job = await self.wait(await self.submit(report_type, params, requested_by))
+        if job["status"] == "failed":
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Report rendering failed: {job.get('error', 'unknown error')}"
+            )
+        return job, await self.download(job)
+
+    def shutdown(self):
+        """Release the rendering processes"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global service instance
+report_jobs = ReportJobService()
@@ -0,0 +1,394 @@
+"""
+Report data - Shared aggregations behind the attendance and professional reports
+
+Every report gathers its reservation figures with a single `$facet`
+aggregation: per-event status counts, age buckets and location histograms
+are computed by MongoDB in one round trip instead of one query per event and
+one `find_one` per reservation. The facet result is a single document, so it
+only holds counts; participant lists come from a separate streamed cursor.
+"""
+
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator
+
+from core.database import database
+
+
+# (exclusive upper bound, label); the last bucket has no upper bound
+ATTENDANCE_AGE_GROUPS: List[Tuple[Optional[int], str]] = [
+    (18, "Menor de 18"),
+    (30, "18-29"),
+    (45, "30-44"),
+    (60, "45-59"),
+    (None, "60+")
+]
+
+PROFESSIONAL_AGE_GROUPS: List[Tuple[Optional[int], str]] = [
+    (20, "< 20"),
+    (30, "20-29"),
+    (40, "30-39"),
+    (50, "40-49"),
+    (60, "50-59"),
+    (None, "60+")
+]
+
+MONTH_NAMES = {
+    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril",
+    5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto",
+    9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
+}
+
+EVENT_FIELDS = {
+    "_id": 0, "id": 1, "title": 1, "date": 1, "time": 1, "location": 1,
+    "capacity": 1, "category": 1, "description": 1, "price": 1
+}
+
+USER_FIELDS = {"_id": 0, "name": 1, "email": 1, "phone": 1, "age": 1, "location": 1}
+
+
+def _age_bucket(age_groups: List[Tuple[Optional[int], str]]) -> Dict[str, Any]:
+    """`$switch` expression mapping `$age` to its bucket label"""
+    return {"$switch": {
+        "branches": [
+            {"case": {"$lt": ["$age", bound]}, "then": label}
+            for bound, label in age_groups if bound is not None
+        ],
+        "default": age_groups[-1][1]
+    }}
+
+
+def _user_lookup() -> Dict[str, Any]:
+    """$lookup of the reservation's user, reduced to USER_FIELDS"""
+    return {"$lookup": {
+        "from": "users",
+        "let": {"user_id": "$user_id"},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$id", "$$user_id"]}}},
+            {"$limit": 1},
+            {"$project": USER_FIELDS}
+        ],
+        "as": "user"
+    }}
+
+
+def build_report_pipeline(
+    event_ids: List[str],
+    age_groups: List[Tuple[Optional[int], str]],
+    demographic_filter: Optional[Dict[str, Any]] = None,
+    age_default: Optional[int] = None,
+    location_default: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Aggregation over the reservations of `event_ids` returning a single `$facet` document
+
+    Demographics only count reservations matching `demographic_filter` whose
+    user still exists. Users without an age or location are skipped unless
+    `age_default` / `location_default` gives them a value.
+    """
+    age = {"$convert": {"input": "$user.age", "to": "double", "onError": None, "onNull": None}}
+    if age_default is not None:
+        age = {"$ifNull": [age, age_default]}
+    location: Any = "$user.location"
+    if location_default is not None:
+        location = {"$ifNull": [location, location_default]}
+
+    with_user = {"user": {"$exists": True}, **(demographic_filter or {})}
+
+    age_stages: List[Dict[str, Any]] = [{"$match": with_user}, {"$project": {"age": age}}]
+    if age_default is None:
+        age_stages.append({"$match": {"age": {"$nin": [None, 0]}}})
+    location_stages: List[Dict[str, Any]] = [{"$match": with_user}, {"$project": {"location": location}}]
+    if location_default is None:
+        location_stages.append({"$match": {"location": {"$nin": [None, ""]}}})
+
+    facets: Dict[str, List[Dict[str, Any]]] = {
+        "statuses": [
+            {"$group": {
+                "_id": {"event_id": "$event_id", "status": "$status"},
+                "count": {"$sum": 1}
+            }}
+        ],
+        "age_groups": age_stages + [
+            {"$group": {"_id": _age_bucket(age_groups), "count": {"$sum": 1}}}
+        ],
+        "locations": location_stages + [
+            {"$group": {"_id": "$location", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}}
+        ]
+    }
+
+    return [
+        {"$match": {"event_id": {"$in": event_ids}}},
+        _user_lookup(),
+        # Deleted users leave `user` unset
+        {"$project": {
+            "_id": 0, "event_id": 1, "status": 1,
+            "user": {"$arrayElemAt": ["$user", 0]}
+        }},
+        {"$facet": facets}
+    ]
+
+
+def build_participants_pipeline(event_ids: List[str]) -> List[Dict[str, Any]]:
+    """Aggregation producing one participant row per reservation whose user still exists"""
+    return [
+        {"$match": {"event_id": {"$in": event_ids}}},
+        _user_lookup(),
+        {"$unwind": "$user"},
+        {"$project": {
+            "_id": 0,
+            "user_name": {"$ifNull": ["$user.name", ""]},
+            "user_email": {"$ifNull": ["$user.email", ""]},
+            "user_phone": {"$ifNull": ["$user.phone", ""]},
+            "user_age": {"$ifNull": ["$user.age", ""]},
+            "user_location": {"$ifNull": ["$user.location", ""]},
+            "reservation_id": "$id",
+            "checkin_code": {"$ifNull": ["$checkin_code", ""]},
+            "status": "$status",
+            "reserved_at": "$created_at",
+            "checked_in_at": {"$ifNull": ["$checked_in_at", None]},
+            "cancelled_at": {"$ifNull": ["$cancelled_at", None]},
+            "attended": {"$eq": ["$status", "checked_in"]}
+        }}
+    ]
+
+
+async def fetch_report_data(event_ids: List[str], age_groups: List[Tuple[Optional[int], str]], **options) -> Dict[str, Any]:
+    """
+    Run the report aggregation and reshape its result
+
+    Returns `status_counts` ({event_id: {status: count}}) and the
+    `age_groups` and `locations` histograms. Accepts the options of
+    `build_report_pipeline`.
+    """
+    result = {"status_counts": {}, "age_groups": {}, "locations": {}}
+    if not event_ids:
+        return result
+
+    pipeline = build_report_pipeline(event_ids, age_groups, **options)
+    facets = await database.reservations.aggregate(pipeline).to_list(length=1)
+    if not facets:
+        return result
+    facets = facets[0]
+
+    for doc in facets["statuses"]:
+        counts = result["status_counts"].setdefault(doc["_id"]["event_id"], {})
+        counts[doc["_id"]["status"]] = doc["count"]
+
+    # Keep the bucket order of the definition
+    ages = {doc["_id"]: doc["count"] for doc in facets["age_groups"]}
+    result["age_groups"] = {label: ages[label] for _, label in age_groups if label in ages}
+    result["locations"] = {doc["_id"]: doc["count"] for doc in facets["locations"]}
+    return result
+
+
+async def iter_participants(event_ids: List[str]) -> AsyncIterator[Dict[str, Any]]:
+    """Participant rows of `event_ids`, streamed from the cursor"""
+    async for row in database.reservations.aggregate(build_participants_pipeline(event_ids)):
+        yield row
+
+
+def _totals(counts: Dict[str, int]) -> Dict[str, int]:
+    return {
+        "reservations": sum(counts.values()),
+        "attended": counts.get("checked_in", 0),
+        "confirmed": counts.get("confirmed", 0),
+        "cancelled": counts.get("cancelled", 0)
+    }
+
+
+def _percent(part: float, whole: float) -> float:
+    return (part / whole * 100) if whole > 0 else 0
+
+
+async def get_event(event_id: str) -> Optional[Dict[str, Any]]:
+    return await database.events.find_one({"id": event_id}, EVENT_FIELDS)
+
+
+async def event_attendance_report(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Detailed attendance report for one event, with attendee demographics"""
+    data = await fetch_report_data(
+        [event["id"]],
+        ATTENDANCE_AGE_GROUPS,
+        demographic_filter={"status": "checked_in"}
+    )
+    totals = _totals(data["status_counts"].get(event["id"], {}))
+
+    return {
+        "event": {
+            "id": event["id"],
+            "title": event["title"],
+            "date": event["date"],
+            "time": event["time"],
+            "location": event["location"],
+            "capacity": event["capacity"],
+            "category": event["category"]
+        },
+        "summary": {
+            "total_reservations": totals["reservations"],
+            "total_attended": totals["attended"],
+            "total_confirmed": totals["confirmed"],
+            "total_cancelled": totals["cancelled"],
+            "attendance_rate": round(_percent(totals["attended"], totals["reservations"]), 1),
+            "capacity_utilization": round(_percent(totals["reservations"], event["capacity"]), 1)
+        },
+        "demographics": {
+            "age_groups": data["age_groups"],
+            "locations": data["locations"]
+        },
+        "attendance_list": [participant async for participant in iter_participants([event["id"]])],
+        "generated_at": datetime.utcnow().isoformat()
+    }
+
+
+async def attendance_summary_report(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    category: Optional[str] = None
+) -> Dict[str, Any]:
+    """Attendance summary across the events matching the filters"""
+    event_filter: Dict[str, Any] = {}
+    if date_from or date_to:
+        event_filter["date"] = {}
+        if date_from:
+            event_filter["date"]["$gte"] = date_from
+        if date_to:
+            event_filter["date"]["$lte"] = date_to
+    if category:
+        event_filter["category"] = category
+
+    events = await database.events.find(event_filter, EVENT_FIELDS).to_list(length=None)
+    data = await fetch_report_data([event["id"] for event in events], ATTENDANCE_AGE_GROUPS)
+
+    summary_data = []
+    total_capacity = 0
+    total_reservations = 0
+    total_attended = 0
+    for event in events:
+        totals = _totals(data["status_counts"].get(event["id"], {}))
+        summary_data.append({
+            "event_id": event["id"],
+            "event_title": event["title"],
+            "event_date": event["date"],
+            "event_time": event["time"],
+            "event_category": event["category"],
+            "capacity": event["capacity"],
+            "total_reservations": totals["reservations"],
+            "total_attended": totals["attended"],
+            "total_cancelled": totals["cancelled"],
+            "attendance_rate": round(_percent(totals["attended"], totals["reservations"]), 1),
+            "capacity_utilization": round(_percent(totals["reservations"], event["capacity"]), 1)
+        })
+        total_capacity += event["capacity"]
+        total_reservations += totals["reservations"]
+        total_attended += totals["attended"]
+
+    return {
+        "summary": {
+            "total_events": len(events),
+            "total_capacity": total_capacity,
+            "total_reservations": total_reservations,
+            "total_attended": total_attended,
+            "overall_attendance_rate": round(_percent(total_attended, total_reservations), 1),
+            "overall_capacity_utilization": round(_percent(total_reservations, total_capacity), 1)
+        },
+        "events": summary_data,
+        "filters_applied": {
+            "date_from": date_from,
+            "date_to": date_to,
+            "category": category
+        },
+        "generated_at": datetime.utcnow().isoformat()
+    }
+
+
+async def professional_event_data(event: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Event details and participant rows for the professional event PDF"""
+    event_data = {
+        "title": event["title"],
+        "date": event["date"],
+        "time": event["time"],
+        "location": event["location"],
+        "capacity": event["capacity"],
+        "category": event["category"],
+        "description": event.get("description", ""),
+        "price": event.get("price", 0)
+    }
+
+    participants = [
+        {
+            "user_name": participant["user_name"],
+            "user_email": participant["user_email"],
+            "user_phone": participant["user_phone"],
+            "status": "confirmed" if participant["attended"] else "pending",
+            "created_at": participant["reserved_at"]
+        }
+        async for participant in iter_participants([event["id"]])
+    ]
+    return event_data, participants
+
+
+async def professional_monthly_data(month: int, year: int) -> Dict[str, Any]:
+    """Consolidated figures for the professional monthly PDF"""
+    start_date = datetime(year, month, 1)
+    end_date = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+
+    events = await database.events.find(
+        {"date": {"$gte": start_date.strftime("%Y-%m-%d"), "$lt": end_date.strftime("%Y-%m-%d")}},
+        EVENT_FIELDS
+    ).to_list(length=None)
+    data = await fetch_report_data(
+        [event["id"] for event in events],
+        PROFESSIONAL_AGE_GROUPS,
+        demographic_filter={"status": {"$ne": "cancelled"}},
+        age_default=0,
+        location_default="No especificado"
+    )
+
+    events_data = []
+    total_reservations = 0
+    total_attendees = 0
+    total_cancellations = 0
+    for event in events:
+        totals = _totals(data["status_counts"].get(event["id"], {}))
+        events_data.append({
+            "title": event["title"],
+            "date": event["date"],
+            "reservations": totals["reservations"],
+            "attendees": totals["attended"],
+            "cancellations": totals["cancelled"]
+        })
+        total_reservations += totals["reservations"]
+        total_attendees += totals["attended"]
+        total_cancellations += totals["cancelled"]
+
+    total_capacity = sum(event["capacity"] for event in events)
+    avg_attendance_rate = _percent(total_attendees, total_reservations)
+    avg_capacity_utilization = _percent(total_reservations, total_capacity)
+
+    return {
+        "period": f"{MONTH_NAMES[month]} {year}",
+        "total_events": len(events),
+        "total_reservations": total_reservations,
+        "total_attendees": total_attendees,
+        "total_cancellations": total_cancellations,
+        "avg_attendance_rate": avg_attendance_rate,
+        "avg_capacity_utilization": avg_capacity_utilization,
+        "metrics": {
+            "total_reservations": total_reservations,
+            "total_attendees": total_attendees,
+            "total_cancellations": total_cancellations,
+            "attendance_rate": avg_attendance_rate,
+            "capacity_utilization": avg_capacity_utilization
+        },
+        "events": events_data,
+        "demographics": {
+            "age_distribution": data["age_groups"],
+            "location_distribution": data["locations"]
+        },
+        "performance_data": {
+            "months": [f"{year}-{month:02d}"],
+            "attendance": [total_attendees],
+            "capacity": [total_capacity]
+        }
+    }
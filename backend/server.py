@@ -1,24 +1,16 @@
 from fastapi import FastAPI, HTTPException, Depends, status, WebSocket, WebSocketDisconnect, UploadFile, File
-from fastapi.responses import Response
+from fastapi.responses import Response, JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
-import csv
-import pandas as pd
-import io
 import os
 from datetime import datetime, timedelta
 import jwt
-import bcrypt
-from pymongo import MongoClient
 import uuid
 import qrcode
 import base64
 from io import BytesIO
-from email_validator import validate_email, EmailNotValidError
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 import logging
 from PIL import Image
 
@@ -27,6 +19,28 @@ from analytics.tracker import analytics, performance_tracker
 from analytics.dashboard import dashboard_manager
 from analytics.segmentation import user_segmentation
 
+# Shared async data layer
+from core.config import settings
+from core.database import database
+from core.dashboard_counters import dashboard_counters
+from core.feature_store import feature_store
+from core.principal_cache import principal_cache, token_claims
+from core.passwords import password_hasher
+from services.reservation_service import reservation_service, ReservationService
+from services.event_service import event_service
+from services.checkin_roster import checkin_roster, CHECKED_IN, ALREADY_CHECKED_IN
+from core.email_outbox import email_outbox
+from services.user_import import user_import_service
+from services.reservation_export import stream_reservations_export, EXPORT_FORMATS
+from utils.dates import with_native_dates, day_range, days_filter, range_filter
+from utils.identifiers import with_normalized_identifiers, find_user_by_identifier
+from utils.search import (
+    with_search_fields, search_filter, text_search, escape_regex,
+    HIDDEN_SEARCH_FIELDS, TEXT_SCORE, RELEVANCE_SORT
+)
+from reports import report_data
+from reports.jobs import report_jobs
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -57,49 +71,57 @@ async def startup_event():
         await dashboard_manager.initialize()
         await user_segmentation.initialize()
         logger.info("Analytics systems initialized successfully")
-        
-        # Create database indexes for better performance
-        try:
-            # Users collection indexes
-            db.users.create_index("email", unique=True)
-            db.users.create_index("created_at")
-            db.users.create_index("is_admin")
-            db.users.create_index("deleted")
-            db.users.create_index("location")
-            db.users.create_index("age")
-            db.users.create_index([("name", "text"), ("email", "text"), ("location", "text")])
-            
-            # Reservations collection indexes
-            db.reservations.create_index("user_id")
-            db.reservations.create_index("event_id")
-            db.reservations.create_index("created_at")
-            db.reservations.create_index("status")
-            
-            # Events collection indexes
-            db.events.create_index("date")
-            db.events.create_index("category")
-            db.events.create_index("created_at")
-            
-            logger.info("Database indexes created successfully")
-        except Exception as index_error:
-            logger.warning(f"Some indexes may already exist: {index_error}")
-            
     except Exception as e:
         logger.error(f"Failed to initialize analytics: {e}")
+    
+    # Apply the index manifest and report missing/redundant indexes
+    await database.check_indexes()
+    
+    # Rebuild event seat counters now and periodically
+    reservation_service.start_reconciler()
+    
+    # Recount the dashboard counters now and periodically
+    dashboard_counters.start_reconciler()
+    
+    # Load check-in rosters of upcoming events for the door scanners
+    checkin_roster.start_preloader()
+    
+    # Refresh stored user segment assignments and retrain the model periodically
+    user_segmentation.start_scorer()
+    user_segmentation.start_retrainer()
+    
+    # Deliver queued emails in the background
+    email_outbox.start()
+    
+    # Imports cut off by a previous shutdown cannot resume (the upload is gone)
+    await user_import_service.fail_interrupted_jobs()
+    
+    # Shared tier of the authenticated-principal cache
+    await principal_cache.connect()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup analytics systems on shutdown"""
     try:
         await dashboard_manager.cleanup()
+        await analytics.close()
+        await reservation_service.stop_reconciler()
+        await dashboard_counters.stop_reconciler()
+        await checkin_roster.stop_preloader()
+        await user_segmentation.stop_scorer()
+        await user_segmentation.stop_retrainer()
+        user_segmentation.shutdown()
+        await email_outbox.stop()
+        await principal_cache.close()
+        password_hasher.shutdown()
+        report_jobs.shutdown()
+        await database.close()
         logger.info("Analytics systems cleaned up")
     except Exception as e:
         logger.error(f"Failed to cleanup analytics: {e}")
 
-# MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/')
-client = MongoClient(MONGO_URL)
-db = client.cultural_center
+# MongoDB connection (async Motor client shared with the core package)
+db = database.connect()
 
 # JWT configuration
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
@@ -228,12 +250,19 @@ class BulkUserAction(BaseModel):
     user_ids: List[str]
     action: str  # "delete", "activate", "deactivate", "make_admin", "remove_admin"
 
-# Utility functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+class OfflineScan(BaseModel):
+    checkin_code: Optional[str] = None
+    reservation_id: Optional[str] = None
+    scanned_at: str  # ISO timestamp taken on the device
+    device_id: Optional[str] = None
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+class CheckInBatch(BaseModel):
+    event_id: str
+    scans: List[OfflineScan]
+
+# Utility functions
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -245,23 +274,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user_id
     except jwt.PyJWTError:
+        user_id = None
+    # Unknown users and revoked tokens (stale token version) are rejected;
+    # the principal stays cached for the admin checks that follow
+    if user_id is None or await principal_cache.get(user_id, payload.get("tv", 0)) is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return user_id
 
 def generate_checkin_code() -> str:
     """Generate unique 8-character alphanumeric check-in code"""
@@ -302,32 +329,22 @@ def generate_qr_code(data: str) -> str:
     img_str = base64.b64encode(buffer.read()).decode()
     return f"data:image/png;base64,{img_str}"
 
-def send_email(to_email: str, subject: str, html_content: str, plain_content: str = None):
-    """Send email using SendGrid"""
+async def send_email(to_email: str, subject: str, html_content: str, plain_content: str = None, dedupe_key: str = None):
+    """Queue an email in the outbox; background workers deliver it"""
     try:
-        if not SENDGRID_API_KEY:
-            logger.warning("SendGrid API key not configured - email not sent")
-            return False
-            
-        sg = SendGridAPIClient(api_key=SENDGRID_API_KEY)
-        
-        message = Mail(
-            from_email=FROM_EMAIL,
-            to_emails=to_email,
-            subject=subject,
-            html_content=html_content,
-            plain_text_content=plain_content or html_content
+        return await email_outbox.enqueue(
+            to_email,
+            subject,
+            html_content,
+            plain_content=plain_content,
+            dedupe_key=dedupe_key,
+            from_email=FROM_EMAIL
         )
-        
-        response = sg.send(message)
-        logger.info(f"Email sent successfully to {to_email}, status: {response.status_code}")
-        return True
-        
     except Exception as e:
-        logger.error(f"Failed to send email to {to_email}: {str(e)}")
+        logger.error(f"Failed to queue email to {to_email}: {str(e)}")
         return False
 
-def send_welcome_email(user_email: str, user_name: str):
+async def send_welcome_email(user_email: str, user_name: str, user_id: str = None):
     """Send welcome email after registration"""
     subject = "Welcome to Cultural Center!"
     
@@ -388,9 +405,9 @@ def send_welcome_email(user_email: str, user_name: str):
     Cultural Center Visitor Management Platform
     """
     
-    return send_email(user_email, subject, html_content, plain_content)
+    return await send_email(user_email, subject, html_content, plain_content, dedupe_key=f"welcome:{user_id}" if user_id else "welcome")
 
-def send_reservation_confirmation_email(user_email: str, user_name: str, event_title: str, event_date: str, event_time: str, event_location: str, qr_code_data: str, checkin_code: str = ""):
+async def send_reservation_confirmation_email(user_email: str, user_name: str, event_title: str, event_date: str, event_time: str, event_location: str, qr_code_data: str, checkin_code: str = ""):
     """Send reservation confirmation email with QR code"""
     subject = f"Reservation Confirmed: {event_title}"
     
@@ -472,9 +489,9 @@ def send_reservation_confirmation_email(user_email: str, user_name: str, event_t
     Cultural Center Visitor Management Platform
     """
     
-    return send_email(user_email, subject, html_content, plain_content)
+    return await send_email(user_email, subject, html_content, plain_content, dedupe_key=f"reservation:{checkin_code}" if checkin_code else None)
 
-def send_checkin_confirmation_email(user_email: str, user_name: str, event_title: str):
+async def send_checkin_confirmation_email(user_email: str, user_name: str, event_title: str, reservation_id: str = None):
     """Send check-in confirmation email"""
     subject = f"Checked In: {event_title}"
     
@@ -521,9 +538,9 @@ def send_checkin_confirmation_email(user_email: str, user_name: str, event_title
     Cultural Center Visitor Management Platform
     """
     
-    return send_email(user_email, subject, html_content, plain_content)
+    return await send_email(user_email, subject, html_content, plain_content, dedupe_key=f"checkin:{reservation_id}" if reservation_id else None)
 
-def send_reservation_cancellation_email(user_email: str, user_name: str, event_title: str, event_date: str, event_time: str, event_location: str, cancellation_time: str):
+async def send_reservation_cancellation_email(user_email: str, user_name: str, event_title: str, event_date: str, event_time: str, event_location: str, cancellation_time: str, reservation_id: str = None):
     """Send reservation cancellation confirmation email"""
     try:
         # Parse cancellation time for formatting
@@ -593,7 +610,7 @@ def send_reservation_cancellation_email(user_email: str, user_name: str, event_t
         Centro Cultural Banreservas
         """
         
-        send_email(user_email, subject, html_content, plain_content)
+        await send_email(user_email, subject, html_content, plain_content, dedupe_key=f"cancellation:{reservation_id}" if reservation_id else None)
         logger.info(f"Cancellation confirmation email sent to {user_email}")
         
     except Exception as e:
@@ -603,7 +620,7 @@ async def send_admin_notification_for_cancellation(user_name: str, user_email: s
     """Send notification to all admins when a user cancels a reservation"""
     try:
         # Get all admin users
-        admin_users = list(db.users.find({"is_admin": True, "deleted": {"$ne": True}}))
+        admin_users = await db.users.find({"is_admin": True, "deleted": {"$ne": True}}).to_list(length=None)
         
         if not admin_users:
             logger.warning("No admin users found to send cancellation notification")
@@ -692,7 +709,7 @@ async def send_admin_notification_for_cancellation(user_name: str, user_email: s
             """
             
             # Send email to admin
-            send_email(admin_email, subject, html_content, plain_content)
+            await send_email(admin_email, subject, html_content, plain_content)
             logger.info(f"Admin cancellation notification sent to {admin_email}")
         
     except Exception as e:
@@ -708,13 +725,13 @@ async def root():
 async def register(user: UserCreate):
     try:
         # Check if user already exists
-        existing_user = db.users.find_one({"email": user.email})
+        existing_user = await db.users.find_one({"email": user.email})
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Create new user
         user_id = str(uuid.uuid4())
-        hashed_password = hash_password(user.password)
+        hashed_password = await hash_password(user.password)
         
         # Combine nombre and apellido for full name
         full_name = f"{user.nombre} {user.apellido}".strip() if user.apellido else user.nombre
@@ -737,10 +754,12 @@ async def register(user: UserCreate):
             "created_at": datetime.utcnow().isoformat()
         }
         
-        db.users.insert_one(user_doc)
+        await db.users.insert_one(with_native_dates(with_normalized_identifiers(with_search_fields(user_doc))))
+        await dashboard_counters.record_users_created([user_doc])
+        await feature_store.add_users([user_id])
         
         # Send welcome email
-        send_welcome_email(user.email, full_name)
+        await send_welcome_email(user.email, full_name, user_id)
         
         # Track user registration event (disabled due to Redis connection issues)
         try:
@@ -762,7 +781,7 @@ async def register(user: UserCreate):
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user_id}, expires_delta=access_token_expires
+            data=token_claims(user_doc), expires_delta=access_token_expires
         )
         
         return {
@@ -794,13 +813,16 @@ async def register(user: UserCreate):
 async def login(user: UserLogin):
     try:
         # Find user
-        user_doc = db.users.find_one({"email": user.email})
+        user_doc = await db.users.find_one({"email": user.email})
         if not user_doc:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
-        # Verify password
-        if not verify_password(user.password, user_doc["password"]):
+        # Verify password, upgrading hashes made at another bcrypt cost
+        verified, new_hash = await password_hasher.verify_and_rehash(user.password, user_doc["password"])
+        if not verified:
             raise HTTPException(status_code=401, detail="Invalid credentials")
+        if new_hash:
+            await db.users.update_one({"id": user_doc["id"]}, {"$set": {"password": new_hash}})
         
         # Track user login event (disabled due to Redis connection issues)
         try:
@@ -819,7 +841,7 @@ async def login(user: UserLogin):
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user_doc["id"]}, expires_delta=access_token_expires
+            data=token_claims(user_doc), expires_delta=access_token_expires
         )
         
         return {
@@ -847,7 +869,7 @@ async def login(user: UserLogin):
 async def get_current_user(user_id: str = Depends(verify_token)):
     """Get current user profile"""
     try:
-        user = db.users.find_one({"id": user_id})
+        user = await principal_cache.get(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -881,7 +903,7 @@ async def update_user_profile(profile_update: UserProfileUpdate, user_id: str =
     """Update user profile"""
     try:
         # Check if user exists
-        user = db.users.find_one({"id": user_id})
+        user = await principal_cache.get(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -904,13 +926,17 @@ async def update_user_profile(profile_update: UserProfileUpdate, user_id: str =
         update_doc["updated_at"] = datetime.utcnow().isoformat()
         
         # Update user document
-        result = db.users.update_one({"id": user_id}, {"$set": update_doc})
+        result = await db.users.update_one(
+            {"id": user_id},
+            {"$set": with_normalized_identifiers(with_search_fields(update_doc, user))}
+        )
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
+        await principal_cache.invalidate(user_id)
         
         # Get updated user
-        updated_user = db.users.find_one({"id": user_id})
+        updated_user = await db.users.find_one({"id": user_id})
         
         # Remove MongoDB ObjectId and password
         if "_id" in updated_user:
@@ -942,13 +968,13 @@ async def get_user_reservations(user_id: str = Depends(verify_token)):
     """Get user's reservations history"""
     try:
         # Get user reservations with event details
-        reservations = list(db.reservations.find({"user_id": user_id}))
+        reservations = await db.reservations.find({"user_id": user_id}).to_list(length=None)
         
         # Enrich with event details
         enriched_reservations = []
         for reservation in reservations:
             # Get event details
-            event = db.events.find_one({"id": reservation["event_id"]})
+            event = await db.events.find_one({"id": reservation["event_id"]})
             
             # Remove MongoDB ObjectId
             if "_id" in reservation:
@@ -993,22 +1019,22 @@ async def get_user_stats(user_id: str = Depends(verify_token)):
     """Get user statistics"""
     try:
         # Get user reservations count
-        total_reservations = db.reservations.count_documents({"user_id": user_id})
+        total_reservations = await db.reservations.count_documents({"user_id": user_id})
         
         # Get attended events count
-        attended_events = db.reservations.count_documents({
+        attended_events = await db.reservations.count_documents({
             "user_id": user_id,
             "estado": "checked_in"
         })
         
         # Get upcoming events count
-        upcoming_reservations = db.reservations.count_documents({
+        upcoming_reservations = await db.reservations.count_documents({
             "user_id": user_id,
             "estado": "confirmed"
         })
         
         # Get canceled reservations count
-        canceled_reservations = db.reservations.count_documents({
+        canceled_reservations = await db.reservations.count_documents({
             "user_id": user_id,
             "estado": "cancelled"
         })
@@ -1036,7 +1062,7 @@ async def get_user_stats(user_id: str = Depends(verify_token)):
             {"$limit": 3}
         ]
         
-        favorite_categories = list(db.reservations.aggregate(pipeline))
+        favorite_categories = await db.reservations.aggregate(pipeline).to_list(length=None)
         
         return {
             "total_reservations": total_reservations,
@@ -1052,23 +1078,18 @@ async def get_user_stats(user_id: str = Depends(verify_token)):
 
 @app.get("/api/events")
 @performance_tracker.track_endpoint_performance("get_events")
-async def get_events():
+async def get_events(response: Response, skip: int = 0, limit: Optional[int] = None):
     try:
-        events = list(db.events.find({}))
-        event_list = []
+        if skip < 0 or (limit is not None and not 1 <= limit <= 100):
+            raise HTTPException(status_code=400, detail="Invalid pagination parameters")
+        
+        # One find with projection plus at most one $group for legacy events
+        events = await event_service.list_events(skip=skip, limit=limit)
+        if limit:
+            response.headers["X-Total-Count"] = str(await db.events.count_documents({}))
         
+        event_list = []
         for event in events:
-            # Remove MongoDB ObjectId
-            if "_id" in event:
-                del event["_id"]
-                
-            # Calculate available spots
-            reservations = db.reservations.count_documents({
-                "event_id": event["id"],
-                "status": {"$in": ["confirmed", "checked_in"]}
-            })
-            available_spots = event["capacity"] - reservations
-            
             event_list.append(Event(
                 id=event["id"],
                 title=event["title"],
@@ -1079,12 +1100,14 @@ async def get_events():
                 capacity=event["capacity"],
                 location=event["location"],
                 image_url=event.get("image_url"),
-                available_spots=available_spots,
+                available_spots=event["available_spots"],
                 created_at=event["created_at"]
             ))
         
         return event_list
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1093,7 +1116,7 @@ async def get_events():
 async def get_event_by_id(event_id: str):
     try:
         # Find the event by ID
-        event = db.events.find_one({"id": event_id})
+        event = await db.events.find_one({"id": event_id})
         if not event:
             raise HTTPException(status_code=404, detail="Event not found")
         
@@ -1101,12 +1124,8 @@ async def get_event_by_id(event_id: str):
         if "_id" in event:
             del event["_id"]
             
-        # Calculate available spots
-        reservations = db.reservations.count_documents({
-            "event_id": event["id"],
-            "status": {"$in": ["confirmed", "checked_in"]}
-        })
-        available_spots = event["capacity"] - reservations
+        # Available spots come from the event's seat counter
+        available_spots = ReservationService.available_spots(event)
         
         return Event(
             id=event["id"],
@@ -1131,7 +1150,7 @@ async def get_event_by_id(event_id: str):
 async def create_event(event: EventCreate, user_id: str = Depends(verify_token)):
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
@@ -1156,10 +1175,11 @@ async def create_event(event: EventCreate, user_id: str = Depends(verify_token))
             "requirements": event.requirements,
             "contact_info": event.contact_info,
             "published": event.published,
+            "reserved_count": 0,
             "created_at": datetime.utcnow().isoformat()
         }
         
-        db.events.insert_one(event_doc)
+        await db.events.insert_one(with_native_dates(event_doc))
         
         return Event(
             id=event_id,
@@ -1188,12 +1208,12 @@ async def create_event(event: EventCreate, user_id: str = Depends(verify_token))
 async def update_event(event_id: str, event_update: EventCreate, user_id: str = Depends(verify_token)):
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
         # Check if event exists
-        existing_event = db.events.find_one({"id": event_id})
+        existing_event = await db.events.find_one({"id": event_id})
         if not existing_event:
             raise HTTPException(status_code=404, detail="Event not found")
         
@@ -1219,14 +1239,13 @@ async def update_event(event_id: str, event_update: EventCreate, user_id: str =
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        db.events.update_one({"id": event_id}, {"$set": update_doc})
+        await db.events.update_one({"id": event_id}, {"$set": update_doc})
         
-        # Calculate available spots for response
-        reservations = db.reservations.count_documents({
-            "event_id": event_id,
-            "status": {"$in": ["confirmed", "checked_in"]}
+        # Available spots come from the event's seat counter
+        available_spots = ReservationService.available_spots({
+            "capacity": event_update.capacity,
+            "reserved_count": existing_event.get("reserved_count", 0)
         })
-        available_spots = event_update.capacity - reservations
         
         return Event(
             id=event_id,
@@ -1258,17 +1277,17 @@ async def delete_event(event_id: str, user_id: str = Depends(verify_token)):
     """Delete an event (Admin only)"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
         # Check if event exists
-        existing_event = db.events.find_one({"id": event_id})
+        existing_event = await db.events.find_one({"id": event_id})
         if not existing_event:
             raise HTTPException(status_code=404, detail="Event not found")
         
         # Check if event has active reservations
-        active_reservations = db.reservations.count_documents({
+        active_reservations = await db.reservations.count_documents({
             "event_id": event_id,
             "status": {"$in": ["confirmed", "checked_in"]}
         })
@@ -1280,7 +1299,7 @@ async def delete_event(event_id: str, user_id: str = Depends(verify_token)):
             )
         
         # Delete the event
-        result = db.events.delete_one({"id": event_id})
+        result = await db.events.delete_one({"id": event_id})
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=500, detail="Failed to delete event")
@@ -1312,17 +1331,17 @@ async def delete_event(event_id: str, user_id: str = Depends(verify_token)):
 async def create_reservation(reservation: ReservationCreate, user_id: str = Depends(verify_token)):
     try:
         # Check if event exists
-        event = db.events.find_one({"id": reservation.event_id})
+        event = await db.events.find_one({"id": reservation.event_id})
         if not event:
             raise HTTPException(status_code=404, detail="Event not found")
         
         # Get user details for email
-        user = db.users.find_one({"id": user_id})
+        user = await principal_cache.get(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Check if user already has a reservation for this event
-        existing_reservation = db.reservations.find_one({
+        existing_reservation = await db.reservations.find_one({
             "event_id": reservation.event_id,
             "user_id": user_id,
             "status": {"$in": ["confirmed", "checked_in"]}
@@ -1330,23 +1349,11 @@ async def create_reservation(reservation: ReservationCreate, user_id: str = Depe
         if existing_reservation:
             raise HTTPException(status_code=400, detail="You already have a reservation for this event")
         
-        # Check capacity
-        reservations_count = db.reservations.count_documents({
-            "event_id": reservation.event_id,
-            "status": {"$in": ["confirmed", "checked_in"]}
-        })
-        
-        if reservations_count >= event["capacity"]:
-            raise HTTPException(status_code=400, detail="Event is fully booked")
-        
         # Create reservation
         reservation_id = str(uuid.uuid4())
         
-        # Generate unique check-in code
+        # Check-in code uniqueness is enforced by the unique index on insert
         checkin_code = generate_checkin_code()
-        # Ensure uniqueness by checking database
-        while db.reservations.find_one({"checkin_code": checkin_code}):
-            checkin_code = generate_checkin_code()
         
         # Código QR deshabilitado - se usa solo código de reserva
         # qr_data = f"https://ccb.checkin.app/verify/{reservation_id}"
@@ -1363,7 +1370,9 @@ async def create_reservation(reservation: ReservationCreate, user_id: str = Depe
             "created_at": datetime.utcnow().isoformat()
         }
         
-        db.reservations.insert_one(reservation_doc)
+        # Take a seat atomically (capacity guard) and insert the reservation
+        await reservation_service.book(reservation_doc, generate_checkin_code)
+        checkin_code = reservation_doc["checkin_code"]
         
         # Track event booking
         await analytics.track_user_event(
@@ -1385,7 +1394,7 @@ async def create_reservation(reservation: ReservationCreate, user_id: str = Depe
         )
         
         # Send confirmation email
-        send_reservation_confirmation_email(
+        await send_reservation_confirmation_email(
             user["email"],
             user["name"],
             event["title"],
@@ -1414,12 +1423,12 @@ async def create_reservation(reservation: ReservationCreate, user_id: str = Depe
 @app.get("/api/reservations")
 async def get_user_reservations(user_id: str = Depends(verify_token)):
     try:
-        reservations = list(db.reservations.find({"user_id": user_id}))
+        reservations = await db.reservations.find({"user_id": user_id}).to_list(length=None)
         reservation_list = []
         
         for reservation in reservations:
             # Get event details
-            event = db.events.find_one({"id": reservation["event_id"]})
+            event = await db.events.find_one({"id": reservation["event_id"]})
             if event:
                 # Convert MongoDB ObjectId to string if present
                 if "_id" in event:
@@ -1460,86 +1469,64 @@ async def checkin_user(request: dict):
         if not identifier:
             raise HTTPException(status_code=400, detail="Identifier is required")
         
-        reservation = None
+        entry = None
         
         # Method 1: QR code data - formato URL nuevo
         if identifier.startswith("https://ccb.checkin.app/verify/"):
             reservation_id = identifier.replace("https://ccb.checkin.app/verify/", "")
-            reservation = db.reservations.find_one({"id": reservation_id})
+            entry = await checkin_roster.find_by_reservation(reservation_id)
         
         # Method 1b: QR code data - formato anterior (backward compatibility)
         elif identifier.startswith("reservation:"):
             reservation_id = identifier.replace("reservation:", "")
-            reservation = db.reservations.find_one({"id": reservation_id})
+            entry = await checkin_roster.find_by_reservation(reservation_id)
         
         # Method 2: Check-in code (8-character alphanumeric)
         elif len(identifier) == 8 and identifier.replace("-", "").isalnum():
-            reservation = db.reservations.find_one({"checkin_code": identifier.upper()})
-        
-        # Method 3: Email address
-        elif "@" in identifier:
-            user = db.users.find_one({"email": identifier.lower()})
-            if user:
-                # Find the most recent confirmed reservation for this user
-                reservation = db.reservations.find_one(
-                    {"user_id": user["id"], "status": "confirmed"},
-                    sort=[("created_at", -1)]
-                )
+            entry = await checkin_roster.find_by_code(identifier)
         
-        # Method 4: Phone number
+        # Methods 3 and 4: Email address or phone number, one lookup on the normalized key
         else:
-            # Clean phone number (remove spaces, dashes, etc.)
-            clean_phone = ''.join(filter(str.isdigit, identifier))
-            user = db.users.find_one({
-                "$or": [
-                    {"phone": identifier},
-                    {"phone": clean_phone},
-                    {"phone": f"+1{clean_phone}"},
-                    {"phone": f"+1-{clean_phone[:3]}-{clean_phone[3:6]}-{clean_phone[6:]}"}
-                ]
-            })
+            user = await find_user_by_identifier(db.users, identifier, {"_id": 0, "id": 1})
             if user:
                 # Find the most recent confirmed reservation for this user
-                reservation = db.reservations.find_one(
+                reservation = await db.reservations.find_one(
                     {"user_id": user["id"], "status": "confirmed"},
+                    {"_id": 0, "id": 1},
                     sort=[("created_at", -1)]
                 )
+                if reservation:
+                    entry = await checkin_roster.find_by_reservation(reservation["id"])
         
-        if not reservation:
+        if not entry:
             raise HTTPException(status_code=404, detail="No valid reservation found for this identifier")
         
-        if reservation["status"] == "checked_in":
+        # Answered from the roster; the write is conditional on the reservation still being confirmed
+        result = await checkin_roster.check_in(entry, {"checked_in_at": datetime.utcnow().isoformat()})
+        if result == ALREADY_CHECKED_IN:
             raise HTTPException(status_code=400, detail="Already checked in")
-        
-        if reservation["status"] == "cancelled":
+        if result != CHECKED_IN:
             raise HTTPException(status_code=400, detail="Cannot check in to a cancelled reservation")
         
-        # Get user and event details for email
-        user = db.users.find_one({"id": reservation["user_id"]})
-        event = db.events.find_one({"id": reservation["event_id"]})
+        event = checkin_roster.event(entry["event_id"])
         
-        # Update reservation status
-        db.reservations.update_one(
-            {"id": reservation["id"]},
-            {"$set": {"status": "checked_in", "checked_in_at": datetime.utcnow().isoformat()}}
-        )
-        
-        # Send check-in confirmation email
-        if user and event:
-            send_checkin_confirmation_email(
-                user["email"],
-                user["name"],
-                event["title"]
+        # Queue the check-in confirmation email
+        if entry["user_email"] and event:
+            await send_checkin_confirmation_email(
+                entry["user_email"],
+                entry["user_name"],
+                event["title"],
+                entry["reservation_id"]
             )
         
         # Track check-in analytics
         await analytics.track_user_event(
-            user_id=user["id"],
+            user_id=entry["user_id"],
             event_type="event_checkin",
             metadata={
-                "event_id": event["id"],
-                "event_title": event["title"],
-                "reservation_id": reservation["id"],
+                "event_id": entry["event_id"],
+                "event_title": event.get("title", ""),
+                "reservation_id": entry["reservation_id"],
                 "checkin_method": "qr_code" if identifier.startswith("reservation:") 
                                 else "checkin_code" if len(identifier) == 8 
                                 else "email" if "@" in identifier 
@@ -1549,12 +1536,70 @@ async def checkin_user(request: dict):
         
         return {
             "message": "Successfully checked in",
-            "reservation_id": reservation["id"],
-            "user_name": user["name"],
-            "event_title": event["title"]
+            "reservation_id": entry["reservation_id"],
+            "user_name": entry["user_name"],
+            "event_title": event.get("title", "")
         }
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/checkin/roster/{event_id}")
+async def export_checkin_roster(event_id: str, user_id: str = Depends(verify_token)):
+    """Signed roster of an event for scanners working offline"""
+    try:
+        user_doc = await principal_cache.get(user_id)
+        if not user_doc or not user_doc.get("is_admin"):
+            raise HTTPException(status_code=403, detail="Admin access required")
+        
+        roster = await checkin_roster.export(event_id)
+        if roster is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        return roster
+        
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.error(f"Error exporting check-in roster: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/checkin/batch")
+async def checkin_batch(batch: CheckInBatch, user_id: str = Depends(verify_token)):
+    """
+    Sync scans collected offline
+    
+    Scans are applied in scan-time order with one bulk write; each gets a
+    result: checked_in, already_checked_in, duplicate, cancelled,
+    cancelled_after_scan, not_found or invalid.
+    """
+    try:
+        user_doc = await principal_cache.get(user_id)
+        if not user_doc or not user_doc.get("is_admin"):
+            raise HTTPException(status_code=403, detail="Admin access required")
+        
+        if len(batch.scans) > settings.CHECKIN_BATCH_MAX_SCANS:
+            raise HTTPException(status_code=400, detail=f"At most {settings.CHECKIN_BATCH_MAX_SCANS} scans per batch")
+        
+        results = await checkin_roster.check_in_batch(
+            batch.event_id,
+            [scan.dict() for scan in batch.scans],
+            user_id
+        )
+        if results is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        
+        summary = {}
+        for result in results:
+            summary[result["status"]] = summary.get(result["status"], 0) + 1
+        
+        return {"event_id": batch.event_id, "summary": summary, "results": results}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch check-in: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Mantener el endpoint anterior para compatibilidad
@@ -1562,6 +1607,8 @@ async def checkin_user(request: dict):
 async def checkin_reservation(reservation_id: str):
     try:
         return await checkin_user({"identifier": f"reservation:{reservation_id}"})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1574,7 +1621,7 @@ async def cancel_reservation(reservation_id: str, user_id: str = Depends(verify_
         print(f"🔍 DEBUG: User ID: {user_id}")
         
         # Find reservation
-        reservation = db.reservations.find_one({"id": reservation_id})
+        reservation = await db.reservations.find_one({"id": reservation_id})
         print(f"🔍 DEBUG: Found reservation: {reservation}")
         
         if not reservation:
@@ -1582,7 +1629,7 @@ async def cancel_reservation(reservation_id: str, user_id: str = Depends(verify_
             raise HTTPException(status_code=404, detail="Reservation not found")
         
         # Check if user owns this reservation or is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         print(f"🔍 DEBUG: User doc: {user_doc}")
         
         if reservation["user_id"] != user_id and not user_doc.get("is_admin"):
@@ -1596,21 +1643,18 @@ async def cancel_reservation(reservation_id: str, user_id: str = Depends(verify_
             raise HTTPException(status_code=400, detail="Cannot cancel a reservation that has already been checked in")
         
         # Get user and event details for notifications
-        user = db.users.find_one({"id": reservation["user_id"]})
-        event = db.events.find_one({"id": reservation["event_id"]})
+        user = await db.users.find_one({"id": reservation["user_id"]})
+        event = await db.events.find_one({"id": reservation["event_id"]})
         
         # Update reservation status
         cancellation_time = datetime.utcnow().isoformat()
-        update_result = db.reservations.update_one(
-            {"id": reservation_id},
-            {"$set": {
-                "status": "cancelled",
-                "cancelled_at": cancellation_time,
-                "cancelled_by": user_id
-            }}
+        cancelled = await reservation_service.cancel(
+            reservation_id,
+            {"cancelled_at": cancellation_time, "cancelled_by": user_id},
+            cancellable_statuses=["confirmed"]
         )
         
-        if update_result.modified_count == 0:
+        if not cancelled:
             raise HTTPException(status_code=500, detail="Failed to cancel reservation")
         
         # Track cancellation analytics
@@ -1635,14 +1679,15 @@ async def cancel_reservation(reservation_id: str, user_id: str = Depends(verify_
         
         # Send cancellation notification email to user
         if user and event:
-            send_reservation_cancellation_email(
+            await send_reservation_cancellation_email(
                 user["email"],
                 user["name"],
                 event["title"],
                 event["date"],
                 event["time"],
                 event["location"],
-                cancellation_time
+                cancellation_time,
+                reservation_id
             )
         
         # Send notification to admins if cancelled by user
@@ -1703,13 +1748,13 @@ async def create_admin():
     """Create an admin user for testing purposes"""
     try:
         # Check if admin already exists
-        existing_admin = db.users.find_one({"email": "admin@culturalcenter.com"})
+        existing_admin = await db.users.find_one({"email": "admin@culturalcenter.com"})
         if existing_admin:
             return {"message": "Admin user already exists"}
         
         # Create admin user
         admin_id = str(uuid.uuid4())
-        hashed_password = hash_password("admin123")
+        hashed_password = await hash_password("admin123")
         
         admin_doc = {
             "id": admin_id,
@@ -1723,7 +1768,9 @@ async def create_admin():
             "created_at": datetime.utcnow().isoformat()
         }
         
-        db.users.insert_one(admin_doc)
+        await db.users.insert_one(with_native_dates(with_normalized_identifiers(with_search_fields(admin_doc))))
+        await dashboard_counters.record_users_created([admin_doc])
+        await feature_store.add_users([admin_doc["id"]])
         
         return {"message": "Admin user created successfully", "email": "admin@culturalcenter.com", "password": "admin123"}
         
@@ -1735,7 +1782,7 @@ async def seed_data():
     """Create sample events for testing"""
     try:
         # Check if events already exist
-        existing_events = db.events.count_documents({})
+        existing_events = await db.events.count_documents({})
         if existing_events > 0:
             return {"message": f"Database already has {existing_events} events"}
         
@@ -1804,26 +1851,50 @@ async def seed_data():
         ]
         
         # Insert events
-        db.events.insert_many(sample_events)
+        await db.events.insert_many([with_native_dates(event) for event in sample_events])
         
         return {"message": f"Created {len(sample_events)} sample events"}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/admin/events/reconcile-capacity")
+async def reconcile_event_capacity(user_id: str = Depends(verify_token)):
+    """Rebuild every event's seat counter from its reservations (Admin only)"""
+    user_doc = await principal_cache.get(user_id)
+    if not user_doc or not user_doc.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        corrected = await reservation_service.reconcile_reserved_counts()
+        return {"message": "Seat counters reconciled", "events_corrected": corrected}
+    except Exception as e:
+        logger.error(f"Error reconciling seat counters: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/admin/email-outbox")
+async def get_email_outbox_stats(user_id: str = Depends(verify_token)):
+    """Email outbox queue depth and delivery counters (Admin only)"""
+    user_doc = await principal_cache.get(user_id)
+    if not user_doc or not user_doc.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return await email_outbox.get_stats()
+
 @app.get("/api/admin/stats")
 async def get_admin_stats(user_id: str = Depends(verify_token)):
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
-        # Get statistics
-        total_events = db.events.count_documents({})
-        total_reservations = db.reservations.count_documents({})
-        total_checkins = db.reservations.count_documents({"status": "checked_in"})
-        total_users = db.users.count_documents({"deleted": {"$ne": True}})
+        # Get statistics (collection metadata and the write-time counters)
+        totals = (await dashboard_counters.read())["totals"]
+        total_events = await db.events.estimated_document_count()
+        total_reservations = await db.reservations.estimated_document_count()
+        total_checkins = totals["checkins"]
+        total_users = totals["users"]
         
         return {
             "total_events": total_events,
@@ -1844,14 +1915,20 @@ async def get_all_users(
     location_filter: str = None,
     age_min: int = None,
     age_max: int = None,
-    sort_by: str = "created_at",  # "name", "email", "created_at", "last_activity"
+    sort_by: str = "created_at",  # "name", "email", "created_at", "last_activity", "relevance"
     sort_order: str = "desc",  # "asc", "desc"
     user_id: str = Depends(verify_token)
 ):
-    """Get all users with pagination and search"""
+    """
+    Get all users with pagination and search
+    
+    `search` matches users whose name, email or location words start with
+    every typed word (accents and case ignored). With sort_by="relevance" it
+    becomes a ranked full-word search.
+    """
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
@@ -1862,13 +1939,14 @@ async def get_all_users(
         if status_filter != "deleted" and status_filter != "all":
             query["deleted"] = {"$ne": True}
         
-        # Text search
+        # Text search on the indexed search fields
+        ranked = bool(search) and sort_by == "relevance"
         if search:
-            query["$or"] = [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"email": {"$regex": search, "$options": "i"}},
-                {"location": {"$regex": search, "$options": "i"}}
-            ]
+            search_query = text_search(search) if ranked else search_filter(search)
+            if search_query:
+                query.update(search_query)
+            else:
+                ranked = False
         
         # Status filters
         if status_filter == "admin":
@@ -1878,7 +1956,7 @@ async def get_all_users(
         
         # Location filter
         if location_filter:
-            query["location"] = {"$regex": location_filter, "$options": "i"}
+            query["location"] = {"$regex": escape_regex(location_filter), "$options": "i"}
         
         # Age filters
         if age_min is not None or age_max is not None:
@@ -1893,11 +1971,17 @@ async def get_all_users(
         sort_direction = 1 if sort_order == "asc" else -1
         
         # Get users with pagination and sorting
-        users_cursor = db.users.find(query).sort(sort_by, sort_direction).skip(skip).limit(limit)
-        users = list(users_cursor)
+        if ranked:
+            users_cursor = db.users.find(query, {**HIDDEN_SEARCH_FIELDS, "score": TEXT_SCORE}).sort(RELEVANCE_SORT)
+        else:
+            users_cursor = db.users.find(query, HIDDEN_SEARCH_FIELDS).sort(
+                "created_at" if sort_by == "relevance" else sort_by, sort_direction
+            )
+        users_cursor = users_cursor.skip(skip).limit(limit)
+        users = await users_cursor.to_list(length=None)
         
         # Get total count
-        total_users = db.users.count_documents(query)
+        total_users = await db.users.count_documents(query)
         
         # Enhance user data with statistics
         enhanced_users = []
@@ -1908,8 +1992,8 @@ async def get_all_users(
                 del user["password"]
             
             # Calculate user statistics
-            total_reservations = db.reservations.count_documents({"user_id": user["id"]})
-            attended_events = db.reservations.count_documents({
+            total_reservations = await db.reservations.count_documents({"user_id": user["id"]})
+            attended_events = await db.reservations.count_documents({
                 "user_id": user["id"], 
                 "status": "checked_in"
             })
@@ -1918,7 +2002,7 @@ async def get_all_users(
             attendance_rate = (attended_events / total_reservations * 100) if total_reservations > 0 else 0
             
             # Get last activity (most recent reservation)
-            last_reservation = db.reservations.find_one(
+            last_reservation = await db.reservations.find_one(
                 {"user_id": user["id"]}, 
                 sort=[("created_at", -1)]
             )
@@ -1959,12 +2043,12 @@ async def get_user_profile(target_user_id: str, user_id: str = Depends(verify_to
     """Get detailed profile for a specific user"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
         # Get user
-        target_user = db.users.find_one({"id": target_user_id})
+        target_user = await db.users.find_one({"id": target_user_id}, HIDDEN_SEARCH_FIELDS)
         if not target_user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -1975,7 +2059,7 @@ async def get_user_profile(target_user_id: str, user_id: str = Depends(verify_to
             del target_user["password"]
         
         # Get user's reservations with event details
-        reservations = list(db.reservations.find({"user_id": target_user_id}).sort("created_at", -1))
+        reservations = await db.reservations.find({"user_id": target_user_id}).sort("created_at", -1).to_list(length=None)
         
         enhanced_reservations = []
         for reservation in reservations:
@@ -1983,7 +2067,7 @@ async def get_user_profile(target_user_id: str, user_id: str = Depends(verify_to
                 del reservation["_id"]
             
             # Get event details
-            event = db.events.find_one({"id": reservation["event_id"]})
+            event = await db.events.find_one({"id": reservation["event_id"]})
             if event:
                 if "_id" in event:
                     del event["_id"]
@@ -2037,24 +2121,24 @@ async def get_users_metrics(user_id: str = Depends(verify_token)):
     """Get general metrics about users"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
         # Get basic counts (excluding deleted users)
-        total_users = db.users.count_documents({"deleted": {"$ne": True}})
-        admin_users = db.users.count_documents({"is_admin": True, "deleted": {"$ne": True}})
-        deleted_users = db.users.count_documents({"deleted": True})
+        total_users = await db.users.count_documents({"deleted": {"$ne": True}})
+        admin_users = await db.users.count_documents({"is_admin": True, "deleted": {"$ne": True}})
+        deleted_users = await db.users.count_documents({"deleted": True})
         
         # Get registrations in last 30 days (excluding deleted users)
-        thirty_days_ago = (datetime.utcnow() - timedelta(days=30)).isoformat()
-        recent_registrations = db.users.count_documents({
-            "created_at": {"$gte": thirty_days_ago},
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        recent_registrations = await db.users.count_documents({
+            "created_at_dt": range_filter(thirty_days_ago),
             "deleted": {"$ne": True}
         })
         
         # Get active users (with at least one reservation, excluding deleted users)
-        active_users = len(list(db.users.aggregate([
+        active_users = len(await db.users.aggregate([
             {
                 "$match": {
                     "deleted": {"$ne": True}
@@ -2073,7 +2157,7 @@ async def get_users_metrics(user_id: str = Depends(verify_token)):
                     "reservations": {"$ne": []}
                 }
             }
-        ])))
+        ]).to_list(length=None))
         
         # Age distribution (excluding deleted users)
         age_groups = {
@@ -2083,10 +2167,10 @@ async def get_users_metrics(user_id: str = Depends(verify_token)):
             "51+": 0
         }
         
-        users_with_age = list(db.users.find({
+        users_with_age = await db.users.find({
             "age": {"$exists": True}, 
             "deleted": {"$ne": True}
-        }, {"age": 1}))
+        }, {"age": 1}).to_list(length=None)
         for user in users_with_age:
             age = user.get("age", 0)
             if 18 <= age <= 25:
@@ -2105,7 +2189,7 @@ async def get_users_metrics(user_id: str = Depends(verify_token)):
             {"$sort": {"count": -1}},
             {"$limit": 5}
         ]
-        top_locations = list(db.users.aggregate(location_pipeline))
+        top_locations = await db.users.aggregate(location_pipeline).to_list(length=None)
         location_distribution = {loc["_id"]: loc["count"] for loc in top_locations}
         
         return {
@@ -2128,12 +2212,12 @@ async def update_user(target_user_id: str, user_update: UserUpdate, user_id: str
     """Update a specific user"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
         # Check if target user exists
-        target_user = db.users.find_one({"id": target_user_id})
+        target_user = await db.users.find_one({"id": target_user_id})
         if not target_user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -2143,7 +2227,7 @@ async def update_user(target_user_id: str, user_update: UserUpdate, user_id: str
             update_data["name"] = user_update.name
         if user_update.email is not None:
             # Check if email is already taken by another user
-            existing_email = db.users.find_one({"email": user_update.email, "id": {"$ne": target_user_id}})
+            existing_email = await db.users.find_one({"email": user_update.email, "id": {"$ne": target_user_id}})
             if existing_email:
                 raise HTTPException(status_code=400, detail="Email already exists")
             update_data["email"] = user_update.email
@@ -2165,16 +2249,22 @@ async def update_user(target_user_id: str, user_update: UserUpdate, user_id: str
         update_data["updated_at"] = datetime.utcnow().isoformat()
         
         # Update user
-        result = db.users.update_one(
+        result = await db.users.update_one(
             {"id": target_user_id},
-            {"$set": update_data}
+            {"$set": with_normalized_identifiers(with_search_fields(dict(update_data), target_user))}
         )
         
         if result.modified_count == 0:
             raise HTTPException(status_code=400, detail="No changes made")
         
+        # A role change invalidates the user's tokens; other edits only the cached profile
+        if "is_admin" in update_data:
+            await principal_cache.revoke([target_user_id])
+        else:
+            await principal_cache.invalidate(target_user_id)
+        
         # Get updated user
-        updated_user = db.users.find_one({"id": target_user_id})
+        updated_user = await db.users.find_one({"id": target_user_id}, HIDDEN_SEARCH_FIELDS)
         if "_id" in updated_user:
             del updated_user["_id"]
         if "password" in updated_user:
@@ -2206,12 +2296,12 @@ async def delete_user(target_user_id: str, user_id: str = Depends(verify_token))
     """Delete a specific user"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
         # Check if target user exists
-        target_user = db.users.find_one({"id": target_user_id})
+        target_user = await db.users.find_one({"id": target_user_id})
         if not target_user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -2220,13 +2310,13 @@ async def delete_user(target_user_id: str, user_id: str = Depends(verify_token))
             raise HTTPException(status_code=400, detail="Cannot delete your own account")
         
         # Check if user has reservations
-        user_reservations = db.reservations.count_documents({"user_id": target_user_id})
+        user_reservations = await db.reservations.count_documents({"user_id": target_user_id})
         if user_reservations > 0:
             # Option 1: Soft delete (mark as deleted but keep data)
             # Option 2: Hard delete with cascade (remove user and reservations)
             # For now, we'll do soft delete
             
-            result = db.users.update_one(
+            result = await db.users.update_one(
                 {"id": target_user_id},
                 {"$set": {
                     "deleted": True,
@@ -2238,12 +2328,16 @@ async def delete_user(target_user_id: str, user_id: str = Depends(verify_token))
             message = f"User marked as deleted (had {user_reservations} reservations)"
         else:
             # Hard delete if no reservations
-            result = db.users.delete_one({"id": target_user_id})
+            result = await db.users.delete_one({"id": target_user_id})
             message = "User deleted permanently"
         
         if result.modified_count == 0 and result.deleted_count == 0:
             raise HTTPException(status_code=400, detail="Failed to delete user")
-        
+
+        if not target_user.get("deleted"):
+            await dashboard_counters.record_users_removed([target_user])
+        await principal_cache.revoke([target_user_id])
+
         # Track analytics
         try:
             await analytics.track_user_event(
@@ -2271,7 +2365,7 @@ async def bulk_user_action(action_data: BulkUserAction, user_id: str = Depends(v
     """Perform bulk actions on multiple users"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
@@ -2292,43 +2386,47 @@ async def bulk_user_action(action_data: BulkUserAction, user_id: str = Depends(v
             # Soft delete users with reservations, hard delete others
             for target_user_id in action_data.user_ids:
                 try:
-                    user_reservations = db.reservations.count_documents({"user_id": target_user_id})
+                    user_reservations = await db.reservations.count_documents({"user_id": target_user_id})
                     if user_reservations > 0:
                         # Soft delete
-                        result = db.users.update_one(
+                        removed = await db.users.find_one_and_update(
                             {"id": target_user_id, "deleted": {"$ne": True}},
                             {"$set": {
                                 "deleted": True,
                                 "deleted_at": datetime.utcnow().isoformat(),
                                 "deleted_by": user_id
-                            }}
+                            }},
+                            projection={"_id": 0, "created_at": 1, "deleted": 1}
                         )
-                        if result.modified_count > 0:
-                            affected_count += 1
                     else:
                         # Hard delete
-                        result = db.users.delete_one({"id": target_user_id})
-                        if result.deleted_count > 0:
-                            affected_count += 1
+                        removed = await db.users.find_one_and_delete(
+                            {"id": target_user_id},
+                            projection={"_id": 0, "created_at": 1, "deleted": 1}
+                        )
+                    if removed:
+                        affected_count += 1
+                        if not removed.get("deleted"):
+                            await dashboard_counters.record_users_removed([removed])
                 except Exception as e:
                     errors.append(f"User {target_user_id}: {str(e)}")
         
         elif action_data.action == "make_admin":
-            result = db.users.update_many(
+            result = await db.users.update_many(
                 {"id": {"$in": action_data.user_ids}},
                 {"$set": {"is_admin": True, "updated_at": datetime.utcnow().isoformat()}}
             )
             affected_count = result.modified_count
         
         elif action_data.action == "remove_admin":
-            result = db.users.update_many(
+            result = await db.users.update_many(
                 {"id": {"$in": action_data.user_ids}},
                 {"$set": {"is_admin": False, "updated_at": datetime.utcnow().isoformat()}}
             )
             affected_count = result.modified_count
         
         elif action_data.action == "activate":
-            result = db.users.update_many(
+            result = await db.users.update_many(
                 {"id": {"$in": action_data.user_ids}},
                 {"$unset": {"deleted": "", "deleted_at": "", "deleted_by": ""}, 
                  "$set": {"updated_at": datetime.utcnow().isoformat()}}
@@ -2338,6 +2436,12 @@ async def bulk_user_action(action_data: BulkUserAction, user_id: str = Depends(v
         else:
             raise HTTPException(status_code=400, detail="Invalid action")
         
+        # Deletions and role changes invalidate the affected users' tokens
+        if action_data.action == "activate":
+            await principal_cache.invalidate(*action_data.user_ids)
+        else:
+            await principal_cache.revoke(action_data.user_ids)
+        
         # Track analytics
         try:
             await analytics.track_user_event(
@@ -2375,7 +2479,7 @@ async def bulk_import_users(
     """Import multiple users from CSV/Excel file"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
@@ -2383,172 +2487,36 @@ async def bulk_import_users(
         if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
             raise HTTPException(status_code=400, detail="Only CSV and Excel files are supported")
         
-        # Read file content
+        # Read file content; parsing, hashing and inserts happen in the job
         content = await file.read()
         
-        # Parse file based on type
-        users_data = []
-        if file.filename.endswith('.csv'):
-            # Parse CSV
-            content_str = content.decode('utf-8')
-            csv_file = io.StringIO(content_str)
-            reader = csv.DictReader(csv_file)
-            users_data = list(reader)
-        else:
-            # Parse Excel
-            df = pd.read_excel(io.BytesIO(content))
-            users_data = df.to_dict('records')
-        
-        # Initialize result tracking
-        result = {
-            "total_processed": len(users_data),
-            "successful_imports": 0,
-            "failed_imports": 0,
-            "duplicate_emails": 0,
-            "errors": [],
-            "imported_users": []
-        }
-        
-        # Required columns mapping (flexible column names)
-        column_mapping = {
-            'name': ['name', 'nombre', 'full_name', 'fullname', 'full name'],
-            'email': ['email', 'correo', 'mail', 'e-mail'],
-            'phone': ['phone', 'telefono', 'tel', 'telephone', 'cellphone', 'celular'],
-            'age': ['age', 'edad', 'years', 'años'],
-            'location': ['location', 'ubicacion', 'city', 'ciudad', 'address', 'direccion']
-        }
-        
-        def find_column(data_row, possible_names):
-            """Find the actual column name from possible variations"""
-            for key in data_row.keys():
-                if key.lower().strip() in possible_names:
-                    return key
-            return None
-        
-        # Process each user
-        for idx, row in enumerate(users_data, 1):
-            try:
-                # Map columns to standard names
-                mapped_user = {}
-                missing_fields = []
-                
-                for field, possible_names in column_mapping.items():
-                    column_name = find_column(row, possible_names)
-                    if column_name and row[column_name] and str(row[column_name]).strip():
-                        mapped_user[field] = str(row[column_name]).strip()
-                    else:
-                        missing_fields.append(field)
-                
-                # Check for required fields
-                if missing_fields:
-                    result["errors"].append({
-                        "row": idx,
-                        "error": f"Missing required fields: {', '.join(missing_fields)}",
-                        "data": dict(row)
-                    })
-                    result["failed_imports"] += 1
-                    continue
-                
-                # Validate email format
-                try:
-                    # Allow example.com for testing purposes
-                    validate_email(mapped_user['email'], check_deliverability=False)
-                except EmailNotValidError:
-                    result["errors"].append({
-                        "row": idx,
-                        "error": "Invalid email format",
-                        "data": dict(row)
-                    })
-                    result["failed_imports"] += 1
-                    continue
-                
-                # Check if email already exists
-                existing_user = db.users.find_one({"email": mapped_user['email']})
-                if existing_user:
-                    result["duplicate_emails"] += 1
-                    result["errors"].append({
-                        "row": idx,
-                        "error": "Email already exists",
-                        "data": dict(row)
-                    })
-                    continue
-                
-                # Validate age
-                try:
-                    age = int(float(mapped_user['age']))
-                    if age < 1 or age > 120:
-                        raise ValueError("Age out of range")
-                    mapped_user['age'] = age
-                except ValueError:
-                    result["errors"].append({
-                        "row": idx,
-                        "error": "Invalid age (must be a number between 1-120)",
-                        "data": dict(row)
-                    })
-                    result["failed_imports"] += 1
-                    continue
-                
-                # Create user document
-                user_id_new = str(uuid.uuid4())
-                hashed_password = hash_password(default_password)
-                
-                user_doc = {
-                    "id": user_id_new,
-                    "name": mapped_user['name'],
-                    "email": mapped_user['email'],
-                    "password": hashed_password,
-                    "phone": mapped_user['phone'],
-                    "age": mapped_user['age'],
-                    "location": mapped_user['location'],
-                    "is_admin": False,
-                    "created_at": datetime.utcnow().isoformat(),
-                    "imported": True,
-                    "import_date": datetime.utcnow().isoformat()
-                }
-                
-                # Insert user
-                db.users.insert_one(user_doc)
-                
-                # Add to successful imports
-                result["successful_imports"] += 1
-                result["imported_users"].append({
-                    "name": mapped_user['name'],
-                    "email": mapped_user['email'],
-                    "phone": mapped_user['phone'],
-                    "age": mapped_user['age'],
-                    "location": mapped_user['location']
-                })
-                
-                # Send welcome email (optional)
-                try:
-                    send_welcome_email(mapped_user['email'], mapped_user['name'])
-                except Exception as email_error:
-                    logger.warning(f"Failed to send welcome email to {mapped_user['email']}: {email_error}")
-                
-            except Exception as row_error:
-                result["errors"].append({
-                    "row": idx,
-                    "error": str(row_error),
-                    "data": dict(row)
-                })
-                result["failed_imports"] += 1
-        
-        # Track analytics event
-        try:
+        async def track_import(job: dict):
             await analytics.track_user_event(
                 user_id=user_id,
                 event_type="bulk_import_users",
                 metadata={
-                    "total_processed": result["total_processed"],
-                    "successful_imports": result["successful_imports"],
-                    "failed_imports": result["failed_imports"],
-                    "duplicate_emails": result["duplicate_emails"]
+                    "total_processed": job["total_processed"],
+                    "successful_imports": job["successful_imports"],
+                    "failed_imports": job["failed_imports"],
+                    "duplicate_emails": job["duplicate_emails"]
                 }
             )
-        except Exception as analytics_error:
-            logger.warning(f"Failed to track analytics: {analytics_error}")
         
-        return result
+        job = await user_import_service.start_import(
+            content,
+            file.filename,
+            default_password,
+            requested_by=user_id,
+            send_welcome=send_welcome_email,
+            on_complete=track_import
+        )
+        
+        return JSONResponse(status_code=202, content={
+            "message": "Import started",
+            "job_id": job["id"],
+            "status": job["status"],
+            "status_url": f"/api/admin/users/bulk-import/{job['id']}"
+        })
         
     except HTTPException:
         raise
@@ -2557,6 +2525,19 @@ async def bulk_import_users(
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
 
 
+@app.get("/api/admin/users/bulk-import/{job_id}")
+async def get_bulk_import_status(job_id: str, user_id: str = Depends(verify_token)):
+    """Progress and results of a bulk user import job"""
+    user_doc = await principal_cache.get(user_id)
+    if not user_doc or not user_doc.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    job = await user_import_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
 # ===== ANALYTICS ENDPOINTS =====
 
 @app.websocket("/ws/dashboard")
@@ -2567,9 +2548,13 @@ async def dashboard_websocket(websocket: WebSocket):
         while True:
             # Keep connection alive and handle messages
             data = await websocket.receive_text()
-            # Echo back for ping/pong
-            await websocket.send_text(f"pong: {data}")
-    except WebSocketDisconnect:
+            dashboard_manager.touch(websocket)
+            # Echo client pings; replies to server pings need no answer
+            if data.strip().lower() != "pong":
+                dashboard_manager.send(websocket, f"pong: {data}")
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
         await dashboard_manager.disconnect(websocket)
 
 @app.get("/api/analytics/metrics")
@@ -2577,22 +2562,54 @@ async def get_live_metrics(user_id: str = Depends(verify_token)):
     """Get current live metrics"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
-        metrics = await analytics.get_live_metrics()
-        return metrics
+        # Shared dashboard snapshot, with the flat response-time keys kept for compatibility
+        metrics = await dashboard_manager.get_metrics()
+        performance = metrics.get("performance", {})
+        return {
+            **metrics,
+            **{key: value for key, value in performance.items() if key.endswith("_avg_response")}
+        }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/analytics/ingestion")
+async def get_analytics_ingestion_stats(user_id: str = Depends(verify_token)):
+    """Analytics buffer occupancy, flush and drop counters"""
+    user_doc = await principal_cache.get(user_id)
+    if not user_doc or not user_doc.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return analytics.buffer.get_stats()
+
+@app.get("/api/analytics/dashboard/connections")
+async def get_dashboard_connection_stats(user_id: str = Depends(verify_token)):
+    """Dashboard WebSocket connection count, queue depths and drop counters"""
+    user_doc = await principal_cache.get(user_id)
+    if not user_doc or not user_doc.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return dashboard_manager.get_connection_stats()
+
+@app.get("/api/admin/password-hashing")
+async def get_password_hashing_stats(user_id: str = Depends(verify_token)):
+    """bcrypt pool size, load and queue-time counters"""
+    user_doc = await principal_cache.get(user_id)
+    if not user_doc or not user_doc.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return password_hasher.stats()
+
 @app.get("/api/analytics/user-behavior/{target_user_id}")
 async def get_user_behavior(target_user_id: str, user_id: str = Depends(verify_token)):
     """Get behavior data for a specific user"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
@@ -2607,7 +2624,7 @@ async def segment_user(target_user_id: str, user_id: str = Depends(verify_token)
     """Segment a specific user using ML"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
@@ -2622,7 +2639,7 @@ async def get_segment_analytics(user_id: str = Depends(verify_token)):
     """Get analytics for all user segments"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
@@ -2637,7 +2654,7 @@ async def train_segmentation_model(user_id: str = Depends(verify_token)):
     """Train the user segmentation model"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
@@ -2647,12 +2664,68 @@ async def train_segmentation_model(user_id: str = Depends(verify_token)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/analytics/segmentation/models")
+async def list_segmentation_models(user_id: str = Depends(verify_token)):
+    """List stored segmentation model versions and the one in use"""
+    try:
+        # Check if user is admin
+        user_doc = await principal_cache.get(user_id)
+        if not user_doc or not user_doc.get("is_admin"):
+            raise HTTPException(status_code=403, detail="Admin access required")
+            
+        return {
+            "active_version": user_segmentation.model_metadata.get("version"),
+            "versions": await user_segmentation.registry.list_versions() if user_segmentation.registry else []
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/analytics/score-segments")
+async def score_segments(user_id: str = Depends(verify_token)):
+    """Reassign stored segments for all users with the trained model"""
+    try:
+        # Check if user is admin
+        user_doc = await principal_cache.get(user_id)
+        if not user_doc or not user_doc.get("is_admin"):
+            raise HTTPException(status_code=403, detail="Admin access required")
+        
+        if not user_segmentation.is_trained:
+            raise HTTPException(status_code=409, detail="Segmentation model is not trained")
+            
+        scored = await user_segmentation.score_users()
+        return {"scored_users": scored}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/analytics/feature-store/rebuild")
+async def rebuild_feature_store(user_id: str = Depends(verify_token)):
+    """Recompute per-user feature counters for the feature window"""
+    try:
+        # Check if user is admin
+        user_doc = await principal_cache.get(user_id)
+        if not user_doc or not user_doc.get("is_admin"):
+            raise HTTPException(status_code=403, detail="Admin access required")
+            
+        rebuilt = await feature_store.rebuild()
+        return {"rebuilt_users": rebuilt}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/analytics/historical/{metric_name}")
 async def get_historical_data(metric_name: str, hours: int = 24, user_id: str = Depends(verify_token)):
     """Get historical data for a specific metric"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
@@ -2699,7 +2772,7 @@ async def get_all_reservations(
     """Get all reservations with admin privileges and filtering"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
@@ -2713,25 +2786,23 @@ async def get_all_reservations(
             filter_query["event_id"] = event_filter
             
         if date_from or date_to:
-            date_filter = {}
-            if date_from:
-                date_filter["$gte"] = date_from
-            if date_to:
-                date_filter["$lte"] = date_to
-            filter_query["created_at"] = date_filter
+            try:
+                filter_query["created_at_dt"] = days_filter(date_from, date_to)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
         
         # Get reservations with filters
         sort_direction = -1 if sort_order == "desc" else 1
         reservations_cursor = db.reservations.find(filter_query).sort(sort_by, sort_direction).skip(skip).limit(limit)
-        reservations = list(reservations_cursor)
+        reservations = await reservations_cursor.to_list(length=None)
         
         # Get user and event details for each reservation
         enriched_reservations = []
         for reservation in reservations:
             # Get user details
-            user = db.users.find_one({"id": reservation["user_id"]})
+            user = await db.users.find_one({"id": reservation["user_id"]})
             # Get event details  
-            event = db.events.find_one({"id": reservation["event_id"]})
+            event = await db.events.find_one({"id": reservation["event_id"]})
             
             # Filter by user search if provided
             if user_search and user:
@@ -2771,7 +2842,7 @@ async def get_all_reservations(
             enriched_reservations.append(enriched_reservation)
         
         # Get total count for pagination
-        total_count = db.reservations.count_documents(filter_query)
+        total_count = await db.reservations.count_documents(filter_query)
         
         return {
             "reservations": enriched_reservations,
@@ -2791,26 +2862,25 @@ async def get_reservations_metrics(user_id: str = Depends(verify_token)):
     """Get comprehensive metrics for reservations"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
         # Basic counts
-        total_reservations = db.reservations.count_documents({})
-        confirmed_reservations = db.reservations.count_documents({"status": "confirmed"})
-        checked_in_reservations = db.reservations.count_documents({"status": "checked_in"})
-        cancelled_reservations = db.reservations.count_documents({"status": "cancelled"})
+        total_reservations = await db.reservations.count_documents({})
+        confirmed_reservations = await db.reservations.count_documents({"status": "confirmed"})
+        checked_in_reservations = await db.reservations.count_documents({"status": "checked_in"})
+        cancelled_reservations = await db.reservations.count_documents({"status": "cancelled"})
         
         # Today's reservations
-        today = datetime.utcnow().date().isoformat()
-        today_reservations = db.reservations.count_documents({
-            "created_at": {"$regex": f"^{today}"}
+        today_start, tomorrow = day_range(datetime.utcnow())
+        today_reservations = await db.reservations.count_documents({
+            "created_at_dt": range_filter(today_start, tomorrow)
         })
         
         # This week's reservations
-        week_ago = (datetime.utcnow() - timedelta(days=7)).date().isoformat()
-        week_reservations = db.reservations.count_documents({
-            "created_at": {"$gte": week_ago}
+        week_reservations = await db.reservations.count_documents({
+            "created_at_dt": range_filter(today_start - timedelta(days=7))
         })
         
         # Reservations by event
@@ -2820,12 +2890,12 @@ async def get_reservations_metrics(user_id: str = Depends(verify_token)):
             {"$limit": 5}
         ]
         top_events_cursor = db.reservations.aggregate(pipeline)
-        top_events_data = list(top_events_cursor)
+        top_events_data = await top_events_cursor.to_list(length=None)
         
         # Enrich with event details
         top_events = []
         for event_data in top_events_data:
-            event = db.events.find_one({"id": event_data["_id"]})
+            event = await db.events.find_one({"id": event_data["_id"]})
             if event:
                 top_events.append({
                     "event_title": event["title"],
@@ -2856,12 +2926,12 @@ async def admin_checkin_reservation(reservation_id: str, user_id: str = Depends(
     """Manually check in a reservation as admin"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
         # Find reservation
-        reservation = db.reservations.find_one({"id": reservation_id})
+        reservation = await db.reservations.find_one({"id": reservation_id})
         if not reservation:
             raise HTTPException(status_code=404, detail="Reservation not found")
         
@@ -2872,14 +2942,12 @@ async def admin_checkin_reservation(reservation_id: str, user_id: str = Depends(
             raise HTTPException(status_code=400, detail="Cannot check in cancelled reservation")
         
         # Update reservation status
-        db.reservations.update_one(
-            {"id": reservation_id},
-            {"$set": {
-                "status": "checked_in", 
-                "checked_in_at": datetime.utcnow().isoformat(),
-                "checked_in_by": "admin"
-            }}
+        checked_in = await reservation_service.check_in(
+            reservation_id,
+            {"checked_in_at": datetime.utcnow().isoformat(), "checked_in_by": "admin"}
         )
+        if not checked_in:
+            raise HTTPException(status_code=400, detail="Already checked in")
         
         # Track analytics
         try:
@@ -2902,7 +2970,7 @@ async def admin_checkin_reservation(reservation_id: str, user_id: str = Depends(
         logger.error(f"Error in admin checkin: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def send_admin_cancellation_email(user_email: str, user_name: str, event_title: str, event_date: str, event_time: str):
+async def send_admin_cancellation_email(user_email: str, user_name: str, event_title: str, event_date: str, event_time: str, reservation_id: str = None):
     """Send email notification when admin cancels a reservation"""
     try:
         subject = f"Reserva Cancelada - {event_title}"
@@ -2957,7 +3025,7 @@ def send_admin_cancellation_email(user_email: str, user_name: str, event_title:
         Cultural Center Visitor Management Platform
         """
         
-        send_email(user_email, subject, html_content, plain_content)
+        await send_email(user_email, subject, html_content, plain_content, dedupe_key=f"cancellation:{reservation_id}" if reservation_id else None)
         
     except Exception as e:
         logger.error(f"Error sending admin cancellation email: {e}")
@@ -2967,12 +3035,12 @@ async def admin_cancel_reservation(reservation_id: str, user_id: str = Depends(v
     """Cancel a reservation as admin"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
         # Find reservation
-        reservation = db.reservations.find_one({"id": reservation_id})
+        reservation = await db.reservations.find_one({"id": reservation_id})
         if not reservation:
             raise HTTPException(status_code=404, detail="Reservation not found")
         
@@ -2980,27 +3048,26 @@ async def admin_cancel_reservation(reservation_id: str, user_id: str = Depends(v
             raise HTTPException(status_code=400, detail="Reservation already cancelled")
         
         # Get user and event details for notification
-        user = db.users.find_one({"id": reservation["user_id"]})
-        event = db.events.find_one({"id": reservation["event_id"]})
+        user = await db.users.find_one({"id": reservation["user_id"]})
+        event = await db.events.find_one({"id": reservation["event_id"]})
         
-        # Update reservation status
-        db.reservations.update_one(
-            {"id": reservation_id},
-            {"$set": {
-                "status": "cancelled",
-                "cancelled_at": datetime.utcnow().isoformat(),
-                "cancelled_by": "admin"
-            }}
+        # Update reservation status and release the seat
+        cancelled = await reservation_service.cancel(
+            reservation_id,
+            {"cancelled_at": datetime.utcnow().isoformat(), "cancelled_by": "admin"}
         )
+        if not cancelled:
+            raise HTTPException(status_code=400, detail="Reservation already cancelled")
         
         # Send cancellation notification email
         if user and event:
-            send_admin_cancellation_email(
+            await send_admin_cancellation_email(
                 user["email"],
                 user["name"],
                 event["title"],
                 event["date"],
-                event["time"]
+                event["time"],
+                reservation_id
             )
         
         # Track analytics
@@ -3029,7 +3096,7 @@ async def bulk_reservations_action(request: dict, user_id: str = Depends(verify_
     """Perform bulk actions on multiple reservations"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
@@ -3042,28 +3109,20 @@ async def bulk_reservations_action(request: dict, user_id: str = Depends(verify_
         result = {"updated": 0, "message": ""}
         
         if action == "cancel":
-            update_result = db.reservations.update_many(
-                {"id": {"$in": reservation_ids}, "status": {"$ne": "cancelled"}},
-                {"$set": {
-                    "status": "cancelled",
-                    "cancelled_at": datetime.utcnow().isoformat(),
-                    "cancelled_by": "admin"
-                }}
+            cancelled_count = await reservation_service.cancel_many(
+                reservation_ids,
+                {"cancelled_at": datetime.utcnow().isoformat(), "cancelled_by": "admin"}
             )
-            result["updated"] = update_result.modified_count
-            result["message"] = f"{update_result.modified_count} reservas canceladas"
+            result["updated"] = cancelled_count
+            result["message"] = f"{cancelled_count} reservas canceladas"
             
         elif action == "checkin":
-            update_result = db.reservations.update_many(
-                {"id": {"$in": reservation_ids}, "status": "confirmed"},
-                {"$set": {
-                    "status": "checked_in",
-                    "checked_in_at": datetime.utcnow().isoformat(),
-                    "checked_in_by": "admin"
-                }}
+            checked_in_count = await reservation_service.check_in_many(
+                reservation_ids,
+                {"checked_in_at": datetime.utcnow().isoformat(), "checked_in_by": "admin"}
             )
-            result["updated"] = update_result.modified_count
-            result["message"] = f"{update_result.modified_count} reservas registradas"
+            result["updated"] = checked_in_count
+            result["message"] = f"{checked_in_count} reservas registradas"
             
         # Track analytics
         try:
@@ -3094,12 +3153,13 @@ async def export_reservations(
     event_filter: str = None,
     date_from: str = None,
     date_to: str = None,
+    compress: bool = False,
     user_id: str = Depends(verify_token)
 ):
-    """Export reservations data"""
+    """Export reservations data as CSV, NDJSON or JSON, optionally gzip-compressed"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
@@ -3113,70 +3173,27 @@ async def export_reservations(
             filter_query["event_id"] = event_filter
             
         if date_from or date_to:
-            date_filter = {}
-            if date_from:
-                date_filter["$gte"] = date_from
-            if date_to:
-                date_filter["$lte"] = date_to
-            filter_query["created_at"] = date_filter
-        
-        # Get all reservations (no pagination for export)
-        reservations = list(db.reservations.find(filter_query))
-        
-        # Enrich with user and event data
-        export_data = []
-        for reservation in reservations:
-            user = db.users.find_one({"id": reservation["user_id"]})
-            event = db.events.find_one({"id": reservation["event_id"]})
-            
-            export_item = {
-                "reservation_id": reservation["id"],
-                "checkin_code": reservation.get("checkin_code", ""),
-                "status": reservation["status"],
-                "created_at": reservation["created_at"],
-                "checked_in_at": reservation.get("checked_in_at", ""),
-                "cancelled_at": reservation.get("cancelled_at", ""),
-                "checked_in_by": reservation.get("checked_in_by", ""),
-                "cancelled_by": reservation.get("cancelled_by", ""),
-                "user_name": user["name"] if user else "Usuario eliminado",
-                "user_email": user["email"] if user else "N/A",
-                "user_phone": user.get("phone", "") if user else "N/A",
-                "user_age": user.get("age", "") if user else "N/A",
-                "user_location": user.get("location", "") if user else "N/A",
-                "event_title": event["title"] if event else "Evento eliminado",
-                "event_date": event["date"] if event else "N/A",
-                "event_time": event["time"] if event else "N/A",
-                "event_location": event["location"] if event else "N/A",
-                "event_category": event["category"] if event else "N/A",
-                "event_capacity": event["capacity"] if event else "N/A"
-            }
-            export_data.append(export_item)
-        
-        if format.lower() == "csv":
-            import csv
-            import io
-            
-            output = io.StringIO()
-            if export_data:
-                writer = csv.DictWriter(output, fieldnames=export_data[0].keys())
-                writer.writeheader()
-                writer.writerows(export_data)
-            
-            content = output.getvalue()
-            output.close()
-            
-            return Response(
-                content=content,
-                media_type="text/csv",
-                headers={"Content-Disposition": "attachment; filename=reservations_export.csv"}
-            )
-        else:
-            # JSON format
-            from fastapi.responses import JSONResponse
-            return JSONResponse(
-                content=export_data,
-                headers={"Content-Disposition": "attachment; filename=reservations_export.json"}
-            )
+            try:
+                filter_query["created_at_dt"] = days_filter(date_from, date_to)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+        
+        export_format = format.lower()
+        if export_format not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}")
+        
+        # Rows are joined and encoded while the cursor is read
+        filename = f"reservations_export.{export_format}"
+        media_type = EXPORT_FORMATS[export_format]
+        if compress:
+            filename += ".gz"
+            media_type = "application/gzip"
+        
+        return StreamingResponse(
+            stream_reservations_export(filter_query, export_format, compress),
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
             
     except HTTPException:
         raise
@@ -3189,96 +3206,15 @@ async def get_event_attendance_report(event_id: str, user_id: str = Depends(veri
     """Generate detailed attendance report for a specific event"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
-        # Get event details
-        event = db.events.find_one({"id": event_id})
+        event = await report_data.get_event(event_id)
         if not event:
             raise HTTPException(status_code=404, detail="Event not found")
-            
-        # Get all reservations for this event
-        reservations = list(db.reservations.find({"event_id": event_id}))
-        
-        # Build detailed attendance data
-        attendance_data = []
-        for reservation in reservations:
-            user = db.users.find_one({"id": reservation["user_id"]})
-            if user:
-                attendance_data.append({
-                    "user_name": user["name"],
-                    "user_email": user["email"],
-                    "user_phone": user.get("phone", ""),
-                    "user_age": user.get("age", ""),
-                    "user_location": user.get("location", ""),
-                    "reservation_id": reservation["id"],
-                    "checkin_code": reservation.get("checkin_code", ""),
-                    "status": reservation["status"],
-                    "reserved_at": reservation["created_at"],
-                    "checked_in_at": reservation.get("checked_in_at"),
-                    "cancelled_at": reservation.get("cancelled_at"),
-                    "attended": reservation["status"] == "checked_in"
-                })
         
-        # Calculate metrics
-        total_reservations = len(attendance_data)
-        total_attended = len([a for a in attendance_data if a["attended"]])
-        total_confirmed = len([a for a in attendance_data if a["status"] == "confirmed"])
-        total_cancelled = len([a for a in attendance_data if a["status"] == "cancelled"])
-        attendance_rate = (total_attended / total_reservations * 100) if total_reservations > 0 else 0
-        
-        # Demographic breakdown for attendees
-        attendees = [a for a in attendance_data if a["attended"]]
-        age_groups = {}
-        locations = {}
-        
-        for attendee in attendees:
-            # Age groups
-            if attendee["user_age"]:
-                age = int(attendee["user_age"])
-                if age < 18:
-                    age_group = "Menor de 18"
-                elif age < 30:
-                    age_group = "18-29"
-                elif age < 45:
-                    age_group = "30-44"
-                elif age < 60:
-                    age_group = "45-59"
-                else:
-                    age_group = "60+"
-                age_groups[age_group] = age_groups.get(age_group, 0) + 1
-            
-            # Locations
-            if attendee["user_location"]:
-                location = attendee["user_location"]
-                locations[location] = locations.get(location, 0) + 1
-        
-        return {
-            "event": {
-                "id": event["id"],
-                "title": event["title"],
-                "date": event["date"],
-                "time": event["time"],
-                "location": event["location"],
-                "capacity": event["capacity"],
-                "category": event["category"]
-            },
-            "summary": {
-                "total_reservations": total_reservations,
-                "total_attended": total_attended,
-                "total_confirmed": total_confirmed,
-                "total_cancelled": total_cancelled,
-                "attendance_rate": round(attendance_rate, 1),
-                "capacity_utilization": round((total_reservations / event["capacity"]) * 100, 1)
-            },
-            "demographics": {
-                "age_groups": age_groups,
-                "locations": locations
-            },
-            "attendance_list": attendance_data,
-            "generated_at": datetime.utcnow().isoformat()
-        }
+        return await report_data.event_attendance_report(event)
         
     except HTTPException:
         raise
@@ -3296,77 +3232,11 @@ async def get_attendance_summary_report(
     """Generate summary attendance report across multiple events"""
     try:
         # Check if user is admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
             
-        # Build event filter
-        event_filter = {}
-        if date_from:
-            event_filter["date"] = {"$gte": date_from}
-        if date_to:
-            if "date" in event_filter:
-                event_filter["date"]["$lte"] = date_to
-            else:
-                event_filter["date"] = {"$lte": date_to}
-        if category:
-            event_filter["category"] = category
-            
-        # Get filtered events
-        events = list(db.events.find(event_filter))
-        
-        summary_data = []
-        total_capacity = 0
-        total_reservations = 0
-        total_attended = 0
-        
-        for event in events:
-            # Get reservations for this event
-            event_reservations = list(db.reservations.find({"event_id": event["id"]}))
-            event_attended = len([r for r in event_reservations if r["status"] == "checked_in"])
-            event_cancelled = len([r for r in event_reservations if r["status"] == "cancelled"])
-            
-            attendance_rate = (event_attended / len(event_reservations) * 100) if event_reservations else 0
-            capacity_utilization = (len(event_reservations) / event["capacity"] * 100)
-            
-            summary_data.append({
-                "event_id": event["id"],
-                "event_title": event["title"],
-                "event_date": event["date"],
-                "event_time": event["time"],
-                "event_category": event["category"],
-                "capacity": event["capacity"],
-                "total_reservations": len(event_reservations),
-                "total_attended": event_attended,
-                "total_cancelled": event_cancelled,
-                "attendance_rate": round(attendance_rate, 1),
-                "capacity_utilization": round(capacity_utilization, 1)
-            })
-            
-            total_capacity += event["capacity"]
-            total_reservations += len(event_reservations)
-            total_attended += event_attended
-        
-        overall_attendance_rate = (total_attended / total_reservations * 100) if total_reservations > 0 else 0
-        overall_capacity_utilization = (total_reservations / total_capacity * 100) if total_capacity > 0 else 0
-        
-        return {
-            "summary": {
-                "total_events": len(events),
-                "total_capacity": total_capacity,
-                "total_reservations": total_reservations,
-                "total_attended": total_attended,
-                "overall_attendance_rate": round(overall_attendance_rate, 1),
-                "overall_capacity_utilization": round(overall_capacity_utilization, 1)
-            },
-            "events": summary_data,
-            "filters_applied": {
-                "date_from": date_from,
-                "date_to": date_to,
-                "category": category
-            },
-            "generated_at": datetime.utcnow().isoformat()
-        }
+        return await report_data.attendance_summary_report(date_from, date_to, category)
         
     except HTTPException:
         raise
@@ -3381,128 +3251,21 @@ async def generate_professional_event_report(event_id: str, user_id: str = Depen
     """Generar reporte profesional PDF para un evento específico"""
     try:
         # Verificar permisos de admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
-        # Obtener datos del evento
-        event = db.events.find_one({"id": event_id})
-        if not event:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
-        # Obtener todas las reservas del evento
-        reservations = list(db.reservations.find({"event_id": event_id}))
-        
-        # Obtener datos de usuarios
-        participants = []
-        age_distribution = {}
-        location_distribution = {}
-        
-        total_reservations = len(reservations)
-        total_attendees = len([r for r in reservations if r["status"] == "checked_in"])
-        total_cancellations = len([r for r in reservations if r["status"] == "cancelled"])
+        # Renderizado fuera del event loop; se reutiliza el PDF si los datos no cambiaron
+        job, pdf_bytes = await report_jobs.render("event", {"event_id": event_id}, requested_by=user_id)
         
-        for reservation in reservations:
-            user = db.users.find_one({"id": reservation["user_id"]})
-            if user:
-                participant_data = {
-                    "name": user.get("name", ""),
-                    "email": user.get("email", ""),
-                    "phone": user.get("phone", ""),
-                    "age": user.get("age", 0),
-                    "location": user.get("location", ""),
-                    "checked_in": reservation["status"] == "checked_in",
-                    "status": reservation["status"]
-                }
-                participants.append(participant_data)
-                
-                # Distribución por edad
-                age = user.get("age", 0)
-                if age < 20:
-                    age_range = "< 20"
-                elif age < 30:
-                    age_range = "20-29"
-                elif age < 40:
-                    age_range = "30-39"
-                elif age < 50:
-                    age_range = "40-49"
-                elif age < 60:
-                    age_range = "50-59"
-                else:
-                    age_range = "60+"
-                
-                age_distribution[age_range] = age_distribution.get(age_range, 0) + 1
-                
-                # Distribución por ubicación
-                location = user.get("location", "No especificado")
-                location_distribution[location] = location_distribution.get(location, 0) + 1
-        
-        # Calcular métricas
-        attendance_rate = (total_attendees / total_reservations * 100) if total_reservations > 0 else 0
-        capacity_utilization = (total_reservations / event["capacity"] * 100) if event["capacity"] > 0 else 0
-        
-        # Preparar datos para el reporte
-        event_data = {
-            "title": event["title"],
-            "date": event["date"],
-            "time": event["time"],
-            "location": event["location"],
-            "capacity": event["capacity"],
-            "category": event["category"],
-            "metrics": {
-                "total_reservations": total_reservations,
-                "total_attendees": total_attendees,
-                "total_cancellations": total_cancellations,
-                "attendance_rate": attendance_rate,
-                "capacity_utilization": capacity_utilization
-            },
-            "demographics": {
-                "age_distribution": age_distribution,
-                "location_distribution": location_distribution
-            },
-            "participants": participants
-        }
-        
-        # Generar reporte PDF con el nuevo sistema HTML
-        from reports.pdfdocument_generator import PDFDocumentReportGenerator
-        generator = PDFDocumentReportGenerator()
-        
-        # Adaptar datos para el nuevo formato
-        event_data = {
-            "title": event["title"],
-            "date": event["date"],
-            "time": event["time"],
-            "location": event["location"],
-            "capacity": event["capacity"],
-            "category": event["category"],
-            "description": event.get("description", ""),
-            "price": event.get("price", 0)
-        }
-        
-        # Adaptar participantes para el nuevo formato
-        participants_data = []
-        for participant in participants:
-            participants_data.append({
-                "user_name": participant["name"],
-                "user_email": participant["email"],
-                "user_phone": participant["phone"],
-                "status": "confirmed" if participant["checked_in"] else "pending",
-                "created_at": datetime.now().isoformat()
-            })
-        
-        # Generar PDF usando PDFDocument (retorna bytes directamente)
-        pdf_bytes = generator.generate_event_report(event_data, participants_data)
-        
-        # Retornar PDF como respuesta
-        from fastapi.responses import Response
         return Response(
             content=pdf_bytes,
             media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=Reporte_Evento_{event['title'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
-            }
+            headers={"Content-Disposition": f"attachment; filename={job['filename']}"}
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -3515,7 +3278,7 @@ async def generate_professional_monthly_report(
     """Generar reporte mensual profesional consolidado"""
     try:
         # Verificar permisos de admin
-        user_doc = db.users.find_one({"id": user_id})
+        user_doc = await principal_cache.get(user_id)
         if not user_doc or not user_doc.get("is_admin"):
             raise HTTPException(status_code=403, detail="Admin access required")
         
@@ -3525,138 +3288,76 @@ async def generate_professional_monthly_report(
             month = month or now.month
             year = year or now.year
         
-        # Calcular rango de fechas
-        start_date = datetime(year, month, 1)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1)
-        else:
-            end_date = datetime(year, month + 1, 1)
-        
-        start_date_str = start_date.strftime("%Y-%m-%d")
-        end_date_str = end_date.strftime("%Y-%m-%d")
-        
-        # Obtener eventos del mes
-        events = list(db.events.find({
-            "date": {"$gte": start_date_str, "$lt": end_date_str}
-        }))
-        
-        # Preparar datos del reporte
-        events_data = []
-        total_reservations = 0
-        total_attendees = 0
-        total_cancellations = 0
-        total_events = len(events)
-        
-        age_distribution = {}
-        location_distribution = {}
-        
-        for event in events:
-            # Obtener reservas del evento
-            reservations = list(db.reservations.find({"event_id": event["id"]}))
-            
-            event_reservations = len(reservations)
-            event_attendees = len([r for r in reservations if r["status"] == "checked_in"])
-            event_cancellations = len([r for r in reservations if r["status"] == "cancelled"])
-            
-            total_reservations += event_reservations
-            total_attendees += event_attendees
-            total_cancellations += event_cancellations
-            
-            # Datos del evento para la tabla
-            events_data.append({
-                "title": event["title"],
-                "date": event["date"],
-                "reservations": event_reservations,
-                "attendees": event_attendees,
-                "cancellations": event_cancellations
-            })
-            
-            # Obtener datos demográficos
-            for reservation in reservations:
-                if reservation["status"] != "cancelled":
-                    user = db.users.find_one({"id": reservation["user_id"]})
-                    if user:
-                        # Distribución por edad
-                        age = user.get("age", 0)
-                        if age < 20:
-                            age_range = "< 20"
-                        elif age < 30:
-                            age_range = "20-29"
-                        elif age < 40:
-                            age_range = "30-39"
-                        elif age < 50:
-                            age_range = "40-49"
-                        elif age < 60:
-                            age_range = "50-59"
-                        else:
-                            age_range = "60+"
-                        
-                        age_distribution[age_range] = age_distribution.get(age_range, 0) + 1
-                        
-                        # Distribución por ubicación
-                        location = user.get("location", "No especificado")
-                        location_distribution[location] = location_distribution.get(location, 0) + 1
-        
-        # Calcular métricas promedio
-        avg_attendance_rate = (total_attendees / total_reservations * 100) if total_reservations > 0 else 0
-        total_capacity = sum([event["capacity"] for event in events])
-        avg_capacity_utilization = (total_reservations / total_capacity * 100) if total_capacity > 0 else 0
-        
-        # Preparar datos para gráficos de rendimiento
-        performance_data = {
-            "months": [f"{year}-{month:02d}"],
-            "attendance": [total_attendees],
-            "capacity": [total_capacity]
-        }
-        
-        # Preparar datos del reporte mensual
-        month_names = {
-            1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril",
-            5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto",
-            9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
-        }
-        
-        monthly_data = {
-            "period": f"{month_names[month]} {year}",
-            "total_events": total_events,
-            "total_reservations": total_reservations,
-            "total_attendees": total_attendees,
-            "total_cancellations": total_cancellations,
-            "avg_attendance_rate": avg_attendance_rate,
-            "avg_capacity_utilization": avg_capacity_utilization,
-            "metrics": {
-                "total_reservations": total_reservations,
-                "total_attendees": total_attendees,
-                "total_cancellations": total_cancellations,
-                "attendance_rate": avg_attendance_rate,
-                "capacity_utilization": avg_capacity_utilization
-            },
-            "events": events_data,
-            "demographics": {
-                "age_distribution": age_distribution,
-                "location_distribution": location_distribution
-            },
-            "performance_data": performance_data
-        }
-        
-        # Generar reporte PDF
-        from reports.professional_generator import ProfessionalReportGenerator
-        generator = ProfessionalReportGenerator()
-        pdf_bytes = generator.generate_monthly_report(monthly_data)
+        # Renderizado fuera del event loop; se reutiliza el PDF si los datos no cambiaron
+        job, pdf_bytes = await report_jobs.render(
+            "monthly", {"month": month, "year": year}, requested_by=user_id
+        )
         
-        # Retornar PDF como respuesta
-        from fastapi.responses import Response
         return Response(
             content=pdf_bytes,
             media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=Reporte_Mensual_{month_names[month]}_{year}.pdf"
-            }
+            headers={"Content-Disposition": f"attachment; filename={job['filename']}"}
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/admin/reports/jobs")
+async def create_report_job(
+    report_type: str,
+    event_id: str = None,
+    month: int = None,
+    year: int = None,
+    user_id: str = Depends(verify_token)
+):
+    """Queue a PDF report; returns the job to poll (cached reports come back completed)"""
+    user_doc = await principal_cache.get(user_id)
+    if not user_doc or not user_doc.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if report_type == "event":
+        if not event_id:
+            raise HTTPException(status_code=400, detail="event_id is required for event reports")
+        params = {"event_id": event_id}
+    else:
+        now = datetime.now()
+        params = {"month": month or now.month, "year": year or now.year}
+    
+    job = await report_jobs.submit(report_type, params, requested_by=user_id)
+    return JSONResponse(status_code=200 if job["status"] == "completed" else 202, content=job)
+
+@app.get("/api/admin/reports/jobs/{job_id}")
+async def get_report_job(job_id: str, user_id: str = Depends(verify_token)):
+    """Status of a report job"""
+    user_doc = await principal_cache.get(user_id)
+    if not user_doc or not user_doc.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    job = await report_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job
+
+@app.get("/api/admin/reports/jobs/{job_id}/download")
+async def download_report_job(job_id: str, user_id: str = Depends(verify_token)):
+    """Download the PDF of a completed report job"""
+    user_doc = await principal_cache.get(user_id)
+    if not user_doc or not user_doc.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    job = await report_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    
+    pdf_bytes = await report_jobs.download(job)
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename={job['filename']}"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8004)
\ No newline at end of file
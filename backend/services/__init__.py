@@ -4,8 +4,10 @@ Services module exports
 
 from .user_service import user_service
 from .event_service import event_service
+from .user_import import user_import_service
 
 __all__ = [
     "user_service",
-    "event_service"
+    "event_service",
+    "user_import_service"
 ]
@@ -0,0 +1,486 @@
+"""
+Check-in roster - In-memory per-event index for door scanning
+
+A roster maps every check-in code (and reservation id) of an event to the
+reservation status, the attendee's name and email, so a scan is answered
+without touching the database. Rosters of events in the next
+CHECKIN_ROSTER_PRELOAD_DAYS days are loaded ahead of time with three
+queries per event; a scan for any other event loads its roster on first
+use.
+
+The roster is a read cache, not the source of truth: check-ins are written
+with one `update_one` conditional on the reservation still being
+confirmed. When that write matches nothing - another worker checked the
+guest in, or the booking was cancelled elsewhere - the current status is
+read back and the roster corrected. Cancellations and check-ins made
+through ReservationService update the roster through its listener.
+
+For scanners that lose connectivity, `export` produces a compact roster
+signed with HMAC-SHA256 (CHECKIN_ROSTER_SIGNING_KEY, SECRET_KEY by
+default): check-in codes appear only as salted SHA-256 hashes next to the
+reservation id, name and status. Scans collected offline come back through
+`check_in_batch`, which applies them with one bulk write and resolves
+conflicts by scan time: the earliest scan of a reservation wins, later ones
+are duplicates, and a cancellation only beats a scan made after it.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any
+
+from core.config import settings
+from core.database import database
+from services.reservation_service import reservation_service
+from utils.dates import parse_timestamp, with_native_dates
+
+logger = logging.getLogger(__name__)
+
+# Results of CheckinRoster.check_in and check_in_batch
+CHECKED_IN = "checked_in"
+ALREADY_CHECKED_IN = "already_checked_in"
+CANCELLED = "cancelled"
+# Batch-only results
+CANCELLED_AFTER_SCAN = "cancelled_after_scan"
+DUPLICATE = "duplicate"
+NOT_FOUND = "not_found"
+INVALID = "invalid"
+
+ROSTER_FORMAT_VERSION = 1
+ROSTER_FIELDS = ["code_hash", "reservation_id", "name", "status"]
+
+
+def code_hash(salt: str, checkin_code: str) -> str:
+    """Salted hash under which an exported roster lists a check-in code"""
+    return hashlib.sha256(f"{salt}:{checkin_code.strip().upper()}".encode("utf-8")).hexdigest()[:32]
+
+
+def _signing_key() -> bytes:
+    return (settings.CHECKIN_ROSTER_SIGNING_KEY or settings.SECRET_KEY).encode("utf-8")
+
+
+def sign_roster(roster: Dict[str, Any]) -> str:
+    """HMAC-SHA256 of an exported roster's canonical JSON, without its signature"""
+    body = {key: value for key, value in roster.items() if key != "signature"}
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hmac.new(_signing_key(), canonical.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def verify_roster(roster: Dict[str, Any]) -> bool:
+    """Whether an exported roster is unmodified"""
+    return hmac.compare_digest(roster.get("signature", ""), sign_roster(roster))
+
+
+class CheckinRoster:
+    """Per-event check-in code index with conditional check-in writes"""
+
+    RESERVATION_FIELDS = {
+        "_id": 0, "id": 1, "user_id": 1, "event_id": 1, "status": 1,
+        "checkin_code": 1, "created_at": 1, "checked_in_at": 1, "cancelled_at": 1
+    }
+
+    def __init__(self):
+        # event_id -> {"event": event fields, "reservations": ids, "loaded_at": monotonic time}
+        self._events: Dict[str, Dict[str, Any]] = {}
+        # Roster entries, shared between both indexes
+        self._by_code: Dict[str, Dict[str, Any]] = {}
+        self._by_reservation: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._preload_task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, reservation: Dict[str, Any], user: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        user = user or {}
+        return {
+            "reservation_id": reservation["id"],
+            "event_id": reservation["event_id"],
+            "user_id": reservation["user_id"],
+            "checkin_code": reservation.get("checkin_code") or "",
+            "status": reservation.get("status", "confirmed"),
+            "created_at": reservation.get("created_at") or "",
+            "checked_in_at": reservation.get("checked_in_at"),
+            "cancelled_at": reservation.get("cancelled_at"),
+            "user_name": user.get("name", ""),
+            "user_email": user.get("email", "")
+        }
+
+    def _put(self, entry: Dict[str, Any]):
+        self._by_reservation[entry["reservation_id"]] = entry
+        if entry["checkin_code"]:
+            self._by_code[entry["checkin_code"]] = entry
+        loaded = self._events.get(entry["event_id"])
+        if loaded is not None:
+            loaded["reservations"].add(entry["reservation_id"])
+
+    def _drop(self, event_id: str):
+        loaded = self._events.pop(event_id, None)
+        if loaded is None:
+            return
+        for reservation_id in loaded["reservations"]:
+            entry = self._by_reservation.pop(reservation_id, None)
+            if entry is not None:
+                self._by_code.pop(entry["checkin_code"], None)
+
+    async def load(self, event_id: str) -> bool:
+        """
+        (Re)build the roster of one event
+
+        Three queries: the event, its reservations and their users. Returns
+        False if the event does not exist.
+        """
+        lock = self._locks.setdefault(event_id, asyncio.Lock())
+        async with lock:
+            event = await database.events.find_one(
+                {"id": event_id},
+                {"_id": 0, "id": 1, "title": 1, "date": 1, "time": 1, "location": 1}
+            )
+            if not event:
+                self._drop(event_id)
+                return False
+
+            reservations = await database.reservations.find(
+                {"event_id": event_id}, self.RESERVATION_FIELDS
+            ).to_list(length=None)
+            user_ids = list({reservation["user_id"] for reservation in reservations})
+            users = {
+                user["id"]: user
+                async for user in database.users.find(
+                    {"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "name": 1, "email": 1}
+                )
+            }
+
+            self._drop(event_id)
+            self._events[event_id] = {"event": event, "reservations": set(), "loaded_at": time.monotonic()}
+            for reservation in reservations:
+                self._put(self._entry(reservation, users.get(reservation["user_id"])))
+            return True
+
+    async def _load_entry(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Cache miss: find the reservation, then load its event's roster"""
+        self.misses += 1
+        reservation = await database.reservations.find_one(query, self.RESERVATION_FIELDS)
+        if not reservation:
+            return None
+        event_id = reservation["event_id"]
+        if event_id not in self._events:
+            await self.load(event_id)
+        entry = self._by_reservation.get(reservation["id"])
+        if entry is None:
+            # Booked after the roster was loaded
+            user = await database.users.find_one(
+                {"id": reservation["user_id"]}, {"_id": 0, "name": 1, "email": 1}
+            )
+            entry = self._entry(reservation, user)
+            self._put(entry)
+        return entry
+
+    async def find_by_code(self, checkin_code: str) -> Optional[Dict[str, Any]]:
+        """Roster entry for a check-in code, or None if no reservation has it"""
+        code = checkin_code.strip().upper()
+        entry = self._by_code.get(code)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        return await self._load_entry({"checkin_code": code})
+
+    async def find_by_reservation(self, reservation_id: str) -> Optional[Dict[str, Any]]:
+        """Roster entry for a reservation id, or None if it does not exist"""
+        entry = self._by_reservation.get(reservation_id)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        return await self._load_entry({"id": reservation_id})
+
+    def event(self, event_id: str) -> Dict[str, Any]:
+        """Cached fields of a loaded event (title, date, time, location)"""
+        loaded = self._events.get(event_id)
+        return loaded["event"] if loaded else {}
+
+    def details(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """A roster entry with its event fields, shaped like ReservationWithDetails"""
+        event = self.event(entry["event_id"])
+        return {
+            "id": entry["reservation_id"],
+            "event_id": entry["event_id"],
+            "event_title": event.get("title", ""),
+            "event_date": event.get("date", ""),
+            "event_time": event.get("time", ""),
+            "event_location": event.get("location", ""),
+            "user_id": entry["user_id"],
+            "user_name": entry["user_name"],
+            "user_email": entry["user_email"],
+            "status": entry["status"],
+            "checkin_code": entry["checkin_code"],
+            "created_at": entry["created_at"]
+        }
+
+    async def check_in(self, entry: Dict[str, Any], update_fields: Dict[str, Any]) -> str:
+        """
+        Check in a roster entry
+
+        Returns CHECKED_IN, ALREADY_CHECKED_IN or CANCELLED. Statuses known to
+        the roster are answered without a write; otherwise one conditional
+        `update_one` decides, and a lost race reads the status back.
+        """
+        if entry["status"] == "checked_in":
+            return ALREADY_CHECKED_IN
+        if entry["status"] == "cancelled":
+            return CANCELLED
+
+        reservation = {
+            "id": entry["reservation_id"],
+            "user_id": entry["user_id"],
+            "event_id": entry["event_id"],
+            "status": entry["status"],
+            "created_at": entry["created_at"]
+        }
+        if await reservation_service.check_in_known(reservation, update_fields):
+            entry["status"] = "checked_in"
+            entry["checked_in_at"] = update_fields.get("checked_in_at")
+            return CHECKED_IN
+
+        current = await database.reservations.find_one(
+            {"id": entry["reservation_id"]}, {"_id": 0, "status": 1}
+        )
+        entry["status"] = current["status"] if current else "cancelled"
+        return ALREADY_CHECKED_IN if entry["status"] == "checked_in" else CANCELLED
+
+    async def apply_reservation_changes(self, changes: List[Dict[str, Any]]):
+        """ReservationService listener: keep cached statuses current"""
+        for change in changes:
+            entry = self._by_reservation.get(change["reservation_id"])
+            if entry is not None:
+                entry["status"] = change["status"]
+                if change["status"] == "cancelled":
+                    entry["cancelled_at"] = datetime.utcnow().isoformat()
+
+    async def export(self, event_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Signed offline roster of an event, freshly loaded
+
+        Entries are [code_hash, reservation_id, name, status] rows (see
+        ROSTER_FIELDS); scanners hash a scanned code with the roster's
+        `salt` through `code_hash` to look it up. Returns None if the event
+        does not exist.
+        """
+        if not await self.load(event_id):
+            return None
+        salt = secrets.token_hex(8)
+        roster = {
+            "version": ROSTER_FORMAT_VERSION,
+            "event": self.event(event_id),
+            "generated_at": datetime.utcnow().isoformat(),
+            "salt": salt,
+            "fields": ROSTER_FIELDS,
+            "entries": [
+                [code_hash(salt, entry["checkin_code"]), entry["reservation_id"], entry["user_name"], entry["status"]]
+                for entry in (
+                    self._by_reservation[reservation_id]
+                    for reservation_id in sorted(self._events[event_id]["reservations"])
+                )
+                if entry["checkin_code"]
+            ]
+        }
+        roster["signature"] = sign_roster(roster)
+        return roster
+
+    def _resolve(self, event_id: str, scan: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if scan.get("checkin_code"):
+            entry = self._by_code.get(scan["checkin_code"].strip().upper())
+        else:
+            entry = self._by_reservation.get(scan.get("reservation_id") or "")
+        return entry if entry is not None and entry["event_id"] == event_id else None
+
+    async def check_in_batch(
+        self,
+        event_id: str,
+        scans: List[Dict[str, Any]],
+        checked_in_by: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Apply timestamped offline scans of one event
+
+        A scan has `checkin_code` or `reservation_id`, `scanned_at` (ISO
+        timestamp) and optionally `device_id`. Scans are ordered by
+        (scanned_at, position) and the check-ins written with one bulk
+        write, each stamped with its scan time. Returns one result per scan,
+        in request order, or None if the event does not exist.
+        """
+        if event_id not in self._events and not await self.load(event_id):
+            return None
+        if any(self._resolve(event_id, scan) is None for scan in scans):
+            # Codes booked since the roster was loaded
+            await self.load(event_id)
+
+        now = datetime.utcnow()
+        results: List[Dict[str, Any]] = [
+            {"index": index, "reservation_id": None, "status": INVALID}
+            for index in range(len(scans))
+        ]
+        ordered = []
+        for index, scan in enumerate(scans):
+            scanned_at = parse_timestamp(scan.get("scanned_at"))
+            if scanned_at is None:
+                continue
+            entry = self._resolve(event_id, scan)
+            if entry is None:
+                results[index]["status"] = NOT_FOUND
+                continue
+            results[index]["reservation_id"] = entry["reservation_id"]
+            ordered.append((min(scanned_at, now), index, entry))
+        ordered.sort(key=lambda item: (item[0], item[1]))
+
+        claimed = set()
+        pending = []
+        for scanned_at, index, entry in ordered:
+            if entry["reservation_id"] in claimed:
+                results[index]["status"] = DUPLICATE
+                continue
+            claimed.add(entry["reservation_id"])
+            results[index]["status"] = self._offline_conflict(entry, scanned_at)
+            if results[index]["status"] is None:
+                pending.append((scanned_at, index, entry))
+
+        items = [
+            (
+                {
+                    "id": entry["reservation_id"],
+                    "user_id": entry["user_id"],
+                    "event_id": entry["event_id"],
+                    "status": "confirmed",
+                    "created_at": entry["created_at"]
+                },
+                {
+                    "checked_in_at": scanned_at.isoformat(),
+                    "checked_in_by": checked_in_by,
+                    "checkin_method": "offline"
+                }
+            )
+            for scanned_at, _, entry in pending
+        ]
+        checked_in = set(await reservation_service.check_in_known_many(items))
+
+        # Lost races: read the current state of the rest back in one query
+        lost = [entry["reservation_id"] for _, _, entry in pending if entry["reservation_id"] not in checked_in]
+        current = {}
+        if lost:
+            current = {
+                doc["id"]: doc
+                async for doc in database.reservations.find(
+                    {"id": {"$in": lost}}, {"_id": 0, "id": 1, "status": 1, "cancelled_at": 1}
+                )
+            }
+
+        checkins = []
+        for scanned_at, index, entry in pending:
+            if entry["reservation_id"] in checked_in:
+                entry["status"] = "checked_in"
+                entry["checked_in_at"] = scanned_at.isoformat()
+                results[index]["status"] = CHECKED_IN
+                results[index]["checked_in_at"] = entry["checked_in_at"]
+                checkins.append(with_native_dates({
+                    "reservation_id": entry["reservation_id"],
+                    "event_id": entry["event_id"],
+                    "user_id": entry["user_id"],
+                    "checked_in_by": checked_in_by,
+                    "method": "offline",
+                    "device_id": scans[index].get("device_id"),
+                    "timestamp": entry["checked_in_at"]
+                }))
+            else:
+                doc = current.get(entry["reservation_id"]) or {"status": "cancelled"}
+                entry["status"] = doc["status"]
+                entry["cancelled_at"] = doc.get("cancelled_at")
+                results[index]["status"] = self._offline_conflict(entry, scanned_at) or ALREADY_CHECKED_IN
+
+        if checkins:
+            await database.checkins.insert_many(checkins)
+        return results
+
+    @staticmethod
+    def _offline_conflict(entry: Dict[str, Any], scanned_at: datetime) -> Optional[str]:
+        """Why an offline scan cannot check `entry` in, or None if it can"""
+        if entry["status"] == "checked_in":
+            return ALREADY_CHECKED_IN
+        if entry["status"] == "cancelled":
+            cancelled_at = parse_timestamp(entry.get("cancelled_at"))
+            if cancelled_at is not None and cancelled_at > scanned_at:
+                return CANCELLED_AFTER_SCAN
+            return CANCELLED
+        return None
+
+    async def preload(self) -> int:
+        """
+        Load rosters of events in the next CHECKIN_ROSTER_PRELOAD_DAYS days
+
+        Rosters of other events are dropped once older than
+        CHECKIN_ROSTER_TTL. Returns the number of rosters loaded.
+        """
+        today = datetime.utcnow().date()
+        last_day = today + timedelta(days=settings.CHECKIN_ROSTER_PRELOAD_DAYS)
+        upcoming = [
+            event["id"]
+            async for event in database.events.find(
+                {"date": {"$gte": today.isoformat(), "$lte": last_day.isoformat()}},
+                {"_id": 0, "id": 1}
+            )
+        ]
+
+        expired_before = time.monotonic() - settings.CHECKIN_ROSTER_TTL
+        for event_id, loaded in list(self._events.items()):
+            if event_id not in upcoming and loaded["loaded_at"] < expired_before:
+                self._drop(event_id)
+                self._locks.pop(event_id, None)
+
+        for event_id in upcoming:
+            await self.load(event_id)
+        return len(upcoming)
+
+    async def _preload_loop(self, interval: int):
+        while True:
+            try:
+                loaded = await self.preload()
+                logger.debug(f"Loaded check-in rosters for {loaded} upcoming events")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Check-in roster preload failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start_preloader(self):
+        """Load upcoming rosters now and then every CHECKIN_ROSTER_REFRESH_INTERVAL seconds"""
+        if self._preload_task is None or self._preload_task.done():
+            self._preload_task = asyncio.create_task(
+                self._preload_loop(settings.CHECKIN_ROSTER_REFRESH_INTERVAL)
+            )
+
+    async def stop_preloader(self):
+        """Stop the background preload task"""
+        if self._preload_task is not None:
+            self._preload_task.cancel()
+            try:
+                await self._preload_task
+            except asyncio.CancelledError:
+                pass
+            self._preload_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Loaded rosters and hit/miss counters"""
+        return {
+            "events": len(self._events),
+            "entries": len(self._by_reservation),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+# Global roster instance
+checkin_roster = CheckinRoster()
+reservation_service.add_listener(checkin_roster.apply_reservation_changes)
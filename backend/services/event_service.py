@@ -9,8 +9,11 @@ from typing import Optional, List, Dict, Any
 from fastapi import HTTPException, status
 
 from core.database import database
+from services.reservation_service import ReservationService, reservation_service
 from models.events import EventCreate, EventUpdate, Event
 from utils.validation import validate_event_data
+from utils.dates import with_native_dates
+from utils.search import escape_regex
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +32,29 @@ class EventService:
         "Experiencias 3D"
     ]
     
+    # Fields returned by event listings; the seat counter replaces a
+    # per-event reservation count
+    LISTING_PROJECTION = {
+        "_id": 0,
+        "id": 1,
+        "title": 1,
+        "description": 1,
+        "category": 1,
+        "date": 1,
+        "time": 1,
+        "capacity": 1,
+        "location": 1,
+        "image_url": 1,
+        "price": 1,
+        "tags": 1,
+        "requirements": 1,
+        "contact_info": 1,
+        "published": 1,
+        "reserved_count": 1,
+        "created_at": 1,
+        "updated_at": 1
+    }
+    
     @staticmethod
     async def create_event(event_data: EventCreate) -> Dict[str, Any]:
         """Create a new event"""
@@ -60,16 +86,17 @@ class EventService:
                 "requirements": event_data.requirements,
                 "contact_info": event_data.contact_info,
                 "published": event_data.published,
-                "available_spots": event_data.capacity,
+                "reserved_count": 0,
                 "created_at": datetime.utcnow().isoformat(),
                 "updated_at": None
             }
             
             # Insert event
-            result = database.events.insert_one(event_doc)
+            result = await database.events.insert_one(with_native_dates(event_doc))
             
             if result.inserted_id:
                 event_doc.pop("_id", None)
+                event_doc["available_spots"] = event_data.capacity
                 logger.info(f"Event created: {event_data.title}")
                 return event_doc
             else:
@@ -91,16 +118,10 @@ class EventService:
     async def get_event_by_id(event_id: str) -> Optional[Dict[str, Any]]:
         """Get event by ID with reservation count"""
         try:
-            event = database.events.find_one({"id": event_id})
+            event = await database.events.find_one({"id": event_id})
             if event:
-                # Calculate available spots
-                # Calculate available spots
-                reservation_count = database.reservations.count_documents({
-                    "event_id": event_id,
-                    "status": {"$ne": "cancelled"}
-                })
-                
-                event["available_spots"] = max(0, event["capacity"] - reservation_count)
+                # Available spots come from the event's seat counter
+                event["available_spots"] = ReservationService.available_spots(event)
                 event.pop("_id", None)
                 
             return event
@@ -128,29 +149,18 @@ class EventService:
                 query["published"] = published
             
             if search:
+                pattern = escape_regex(search)
                 query["$or"] = [
-                    {"title": {"$regex": search, "$options": "i"}},
-                    {"description": {"$regex": search, "$options": "i"}},
-                    {"tags": {"$regex": search, "$options": "i"}}
+                    {"title": {"$regex": pattern, "$options": "i"}},
+                    {"description": {"$regex": pattern, "$options": "i"}},
+                    {"tags": {"$regex": pattern, "$options": "i"}}
                 ]
             
             # Get total count
-            total = database.events.count_documents(query)
+            total = await database.events.count_documents(query)
             
             # Get events
-            events_cursor = database.events.find(query).sort("date", 1).skip(skip).limit(limit)
-            events = []
-            
-            for event in events_cursor:
-                # Calculate available spots for each event
-                reservation_count = database.reservations.count_documents({
-                    "event_id": event["id"],
-                    "status": {"$ne": "cancelled"}
-                })
-                
-                event["available_spots"] = max(0, event["capacity"] - reservation_count)
-                event.pop("_id", None)
-                events.append(event)
+            events = await EventService.list_events(query, skip, limit)
             
             return {
                 "events": events,
@@ -167,6 +177,23 @@ class EventService:
                 detail="Internal server error"
             )
     
+    @staticmethod
+    async def list_events(
+        query: Optional[Dict[str, Any]] = None,
+        skip: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get a page of events with available spots in a constant number of round trips"""
+        cursor = database.events.find(
+            query or {},
+            EventService.LISTING_PROJECTION
+        ).sort([("date", 1), ("id", 1)]).skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        
+        events = await cursor.to_list(length=None)
+        return await reservation_service.attach_available_spots(events)
+    
     @staticmethod
     async def update_event(event_id: str, update_data: EventUpdate) -> Dict[str, Any]:
         """Update event information"""
@@ -193,7 +220,7 @@ class EventService:
                 update_doc["updated_at"] = datetime.utcnow().isoformat()
                 
                 # Update event
-                result = database.events.update_one(
+                result = await database.events.update_one(
                     {"id": event_id},
                     {"$set": update_doc}
                 )
@@ -224,7 +251,7 @@ class EventService:
         """Delete an event"""
         try:
             # Check if event has reservations
-            reservation_count = database.reservations.count_documents({
+            reservation_count = await database.reservations.count_documents({
                 "event_id": event_id,
                 "status": {"$ne": "cancelled"}
             })
@@ -236,7 +263,7 @@ class EventService:
                 )
             
             # Delete event
-            result = database.events.delete_one({"id": event_id})
+            result = await database.events.delete_one({"id": event_id})
             
             if result.deleted_count > 0:
                 logger.info(f"Event deleted: {event_id}")
@@ -0,0 +1,174 @@
+"""
+Reservation export - Streams reservation exports straight from a cursor
+
+User and event details are joined server-side with `$lookup` in a single
+aggregation; each lookup projects only the exported fields, so whole user
+documents (password hashes included) never enter the pipeline. Rows are
+encoded in batches as they come off the cursor, so memory stays flat no
+matter how many reservations are exported.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Dict, Any, AsyncIterator, List
+
+from core.config import settings
+from core.database import database
+
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "json": "application/json"
+}
+
+# Reservation fields copied as-is (missing values export as "")
+RESERVATION_FIELDS = {
+    "reservation_id": "id",
+    "checkin_code": "checkin_code",
+    "status": "status",
+    "created_at": "created_at",
+    "checked_in_at": "checked_in_at",
+    "cancelled_at": "cancelled_at",
+    "checked_in_by": "checked_in_by",
+    "cancelled_by": "cancelled_by"
+}
+
+# Joined fields: (source field, value when the field is missing, value when the document is gone)
+USER_FIELDS = {
+    "user_name": ("name", "", "Usuario eliminado"),
+    "user_email": ("email", "", "N/A"),
+    "user_phone": ("phone", "", "N/A"),
+    "user_age": ("age", "", "N/A"),
+    "user_location": ("location", "", "N/A")
+}
+
+EVENT_FIELDS = {
+    "event_title": ("title", "", "Evento eliminado"),
+    "event_date": ("date", "", "N/A"),
+    "event_time": ("time", "", "N/A"),
+    "event_location": ("location", "", "N/A"),
+    "event_category": ("category", "", "N/A"),
+    "event_capacity": ("capacity", "", "N/A")
+}
+
+EXPORT_COLUMNS = list(RESERVATION_FIELDS) + list(USER_FIELDS) + list(EVENT_FIELDS)
+
+
+def _joined(alias: str, fields: Dict[str, tuple]) -> Dict[str, Any]:
+    """Projection for fields of a joined document, with deleted-document fallbacks"""
+    return {
+        column: {"$cond": [
+            {"$gt": [{"$size": f"${alias}"}, 0]},
+            {"$ifNull": [{"$arrayElemAt": [f"${alias}.{field}", 0]}, missing]},
+            gone
+        ]}
+        for column, (field, missing, gone) in fields.items()
+    }
+
+
+def _lookup(collection: str, local_field: str, alias: str, fields: Dict[str, tuple]) -> Dict[str, Any]:
+    """$lookup of the one document whose `id` matches, reduced to the exported fields"""
+    return {"$lookup": {
+        "from": collection,
+        "let": {"key": f"${local_field}"},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$id", "$$key"]}}},
+            {"$limit": 1},
+            {"$project": {"_id": 0, **{field: 1 for field, _, _ in fields.values()}}}
+        ],
+        "as": alias
+    }}
+
+
+def build_pipeline(filter_query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Aggregation producing one flat export row per matching reservation"""
+    return [
+        {"$match": filter_query},
+        _lookup("users", "user_id", "user", USER_FIELDS),
+        _lookup("events", "event_id", "event", EVENT_FIELDS),
+        {"$project": {
+            "_id": 0,
+            **{column: {"$ifNull": [f"${field}", ""]} for column, field in RESERVATION_FIELDS.items()},
+            **_joined("user", USER_FIELDS),
+            **_joined("event", EVENT_FIELDS)
+        }}
+    ]
+
+
+def _encode_csv(rows: List[Dict[str, Any]], header: bool) -> bytes:
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=EXPORT_COLUMNS)
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue().encode("utf-8")
+
+
+def _encode_json_lines(rows: List[Dict[str, Any]]) -> str:
+    return "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows)
+
+
+async def _encoded_batches(filter_query: Dict[str, Any], export_format: str) -> AsyncIterator[bytes]:
+    batch_size = settings.EXPORT_BATCH_SIZE
+    cursor = database.reservations.aggregate(build_pipeline(filter_query), batchSize=batch_size)
+
+    if export_format == "csv":
+        yield _encode_csv([], header=True)
+    elif export_format == "json":
+        yield b"["
+
+    first = True
+    batch: List[Dict[str, Any]] = []
+
+    def flush() -> bytes:
+        nonlocal first
+        if export_format == "csv":
+            data = _encode_csv(batch, header=False)
+        elif export_format == "ndjson":
+            data = _encode_json_lines(batch).encode("utf-8")
+        else:
+            separator = "" if first else ","
+            data = (separator + ",".join(
+                json.dumps(row, ensure_ascii=False, default=str) for row in batch
+            )).encode("utf-8")
+        first = False
+        batch.clear()
+        return data
+
+    async for row in cursor:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield flush()
+
+    if batch:
+        yield flush()
+    if export_format == "json":
+        yield b"]"
+
+
+async def stream_reservations_export(
+    filter_query: Dict[str, Any],
+    export_format: str = "csv",
+    compress: bool = False
+) -> AsyncIterator[bytes]:
+    """
+    Yield the export as byte chunks, gzip-compressed on the fly when `compress` is set
+
+    `export_format` is one of EXPORT_FORMATS: "csv", "ndjson" (one JSON object
+    per line) or "json" (a single array, for existing clients).
+    """
+    if not compress:
+        async for chunk in _encoded_batches(filter_query, export_format):
+            yield chunk
+        return
+
+    # wbits=31 writes a gzip container rather than a raw zlib stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in _encoded_batches(filter_query, export_format):
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,483 @@
+"""
+Reservation service - Seat accounting and reservation state changes
+
+Each event document carries a `reserved_count` seat counter. Booking takes a
+seat with a single guarded `find_one_and_update`, so concurrent requests can
+never push an event past its capacity, and `available_spots` is read straight
+from the event instead of counting reservations.
+"""
+
+import asyncio
+import logging
+import uuid
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Tuple
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from core.config import settings
+from core.dashboard_counters import dashboard_counters
+from core.database import database
+from core.feature_store import feature_store
+from utils.dates import with_native_dates
+
+logger = logging.getLogger(__name__)
+
+
+class ReservationService:
+    """Service for reservation bookings, cancellations and seat counters"""
+
+    # Reservation statuses that occupy a seat
+    ACTIVE_STATUSES = ["confirmed", "checked_in"]
+
+    # Attempts at drawing a check-in code that is not taken yet
+    CHECKIN_CODE_ATTEMPTS = 5
+
+    def __init__(self):
+        self._reconcile_task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = []
+
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]]], Awaitable[None]]):
+        """
+        Register a coroutine called with every batch of reservation status changes
+
+        A change is a dict with `reservation_id`, `user_id`, `event_id`,
+        `previous_status` (None for a new booking), `status`, the
+        reservation's `created_at` and `checked_in_at` (for a check-in, the
+        time being recorded) and, for new bookings, the event `category` and
+        `price`.
+        """
+        self._listeners.append(listener)
+
+    async def _notify(self, changes: List[Dict[str, Any]]):
+        if not changes:
+            return
+        for listener in self._listeners:
+            try:
+                await listener(changes)
+            except Exception as e:
+                logger.error(f"Reservation listener failed: {e}")
+
+    @staticmethod
+    def available_spots(event: Dict[str, Any]) -> int:
+        """Seats left on an event, derived from its seat counter"""
+        return max(0, event.get("capacity", 0) - event.get("reserved_count", 0))
+
+    async def attach_available_spots(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Set `available_spots` on a page of events
+
+        Events with a seat counter need no query at all; any that predate the
+        counter are counted together with a single `$group` aggregation, so a
+        page costs at most one extra round trip however many events it holds.
+        """
+        uncounted = [event["id"] for event in events if "reserved_count" not in event]
+        counts: Dict[str, int] = {}
+        if uncounted:
+            counts = {
+                doc["_id"]: doc["count"]
+                async for doc in database.reservations.aggregate([
+                    {"$match": {
+                        "event_id": {"$in": uncounted},
+                        "status": {"$in": self.ACTIVE_STATUSES}
+                    }},
+                    {"$group": {"_id": "$event_id", "count": {"$sum": 1}}}
+                ])
+            }
+
+        for event in events:
+            reserved = event.pop("reserved_count", counts.get(event["id"], 0))
+            event["available_spots"] = max(0, event.get("capacity", 0) - reserved)
+        return events
+
+    async def reserve_seat(self, event_id: str) -> Dict[str, Any]:
+        """
+        Atomically take one seat on an event
+
+        Raises 404 when the event does not exist and 400 when it is full.
+        Returns the event document with the updated counter.
+        """
+        guard = {
+            "id": event_id,
+            "reserved_count": {"$exists": True},
+            "$expr": {"$lt": ["$reserved_count", "$capacity"]}
+        }
+        event = await database.events.find_one_and_update(
+            guard,
+            {"$inc": {"reserved_count": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if event:
+            return event
+
+        # Slow path: tell "missing", "never counted" and "full" apart
+        current = await database.events.find_one({"id": event_id}, {"_id": 0})
+        if not current:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Event not found"
+            )
+
+        if "reserved_count" not in current:
+            # Event predates the counter: build it once, then retry
+            await self.initialize_reserved_counts([event_id])
+            event = await database.events.find_one_and_update(
+                guard,
+                {"$inc": {"reserved_count": 1}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+            if event:
+                return event
+
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Event is fully booked"
+        )
+
+    async def release_seats(self, event_id: str, count: int = 1):
+        """Give seats back to an event, never driving the counter below zero"""
+        if count <= 0:
+            return
+        await database.events.update_one(
+            {"id": event_id, "reserved_count": {"$gte": count}},
+            {"$inc": {"reserved_count": -count}}
+        )
+
+    async def book(
+        self,
+        reservation_doc: Dict[str, Any],
+        code_factory: Callable[[], str]
+    ) -> Dict[str, Any]:
+        """
+        Take a seat and insert the reservation
+
+        The check-in code is drawn from `code_factory`; a collision on the
+        unique `checkin_code` index draws a new code instead of pre-checking
+        the collection. The seat is handed back if the insert fails.
+        Returns the event document as updated by the seat reservation.
+        """
+        event = await self.reserve_seat(reservation_doc["event_id"])
+
+        try:
+            for attempt in range(self.CHECKIN_CODE_ATTEMPTS):
+                try:
+                    await database.reservations.insert_one(with_native_dates(reservation_doc))
+                    break
+                except DuplicateKeyError as e:
+                    if "checkin_code" not in str(e) or attempt == self.CHECKIN_CODE_ATTEMPTS - 1:
+                        raise
+                    reservation_doc.pop("_id", None)
+                    reservation_doc["checkin_code"] = code_factory()
+        except Exception:
+            await self.release_seats(reservation_doc["event_id"])
+            raise
+
+        reservation_doc.pop("_id", None)
+        await self._notify([{
+            "reservation_id": reservation_doc["id"],
+            "user_id": reservation_doc["user_id"],
+            "event_id": reservation_doc["event_id"],
+            "previous_status": None,
+            "status": reservation_doc.get("status", "confirmed"),
+            "created_at": reservation_doc.get("created_at"),
+            "checked_in_at": None,
+            "category": event.get("category"),
+            "price": event.get("price") or 0
+        }])
+        return event
+
+    async def cancel(
+        self,
+        reservation_id: str,
+        update_fields: Dict[str, Any],
+        cancellable_statuses: Optional[List[str]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Cancel a reservation and free its seat
+
+        The status change is conditional on the reservation still being in
+        one of `cancellable_statuses`, so a seat is released exactly once even
+        when two cancellations race. Returns the reservation as it was before
+        the change, or None if nothing was cancelled.
+        """
+        statuses = cancellable_statuses or self.ACTIVE_STATUSES
+        previous = await database.reservations.find_one_and_update(
+            {"id": reservation_id, "status": {"$in": statuses}},
+            {"$set": {**update_fields, "status": "cancelled"}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous and previous["status"] in self.ACTIVE_STATUSES:
+            await self.release_seats(previous["event_id"])
+        if previous:
+            await self._notify([self._change(previous, "cancelled")])
+        return previous
+
+    async def cancel_many(self, reservation_ids: List[str], update_fields: Dict[str, Any]) -> int:
+        """Cancel several reservations, releasing one seat per cancelled booking"""
+        released: Dict[str, int] = {}
+        changes = []
+        for reservation_id in reservation_ids:
+            previous = await database.reservations.find_one_and_update(
+                {"id": reservation_id, "status": {"$in": self.ACTIVE_STATUSES}},
+                {"$set": {**update_fields, "status": "cancelled"}},
+                projection={
+                    "_id": 0, "id": 1, "user_id": 1, "event_id": 1, "status": 1,
+                    "created_at": 1, "checked_in_at": 1
+                }
+            )
+            if previous:
+                changes.append(self._change(previous, "cancelled"))
+                released[previous["event_id"]] = released.get(previous["event_id"], 0) + 1
+
+        for event_id, count in released.items():
+            await self.release_seats(event_id, count)
+        await self._notify(changes)
+        return len(changes)
+
+    async def check_in(self, reservation_id: str, update_fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Mark a confirmed reservation as checked in
+
+        Conditional on the reservation still being confirmed, so a second
+        check-in is a no-op. Returns the reservation as it was before the
+        change, or None if nothing was checked in.
+        """
+        previous = await database.reservations.find_one_and_update(
+            {"id": reservation_id, "status": "confirmed"},
+            {"$set": {**with_native_dates(dict(update_fields)), "status": "checked_in"}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous:
+            await self._notify([self._change(previous, "checked_in", update_fields)])
+        return previous
+
+    async def check_in_known(self, reservation: Dict[str, Any], update_fields: Dict[str, Any]) -> bool:
+        """
+        Check in a reservation whose fields the caller already holds
+
+        One `update_one` conditional on the reservation still being
+        confirmed; the listener change is built from `reservation` instead of
+        being read back. Returns whether the reservation was checked in.
+        """
+        result = await database.reservations.update_one(
+            {"id": reservation["id"], "status": "confirmed"},
+            {"$set": {**with_native_dates(dict(update_fields)), "status": "checked_in"}}
+        )
+        if not result.modified_count:
+            return False
+        await self._notify([self._change({**reservation, "status": "confirmed"}, "checked_in", update_fields)])
+        return True
+
+    async def check_in_known_many(
+        self,
+        items: List[Tuple[Dict[str, Any], Dict[str, Any]]]
+    ) -> List[str]:
+        """
+        Check in several known reservations with one bulk write
+
+        `items` pairs each reservation (as for `check_in_known`) with its own
+        update fields. Every update is conditional on the reservation still
+        being confirmed and tags it with a batch id; when some updates match
+        nothing, the tagged reservations are read back in one query. Returns
+        the ids that were checked in.
+        """
+        if not items:
+            return []
+        batch_id = uuid.uuid4().hex
+        operations = [
+            UpdateOne(
+                {"id": reservation["id"], "status": "confirmed"},
+                {"$set": {
+                    **with_native_dates(dict(update_fields)),
+                    "status": "checked_in",
+                    "checkin_batch_id": batch_id
+                }}
+            )
+            for reservation, update_fields in items
+        ]
+        result = await database.reservations.bulk_write(operations, ordered=False)
+
+        ids = [reservation["id"] for reservation, _ in items]
+        if result.modified_count == len(items):
+            checked_in = set(ids)
+        else:
+            checked_in = {
+                doc["id"]
+                async for doc in database.reservations.find(
+                    {"id": {"$in": ids}, "checkin_batch_id": batch_id}, {"_id": 0, "id": 1}
+                )
+            }
+
+        await self._notify([
+            self._change({**reservation, "status": "confirmed"}, "checked_in", update_fields)
+            for reservation, update_fields in items
+            if reservation["id"] in checked_in
+        ])
+        return [reservation_id for reservation_id in ids if reservation_id in checked_in]
+
+    async def check_in_many(self, reservation_ids: List[str], update_fields: Dict[str, Any]) -> int:
+        """Check in several confirmed reservations; returns how many changed"""
+        update_fields = with_native_dates(dict(update_fields))
+        changes = []
+        for reservation_id in reservation_ids:
+            previous = await database.reservations.find_one_and_update(
+                {"id": reservation_id, "status": "confirmed"},
+                {"$set": {**update_fields, "status": "checked_in"}},
+                projection={
+                    "_id": 0, "id": 1, "user_id": 1, "event_id": 1, "status": 1,
+                    "created_at": 1, "checked_in_at": 1
+                }
+            )
+            if previous:
+                changes.append(self._change(previous, "checked_in", update_fields))
+        await self._notify(changes)
+        return len(changes)
+
+    @staticmethod
+    def _change(
+        previous: Dict[str, Any],
+        new_status: str,
+        update_fields: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Listener change for `previous` moving to `new_status` with `update_fields` set"""
+        return {
+            "reservation_id": previous["id"],
+            "user_id": previous["user_id"],
+            "event_id": previous["event_id"],
+            "previous_status": previous["status"],
+            "status": new_status,
+            "created_at": previous.get("created_at"),
+            "checked_in_at": (update_fields or {}).get("checked_in_at", previous.get("checked_in_at"))
+        }
+
+    async def _active_counts(self, event_ids: Optional[List[str]]) -> Dict[str, int]:
+        """Seat-holding reservations per event, with one `$group` aggregation"""
+        match: Dict[str, Any] = {"status": {"$in": self.ACTIVE_STATUSES}}
+        if event_ids is not None:
+            match["event_id"] = {"$in": event_ids}
+        return {
+            doc["_id"]: doc["count"]
+            async for doc in database.reservations.aggregate([
+                {"$match": match},
+                {"$group": {"_id": "$event_id", "count": {"$sum": 1}}}
+            ])
+        }
+
+    async def initialize_reserved_counts(self, event_ids: Optional[List[str]] = None) -> int:
+        """
+        Create `reserved_count` on events that predate the seat counter
+
+        No booking can move a counter that does not exist yet, so the count
+        is written outright, conditional on the field still being missing.
+        Returns the number of counters created.
+        """
+        event_filter: Dict[str, Any] = {"reserved_count": {"$exists": False}}
+        if event_ids is not None:
+            event_filter["id"] = {"$in": event_ids}
+        uncounted = [event["id"] async for event in database.events.find(event_filter, {"_id": 0, "id": 1})]
+        if not uncounted:
+            return 0
+
+        counts = await self._active_counts(uncounted)
+        result = await database.events.bulk_write([
+            UpdateOne(
+                {"id": event_id, "reserved_count": {"$exists": False}},
+                {"$set": {"reserved_count": counts.get(event_id, 0)}}
+            )
+            for event_id in uncounted
+        ], ordered=False)
+        return result.modified_count
+
+    async def _seat_drift(self, event_ids: Optional[List[str]]) -> Dict[str, Tuple[int, int]]:
+        """Events whose counter disagrees with their reservations: id -> (counter, count)"""
+        event_filter: Dict[str, Any] = {"reserved_count": {"$exists": True}}
+        if event_ids is not None:
+            event_filter["id"] = {"$in": event_ids}
+        counters = {
+            event["id"]: event["reserved_count"]
+            async for event in database.events.find(event_filter, {"_id": 0, "id": 1, "reserved_count": 1})
+        }
+        counts = await self._active_counts(event_ids)
+        return {
+            event_id: (counter, counts.get(event_id, 0))
+            for event_id, counter in counters.items()
+            if counter != counts.get(event_id, 0)
+        }
+
+    async def reconcile_reserved_counts(
+        self,
+        event_ids: Optional[List[str]] = None,
+        settle: Optional[float] = None
+    ) -> int:
+        """
+        Correct `reserved_count` counters that drifted from the reservations collection
+
+        A booking takes its seat before inserting its reservation and a
+        cancellation frees it after, so a counter is briefly ahead of or
+        behind the count while they run. Drift is therefore sampled twice,
+        `settle` seconds apart (CAPACITY_RECONCILE_SETTLE by default), and
+        only corrected where neither the counter nor the count moved. The
+        correction is an `$inc` by the difference, conditional on the counter
+        still holding the observed value, so a booking or cancellation that
+        lands meanwhile wins and the event is left for the next run. Counters
+        missing altogether are created first. Returns the number of events
+        corrected.
+        """
+        corrected = await self.initialize_reserved_counts(event_ids)
+
+        drift = await self._seat_drift(event_ids)
+        if drift:
+            await asyncio.sleep(settings.CAPACITY_RECONCILE_SETTLE if settle is None else settle)
+            resampled = await self._seat_drift(list(drift))
+            drift = {event_id: seen for event_id, seen in resampled.items() if drift.get(event_id) == seen}
+
+        if drift:
+            result = await database.events.bulk_write([
+                UpdateOne(
+                    {"id": event_id, "reserved_count": counter},
+                    {"$inc": {"reserved_count": count - counter}}
+                )
+                for event_id, (counter, count) in drift.items()
+            ], ordered=False)
+            corrected += result.modified_count
+
+        if corrected:
+            logger.info(f"Reconciled seat counters for {corrected} events")
+        return corrected
+
+    async def _reconcile_loop(self, interval: int):
+        while True:
+            try:
+                await self.reconcile_reserved_counts()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Seat counter reconciliation failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start_reconciler(self):
+        """Reconcile seat counters now and then every CAPACITY_RECONCILE_INTERVAL seconds"""
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.create_task(
+                self._reconcile_loop(settings.CAPACITY_RECONCILE_INTERVAL)
+            )
+
+    async def stop_reconciler(self):
+        """Stop the background reconciliation task"""
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+            try:
+                await self._reconcile_task
+            except asyncio.CancelledError:
+                pass
+            self._reconcile_task = None
+
+
+# Global service instance
+reservation_service = ReservationService()
+reservation_service.add_listener(feature_store.apply_reservation_changes)
+reservation_service.add_listener(dashboard_counters.apply_reservation_changes)
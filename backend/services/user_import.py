@@ -0,0 +1,386 @@
+"""
+User import service - Background bulk import of users from CSV/Excel
+
+Imports run as jobs: the upload is parsed in chunks, each chunk is checked
+for existing emails with a single `$in` query and users are written with one
+unordered `insert_many`. Every imported user gets the job's default password,
+so it is hashed once per job through the shared password hasher.
+Progress and results are stored in the `import_jobs` collection. A running
+job renews its `locked_until` lease; jobs whose lease ran out were cut off by
+a restart (the upload only lives in memory) and are marked failed.
+"""
+
+import asyncio
+import csv
+import io
+import logging
+import uuid
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Optional, List, Dict, Any, Iterator, Callable, Awaitable
+
+from email_validator import validate_email, EmailNotValidError
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from core.config import settings
+from core.dashboard_counters import dashboard_counters
+from core.database import database
+from core.feature_store import feature_store
+from core.passwords import password_hasher
+from utils.dates import parse_timestamp
+from utils.identifiers import normalize_email, normalize_phone
+from utils.search import with_search_fields
+
+logger = logging.getLogger(__name__)
+
+
+# Accepted header spellings for each user field
+COLUMN_MAPPING = {
+    'name': ['name', 'nombre', 'full_name', 'fullname', 'full name'],
+    'email': ['email', 'correo', 'mail', 'e-mail'],
+    'phone': ['phone', 'telefono', 'tel', 'telephone', 'cellphone', 'celular'],
+    'age': ['age', 'edad', 'years', 'años'],
+    'location': ['location', 'ubicacion', 'city', 'ciudad', 'address', 'direccion']
+}
+
+# Errors kept on the job document; the counters still cover every row
+MAX_REPORTED_ERRORS = 1000
+
+ACTIVE_STATUSES = ["queued", "running"]
+INTERRUPTED_ERROR = "Import interrupted by a server restart; upload the file again"
+
+
+def _lease_until() -> str:
+    return (datetime.utcnow() + timedelta(seconds=settings.IMPORT_JOB_LEASE)).isoformat()
+
+
+def iter_rows(content: bytes, filename: str) -> Iterator[Dict[str, Any]]:
+    """Yield spreadsheet rows as dicts without materialising the whole file"""
+    if filename.endswith('.csv'):
+        reader = csv.DictReader(io.TextIOWrapper(io.BytesIO(content), encoding='utf-8-sig'))
+        yield from reader
+    elif filename.endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else "" for cell in next(rows, [])]
+            for values in rows:
+                if values and any(value is not None for value in values):
+                    yield dict(zip(header, values))
+        finally:
+            workbook.close()
+    else:
+        # Legacy .xls has no streaming reader
+        import pandas as pd
+
+        yield from pd.read_excel(io.BytesIO(content)).to_dict('records')
+
+
+def map_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map a raw spreadsheet row to a user record
+
+    Raises ValueError with a user-facing message when the row is invalid.
+    """
+    columns = {str(key).lower().strip(): key for key in row.keys() if key is not None}
+    mapped = {}
+    missing = []
+    for field, possible_names in COLUMN_MAPPING.items():
+        column = next((columns[name] for name in possible_names if name in columns), None)
+        value = row.get(column) if column is not None else None
+        if value is not None and str(value).strip() and str(value).strip().lower() != 'nan':
+            mapped[field] = str(value).strip()
+        else:
+            missing.append(field)
+
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    try:
+        validate_email(mapped['email'], check_deliverability=False)
+    except EmailNotValidError:
+        raise ValueError("Invalid email format")
+
+    try:
+        age = int(float(mapped['age']))
+    except ValueError:
+        age = 0
+    if age < 1 or age > 120:
+        raise ValueError("Invalid age (must be a number between 1-120)")
+    mapped['age'] = age
+
+    return mapped
+
+
+class UserImportService:
+    """Runs bulk user imports as background jobs"""
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def jobs(self):
+        return database.db.import_jobs
+
+    async def start_import(
+        self,
+        content: bytes,
+        filename: str,
+        default_password: str,
+        requested_by: str,
+        send_welcome: Optional[Callable[[str, str, str], Awaitable[Any]]] = None,
+        on_complete: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None
+    ) -> Dict[str, Any]:
+        """Create an import job and start processing it in the background"""
+        now = datetime.utcnow().isoformat()
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": "user_import",
+            "filename": filename,
+            "status": "queued",
+            "requested_by": requested_by,
+            "total_processed": 0,
+            "successful_imports": 0,
+            "failed_imports": 0,
+            "duplicate_emails": 0,
+            "errors": [],
+            "created_at": now,
+            "updated_at": now,
+            "locked_until": _lease_until()
+        }
+        await self.jobs.insert_one(job)
+        job.pop("_id", None)
+
+        task = asyncio.create_task(
+            self._run(job["id"], content, filename, default_password, send_welcome, on_complete)
+        )
+        self._tasks[job["id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["id"], None))
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current progress and results of an import job"""
+        job = await self.jobs.find_one({"id": job_id}, {"_id": 0})
+        if job and job["status"] in ACTIVE_STATUSES and job_id not in self._tasks:
+            # Owned by another worker, or by one that was restarted mid-run
+            if await self.fail_interrupted_jobs(job_id):
+                job = await self.jobs.find_one({"id": job_id}, {"_id": 0})
+        return job
+
+    async def fail_interrupted_jobs(self, job_id: Optional[str] = None) -> int:
+        """Mark queued/running jobs whose lease expired as failed; returns how many"""
+        now = datetime.utcnow().isoformat()
+        query: Dict[str, Any] = {
+            "status": {"$in": ACTIVE_STATUSES},
+            "$or": [
+                {"locked_until": {"$lte": now}},
+                # Jobs created before leases were recorded
+                {
+                    "locked_until": {"$exists": False},
+                    "updated_at": {
+                        "$lte": (datetime.utcnow() - timedelta(seconds=settings.IMPORT_JOB_LEASE)).isoformat()
+                    }
+                }
+            ]
+        }
+        if job_id:
+            query["id"] = job_id
+
+        result = await self.jobs.update_many(query, {
+            "$set": {"status": "failed", "error": INTERRUPTED_ERROR, "completed_at": now, "updated_at": now},
+            "$unset": {"locked_until": ""}
+        })
+        if result.modified_count and not job_id:
+            logger.warning(f"Marked {result.modified_count} interrupted user import jobs as failed")
+        return result.modified_count
+
+    async def _heartbeat(self, job_id: str):
+        """Renew the job's lease while it runs"""
+        while True:
+            await asyncio.sleep(settings.IMPORT_JOB_LEASE / 4)
+            try:
+                await self.jobs.update_one(
+                    {"id": job_id, "status": "running"},
+                    {"$set": {"locked_until": _lease_until()}}
+                )
+            except Exception as e:
+                logger.warning(f"Could not renew the lease of user import {job_id}: {e}")
+
+    async def _run(
+        self,
+        job_id: str,
+        content: bytes,
+        filename: str,
+        default_password: str,
+        send_welcome: Optional[Callable[[str, str, str], Awaitable[Any]]],
+        on_complete: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]]
+    ):
+        await self.jobs.update_one({"id": job_id}, {"$set": {
+            "status": "running",
+            "started_at": datetime.utcnow().isoformat(),
+            "locked_until": _lease_until()
+        }})
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+
+        seen_emails = set()
+        row_number = 0
+        try:
+            password_hash = await password_hasher.hash(default_password)
+            rows = iter_rows(content, filename)
+            while True:
+                # Parsing is CPU work: pull each chunk off the event loop
+                chunk = await asyncio.to_thread(lambda: list(islice(rows, settings.IMPORT_CHUNK_SIZE)))
+                if not chunk:
+                    break
+
+                numbered = list(enumerate(chunk, start=row_number + 1))
+                row_number += len(chunk)
+                await self._process_chunk(job_id, numbered, seen_emails, password_hash, send_welcome)
+
+            job = await self.jobs.find_one_and_update(
+                {"id": job_id},
+                {
+                    "$set": {"status": "completed", "completed_at": datetime.utcnow().isoformat()},
+                    "$unset": {"locked_until": ""}
+                },
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+            logger.info(f"User import {job_id} completed: {job['successful_imports']} imported")
+
+            if on_complete:
+                try:
+                    await on_complete(job)
+                except Exception as e:
+                    logger.warning(f"Import completion hook failed: {e}")
+
+        except Exception as e:
+            logger.error(f"User import {job_id} failed: {e}")
+            await self.jobs.update_one({"id": job_id}, {
+                "$set": {
+                    "status": "failed",
+                    "error": str(e),
+                    "completed_at": datetime.utcnow().isoformat()
+                },
+                "$unset": {"locked_until": ""}
+            })
+        finally:
+            heartbeat.cancel()
+
+    async def _process_chunk(
+        self,
+        job_id: str,
+        numbered_rows: List[tuple],
+        seen_emails: set,
+        password_hash: str,
+        send_welcome: Optional[Callable[[str, str, str], Awaitable[Any]]]
+    ):
+        errors = []
+        failed = 0
+        duplicates = 0
+        candidates = []
+
+        for row_number, row in numbered_rows:
+            try:
+                mapped = map_row(row)
+            except ValueError as e:
+                failed += 1
+                errors.append({"row": row_number, "error": str(e)})
+                continue
+
+            email_key = normalize_email(mapped['email'])
+            if email_key in seen_emails:
+                duplicates += 1
+                errors.append({"row": row_number, "email": mapped['email'], "error": "Duplicate email in file"})
+                continue
+            seen_emails.add(email_key)
+            candidates.append((row_number, mapped))
+
+        # One round trip to find every email of the chunk that already exists,
+        # compared on the normalized key so case differences still match
+        if candidates:
+            existing = {
+                doc["email_normalized"]
+                async for doc in database.users.find(
+                    {"email_normalized": {"$in": [normalize_email(mapped['email']) for _, mapped in candidates]}},
+                    {"_id": 0, "email_normalized": 1}
+                )
+            }
+            fresh = []
+            for row_number, mapped in candidates:
+                if normalize_email(mapped['email']) in existing:
+                    duplicates += 1
+                    errors.append({"row": row_number, "email": mapped['email'], "error": "Email already exists"})
+                else:
+                    fresh.append((row_number, mapped))
+            candidates = fresh
+
+        inserted_users = []
+        if candidates:
+            now = datetime.utcnow().isoformat()
+            docs = [
+                with_search_fields({
+                    "id": str(uuid.uuid4()),
+                    "name": mapped['name'],
+                    "email": mapped['email'],
+                    "email_normalized": normalize_email(mapped['email']),
+                    "password": password_hash,
+                    "phone": mapped['phone'],
+                    "phone_normalized": normalize_phone(mapped['phone']),
+                    "age": mapped['age'],
+                    "location": mapped['location'],
+                    "is_admin": False,
+                    "deleted": False,
+                    "created_at": now,
+                    "created_at_dt": parse_timestamp(now),
+                    "imported": True,
+                    "import_date": now
+                })
+                for _, mapped in candidates
+            ]
+
+            try:
+                await database.users.insert_many(docs, ordered=False)
+                inserted_users = docs
+            except BulkWriteError as e:
+                # Unordered: everything except the failed documents was written
+                failed_indexes = {error["index"]: error for error in e.details.get("writeErrors", [])}
+                for index, error in failed_indexes.items():
+                    row_number, mapped = candidates[index]
+                    if error.get("code") == 11000:
+                        duplicates += 1
+                        errors.append({"row": row_number, "email": mapped['email'], "error": "Email already exists"})
+                    else:
+                        failed += 1
+                        errors.append({"row": row_number, "email": mapped['email'], "error": error.get("errmsg", "Write failed")})
+                inserted_users = [doc for index, doc in enumerate(docs) if index not in failed_indexes]
+            await dashboard_counters.record_users_created(inserted_users)
+            await feature_store.add_users([user["id"] for user in inserted_users])
+
+        if send_welcome:
+            for user in inserted_users:
+                try:
+                    await send_welcome(user["email"], user["name"], user["id"])
+                except Exception as e:
+                    logger.warning(f"Failed to queue welcome email to {user['email']}: {e}")
+
+        await self.jobs.update_one(
+            {"id": job_id},
+            {
+                "$inc": {
+                    "total_processed": len(numbered_rows),
+                    "successful_imports": len(inserted_users),
+                    "failed_imports": failed,
+                    "duplicate_emails": duplicates
+                },
+                "$push": {"errors": {"$each": errors, "$slice": MAX_REPORTED_ERRORS}},
+                "$set": {"updated_at": datetime.utcnow().isoformat()}
+            }
+        )
+
+
+# Global service instance
+user_import_service = UserImportService()
@@ -8,11 +8,18 @@ from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from fastapi import HTTPException, status
 
+from core.dashboard_counters import dashboard_counters
+from core.feature_store import feature_store
 from core.database import database
-from core.security import hash_password, verify_password, create_access_token
+from core.security import hash_password, create_access_token
+from core.passwords import password_hasher
+from core.principal_cache import principal_cache, token_claims
 from models.users import UserCreate, UserUpdate, User, BulkImportResult
 from utils.email import send_welcome_email, send_password_reset_email
 from utils.validation import validate_user_data
+from utils.dates import with_native_dates
+from utils.identifiers import with_normalized_identifiers
+from utils.search import with_search_fields, HIDDEN_SEARCH_FIELDS
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +35,7 @@ class UserService:
             await validate_user_data(user_data)
             
             # Check if user already exists
-            existing_user = database.users.find_one({"email": user_data.email})
+            existing_user = await database.users.find_one({"email": user_data.email})
             if existing_user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -37,7 +44,7 @@ class UserService:
             
             # Create new user
             user_id = str(uuid.uuid4())
-            hashed_password = hash_password(user_data.password)
+            hashed_password = await hash_password(user_data.password)
             
             user_doc = {
                 "id": user_id,
@@ -54,12 +61,14 @@ class UserService:
             }
             
             # Insert user into database
-            result = database.users.insert_one(user_doc)
+            result = await database.users.insert_one(with_native_dates(with_normalized_identifiers(with_search_fields(user_doc))))
+            await dashboard_counters.record_users_created([user_doc])
+            await feature_store.add_users([user_id])
             
             if result.inserted_id:
                 # Send welcome email (async)
                 try:
-                    await send_welcome_email(user_data.email, user_data.name)
+                    await send_welcome_email(user_data.email, user_data.name, user_id)
                 except Exception as e:
                     logger.warning(f"Failed to send welcome email: {e}")
                 
@@ -89,29 +98,33 @@ class UserService:
         """Authenticate user and return access token"""
         try:
             # Find user by email
-            user = database.users.find_one({"email": email, "deleted": False})
+            user = await database.users.find_one({"email": email, "deleted": False})
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid email or password"
                 )
             
-            # Verify password
-            if not verify_password(password, user["password"]):
+            # Verify password, upgrading hashes made at another bcrypt cost
+            verified, new_hash = await password_hasher.verify_and_rehash(password, user["password"])
+            if not verified:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid email or password"
                 )
             
             # Update last login
-            database.users.update_one(
+            login_update = with_native_dates({"last_login": datetime.utcnow().isoformat()})
+            if new_hash:
+                login_update["password"] = new_hash
+            await database.users.update_one(
                 {"id": user["id"]},
-                {"$set": {"last_login": datetime.utcnow().isoformat()}}
+                {"$set": login_update}
             )
             
             # Create access token
             access_token = create_access_token(
-                data={"sub": user["id"], "email": user["email"]}
+                data={**token_claims(user), "email": user["email"]}
             )
             
             # Remove password from response
@@ -139,7 +152,7 @@ class UserService:
     async def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
         try:
-            user = database.users.find_one({"id": user_id, "deleted": False})
+            user = await database.users.find_one({"id": user_id, "deleted": False}, HIDDEN_SEARCH_FIELDS)
             if user:
                 user.pop("password", None)
                 user.pop("_id", None)
@@ -165,7 +178,7 @@ class UserService:
             for field, value in update_data.dict(exclude_unset=True).items():
                 if field == "email" and value != current_user["email"]:
                     # Check if email is already taken
-                    existing = database.users.find_one({"email": value, "deleted": False})
+                    existing = await database.users.find_one({"email": value, "deleted": False})
                     if existing and existing["id"] != user_id:
                         raise HTTPException(
                             status_code=status.HTTP_400_BAD_REQUEST,
@@ -177,12 +190,18 @@ class UserService:
                 update_doc["updated_at"] = datetime.utcnow().isoformat()
                 
                 # Update user
-                result = database.users.update_one(
+                result = await database.users.update_one(
                     {"id": user_id},
-                    {"$set": update_doc}
+                    {"$set": with_normalized_identifiers(with_search_fields(update_doc, current_user))}
                 )
                 
                 if result.modified_count > 0:
+                    # A role change invalidates the user's tokens; other edits only the cached profile
+                    if "is_admin" in update_doc:
+                        await principal_cache.revoke([user_id])
+                    else:
+                        await principal_cache.invalidate(user_id)
+                    
                     # Get updated user
                     updated_user = await UserService.get_user_by_id(user_id)
                     logger.info(f"User updated: {user_id}")
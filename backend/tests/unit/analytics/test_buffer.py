@@ -0,0 +1,67 @@
+"""
+Unit tests for the analytics ingestion buffer
+"""
+
+import pytest
+
+from analytics.buffer import AnalyticsBuffer, coalesce_redis_ops
+
+
+@pytest.mark.unit
+class TestCoalesceRedisOps:
+    """Test merging of buffered Redis operations."""
+
+    def test_merges_operations_per_key(self):
+        """Test pushes, members and increments collapse to one command per key."""
+        ops = [
+            ("lpush", "events", "a"),
+            ("expire", "events", 60),
+            ("sadd", "active_users", "u1"),
+            ("incr", "counter"),
+            ("lpush", "events", "b"),
+            ("expire", "events", 120),
+            ("sadd", "active_users", "u2"),
+            ("incr", "counter"),
+        ]
+
+        commands = coalesce_redis_ops(ops)
+
+        assert ("lpush", ("events", "a", "b")) in commands
+        assert ("sadd", ("active_users", "u1", "u2")) in commands
+        assert ("incrby", ("counter", 2)) in commands
+        assert ("expire", ("events", 120)) in commands
+        assert len(commands) == 4
+
+    def test_trims_and_expiries_follow_writes(self):
+        """Test LTRIM and EXPIRE are issued after the writes they apply to."""
+        commands = coalesce_redis_ops([
+            ("lpush", "times", 0.1),
+            ("ltrim", "times", 0, 99),
+            ("expire", "times", 3600),
+        ])
+
+        names = [command for command, _ in commands]
+        assert names == ["lpush", "ltrim", "expire"]
+
+    def test_rejects_unknown_commands(self):
+        """Test unsupported commands are not silently ignored."""
+        with pytest.raises(ValueError):
+            coalesce_redis_ops([("del", "key")])
+
+
+@pytest.mark.unit
+class TestAnalyticsBuffer:
+    """Test buffer bounds and drop accounting."""
+
+    def test_drops_when_full(self):
+        """Test records beyond capacity are dropped and counted."""
+        buffer = AnalyticsBuffer(max_size=2, flush_size=10)
+
+        assert buffer.append([("incr", "a")])
+        assert buffer.append([("incr", "a")])
+        assert not buffer.append([("incr", "a")])
+
+        stats = buffer.get_stats()
+        assert stats["pending"] == 2
+        assert stats["enqueued"] == 2
+        assert stats["dropped"] == 1
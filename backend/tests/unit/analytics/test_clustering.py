@@ -0,0 +1,51 @@
+"""
+Unit tests for segmentation model fitting
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.clustering import SUMMARY_COLUMNS, cluster_count, fit_full, fit_streamed
+
+
+def _features(num_users: int) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    columns = SUMMARY_COLUMNS + ['unique_sessions', 'cancellation_rate']
+    centers = rng.random((3, len(columns))) * 10
+    values = centers[rng.integers(0, 3, num_users)] + rng.normal(0, 0.3, (num_users, len(columns)))
+    df = pd.DataFrame(values, columns=columns)
+    df.insert(0, 'user_id', [f"user-{i}" for i in range(num_users)])
+    return df
+
+
+@pytest.mark.unit
+class TestClustering:
+    """Test full and chunked model fitting."""
+
+    def test_cluster_count_bounds(self):
+        """Test the cluster count stays between 2 and the configured maximum."""
+        assert cluster_count(3, 5) == 2
+        assert cluster_count(16, 5) == 4
+        assert cluster_count(1_000_000, 8) == 8
+
+    def test_streamed_fit_matches_full_fit_shape(self, tmp_path):
+        """Test chunked training yields a usable model from a file on disk."""
+        df = _features(2000)
+        feature_columns = [col for col in df.columns if col != 'user_id']
+        path = tmp_path / "features.f64"
+        path.write_bytes(df[feature_columns].to_numpy(dtype=np.float64).tobytes())
+
+        _, full = fit_full(df, max_clusters=3, silhouette_sample=500)
+        model, streamed = fit_streamed(
+            str(path), feature_columns, max_clusters=3, chunk_size=256, silhouette_sample=500
+        )
+
+        assert streamed['training_mode'] == 'minibatch'
+        assert streamed['num_users'] == full['num_users'] == 2000
+        assert streamed['silhouette_sample_size'] == 500
+        assert sum(c['size'] for c in streamed['cluster_analysis'].values()) <= 2000
+        assert streamed['silhouette_score'] > 0.5
+
+        X = model['pca'].transform(model['scaler'].transform(df[feature_columns].head(5)))
+        assert model['kmeans'].predict(X).shape == (5,)
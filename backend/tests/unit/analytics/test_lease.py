@@ -0,0 +1,65 @@
+"""
+Unit tests for Redis leases
+"""
+
+import pytest
+
+from analytics.lease import RedisLease, RELEASE_LEASE
+
+
+class FakeRedis:
+    """Single-key stand-in for SET NX and the lease scripts (expiry is manual)"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, holder, *args):
+        if self.values.get(key) != holder:
+            return 0
+        if script == RELEASE_LEASE:
+            del self.values[key]
+        return 1
+
+    def expire(self, key):
+        self.values.pop(key, None)
+
+
+@pytest.mark.unit
+class TestRedisLease:
+    """Test one holder at a time and takeover after expiry or release."""
+
+    async def test_single_holder(self):
+        """Test a second worker cannot take a held lease."""
+        client = FakeRedis()
+        first, second = RedisLease("jobs:leader", "a"), RedisLease("jobs:leader", "b")
+
+        assert await first.hold(client, 1000)
+        assert not await second.hold(client, 1000)
+        assert await first.hold(client, 1000)
+
+    async def test_takeover_after_expiry(self):
+        """Test an expired holder loses the lease to the next worker."""
+        client = FakeRedis()
+        first, second = RedisLease("jobs:leader", "a"), RedisLease("jobs:leader", "b")
+        await first.hold(client, 1000)
+
+        client.expire("jobs:leader")
+        assert await second.hold(client, 1000)
+        assert not await first.hold(client, 1000)
+
+    async def test_release_only_drops_own_lease(self):
+        """Test releasing hands the lease over and never deletes another holder's."""
+        client = FakeRedis()
+        first, second = RedisLease("jobs:leader", "a"), RedisLease("jobs:leader", "b")
+        await first.hold(client, 1000)
+
+        await second.release(client)
+        assert client.values["jobs:leader"] == "a"
+        await first.release(client)
+        assert await second.hold(client, 1000)
@@ -0,0 +1,27 @@
+"""
+Unit tests for analytics startup wiring
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[3]
+
+
+@pytest.mark.unit
+class TestAnalyticsImports:
+    """Test the analytics modules load under the server entrypoint."""
+
+    def test_server_enables_analytics(self):
+        """Test importing the server in a fresh interpreter leaves analytics available."""
+        result = subprocess.run(
+            [sys.executable, "-c", "import server; from core import analytics_init; "
+             "print(analytics_init.ANALYTICS_AVAILABLE)"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120
+        )
+
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip().splitlines()[-1] == "True", result.stderr
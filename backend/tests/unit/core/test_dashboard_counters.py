@@ -0,0 +1,46 @@
+"""
+Unit tests for write-time dashboard counters
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import core.dashboard_counters as dashboard_counters_module
+from core.dashboard_counters import DashboardCounters, day_id, TOTALS_ID
+
+
+class FakeCollection:
+    def __init__(self):
+        self.increments = {}
+
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            self.increments[operation._filter["_id"]] = operation._doc["$inc"]
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(
+        dashboard_counters_module, "database", SimpleNamespace(db=SimpleNamespace(dashboard_counters=collection))
+    )
+    return collection
+
+
+@pytest.mark.unit
+class TestDashboardCounters:
+    """Test reservation changes land in the right day buckets."""
+
+    async def test_synced_check_in_counts_on_scan_day(self, counters):
+        """Test an offline check-in synced later is bucketed by its scan time."""
+        await DashboardCounters().apply_reservation_changes([{
+            "reservation_id": "r1", "user_id": "u1", "event_id": "e1",
+            "previous_status": "confirmed", "status": "checked_in",
+            "created_at": "2024-04-20T10:00:00", "checked_in_at": "2024-05-01T19:05:00"
+        }])
+
+        assert counters.increments == {
+            TOTALS_ID: {"checkins": 1},
+            day_id("2024-05-01"): {"checkins": 1}
+        }
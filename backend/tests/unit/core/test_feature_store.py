@@ -0,0 +1,105 @@
+"""
+Unit tests for the windowed per-user feature store
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from analytics.segmentation import features_from_store
+import core.feature_store as feature_store_module
+from core.feature_store import FeatureStore, window_start, window_counters
+
+NOW = datetime.utcnow()
+TODAY = NOW.date().isoformat()
+OLD_DAY = (NOW - timedelta(days=45)).date().isoformat()
+
+
+class FakeCollection:
+    def __init__(self):
+        self.operations = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(feature_store_module, "database", SimpleNamespace(db=SimpleNamespace(user_features=collection)))
+    return FeatureStore()
+
+
+def feature_doc():
+    return {
+        "user_id": "u1",
+        "days": {
+            OLD_DAY: {"total_events": 50, "page_views": 50, "sessions": ["s0"], "total_reservations": 9},
+            TODAY: {
+                "total_events": 4, "page_views": 3, "checkins": 1, "sessions": ["s1", "s2"],
+                "first_event_at": f"{TODAY}T09:00:00", "last_event_at": f"{TODAY}T19:00:00",
+                "hours": {"morning": 3, "evening": 1},
+                "total_reservations": 2, "reservations": {"checked_in": 1, "cancelled": 1}
+            }
+        }
+    }
+
+
+@pytest.mark.unit
+class TestFeatureStore:
+    """Test day-bucketed counters and the feature window."""
+
+    async def test_events_are_bucketed_by_day(self, store):
+        """Test events land in their day's bucket and sessions are kept per day."""
+        await store.apply_events([
+            {"user_id": "u1", "event_type": "page_view", "session_id": "s1", "timestamp": f"{TODAY}T09:00:00"},
+            {"user_id": "u1", "event_type": "page_view", "session_id": "s1", "timestamp": f"{TODAY}T10:00:00"},
+            {"user_id": "u1", "event_type": "page_view", "session_id": "s9", "timestamp": f"{OLD_DAY}T10:00:00"},
+        ])
+
+        update, prune = [operation._doc for operation in store.collection.operations]
+        assert update["$inc"][f"days.{TODAY}.page_views"] == 2
+        assert update["$addToSet"][f"days.{TODAY}.sessions"] == {"$each": ["s1"]}
+        assert not any(OLD_DAY in key for key in update["$inc"])
+        assert "sessions" not in update.get("$addToSet", {})
+        assert isinstance(prune, list)
+
+    def test_window_counters_skip_old_days(self):
+        """Test only buckets inside the window are summed."""
+        totals = window_counters(feature_doc(), window_start(NOW))
+
+        assert totals["total_events"] == 4
+        assert totals["sessions"] == 2
+        assert totals["total_reservations"] == 2
+        assert totals["first_event_at"] == f"{TODAY}T09:00:00"
+
+    def test_features_use_the_window(self):
+        """Test store features match the 30-day window, not lifetime totals."""
+        users = pd.DataFrame([{"id": "u1", "age": 30, "created_at": "2025-01-01T00:00:00"}])
+        row = features_from_store([feature_doc()], users, now=NOW).iloc[0]
+
+        assert row["total_events"] == 4
+        assert row["unique_sessions"] == 2
+        assert row["checkin_rate"] == 0.5
+        assert row["prefers_morning"] == 0.75
+
+    async def test_new_users_get_empty_documents(self, store):
+        """Test new users are upserted with empty counters without touching existing ones."""
+        await store.add_users(["u1", "u2"])
+
+        operations = store.collection.operations
+        assert [operation._filter for operation in operations] == [{"user_id": "u1"}, {"user_id": "u2"}]
+        assert all(operation._upsert for operation in operations)
+        assert set(operations[0]._doc) == {"$setOnInsert"}
+        assert operations[0]._doc["$setOnInsert"]["days"] == {}
+
+    def test_inactive_users_get_feature_rows(self):
+        """Test a user without activity is featurized from zero counters."""
+        users = pd.DataFrame([{"id": "u2", "age": 40, "created_at": "2025-01-01T00:00:00"}])
+        row = features_from_store([{"user_id": "u2", "days": {}}], users, now=NOW).iloc[0]
+
+        assert row["user_id"] == "u2"
+        assert row["total_events"] == 0
+        assert row["total_reservations"] == 0
@@ -0,0 +1,94 @@
+"""
+Unit tests for the declarative index manifest
+"""
+
+import pytest
+
+from core.indexes import INDEX_MANIFEST, index_name, diff_indexes
+
+
+@pytest.mark.unit
+@pytest.mark.database
+class TestIndexManifest:
+    """Test index drift detection."""
+
+    def test_index_name_matches_mongodb_default(self):
+        """Test generated names follow the server's naming scheme."""
+        assert index_name([("id", 1)]) == "id_1"
+        assert index_name([("user_id", 1), ("status", 1), ("created_at", -1)]) == "user_id_1_status_1_created_at_-1"
+
+    def test_hot_path_keys_are_unique(self):
+        """Test primary keys and check-in codes are declared unique."""
+        for collection in ("users", "events", "reservations"):
+            id_specs = [spec for spec in INDEX_MANIFEST[collection] if spec["keys"] == [("id", 1)]]
+            assert id_specs and id_specs[0]["unique"]
+
+        checkin_specs = [spec for spec in INDEX_MANIFEST["reservations"] if spec["keys"] == [("checkin_code", 1)]]
+        assert checkin_specs and checkin_specs[0]["unique"]
+
+    def test_missing_and_conflicting(self):
+        """Test absent indexes and option mismatches are reported."""
+        expected = [
+            {"keys": [("id", 1)], "unique": True},
+            {"keys": [("event_id", 1), ("status", 1)]},
+        ]
+        existing = {
+            "_id_": {"key": [("_id", 1)]},
+            "id_1": {"key": [("id", 1)]},
+        }
+
+        report = diff_indexes(expected, existing)
+
+        assert report["missing"] == ["event_id_1_status_1"]
+        assert report["conflicting"] == ["id_1"]
+
+    def test_option_drift_is_conflicting(self):
+        """Test partial filter, TTL and sparse differences are reported."""
+        expected = [
+            {"keys": [("checkin_code", 1)], "unique": True, "partial": {"checkin_code": {"$type": "string"}}},
+            {"keys": [("expires_at", 1)], "options": {"expireAfterSeconds": 0}},
+            {"keys": [("status", 1)]},
+            {"keys": [("id", 1)], "unique": True},
+        ]
+        existing = {
+            "_id_": {"key": [("_id", 1)]},
+            "checkin_code_1": {"key": [("checkin_code", 1)], "unique": True},
+            "expires_at_1": {"key": [("expires_at", 1)], "expireAfterSeconds": 3600},
+            "status_1": {"key": [("status", 1)], "sparse": True},
+            "id_1": {"key": [("id", 1)], "unique": True},
+        }
+
+        report = diff_indexes(expected, existing)
+
+        assert report["conflicting"] == ["checkin_code_1", "expires_at_1", "status_1"]
+
+    def test_text_index_defaults_match(self):
+        """Test a text index reported with server defaults is in sync."""
+        expected = [{"keys": [("title", "text"), ("tags", "text")]}]
+        existing = {
+            "title_text_tags_text": {
+                "key": [("_fts", "text"), ("_ftsx", 1)],
+                "weights": {"title": 1, "tags": 1},
+                "default_language": "english",
+                "language_override": "language",
+                "textIndexVersion": 3
+            }
+        }
+
+        assert diff_indexes(expected, existing)["conflicting"] == []
+
+    def test_prefix_index_is_redundant(self):
+        """Test a single-field index covered by a compound index is flagged."""
+        expected = [{"keys": [("event_id", 1), ("status", 1)]}]
+        existing = {
+            "_id_": {"key": [("_id", 1)]},
+            "event_id_1": {"key": [("event_id", 1)]},
+            "event_id_1_status_1": {"key": [("event_id", 1), ("status", 1)]},
+            "reservation_code_1": {"key": [("reservation_code", 1)], "unique": True},
+        }
+
+        report = diff_indexes(expected, existing)
+
+        assert report["missing"] == []
+        assert report["redundant"] == ["event_id_1"]
+        assert report["unmanaged"] == ["reservation_code_1"]
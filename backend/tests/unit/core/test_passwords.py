@@ -0,0 +1,59 @@
+"""
+Unit tests for off-loop password hashing
+"""
+
+import asyncio
+
+import pytest
+
+from core.passwords import PasswordHasher, hash_rounds
+
+
+@pytest.mark.unit
+@pytest.mark.security
+class TestPasswordHasher:
+    """Test bounded bcrypt hashing and cost upgrades."""
+
+    async def test_hash_and_verify(self):
+        """Test a hash verifies its password only."""
+        hasher = PasswordHasher(rounds=4, workers=2)
+        hashed = await hasher.hash("secret")
+
+        assert hash_rounds(hashed) == 4
+        assert await hasher.verify("secret", hashed)
+        assert not await hasher.verify("wrong", hashed)
+        assert not await hasher.verify("secret", "not-a-hash")
+
+    async def test_concurrency_is_capped(self):
+        """Test no more than `workers` calls run at once and waits are recorded."""
+        hasher = PasswordHasher(rounds=4, workers=2)
+        peak = 0
+
+        async def watch():
+            nonlocal peak
+            while True:
+                peak = max(peak, hasher.in_flight)
+                await asyncio.sleep(0)
+
+        watcher = asyncio.create_task(watch())
+        await asyncio.gather(*(hasher.hash(f"password-{i}") for i in range(8)))
+        watcher.cancel()
+
+        stats = hasher.stats()
+        assert peak <= 2
+        assert stats["calls"] == 8
+        assert stats["waiting"] == 0 and stats["in_flight"] == 0
+        assert stats["max_queue_ms"] > 0
+
+    async def test_rehash_on_cost_change(self):
+        """Test a login against an older cost returns a hash at the new cost."""
+        old_hash = await PasswordHasher(rounds=4).hash("secret")
+        hasher = PasswordHasher(rounds=5)
+
+        verified, new_hash = await hasher.verify_and_rehash("secret", old_hash)
+        assert verified and hash_rounds(new_hash) == 5
+
+        verified, unchanged = await hasher.verify_and_rehash("secret", new_hash)
+        assert verified and unchanged is None
+
+        assert await hasher.verify_and_rehash("wrong", old_hash) == (False, None)
@@ -0,0 +1,85 @@
+"""
+Unit tests for the authenticated-principal cache
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import core.principal_cache as principal_cache_module
+from core.principal_cache import PrincipalCache, token_claims
+
+
+class FakeUsers:
+    """users collection stand-in that counts reads"""
+
+    def __init__(self, docs):
+        self.docs = {doc["id"]: doc for doc in docs}
+        self.reads = 0
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        doc = self.docs.get(query["id"])
+        return {k: v for k, v in doc.items() if k != "password"} if doc else None
+
+    async def update_many(self, query, update):
+        for user_id in query["id"]["$in"]:
+            if user_id in self.docs:
+                self.docs[user_id]["token_version"] = self.docs[user_id].get("token_version", 0) + 1
+
+
+@pytest.fixture
+def users(monkeypatch):
+    users = FakeUsers([
+        {"id": "u1", "name": "Ana", "password": "hash", "is_admin": True},
+        {"id": "u2", "name": "Luis", "password": "hash"},
+        {"id": "u3", "name": "Eva", "password": "hash"},
+    ])
+    monkeypatch.setattr(principal_cache_module, "database", SimpleNamespace(users=users))
+    return users
+
+
+@pytest.mark.unit
+class TestPrincipalCache:
+    """Test principal lookups, eviction and revocation."""
+
+    async def test_repeated_lookups_read_once(self, users):
+        """Test a cached principal is served without another database read."""
+        cache = PrincipalCache(ttl=60, max_size=10)
+
+        first = await cache.get("u1", 0)
+        first["is_admin"] = False
+        second = await cache.get("u1", 0)
+
+        assert users.reads == 1
+        assert second["is_admin"] is True
+        assert "password" not in second
+
+    async def test_least_recently_used_is_evicted(self, users):
+        """Test the cache keeps at most max_size principals."""
+        cache = PrincipalCache(ttl=60, max_size=2)
+
+        await cache.get("u1")
+        await cache.get("u2")
+        await cache.get("u1")
+        await cache.get("u3")
+        await cache.get("u1")
+        await cache.get("u2")
+
+        assert users.reads == 4
+
+    async def test_revoke_rejects_old_tokens(self, users):
+        """Test bumping the token version invalidates previously issued tokens."""
+        cache = PrincipalCache(ttl=60, max_size=10)
+        claims = token_claims(users.docs["u2"])
+
+        assert await cache.get(claims["sub"], claims["tv"]) is not None
+
+        await cache.revoke(["u2"])
+
+        assert await cache.get(claims["sub"], claims["tv"]) is None
+        assert await cache.get("u2", token_claims(users.docs["u2"])["tv"]) is not None
+
+    async def test_unknown_user_is_none(self, users):
+        """Test a token for a missing user resolves to no principal."""
+        assert await PrincipalCache().get("missing") is None
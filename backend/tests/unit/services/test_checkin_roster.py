@@ -0,0 +1,211 @@
+"""
+Unit tests for the door-scanner check-in roster
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import services.checkin_roster as checkin_roster_module
+import services.reservation_service as reservation_service_module
+from services.checkin_roster import (
+    CheckinRoster, code_hash, verify_roster,
+    CHECKED_IN, ALREADY_CHECKED_IN, CANCELLED, CANCELLED_AFTER_SCAN, DUPLICATE, NOT_FOUND, INVALID
+)
+
+
+def project(doc, projection):
+    if not projection:
+        return dict(doc)
+    return {k: v for k, v in doc.items() if projection.get(k)}
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield doc
+        return iterate()
+
+
+class FakeCollection:
+    """Collection stand-in matching on equality and `$in`, counting reads"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.reads = 0
+        self.writes = 0
+
+    def _matches(self, doc, query):
+        for key, value in query.items():
+            if isinstance(value, dict) and "$in" in value:
+                if doc.get(key) not in value["$in"]:
+                    return False
+            elif doc.get(key) != value:
+                return False
+        return True
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        for doc in self.docs:
+            if self._matches(doc, query):
+                return project(doc, projection)
+        return None
+
+    def find(self, query, projection=None):
+        self.reads += 1
+        return FakeCursor([project(doc, projection) for doc in self.docs if self._matches(doc, query)])
+
+    async def update_one(self, query, update):
+        self.writes += 1
+        for doc in self.docs:
+            if self._matches(doc, query):
+                doc.update(update["$set"])
+                return SimpleNamespace(modified_count=1)
+        return SimpleNamespace(modified_count=0)
+
+    async def bulk_write(self, operations, ordered=True):
+        modified = 0
+        for operation in operations:
+            modified += (await self.update_one(operation._filter, operation._doc)).modified_count
+        return SimpleNamespace(modified_count=modified)
+
+    async def insert_many(self, docs):
+        self.docs.extend(docs)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = SimpleNamespace(
+        events=FakeCollection([
+            {"id": "e1", "title": "Concierto", "date": "2026-10-18", "time": "19:00", "location": "Sala"}
+        ]),
+        reservations=FakeCollection([
+            {"id": "r1", "event_id": "e1", "user_id": "u1", "status": "confirmed", "checkin_code": "AAAA1111"},
+            {"id": "r2", "event_id": "e1", "user_id": "u2", "status": "confirmed", "checkin_code": "BBBB2222"},
+            {"id": "r3", "event_id": "e1", "user_id": "u2", "status": "cancelled", "checkin_code": "CCCC3333"},
+        ]),
+        users=FakeCollection([
+            {"id": "u1", "name": "Ana", "email": "ana@example.com"},
+            {"id": "u2", "name": "Luis", "email": "luis@example.com"},
+        ]),
+        checkins=FakeCollection([])
+    )
+    monkeypatch.setattr(checkin_roster_module, "database", db)
+    monkeypatch.setattr(reservation_service_module, "database", db)
+    monkeypatch.setattr(reservation_service_module.reservation_service, "_listeners", [])
+    monkeypatch.setattr(checkin_roster_module.settings, "CHECKIN_ROSTER_SIGNING_KEY", "test-key", raising=False)
+    return db
+
+
+@pytest.mark.unit
+class TestCheckinRoster:
+    """Test scans answered from the roster and conditional check-in writes."""
+
+    async def test_scans_after_load_do_not_read(self, db):
+        """Test a loaded roster answers code and reservation lookups from memory."""
+        roster = CheckinRoster()
+        assert await roster.load("e1")
+        reads = db.reservations.reads + db.users.reads + db.events.reads
+
+        entry = await roster.find_by_code("aaaa1111")
+        assert entry["user_name"] == "Ana"
+        assert (await roster.find_by_reservation("r2"))["user_name"] == "Luis"
+        assert roster.details(entry)["event_title"] == "Concierto"
+        assert db.reservations.reads + db.users.reads + db.events.reads == reads
+
+    async def test_check_in_writes_once(self, db):
+        """Test a check-in is one conditional write and a repeat scan is refused without one."""
+        roster = CheckinRoster()
+        entry = await roster.find_by_code("AAAA1111")
+
+        assert await roster.check_in(entry, {"checked_in_at": "2026-10-18T19:00:00"}) == CHECKED_IN
+        assert db.reservations.docs[0]["status"] == "checked_in"
+        assert await roster.check_in(entry, {"checked_in_at": "2026-10-18T19:01:00"}) == ALREADY_CHECKED_IN
+        assert db.reservations.writes == 1
+
+    async def test_cancelled_elsewhere_is_refused(self, db):
+        """Test a stale roster entry loses to a cancellation made on another worker."""
+        roster = CheckinRoster()
+        await roster.load("e1")
+        db.reservations.docs[1]["status"] = "cancelled"
+
+        entry = await roster.find_by_code("BBBB2222")
+        assert await roster.check_in(entry, {"checked_in_at": "2026-10-18T19:00:00"}) == CANCELLED
+        assert entry["status"] == "cancelled"
+        assert await roster.check_in(await roster.find_by_code("CCCC3333"), {}) == CANCELLED
+
+    async def test_cancel_listener_updates_roster(self, db):
+        """Test a cancellation through ReservationService reaches the roster."""
+        roster = CheckinRoster()
+        await roster.load("e1")
+
+        await roster.apply_reservation_changes([{"reservation_id": "r1", "status": "cancelled"}])
+
+        assert (await roster.find_by_code("AAAA1111"))["status"] == "cancelled"
+
+    async def test_unknown_code(self, db):
+        """Test a code no reservation has resolves to None."""
+        assert await CheckinRoster().find_by_code("ZZZZ9999") is None
+
+
+@pytest.mark.unit
+class TestOfflineRoster:
+    """Test the signed roster export and batched offline check-ins."""
+
+    async def test_export_is_signed_and_hashed(self, db):
+        """Test exported codes are hashed and any edit breaks the signature."""
+        roster = await CheckinRoster().export("e1")
+
+        rows = {row[1]: row for row in roster["entries"]}
+        assert rows["r1"][0] == code_hash(roster["salt"], "aaaa1111")
+        assert "AAAA1111" not in str(roster["entries"])
+        assert verify_roster(roster)
+
+        rows["r3"][3] = "confirmed"
+        assert not verify_roster(roster)
+
+    async def test_batch_resolves_conflicts(self, db):
+        """Test earliest scan wins and every scan gets a deterministic result."""
+        db.reservations.docs[1].update(status="cancelled", cancelled_at="2024-05-01T19:30:00")
+        scans = [
+            {"checkin_code": "AAAA1111", "scanned_at": "2024-05-01T19:05:00"},
+            {"checkin_code": "aaaa1111", "scanned_at": "2024-05-01T19:01:00"},
+            {"reservation_id": "r2", "scanned_at": "2024-05-01T19:10:00"},
+            {"checkin_code": "CCCC3333", "scanned_at": "2024-05-01T19:10:00"},
+            {"checkin_code": "ZZZZ9999", "scanned_at": "2024-05-01T19:10:00"},
+            {"checkin_code": "AAAA1111", "scanned_at": "not a time"},
+        ]
+
+        results = await CheckinRoster().check_in_batch("e1", scans, "admin")
+
+        assert [result["status"] for result in results] == [
+            DUPLICATE, CHECKED_IN, CANCELLED_AFTER_SCAN, CANCELLED, NOT_FOUND, INVALID
+        ]
+        assert results[1]["checked_in_at"] == "2024-05-01T19:01:00"
+        assert db.reservations.docs[0]["checked_in_at"] == "2024-05-01T19:01:00"
+        assert db.reservations.writes == 1
+        assert len(db.checkins.docs) == 1
+
+    async def test_batch_lost_race_is_already_checked_in(self, db):
+        """Test a reservation checked in elsewhere after the roster loaded is not written twice."""
+        roster = CheckinRoster()
+        await roster.load("e1")
+        db.reservations.docs[0]["status"] = "checked_in"
+
+        results = await roster.check_in_batch("e1", [
+            {"checkin_code": "AAAA1111", "scanned_at": "2024-05-01T19:00:00"}
+        ], "admin")
+
+        assert results[0]["status"] == ALREADY_CHECKED_IN
+        assert db.checkins.docs == []
+
+    async def test_batch_unknown_event(self, db):
+        """Test a batch for a missing event returns None."""
+        assert await CheckinRoster().check_in_batch("missing", [], "admin") is None
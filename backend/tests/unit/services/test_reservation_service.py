@@ -0,0 +1,117 @@
+"""
+Unit tests for seat counter reconciliation
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import services.reservation_service as reservation_service_module
+from services.reservation_service import ReservationService
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield doc
+        return iterate()
+
+
+def matches(doc, query):
+    for key, value in query.items():
+        if isinstance(value, dict) and "$in" in value:
+            if doc.get(key) not in value["$in"]:
+                return False
+        elif isinstance(value, dict) and "$exists" in value:
+            if (key in doc) != value["$exists"]:
+                return False
+        elif doc.get(key) != value:
+            return False
+    return True
+
+
+class FakeEvents:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(doc) for doc in self.docs if matches(doc, query)])
+
+    async def bulk_write(self, operations, ordered=True):
+        modified = 0
+        for operation in operations:
+            for doc in self.docs:
+                if matches(doc, operation._filter):
+                    for key, value in operation._doc.get("$set", {}).items():
+                        doc[key] = value
+                    for key, value in operation._doc.get("$inc", {}).items():
+                        doc[key] = doc.get(key, 0) + value
+                    modified += 1
+                    break
+        return SimpleNamespace(modified_count=modified)
+
+
+class FakeReservations:
+    """Counts active reservations per event; `between_samples` runs after the first count"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.counted = 0
+        self.between_samples = None
+
+    def aggregate(self, pipeline):
+        match = pipeline[0]["$match"]
+        counts = {}
+        for doc in self.docs:
+            if doc["status"] in match["status"]["$in"] and matches(doc, {k: v for k, v in match.items() if k != "status"}):
+                counts[doc["event_id"]] = counts.get(doc["event_id"], 0) + 1
+        self.counted += 1
+        if self.counted == 1 and self.between_samples:
+            self.between_samples()
+        return FakeCursor([{"_id": event_id, "count": count} for event_id, count in counts.items()])
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = SimpleNamespace(
+        events=FakeEvents([
+            {"id": "e1", "capacity": 10, "reserved_count": 3},
+            {"id": "e2", "capacity": 10, "reserved_count": 5},
+            {"id": "e3", "capacity": 10},
+        ]),
+        reservations=FakeReservations([
+            {"id": "r1", "event_id": "e1", "status": "confirmed"},
+            {"id": "r2", "event_id": "e1", "status": "checked_in"},
+            {"id": "r3", "event_id": "e2", "status": "confirmed"},
+            {"id": "r4", "event_id": "e2", "status": "cancelled"},
+            {"id": "r5", "event_id": "e3", "status": "confirmed"},
+        ])
+    )
+    monkeypatch.setattr(reservation_service_module, "database", db)
+    return db
+
+
+@pytest.mark.unit
+class TestSeatCounterReconciliation:
+    """Test drift is only corrected where it held still between samples."""
+
+    async def test_in_flight_booking_keeps_its_seat(self, db):
+        """Test a booking that took its seat but had not inserted yet is not overwritten."""
+        def insert_pending_booking():
+            db.reservations.docs.append({"id": "r6", "event_id": "e1", "status": "confirmed"})
+        db.reservations.between_samples = insert_pending_booking
+
+        await ReservationService().reconcile_reserved_counts(["e1"], settle=0)
+
+        assert db.events.docs[0]["reserved_count"] == 3
+
+    async def test_stable_drift_is_corrected(self, db):
+        """Test counters that stay wrong are fixed and missing ones are created."""
+        corrected = await ReservationService().reconcile_reserved_counts(settle=0)
+
+        assert corrected == 3
+        assert [event["reserved_count"] for event in db.events.docs] == [2, 1, 1]
@@ -0,0 +1,86 @@
+"""
+Unit tests for bulk user import jobs
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import services.user_import as user_import_module
+from services.user_import import UserImportService, INTERRUPTED_ERROR
+
+
+def matches(doc, query):
+    for key, value in query.items():
+        if key == "$or":
+            if not any(matches(doc, option) for option in value):
+                return False
+        elif isinstance(value, dict) and "$in" in value:
+            if doc.get(key) not in value["$in"]:
+                return False
+        elif isinstance(value, dict) and "$exists" in value:
+            if (key in doc) != value["$exists"]:
+                return False
+        elif isinstance(value, dict) and "$lte" in value:
+            if key not in doc or doc[key] > value["$lte"]:
+                return False
+        elif doc.get(key) != value:
+            return False
+    return True
+
+
+class FakeJobs:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def find_one(self, query, projection=None):
+        return next((dict(doc) for doc in self.docs if matches(doc, query)), None)
+
+    async def update_many(self, query, update):
+        modified = 0
+        for doc in self.docs:
+            if matches(doc, query):
+                doc.update(update.get("$set", {}))
+                for key in update.get("$unset", {}):
+                    doc.pop(key, None)
+                modified += 1
+        return SimpleNamespace(modified_count=modified)
+
+
+def at(seconds: int) -> str:
+    return (datetime.utcnow() + timedelta(seconds=seconds)).isoformat()
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    jobs = FakeJobs([
+        {"id": "expired", "status": "running", "updated_at": at(-600), "locked_until": at(-60)},
+        {"id": "live", "status": "running", "updated_at": at(-600), "locked_until": at(60)},
+        {"id": "legacy", "status": "queued", "updated_at": at(-600)},
+        {"id": "done", "status": "completed", "updated_at": at(-600)},
+    ])
+    monkeypatch.setattr(user_import_module, "database", SimpleNamespace(db=SimpleNamespace(import_jobs=jobs)))
+    return jobs
+
+
+@pytest.mark.unit
+class TestInterruptedImports:
+    """Test jobs cut off by a restart are failed once their lease runs out."""
+
+    async def test_expired_jobs_are_failed(self, jobs):
+        """Test only active jobs without a live lease are marked failed."""
+        failed = await UserImportService().fail_interrupted_jobs()
+
+        assert failed == 2
+        assert {doc["id"]: doc["status"] for doc in jobs.docs} == {
+            "expired": "failed", "live": "running", "legacy": "failed", "done": "completed"
+        }
+        assert jobs.docs[0]["error"] == INTERRUPTED_ERROR
+
+    async def test_polling_reports_interrupted_job(self, jobs):
+        """Test a job no worker owns is reported failed when polled."""
+        service = UserImportService()
+
+        assert (await service.get_job("expired"))["status"] == "failed"
+        assert (await service.get_job("live"))["status"] == "running"
@@ -0,0 +1,37 @@
+"""
+Unit tests for native date helpers
+"""
+
+from datetime import datetime
+
+import pytest
+
+from utils.dates import days_filter, with_native_dates
+
+
+@pytest.mark.unit
+class TestDaysFilter:
+    """Test whole-day date range filters."""
+
+    def test_end_day_is_inclusive(self):
+        """Test the range runs up to the start of the day after `date_to`."""
+        assert days_filter("2026-10-01", "2026-10-18") == {
+            "$gte": datetime(2026, 10, 1),
+            "$lt": datetime(2026, 10, 19)
+        }
+
+    def test_open_bounds_are_left_out(self):
+        """Test a missing bound is omitted from the filter."""
+        assert days_filter(date_to="2026-10-18") == {"$lt": datetime(2026, 10, 19)}
+        assert days_filter(date_from="2026-10-18") == {"$gte": datetime(2026, 10, 18)}
+
+    def test_malformed_date_is_rejected(self):
+        """Test invalid dates raise ValueError."""
+        with pytest.raises(ValueError):
+            days_filter("18/10/2026")
+
+    def test_last_login_gets_native_copy(self):
+        """Test login timestamps are stored with a datetime copy."""
+        doc = with_native_dates({"last_login": "2026-10-18T08:30:00"})
+
+        assert doc["last_login_dt"] == datetime(2026, 10, 18, 8, 30)
@@ -0,0 +1,53 @@
+"""
+Unit tests for identifier normalization
+"""
+
+import pytest
+
+from utils.identifiers import (
+    normalize_email,
+    normalize_phone,
+    with_normalized_identifiers,
+    identifier_query
+)
+
+
+@pytest.mark.unit
+class TestIdentifiers:
+    """Test email and phone lookup keys."""
+
+    @pytest.mark.parametrize("phone", [
+        "+1 (809) 555-1234",
+        "809-555-1234",
+        "8095551234",
+        "18095551234",
+        "001 809 555 1234",
+        " +18095551234 ",
+    ])
+    def test_phone_spellings_share_a_key(self, phone):
+        """Test the usual spellings of one number normalize to E.164."""
+        assert normalize_phone(phone) == "+18095551234"
+
+    @pytest.mark.parametrize("phone", ["", "N/A", "555-1234", "+1234567890123456", None])
+    def test_unusable_phone_is_none(self, phone):
+        """Test values that cannot be a dialable number have no key."""
+        assert normalize_phone(phone) is None
+
+    def test_email_is_trimmed_and_lowercased(self):
+        """Test email keys ignore case and surrounding whitespace."""
+        assert normalize_email("  Ana.Perez@Example.COM ") == "ana.perez@example.com"
+        assert normalize_email("") is None
+
+    def test_only_present_fields_are_normalized(self):
+        """Test partial updates only set the keys of the fields they change."""
+        assert with_normalized_identifiers({"phone": "809 555 1234"}) == {
+            "phone": "809 555 1234",
+            "phone_normalized": "+18095551234"
+        }
+        assert with_normalized_identifiers({"name": "Ana"}) == {"name": "Ana"}
+
+    def test_identifier_query(self):
+        """Test an identifier becomes one equality match on a normalized key."""
+        assert identifier_query("Ana@Example.com") == {"email_normalized": "ana@example.com"}
+        assert identifier_query("(809) 555-1234") == {"phone_normalized": "+18095551234"}
+        assert identifier_query("abc") is None
@@ -0,0 +1,127 @@
+"""
+Unit tests for the indexed user search helpers
+"""
+
+import re
+
+import pytest
+
+from utils.search import (
+    fold,
+    search_fields,
+    with_search_fields,
+    search_filter,
+    text_search,
+    escape_regex,
+    find_users_by_name,
+    MAX_PREFIX_LENGTH
+)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def limit(self, count):
+        return FakeCursor(self.docs[:count])
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class FakeUsers:
+    """users stand-in for equality, `$all`, `$nin`, `$ne`, `$regex` and `$and` filters"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def _matches(self, doc, query):
+        for key, value in query.items():
+            if key == "$and":
+                if not all(self._matches(doc, part) for part in value):
+                    return False
+            elif isinstance(value, dict) and "$regex" in value:
+                if not re.search(value["$regex"], doc.get(key, "")):
+                    return False
+            elif isinstance(value, dict) and "$all" in value:
+                if not set(value["$all"]) <= set(doc.get(key, [])):
+                    return False
+            elif isinstance(value, dict) and "$nin" in value:
+                if doc.get(key) in value["$nin"]:
+                    return False
+            elif isinstance(value, dict) and "$ne" in value:
+                if doc.get(key) == value["$ne"]:
+                    return False
+            elif doc.get(key) != value:
+                return False
+        return True
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(doc) for doc in self.docs if self._matches(doc, query)])
+
+
+@pytest.mark.unit
+class TestUserSearch:
+    """Test folding, prefix tokens and query building."""
+
+    def test_fold_removes_case_and_accents(self):
+        """Test accented and differently cased spellings fold together."""
+        assert fold("  José   NÚÑEZ ") == "jose nunez"
+        assert fold(None) == ""
+
+    def test_prefixes_cover_name_email_and_location_words(self):
+        """Test every name/email/location word is findable by its leading characters."""
+        fields = search_fields({"name": "María Pérez", "email": "mperez@correo.do", "location": "Santiago"})
+
+        assert fields["search_name"] == "maria perez"
+        assert {"m", "ma", "mar", "maria", "pere", "mperez", "correo", "do"} <= set(fields["search_prefixes"])
+        assert {"san", "santiago"} <= set(fields["search_prefixes"])
+        assert "santiago" in fields["search_text"]
+        assert max(len(prefix) for prefix in fields["search_prefixes"]) <= MAX_PREFIX_LENGTH
+
+    def test_partial_update_merges_current_values(self):
+        """Test renaming a user keeps their email words searchable."""
+        update = with_search_fields({"name": "Ana"}, {"name": "Old", "email": "ana@x.com", "location": "Higüey"})
+        assert "x" in update["search_prefixes"] and "higuey" in update["search_prefixes"]
+        assert "old" not in update["search_prefixes"]
+        assert update["search_text"] == "ana x com higuey"
+        assert with_search_fields({"phone": "1"}) == {"phone": "1"}
+
+    def test_search_filter_is_anchored_per_word(self):
+        """Test typed words become an $all over prefixes, never a regex."""
+        assert search_filter("Pérez  MAR") == {"search_prefixes": {"$all": ["mar", "perez"]}}
+        assert search_filter("Constantinopla")["search_prefixes"]["$all"] == ["constantin"]
+        assert search_filter(".*") is None
+
+    def test_text_search_requires_every_word(self):
+        """Test $text terms are quoted so all of them must match."""
+        assert text_search("José Núñez") == {"$text": {"$search": '"jose" "nunez"'}}
+        assert text_search("") is None
+
+    def test_escape_regex(self):
+        """Test regex metacharacters in user input are literal."""
+        assert escape_regex(" a.*(b) ") == r"a\.\*\(b\)"
+
+    async def test_exact_name_survives_many_prefix_matches(self):
+        """Test the exact folded name is found even beyond `limit` prefix matches."""
+        names = [f"Ana Perez{i}" for i in range(15)] + ["Ana Pérez"]
+        users = FakeUsers([
+            {"id": f"u{i}", "name": name, **search_fields({"name": name})} for i, name in enumerate(names)
+        ])
+
+        found = await find_users_by_name(users, "ana perez", limit=10)
+
+        assert len(found) == 10
+        assert found[0]["name"] == "Ana Pérez"
+        assert len({user["id"] for user in found}) == 10
+
+    async def test_name_lookup_ignores_location_matches(self):
+        """Test a typed name does not match users who only live in a place of that name."""
+        users = FakeUsers([
+            {"id": "u1", "name": "Ana Santiago", **search_fields({"name": "Ana Santiago", "location": "Moca"})},
+            {"id": "u2", "name": "Ana Gómez", **search_fields({"name": "Ana Gómez", "location": "Santiago"})},
+        ])
+
+        found = await find_users_by_name(users, "ana sant")
+
+        assert [user["id"] for user in found] == ["u1"]
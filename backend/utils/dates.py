@@ -0,0 +1,94 @@
+"""
+Date utilities - Native BSON datetimes stored alongside ISO timestamp strings
+
+Timestamps have always been written as ISO strings (`created_at`,
+`checked_in_at`, check-in `timestamp`, `last_login`), which the API returns as-is. Each of
+them now also gets a `<field>_dt` datetime copy, so date ranges are indexed
+`$gte`/`$lt` scans and aggregations can bucket with `$dateTrunc`.
+Existing documents are back-filled by migrate_native_dates.py.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple, Union
+
+# Timestamp fields that carry a native datetime copy
+NATIVE_DATE_FIELDS = ("created_at", "checked_in_at", "timestamp", "last_login")
+
+
+def native_field(field: str) -> str:
+    """Name of the datetime copy of a timestamp field"""
+    return f"{field}_dt"
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Naive UTC datetime of an ISO timestamp string or datetime, or None"""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def with_native_dates(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the `<field>_dt` copies of the timestamp fields present in `doc` (in place)"""
+    for field in NATIVE_DATE_FIELDS:
+        if field in doc:
+            doc[native_field(field)] = parse_timestamp(doc[field])
+    return doc
+
+
+def day_start(day: Union[date, datetime, str]) -> datetime:
+    """Midnight (UTC) starting a day given as a date, datetime or YYYY-MM-DD string"""
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    elif isinstance(day, datetime):
+        day = day.date()
+    return datetime(day.year, day.month, day.day)
+
+
+def day_range(day: Union[date, datetime, str], days: int = 1) -> Tuple[datetime, datetime]:
+    """[start, end) datetimes covering `days` days from `day`"""
+    start = day_start(day)
+    return start, start + timedelta(days=days)
+
+
+def month_start(moment: Union[date, datetime]) -> datetime:
+    """Midnight (UTC) on the first day of the month of `moment`"""
+    return datetime(moment.year, moment.month, 1)
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    """First day of the month `months` away from the month of `moment`"""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def range_filter(start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, datetime]:
+    """`{"$gte": start, "$lt": end}` with the missing bounds left out"""
+    bounds: Dict[str, datetime] = {}
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lt"] = end
+    return bounds
+
+
+def days_filter(date_from: Optional[str] = None, date_to: Optional[str] = None) -> Dict[str, datetime]:
+    """
+    Range filter covering whole days from `date_from` through `date_to`
+
+    Both bounds are YYYY-MM-DD days and either may be omitted; `date_to` is
+    inclusive, so the range ends at the start of the following day. Raises
+    ValueError for malformed dates.
+    """
+    return range_filter(
+        day_start(date_from) if date_from else None,
+        day_range(date_to)[1] if date_to else None
+    )
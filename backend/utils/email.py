@@ -1,61 +1,35 @@
 """
-Email utilities using SendGrid
+Email utilities
+Messages are queued in the email outbox and delivered by its background workers
 """
 
 import logging
 from typing import Optional
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-from core.config import settings
+from core.email_outbox import email_outbox
 
 logger = logging.getLogger(__name__)
 
-# Initialize SendGrid client if API key is available
-sg_client = None
-if settings.SENDGRID_API_KEY:
-    try:
-        sg_client = SendGridAPIClient(api_key=settings.SENDGRID_API_KEY)
-        logger.info("✅ SendGrid client initialized")
-    except Exception as e:
-        logger.warning(f"⚠️ Failed to initialize SendGrid: {e}")
-else:
-    logger.warning("⚠️ SendGrid API key not configured")
-
 
 async def send_email(
     to_email: str,
     subject: str,
     html_content: str,
-    from_email: Optional[str] = None
+    dedupe_key: Optional[str] = None
 ) -> bool:
-    """Send email using SendGrid"""
-    if not sg_client:
-        logger.warning("SendGrid not configured, email not sent")
-        return False
-    
+    """Queue an email for background delivery"""
     try:
-        message = Mail(
-            from_email=from_email or settings.FROM_EMAIL,
-            to_emails=to_email,
-            subject=subject,
-            html_content=html_content
+        return await email_outbox.enqueue(
+            to_email,
+            subject,
+            html_content,
+            dedupe_key=dedupe_key
         )
-        
-        response = sg_client.send(message)
-        
-        if response.status_code == 202:
-            logger.info(f"✅ Email sent successfully to {to_email}")
-            return True
-        else:
-            logger.error(f"❌ Failed to send email: {response.status_code}")
-            return False
-            
     except Exception as e:
-        logger.error(f"❌ Error sending email: {e}")
+        logger.error(f"❌ Error queueing email: {e}")
         return False
 
 
-async def send_welcome_email(email: str, name: str) -> bool:
+async def send_welcome_email(email: str, name: str, user_id: Optional[str] = None) -> bool:
     """Send welcome email to new user"""
     subject = "¡Bienvenido al Centro Cultural Banreservas!"
     
@@ -102,7 +76,7 @@ async def send_welcome_email(email: str, name: str) -> bool:
     </html>
     """
     
-    return await send_email(email, subject, html_content)
+    return await send_email(email, subject, html_content, dedupe_key=f"welcome:{user_id}" if user_id else "welcome")
 
 
 async def send_reservation_confirmation_email(
@@ -166,7 +140,7 @@ async def send_reservation_confirmation_email(
     </html>
     """
     
-    return await send_email(email, subject, html_content)
+    return await send_email(email, subject, html_content, dedupe_key=f"reservation:{reservation_code}")
 
 
 async def send_password_reset_email(email: str, name: str, reset_token: str) -> bool:
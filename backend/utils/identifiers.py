@@ -0,0 +1,100 @@
+"""
+Identifier utilities - canonical lookup keys for email and phone
+
+Users carry `email_normalized` (trimmed, lowercase) and `phone_normalized`
+(E.164, "+18095551234") next to the raw fields they typed. Both are set by
+`with_normalized_identifiers` on every write and indexed, so finding a user
+by email or phone is a single equality match whatever the spelling.
+
+Numbers without a country code are read as national numbers of
+DEFAULT_COUNTRY_CODE (the North American Numbering Plan, which covers the
+Dominican Republic's 809/829/849).
+"""
+
+import re
+from typing import Optional, Dict, Any
+
+DEFAULT_COUNTRY_CODE = "1"
+NATIONAL_NUMBER_LENGTH = 10
+
+# E.164 allows at most 15 digits; shorter than 8 is no dialable number
+MIN_PHONE_DIGITS = 8
+MAX_PHONE_DIGITS = 15
+
+NORMALIZED_FIELDS = {"email": "email_normalized", "phone": "phone_normalized"}
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_email(email: Any) -> Optional[str]:
+    """Lookup key of an email address, or None if empty"""
+    if not isinstance(email, str):
+        return None
+    return email.strip().lower() or None
+
+
+def normalize_phone(phone: Any) -> Optional[str]:
+    """
+    E.164 form of a phone number, or None if it cannot be one
+
+    "+1 (809) 555-1234", "809-555-1234", "18095551234" and
+    "001 809 555 1234" all give "+18095551234".
+    """
+    if not isinstance(phone, str):
+        return None
+    phone = phone.strip()
+    digits = _NON_DIGITS.sub("", phone)
+
+    if phone.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        # International call prefix
+        digits = digits[2:]
+    elif len(digits) == NATIONAL_NUMBER_LENGTH:
+        digits = DEFAULT_COUNTRY_CODE + digits
+
+    if not MIN_PHONE_DIGITS <= len(digits) <= MAX_PHONE_DIGITS or digits.startswith("0"):
+        return None
+    return f"+{digits}"
+
+
+def with_normalized_identifiers(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the normalized copies of the `email` / `phone` fields present in `doc` (in place)"""
+    if "email" in doc:
+        doc["email_normalized"] = normalize_email(doc["email"])
+    if "phone" in doc:
+        doc["phone_normalized"] = normalize_phone(doc["phone"])
+    return doc
+
+
+def identifier_query(identifier: str) -> Optional[Dict[str, Any]]:
+    """
+    Users filter for an email address or phone number
+
+    Anything with an "@" is an email; everything else is tried as a phone
+    number. Returns None when the identifier normalizes to nothing.
+    """
+    if "@" in identifier:
+        email = normalize_email(identifier)
+        return {"email_normalized": email} if email else None
+    phone = normalize_phone(identifier)
+    return {"phone_normalized": phone} if phone else None
+
+
+async def find_user_by_identifier(
+    users,
+    identifier: str,
+    projection: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    The non-deleted user whose email or phone matches `identifier`
+
+    `users` is the users collection. One indexed equality match on the
+    normalized key; None if the identifier is not an email or phone number
+    or nobody has it.
+    """
+    query = identifier_query(identifier)
+    if query is None:
+        return None
+    query["deleted"] = {"$ne": True}
+    return await users.find_one(query, projection or {"_id": 0, "password": 0})
@@ -0,0 +1,161 @@
+"""
+Search utilities - indexed user search
+
+Users carry three derived fields, maintained by `with_search_fields` on
+every write:
+
+- `search_name`: the name, lowercase and accent-folded ("José Núñez" ->
+  "jose nunez");
+- `search_text`: the folded email and location;
+- `search_prefixes`: every prefix (up to MAX_PREFIX_LENGTH characters) of
+  every folded name, email and location token, for search-as-you-type.
+
+`search_filter` turns what an admin types into an `$all` match on
+`search_prefixes`: each typed word must start a word of the user's name,
+email or location, in any order. It is served by the multikey index and
+combines with any other filter. `name_filter` narrows the same index scan to
+words of the name, for looking people up by name. `text_search` is the ranked alternative: a `$text` query
+over `search_name` and `search_text` (name weighted higher), sorted by
+`TEXT_SCORE`; it matches whole words only, location included.
+
+User input never reaches MongoDB as a pattern; `escape_regex` covers the
+remaining free-text regex filters.
+"""
+
+import re
+import unicodedata
+from typing import Optional, List, Dict, Any
+
+MAX_PREFIX_LENGTH = 10
+MAX_QUERY_TOKENS = 5
+
+SEARCH_SOURCE_FIELDS = ("name", "email", "location")
+
+# Projection keeping the derived fields out of API responses
+HIDDEN_SEARCH_FIELDS = {"search_name": 0, "search_text": 0, "search_prefixes": 0}
+
+# Projection and sort for ranked `$text` results
+TEXT_SCORE = {"$meta": "textScore"}
+RELEVANCE_SORT = [("score", TEXT_SCORE)]
+
+_TOKEN_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+
+def fold(text: Any) -> str:
+    """Lowercase text without accents and with single spaces ("  Ñoño " -> "nono")"""
+    if not isinstance(text, str):
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def tokenize(text: Any) -> List[str]:
+    """Folded alphanumeric words of a text; emails split at "@" and "." too"""
+    return [token for token in _TOKEN_SEPARATORS.split(fold(text)) if token]
+
+
+def prefixes(token: str) -> List[str]:
+    """Leading substrings of a token, one character up to MAX_PREFIX_LENGTH"""
+    return [token[:length] for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1)]
+
+
+def search_fields(user: Dict[str, Any]) -> Dict[str, Any]:
+    """The derived search fields of a user with `name`, `email` and `location`"""
+    tokens = tokenize(user.get("name")) + tokenize(user.get("email")) + tokenize(user.get("location"))
+    return {
+        "search_name": fold(user.get("name")),
+        "search_text": " ".join(filter(None, [
+            " ".join(tokenize(user.get("email"))),
+            fold(user.get("location"))
+        ])),
+        "search_prefixes": sorted({prefix for token in tokens for prefix in prefixes(token)})
+    }
+
+
+def with_search_fields(doc: Dict[str, Any], current: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Add the derived search fields to a user insert or `$set` (in place)
+
+    For a partial update, `current` is the stored user: the fields follow
+    from the merged values. Updates that touch none of name, email and
+    location are left alone.
+    """
+    if not any(field in doc for field in SEARCH_SOURCE_FIELDS):
+        return doc
+    merged = {field: (current or {}).get(field) for field in SEARCH_SOURCE_FIELDS}
+    merged.update({field: doc[field] for field in SEARCH_SOURCE_FIELDS if field in doc})
+    doc.update(search_fields(merged))
+    return doc
+
+
+def search_filter(search: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Index-backed filter for users whose name, email or location words start with each typed word
+
+    None when the search has no letters or digits.
+    """
+    tokens = tokenize(search)[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return None
+    return {"search_prefixes": {"$all": sorted({token[:MAX_PREFIX_LENGTH] for token in tokens})}}
+
+
+def name_filter(name: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    `search_filter` restricted to users whose name words start with each typed word
+
+    The prefix index does the scan; the anchored checks on `search_name`
+    only drop users matched through their email or location. None when the
+    name has no letters or digits.
+    """
+    query = search_filter(name)
+    if query is None:
+        return None
+    query["$and"] = [
+        {"search_name": {"$regex": f"(^| ){re.escape(token)}"}}
+        for token in tokenize(name)[:MAX_QUERY_TOKENS]
+    ]
+    return query
+
+
+def text_search(search: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    `$text` filter requiring every typed word, for ranking by TEXT_SCORE
+
+    None when the search has no letters or digits.
+    """
+    tokens = tokenize(search)[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return None
+    # Quoted terms are ANDed by $text; unquoted ones would be ORed
+    return {"$text": {"$search": " ".join(f'"{token}"' for token in tokens)}}
+
+
+def escape_regex(text: str) -> str:
+    """User input as a literal regex pattern"""
+    return re.escape(text.strip())
+
+
+async def find_users_by_name(users, name: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Non-deleted users matching a typed name, exact (folded) matches first
+
+    `users` is the users collection. Exact matches come from an equality
+    query on `search_name`, so they are never crowded out by prefix matches;
+    a second, prefix-index query fills the rest of the `limit`. An empty list
+    when the name has no letters or digits.
+    """
+    query = name_filter(name)
+    if query is None:
+        return []
+    projection = {"_id": 0, "password": 0, **HIDDEN_SEARCH_FIELDS}
+    found = await users.find(
+        {"search_name": fold(name), "deleted": {"$ne": True}}, projection
+    ).limit(limit).to_list(length=limit)
+    remaining = limit - len(found)
+    if remaining > 0:
+        query["deleted"] = {"$ne": True}
+        query["id"] = {"$nin": [user["id"] for user in found]}
+        found += await users.find(query, projection).limit(remaining).to_list(length=remaining)
+    return found